@@ -0,0 +1,268 @@
+"""
+batching.py — несколько фото одного приёма пищи → один batch-запрос к AI Proxy.
+
+Простыми словами:
+- пользователь часто снимает блюдо с 2–4 ракурсов подряд, и все фото попадают
+  в один Meal (get_or_create_draft_meal, окно DRAFT_WINDOW_MINUTES)
+- раньше каждое фото = отдельный запрос к AI Proxy (отдельный round trip
+  и отдельный накладной расход модели на запрос)
+- теперь фото, пришедшие в коротком окне (AI_BATCH_WINDOW_MS), уходят одним
+  запросом, а результаты раскладываются обратно по своим MealPhoto
+
+Как это устроено (задачи Celery остаются по одной на фото):
+- первая задача приёма пищи становится лидером (cache.add — атомарно)
+- лидер ждёт окно, затем "забирает" остальные PROCESSING фото этого Meal
+  (claim через cache.add, тоже атомарно) и делает один batch-вызов
+- PENDING фото не забираются: их задача запаркована/в очереди и может стартовать
+  позже, чем живут claim/result ключи, — распознает их сама
+- результат каждого забранного фото лидер кладёт в кэш
+- задача забранного фото ждёт свой результат и дальше работает как обычно
+  (FoodItem, recognized_data, usage, finalize — без изменений)
+
+Правила:
+- любая проблема (нет лидера, batch упал, таймаут) → фото распознаётся
+  по одному, как раньше (recognize_in_batch возвращает None)
+- фото с user_comment в batch не попадают (комментарий относится к одному фото)
+- ожидание окна (лидер) и результата (follower) прерывается отменой задачи
+  (cancel token) — TaskCancelled, участники лидера получают fallback
+- выключено по умолчанию: нужен batch endpoint на стороне AI Proxy
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.ai_proxy.service import AIProxyService, BatchImage, RecognizeFoodResult
+
+from .cancellation import CancelToken, TaskCancelled
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "ai_batch_leader:{meal_id}"
+CLAIM_KEY = "ai_batch_claim:{photo_id}"
+RESULT_KEY = "ai_batch_result:{photo_id}"
+
+# Маркер "распознавай сам" (batch не удался / фото не прочиталось)
+FALLBACK = "fallback"
+# Маркер в CLAIM_KEY: фото не участвует в batch (например, есть user_comment)
+SOLO = "solo"
+
+POLL_INTERVAL_S = 0.1
+# Сколько follower ждёт claim после окна лидера
+CLAIM_GRACE_S = 2.0
+# Сколько follower ждёт результат (таймаут AI Proxy 5 + 35 с + запас)
+RESULT_WAIT_S = 45.0
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "AI_BATCH_RECOGNITION_ENABLED", False))
+
+
+def _window_s() -> float:
+    return int(getattr(settings, "AI_BATCH_WINDOW_MS", 1500)) / 1000
+
+
+def _key_ttl() -> int:
+    return int(_window_s() + CLAIM_GRACE_S + RESULT_WAIT_S) + 1
+
+
+def opt_out(meal_photo_id: int) -> None:
+    """Исключает фото из batch (вызывается view до постановки задачи)."""
+    cache.set(CLAIM_KEY.format(photo_id=meal_photo_id), SOLO, timeout=_key_ttl())
+
+
+def recognize_in_batch(
+    *,
+    service: AIProxyService,
+    meal_id: int,
+    meal_photo_id: int,
+    image_bytes: bytes,
+    content_type: str,
+    normalization: Optional[Dict[str, Any]] = None,
+    request_id: str = "",
+    cancel_token: Optional[CancelToken] = None,
+) -> Optional[RecognizeFoodResult]:
+    """
+    Распознаёт фото в составе batch своего приёма пищи.
+
+    Returns:
+        RecognizeFoodResult этого фото или None → распознавать по одному
+
+    Raises:
+        TaskCancelled: задача отменена во время ожидания
+    """
+    leader_key = LEADER_KEY.format(meal_id=meal_id)
+    try:
+        if cache.add(leader_key, meal_photo_id, timeout=_key_ttl()):
+            try:
+                return _lead(
+                    service=service,
+                    meal_id=meal_id,
+                    meal_photo_id=meal_photo_id,
+                    image=BatchImage(image_bytes, content_type, normalization),
+                    request_id=request_id,
+                    cancel_token=cancel_token,
+                )
+            finally:
+                cache.delete(leader_key)
+        return _follow(meal_photo_id, cancel_token)
+    except TaskCancelled:
+        raise
+    except Exception as e:
+        logger.warning(
+            "[AI Batch] coordination failed: photo_id=%s error=%s rid=%s",
+            meal_photo_id,
+            type(e).__name__,
+            request_id,
+        )
+        return None
+
+
+def _lead(
+    *,
+    service: AIProxyService,
+    meal_id: int,
+    meal_photo_id: int,
+    image: BatchImage,
+    request_id: str,
+    cancel_token: Optional[CancelToken],
+) -> Optional[RecognizeFoodResult]:
+    from apps.nutrition.models import MealPhoto
+
+    ttl = _key_ttl()
+    cache.add(CLAIM_KEY.format(photo_id=meal_photo_id), meal_photo_id, timeout=ttl)
+
+    # Окно коалесинга: даём остальным фото приёма пищи загрузиться
+    _sleep(_window_s(), cancel_token)
+
+    # Только фото, чья задача уже выполняется (и ждёт результат в _follow)
+    max_photos = int(getattr(settings, "AI_BATCH_MAX_PHOTOS", 4))
+    candidates = (
+        MealPhoto.objects.filter(meal_id=meal_id, status="PROCESSING")
+        .exclude(id=meal_photo_id)
+        .order_by("created_at")[: max_photos - 1]
+    )
+    members: List[int] = []
+    images: List[BatchImage] = [image]
+    for photo in candidates:
+        if not cache.add(CLAIM_KEY.format(photo_id=photo.id), meal_photo_id, timeout=ttl):
+            continue  # уже забрано / solo
+        member_image = _load_member_image(photo)
+        if member_image is None:
+            _publish(photo.id, FALLBACK)
+            continue
+        members.append(photo.id)
+        images.append(member_image)
+
+    if not members:
+        return None
+
+    try:
+        results = service.recognize_food_batch(images=images, request_id=request_id)
+    except TaskCancelled:
+        # Отменён лидер — участники распознают сами, не дожидаясь RESULT_WAIT_S
+        for photo_id in members:
+            _publish(photo_id, FALLBACK)
+        raise
+    except Exception as e:
+        logger.warning(
+            "[AI Batch] batch call failed, fallback to single: meal_id=%s photos=%d "
+            "error=%s rid=%s",
+            meal_id,
+            len(images),
+            type(e).__name__,
+            request_id,
+        )
+        for photo_id in members:
+            _publish(photo_id, FALLBACK)
+        return None
+
+    for photo_id, result in zip(members, results[1:]):
+        _publish(photo_id, asdict(result))
+
+    logger.info(
+        "[AI Batch] meal_id=%s leader_photo=%s photos=%d rid=%s",
+        meal_id,
+        meal_photo_id,
+        len(images),
+        request_id,
+    )
+    return results[0]
+
+
+def _follow(
+    meal_photo_id: int, cancel_token: Optional[CancelToken]
+) -> Optional[RecognizeFoodResult]:
+    claim_key = CLAIM_KEY.format(photo_id=meal_photo_id)
+
+    # 1. Ждём, пока лидер заберёт фото (или окно закончится)
+    claim_deadline = time.monotonic() + _window_s() + CLAIM_GRACE_S
+    while True:
+        claimed_by = cache.get(claim_key)
+        if claimed_by is not None:
+            break
+        if time.monotonic() >= claim_deadline:
+            # Лидер нас не взял → забираем себя сами (атомарно, без гонки с лидером)
+            if cache.add(claim_key, meal_photo_id, timeout=_key_ttl()):
+                return None
+            continue
+        _sleep(POLL_INTERVAL_S, cancel_token)
+
+    if claimed_by in (meal_photo_id, SOLO):
+        return None
+
+    # 2. Ждём результат от лидера
+    result_key = RESULT_KEY.format(photo_id=meal_photo_id)
+    deadline = time.monotonic() + RESULT_WAIT_S
+    while time.monotonic() < deadline:
+        data = cache.get(result_key)
+        if data is not None:
+            cache.delete(result_key)
+            if data == FALLBACK:
+                return None
+            return RecognizeFoodResult(**data)
+        _sleep(POLL_INTERVAL_S, cancel_token)
+
+    logger.warning("[AI Batch] no result from leader: photo_id=%s", meal_photo_id)
+    return None
+
+
+def _sleep(seconds: float, cancel_token: Optional[CancelToken]) -> None:
+    """Пауза, которую прерывает отмена задачи."""
+    if cancel_token is None:
+        time.sleep(seconds)
+    elif cancel_token.wait(seconds):
+        raise TaskCancelled()
+
+
+def _load_member_image(photo) -> Optional[BatchImage]:
+    """Фото другой задачи: нормализованный JPEG (стадия media) или оригинал."""
+    from apps.ai.image_meta import stored_meta
+    from apps.ai.serializers import _detect_mime_from_bytes
+
+    from .tasks import _read_normalized_photo, _read_photo_bytes
+
+    image_bytes, normalization = _read_normalized_photo(photo)
+    if image_bytes is not None:
+        return BatchImage(image_bytes, "image/jpeg", normalization)
+
+    image_bytes = _read_photo_bytes(photo)
+    if not image_bytes:
+        return None
+    # Тип определён при загрузке (ImageMeta) — сигнатуру заново не проверяем
+    meta = stored_meta(photo)
+    if meta is not None:
+        return BatchImage(image_bytes, meta.mime_type, normalization)
+    # Для HEIC сигнатуры нет (ftyp) — как и в задаче, доверяем формату
+    content_type = _detect_mime_from_bytes(image_bytes) or "image/heic"
+    return BatchImage(image_bytes, content_type, normalization)
+
+
+def _publish(meal_photo_id: int, payload: Any) -> None:
+    cache.set(RESULT_KEY.format(photo_id=meal_photo_id), payload, timeout=_key_ttl())
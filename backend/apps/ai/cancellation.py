@@ -0,0 +1,258 @@
+"""
+cancellation.py — кооперативная отмена AI задачи во время выполнения.
+
+Простыми словами:
+- раньше флаг отмены проверялся один раз, до вызова AI Proxy: отмена во время
+  вызова ждала ответа до 35 с, и результат просто выбрасывался (BR-3 guard)
+- теперь:
+  1) задача проверяет флаг между стадиями (чтение фото → AI Proxy → запись в БД)
+  2) вызов AI Proxy идёт через run_abortable(): задача ждёт ЛИБО ответ,
+     ЛИБО отмену — и при отмене сразу выходит (слот воркера свободен)
+  3) request_cancel() кроме флага публикует уведомление в Redis
+     (канал ai_task_cancel:<task_id>), watcher задачи узнаёт об отмене сразу
+
+Правила:
+- флаг ai_task_cancelled:<task_id> = user_id отменившего (как раньше);
+  чужая отмена задачу не останавливает
+- async-клиент (AI_PROXY_CLIENT_MODE=async): HTTP-запрос реально отменяется;
+  sync: поток запроса дорабатывает в фоне, ответ выбрасывается
+- без Redis pub/sub watcher опрашивает флаг раз в AI_CANCEL_POLL_S
+- время от отмены до освобождения задачи пишется в лог:
+  [AI Cancel] released ... cancel_to_release_ms
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FLAG_KEY = "ai_task_cancelled:{task_id}"
+REQUESTED_AT_KEY = "ai_task_cancel_at:{task_id}"
+CHANNEL = "ai_task_cancel:{task_id}"
+# TTL как у ai_task_owner
+KEY_TTL_S = 86400
+
+
+class TaskCancelled(Exception):
+    """Задача отменена пользователем во время выполнения."""
+
+
+def request_cancel(task_id: str, user_id: int) -> None:
+    """Ставит флаг отмены и будит watcher задачи (best-effort pub/sub)."""
+    from .task_status import redis_client
+
+    cache.set_many(
+        {
+            FLAG_KEY.format(task_id=task_id): user_id,
+            REQUESTED_AT_KEY.format(task_id=task_id): time.time(),
+        },
+        timeout=KEY_TTL_S,
+    )
+    client = redis_client()
+    if client is None:
+        return
+    try:
+        client.publish(CHANNEL.format(task_id=task_id), str(user_id))
+    except Exception as e:
+        logger.warning(
+            "[AI Cancel] publish failed: task_id=%s error=%s", task_id, type(e).__name__
+        )
+
+
+def is_cancelled(task_id: str, user_id: Optional[int]) -> bool:
+    """Отменена ли задача её владельцем."""
+    cancelled_by = cache.get(FLAG_KEY.format(task_id=task_id))
+    if cancelled_by is None:
+        return False
+    return user_id is None or int(cancelled_by) == user_id
+
+
+def observe_release(task_id: str) -> Optional[int]:
+    """Логирует время от запроса отмены до выхода задачи, мс."""
+    requested_at = cache.get(REQUESTED_AT_KEY.format(task_id=task_id))
+    if requested_at is None:
+        return None
+    latency_ms = max(0, int((time.time() - float(requested_at)) * 1000))
+    logger.info("[AI Cancel] released task=%s cancel_to_release_ms=%d", task_id, latency_ms)
+    return latency_ms
+
+
+class CancelToken:
+    """Сигнал отмены одной задачи (потокобезопасный)."""
+
+    def __init__(self) -> None:
+        self._future: Future = Future()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._future.done()
+
+    def cancel(self) -> None:
+        try:
+            self._future.set_result(True)
+        except Exception:
+            pass  # уже отменён
+
+    def wait(self, timeout: float) -> bool:
+        """Ждёт отмену не дольше timeout; True — задача отменена."""
+        wait([self._future], timeout=timeout)
+        return self.cancelled
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """callback() вызовется при отмене (сразу, если токен уже отменён)."""
+        self._future.add_done_callback(lambda _: callback())
+
+
+def _poll_interval_s() -> float:
+    return float(getattr(settings, "AI_CANCEL_POLL_S", 1.0))
+
+
+def _watch(task_id: str, user_id: Optional[int], token: CancelToken, stop: threading.Event):
+    from .task_status import redis_client
+
+    pubsub = None
+    client = redis_client()
+    if client is not None:
+        try:
+            pubsub = client.pubsub()
+            # Подписка ДО проверки флага: отмена между ними не потеряется
+            pubsub.subscribe(CHANNEL.format(task_id=task_id))
+        except Exception:
+            pubsub = None
+
+    try:
+        while not stop.is_set():
+            if is_cancelled(task_id, user_id):
+                token.cancel()
+                return
+            if pubsub is None:
+                stop.wait(_poll_interval_s())
+                continue
+            message = pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=_poll_interval_s()
+            )
+            # Сообщение — только сигнал "проверь флаг" (владелец проверяется там)
+            if message and message.get("type") == "message" and is_cancelled(task_id, user_id):
+                token.cancel()
+                return
+    except Exception as e:
+        logger.warning(
+            "[AI Cancel] watcher stopped: task_id=%s error=%s", task_id, type(e).__name__
+        )
+    finally:
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+
+@contextmanager
+def watch(task_id: str, user_id: Optional[int]) -> Iterator[CancelToken]:
+    """Следит за отменой задачи, пока открыт контекст."""
+    token = CancelToken()
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=_watch, args=(task_id, user_id, token, stop), name="ai-cancel-watch", daemon=True
+    )
+    watcher.start()
+    try:
+        yield token
+    finally:
+        stop.set()
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Пул потоков для вызовов AI Proxy (после fork — новый)."""
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            workers = int(getattr(settings, "AI_PROXY_POOL_MAXSIZE", 32))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-call")
+            _executor_pid = pid
+    return _executor
+
+
+def _run_with_abort_hook(fn: Callable[[], T], token: CancelToken) -> T:
+    from apps.ai_proxy.async_client import abort_hook
+
+    reset = abort_hook.set(token.add_callback)
+    try:
+        return fn()
+    finally:
+        abort_hook.reset(reset)
+
+
+def run_abortable(fn: Callable[[], T], token: CancelToken) -> T:
+    """
+    Выполняет fn() (вызов AI Proxy), но возвращается сразу при отмене.
+
+    Raises:
+        TaskCancelled: отмена пришла раньше ответа
+    """
+    if token.cancelled:
+        raise TaskCancelled()
+    # Контекст задачи (guard AI Proxy) виден и в потоке вызова — см. hold_slot_until
+    context = contextvars.copy_context()
+    future = _get_executor().submit(context.run, _run_with_abort_hook, fn, token)
+    wait([future, token._future], return_when=FIRST_COMPLETED)
+    if not token.cancelled:
+        return future.result()
+    # Отмена: успевший успешный ответ отдаём, иначе (вкл. прерванный вызов) — выходим
+    if future.done() and not future.cancelled() and future.exception() is None:
+        return future.result()
+    if not future.cancel():
+        # sync-клиент: вызов дорабатывает в фоне — слот лимитера AI Proxy держится до конца
+        from apps.ai_proxy.resilience import hold_slot_until
+
+        hold_slot_until(future)
+    raise TaskCancelled()
+
+
+class AbortableClient:
+    """
+    Клиент AI Proxy для AIProxyService: каждый HTTP-вызов — через run_abortable().
+
+    Остальная работа сервиса (кэш, поиск дубликатов в БД) идёт в потоке задачи.
+    """
+
+    def __init__(self, token: CancelToken, client: Any = None) -> None:
+        self._token = token
+        self._client = client
+
+    def _inner(self) -> Any:
+        if self._client is None:
+            from apps.ai_proxy.service import default_client
+
+            self._client = default_client()
+        return self._client
+
+    def recognize_food(self, **kwargs: Any) -> Any:
+        client = self._inner()
+        return run_abortable(lambda: client.recognize_food(**kwargs), self._token)
+
+    def recognize_food_batch(self, **kwargs: Any) -> Any:
+        client = self._inner()
+        return run_abortable(lambda: client.recognize_food_batch(**kwargs), self._token)
@@ -0,0 +1,96 @@
+"""
+dedup.py — поиск почти-дубликатов фото по перцептивному хешу (dHash).
+
+Простыми словами:
+- одно и то же блюдо часто присылают повторно: сфотографировали дважды,
+  Telegram пережал, чуть обрезали — байты разные, а картинка та же
+- у каждого MealPhoto хранится dHash нормализованного фото (perceptual_hash)
+- перед вызовом AI Proxy ищем у этого же пользователя недавнее SUCCESS фото
+  с близким хешем и переиспользуем его recognized_data
+
+Почему это быстро:
+- кандидаты: только фото пользователя за окно AI_NEAR_DUPLICATE_WINDOW_HOURS,
+  не больше AI_NEAR_DUPLICATE_MAX_CANDIDATES штук (один SELECT)
+- расстояние Хэмминга по 64 битам — одна XOR + popcount на кандидата
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import logging
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.ai_proxy.utils import hamming_distance
+
+logger = logging.getLogger(__name__)
+
+
+def find_near_duplicate(
+    user_id: int,
+    perceptual_hash: str,
+    exclude_photo_id: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Ищет у пользователя недавнее распознанное фото, похожее на perceptual_hash.
+
+    Returns:
+        {items, totals, meta} в формате AIProxyService (items с полем grams)
+        или None, если похожих фото нет / поиск выключен
+    """
+    if not getattr(settings, "AI_NEAR_DUPLICATE_ENABLED", True):
+        return None
+
+    from apps.nutrition.models import MealPhoto
+
+    max_distance = int(getattr(settings, "AI_NEAR_DUPLICATE_MAX_DISTANCE", 5))
+    window_hours = int(getattr(settings, "AI_NEAR_DUPLICATE_WINDOW_HOURS", 24))
+    max_candidates = int(getattr(settings, "AI_NEAR_DUPLICATE_MAX_CANDIDATES", 50))
+
+    cutoff = timezone.now() - timedelta(hours=window_hours)
+    candidates = (
+        MealPhoto.objects.filter(
+            meal__user_id=user_id,
+            status="SUCCESS",
+            perceptual_hash__isnull=False,
+            created_at__gte=cutoff,
+        )
+        .exclude(id=exclude_photo_id)
+        .order_by("-created_at")
+        .values_list("id", "perceptual_hash", "recognized_data")[:max_candidates]
+    )
+
+    best: Optional[tuple[int, int, Dict[str, Any]]] = None
+    for photo_id, candidate_hash, recognized_data in candidates:
+        try:
+            distance = hamming_distance(perceptual_hash, candidate_hash)
+        except ValueError:
+            continue
+        if distance <= max_distance and (best is None or distance < best[1]):
+            best = (photo_id, distance, recognized_data or {})
+            if distance == 0:
+                break
+
+    if best is None:
+        return None
+
+    photo_id, distance, recognized_data = best
+    items = recognized_data.get("items") or []
+    if not items:
+        return None
+
+    logger.info(
+        "[AI Dedup] match user_id=%s photo_id=%s distance=%d", user_id, photo_id, distance
+    )
+    return {
+        # recognized_data хранит API-формат (amount_grams) → обратно в формат сервиса (grams)
+        "items": [{**it, "grams": it.get("amount_grams", it.get("grams"))} for it in items],
+        "totals": recognized_data.get("totals") or {},
+        "meta": {
+            **(recognized_data.get("meta") or {}),
+            "near_duplicate_of": photo_id,
+            "hamming_distance": distance,
+        },
+    }
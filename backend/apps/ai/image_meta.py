@@ -0,0 +1,106 @@
+"""
+image_meta.py — метаданные фото, посчитанные ОДИН раз при загрузке.
+
+Простыми словами:
+- раньше одно и то же фото разбиралось много раз: сигнатура в serializer,
+  ещё раз в recognize_food_async, Pillow в normalize_image, валидаторы модели
+- теперь при загрузке (AIRecognizeRequestSerializer) считаем ImageMeta:
+    mime, ширина/высота, EXIF orientation, sha256 содержимого, размер
+  и сохраняем в MealPhoto.image_meta
+- дальше стадии доверяют записи:
+    recognize_food_async / batching — не сниффят сигнатуру повторно
+    normalize_meal_photo — размеры известны, маленький JPEG не открывается Pillow
+    FileSizeValidator / ImageDimensionValidator — не открывают файл
+
+Как считается (без полного decode и без копии файла в памяти):
+- Image.open() читает только заголовок (размеры, формат, EXIF)
+- sha256 — потоково, кусками по файлу
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+import hashlib
+from typing import IO, Any, Dict, Optional
+
+from PIL import Image
+
+# Регистрирует HEIF opener (если установлен pillow-heif)
+from apps.ai_proxy import utils as _ai_proxy_utils  # noqa: F401
+
+EXIF_ORIENTATION_TAG = 0x0112
+HASH_CHUNK_BYTES = 256 * 1024
+
+
+class ImageInspectError(ValueError):
+    """Файл не открывается как изображение."""
+
+
+@dataclass(frozen=True)
+class ImageMeta:
+    """
+    Метаданные исходного фото (MealPhoto.image).
+
+    orientation — EXIF Orientation (1 = без поворота, 6/8 — повёрнуто на 90°);
+    width/height — как хранятся в файле, ДО поворота по EXIF.
+    """
+
+    mime_type: str
+    width: int
+    height: int
+    orientation: int
+    sha256: str
+    size_bytes: int
+
+    @property
+    def longest_side(self) -> int:
+        return max(self.width, self.height)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["ImageMeta"]:
+        """Запись из MealPhoto.image_meta или None (старые фото / другой формат)."""
+        if not data:
+            return None
+        try:
+            return cls(**{name: data[name] for name in cls.__dataclass_fields__})
+        except (KeyError, TypeError):
+            return None
+
+
+def stored_meta(photo) -> Optional[ImageMeta]:
+    """ImageMeta из MealPhoto.image_meta (None — фото загружено до ImageMeta)."""
+    return ImageMeta.from_dict(getattr(photo, "image_meta", None))
+
+
+def inspect_image(file_obj: IO[bytes], mime_type: str, size_bytes: int) -> ImageMeta:
+    """
+    Заголовок изображения + потоковый sha256. Позиция файла возвращается в начало.
+
+    Raises:
+        ImageInspectError: Pillow не смог открыть файл
+    """
+    file_obj.seek(0)
+    try:
+        with Image.open(file_obj) as img:
+            width, height = img.size
+            orientation = int(img.getexif().get(EXIF_ORIENTATION_TAG, 1) or 1)
+    except Exception as e:
+        raise ImageInspectError(type(e).__name__) from e
+
+    file_obj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file_obj.read(HASH_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    file_obj.seek(0)
+
+    return ImageMeta(
+        mime_type=mime_type,
+        width=width,
+        height=height,
+        orientation=orientation if 1 <= orientation <= 8 else 1,
+        sha256=digest.hexdigest(),
+        size_bytes=size_bytes,
+    )
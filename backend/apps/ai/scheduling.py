@@ -0,0 +1,270 @@
+"""
+scheduling.py — честная очередь AI задач: приоритет по тарифу + лимит задач на пользователя.
+
+Простыми словами:
+- очередь ai — FIFO: один пользователь с 10 фото (или всплеск bot/legacy вызовов)
+  задерживает всех, а PRO ждёт за FREE
+- здесь два механизма:
+
+1) Приоритет по тарифу (lane):
+   - платный план → priority=PRIORITY_PAID, FREE → PRIORITY_FREE
+   - Redis-брокер держит отдельный список на каждый priority (priority_steps
+     в config/celery.py), воркер всегда сначала берёт более приоритетный
+   - prefetch=1: воркер не "забирает" задачи впрок, иначе приоритет не работает
+
+2) Лимит задач на пользователя в работе (AI_USER_INFLIGHT_LIMIT):
+   - пока у пользователя в очереди/в работе меньше лимита — задача уходит в брокер
+   - сверх лимита — задача паркуется в Redis-список пользователя (ai_sched_parked:<id>)
+   - завершилась задача пользователя (task_postrun / task_revoked) → его слот
+     отдаётся следующей запаркованной задаче, иначе освобождается
+   - цепочка оборвалась на нормализации (time_limit, ошибка) → errback
+     fail_broken_chain: фото FAILED + release; слоты, утёкшие иначе (воркер убит),
+     возвращаются по TTL счётчика, а застрявшие задачи разбирает beat (drain_stale)
+   - в брокере у каждого пользователя не больше N задач → FIFO очереди
+     сам чередует пользователей (round-robin)
+
+Правила:
+- task_id задачи известен сразу (запаркованная задача получает его заранее),
+  поэтому polling/cancel/owner-ключи работают как раньше
+- admit/release — Lua-скрипты: проверка и изменение счётчика атомарны
+- без Redis (LocMemCache в dev/тестах) лимиты не работают: задача сразу в брокер
+- queue wait (от постановки до старта, включая парковку) пишется в лог
+  по lane: [AI Sched] queue_wait
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Optional
+
+from django.conf import settings
+from kombu.utils.json import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Redis-брокер: 0 — самый высокий приоритет
+PRIORITY_PAID = 0
+PRIORITY_FREE = 6
+
+LANES = {PRIORITY_PAID: "paid", PRIORITY_FREE: "free"}
+
+INFLIGHT_KEY = "ai_sched_inflight:{user_id}"
+PARKED_KEY = "ai_sched_parked:{user_id}"
+# Страховка от утечки слотов (воркер убит без task_postrun): счётчик живёт KEY_TTL_S
+# с последнего допуска задачи. Список запаркованных задач TTL не имеет — payload
+# не теряется; после истечения счётчика его разбирает drain_stale() (beat).
+KEY_TTL_S = 15 * 60
+
+# KEYS: inflight, parked; ARGV: limit, payload, ttl →
+#   1 (в брокер) | 0 (запаркована) | payload (слот свободен, но очередь не пуста:
+#   новая задача встаёт в хвост, в брокер уходит самая старая запаркованная)
+_ADMIT_SCRIPT = """
+local n = redis.call('INCR', KEYS[1])
+if n <= tonumber(ARGV[1]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    if redis.call('LLEN', KEYS[2]) > 0 then
+        redis.call('RPUSH', KEYS[2], ARGV[2])
+        return redis.call('LPOP', KEYS[2])
+    end
+    return 1
+end
+redis.call('DECR', KEYS[1])
+redis.call('RPUSH', KEYS[2], ARGV[2])
+return 0
+"""
+
+# KEYS: inflight, parked; ARGV: ttl → payload следующей задачи (слот переходит к ней) | nil
+_RELEASE_SCRIPT = """
+local payload = redis.call('LPOP', KEYS[2])
+if payload then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        redis.call('SET', KEYS[1], 1)
+    end
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return payload
+end
+if redis.call('DECR', KEYS[1]) < 0 then
+    redis.call('SET', KEYS[1], 0)
+end
+return false
+"""
+
+# KEYS: inflight, parked; ARGV: limit, ttl → payload'ы задач, допущенных вместо утёкших слотов.
+# Счётчик истёк (ни одного допуска за KEY_TTL_S) — все слоты считаются свободными.
+_DRAIN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return {}
+end
+local payloads = {}
+for i = 1, tonumber(ARGV[1]) do
+    local payload = redis.call('LPOP', KEYS[2])
+    if not payload then
+        break
+    end
+    payloads[i] = payload
+end
+if #payloads > 0 then
+    redis.call('SET', KEYS[1], #payloads, 'EX', ARGV[2])
+end
+return payloads
+"""
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "AI_FAIR_SCHEDULING_ENABLED", True))
+
+
+def _inflight_limit() -> int:
+    return max(1, int(getattr(settings, "AI_USER_INFLIGHT_LIMIT", 2)))
+
+
+def priority_for_plan(plan) -> int:
+    """Приоритет задачи по действующему плану (FREE или нет плана → PRIORITY_FREE)."""
+    if plan is None or getattr(plan, "code", "FREE") == "FREE":
+        return PRIORITY_FREE
+    return PRIORITY_PAID
+
+
+def lane_for_priority(priority: Optional[int]) -> str:
+    return LANES.get(priority, "free" if priority is None else f"p{priority}")
+
+
+def submit(*, user_id: Optional[int], signature: Any, task_id: str) -> str:
+    """
+    Ставит задачу (signature/chain с заранее заданным task_id) с учётом лимита пользователя.
+
+    Returns:
+        task_id поставленной (или запаркованной) задачи
+    """
+    from .task_status import redis_client
+
+    client = redis_client() if (is_enabled() and user_id) else None
+    if client is not None:
+        try:
+            admitted = client.eval(
+                _ADMIT_SCRIPT,
+                2,
+                INFLIGHT_KEY.format(user_id=user_id),
+                PARKED_KEY.format(user_id=user_id),
+                _inflight_limit(),
+                dumps(dict(signature)),
+                KEY_TTL_S,
+            )
+        except Exception as e:
+            # Планировщик недоступен — не блокируем пользователя, ставим напрямую
+            logger.warning(
+                "[AI Sched] admit failed, dispatching directly: user_id=%s error=%s",
+                user_id,
+                type(e).__name__,
+            )
+            admitted = 1
+
+        if isinstance(admitted, (bytes, str)):
+            # Утёкшие слоты вернулись по TTL, а очередь пользователя не пуста — FIFO
+            _dispatch(admitted)
+            admitted = 0
+
+        if not admitted:
+            logger.info(
+                "[AI Sched] parked task=%s user_id=%s limit=%s",
+                task_id,
+                user_id,
+                _inflight_limit(),
+            )
+            return task_id
+
+    result = signature.apply_async()
+    return getattr(result, "id", None) or task_id
+
+
+def _dispatch(payload) -> None:
+    from celery import signature
+
+    signature(loads(payload)).apply_async()
+
+
+def release(user_id: Optional[int]) -> None:
+    """
+    Задача пользователя завершилась: слот → следующей запаркованной задаче или свободен.
+    """
+    from .task_status import redis_client
+
+    if not user_id or not is_enabled():
+        return
+    client = redis_client()
+    if client is None:
+        return
+
+    try:
+        payload = client.eval(
+            _RELEASE_SCRIPT,
+            2,
+            INFLIGHT_KEY.format(user_id=user_id),
+            PARKED_KEY.format(user_id=user_id),
+            KEY_TTL_S,
+        )
+        if payload:
+            _dispatch(payload)
+            logger.info("[AI Sched] dispatched parked task: user_id=%s", user_id)
+    except Exception as e:
+        logger.warning(
+            "[AI Sched] release failed: user_id=%s error=%s", user_id, type(e).__name__
+        )
+
+
+def drain_stale() -> int:
+    """
+    Запаркованные задачи пользователей, чей счётчик истёк (слоты утекли: воркер убит,
+    цепочка оборвалась без release), уходят в брокер в пределах лимита.
+
+    Returns:
+        сколько задач отправлено
+    """
+    from .task_status import redis_client
+
+    if not is_enabled():
+        return 0
+    client = redis_client()
+    if client is None:
+        return 0
+
+    dispatched = 0
+    prefix = PARKED_KEY.format(user_id="")
+    for key in client.scan_iter(match=f"{prefix}*", count=100):
+        user_id = (key.decode() if isinstance(key, bytes) else key)[len(prefix) :]
+        try:
+            payloads = client.eval(
+                _DRAIN_SCRIPT,
+                2,
+                INFLIGHT_KEY.format(user_id=user_id),
+                PARKED_KEY.format(user_id=user_id),
+                _inflight_limit(),
+                KEY_TTL_S,
+            )
+            for payload in payloads or []:
+                _dispatch(payload)
+                dispatched += 1
+        except Exception as e:
+            logger.warning(
+                "[AI Sched] drain failed: user_id=%s error=%s", user_id, type(e).__name__
+            )
+    if dispatched:
+        logger.warning("[AI Sched] drained stale parked tasks: count=%d", dispatched)
+    return dispatched
+
+
+def observe_queue_wait(
+    *, task_id: str, enqueued_at: Optional[float], priority: Optional[int]
+) -> Optional[int]:
+    """Логирует время ожидания задачи в очереди (включая парковку), мс."""
+    if not enqueued_at:
+        return None
+    wait_ms = max(0, int((time.time() - float(enqueued_at)) * 1000))
+    logger.info(
+        "[AI Sched] queue_wait task=%s lane=%s wait_ms=%d",
+        task_id,
+        lane_for_priority(priority),
+        wait_ms,
+    )
+    return wait_ms
@@ -7,27 +7,47 @@ serializers.py — валидация входа для AI распознава
 - дополнительно принимаем:
   - meal_type (тип приёма пищи) — можно не передавать, тогда будет SNACK
   - date (дата) — можно не передавать, тогда сегодня
-- на выходе отдаём нормализованную картинку (bytes + mime), чтобы дальше
+- на выходе отдаём нормализованную картинку (файл + mime), чтобы дальше
   views/tasks не ковыряли сырые данные.
+
+Память (пиковый RSS воркера gunicorn):
+- multipart: файл НЕ читаем целиком — тип по сигнатуре из первых байт,
+  размер из UploadedFile.size; дальше в storage уходит сам UploadedFile
+  (большой уже лежит во временном файле — FileSystemStorage его переносит)
+- data_url: base64 декодируется кусками во временный файл (SpooledTemporaryFile),
+  сигнатура — по первому куску, размер проверяется по ходу декодирования
+
+Метаданные (apps/ai/image_meta.py):
+- ImageMeta (размеры, EXIF orientation, sha256) считается здесь ОДИН раз
+  и сохраняется в MealPhoto.image_meta — дальше файл заново не разбирают
+- поэтому image — FileField, а не ImageField: DRF ImageField открывал бы
+  Pillow второй раз (open + verify); проверка «это картинка» — в inspect_image
 """
 
 from __future__ import annotations
 
 import base64
 import binascii
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import re
-from typing import Any, Dict, Optional
+import tempfile
+from typing import IO, Any, Dict, Optional
 
+from django.core.files import File
 from django.utils import timezone
 from rest_framework import serializers
 
+from apps.ai.image_meta import ImageInspectError, ImageMeta, inspect_image
+
 # Meal_type из модели (не импортируем модель, чтобы не тянуть ORM сюда)
 MEAL_TYPE_CHOICES = ("BREAKFAST", "LUNCH", "DINNER", "SNACK")
 
 # Безопасные лимиты (анти-DoS). Поднято до 15MB для больших Android JPEG.
 MAX_IMAGE_BYTES = 15 * 1024 * 1024
 
+# Тело запроса: base64 (+~37%) + остальные поля формы. Больше — отказ до разбора тела
+MAX_REQUEST_BYTES = int(MAX_IMAGE_BYTES * 1.4) + 64 * 1024
+
 # HEIC/HEIF добавлены — normalize_image() конвертирует их в JPEG
 ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
 
@@ -35,19 +55,44 @@ ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "im
 # HEIC не включён — для него доверяем MIME (ftyp сигнатура ненадёжна)
 BYTE_SNIFF_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
 
-DATA_URL_RE = re.compile(r"^data:(?P<mime>[-\w.+/]+);base64,(?P<data>[A-Za-z0-9+/=\s]+)$")
+DATA_URL_HEADER_RE = re.compile(r"^data:(?P<mime>[-\w.+/]+);base64$")
+_WHITESPACE = re.compile(r"\s+")
+
+# Сколько байт нужно для сигнатуры (_detect_mime_from_bytes)
+SNIFF_BYTES = 16
+# base64 декодируем кусками (кратно 4 символам)
+DATA_URL_CHUNK_CHARS = 256 * 1024
+# До этого размера декодированный data_url держим в памяти, дальше — на диске
+SPOOL_MAX_MEMORY_BYTES = 1024 * 1024
 
 
 @dataclass(frozen=True)
 class NormalizedImage:
     """
     Нормализованное изображение:
-    - bytes_data: байты файла
-    - mime_type: image/jpeg | image/png | image/webp
+    - file: файл-объект с позицией 0 (UploadedFile или SpooledTemporaryFile)
+    - size: размер в байтах
+    - mime_type: image/jpeg | image/png | image/webp | image/heic | image/heif
+    - meta: ImageMeta (None — Pillow не смог прочитать заголовок, см. _attach_meta)
     """
 
-    bytes_data: bytes
+    file: IO[bytes]
+    size: int
     mime_type: str
+    meta: Optional[ImageMeta] = None
+
+    def as_django_file(self) -> File:
+        """Для FieldFile.save(): UploadedFile отдаём как есть (storage перенесёт temp-файл)."""
+        self.file.seek(0)
+        return self.file if isinstance(self.file, File) else File(self.file)
+
+    @property
+    def bytes_data(self) -> bytes:
+        """Все байты (полная копия в памяти — не для пути загрузки)."""
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(0)
+        return data
 
 
 def _detect_mime_from_bytes(data: bytes) -> Optional[str]:
@@ -61,14 +106,35 @@ def _detect_mime_from_bytes(data: bytes) -> Optional[str]:
     return None
 
 
+def _sniff(file_obj) -> bytes:
+    """Первые байты файла для сигнатуры; позиция возвращается в начало."""
+    file_obj.seek(0)
+    head = file_obj.read(SNIFF_BYTES)
+    file_obj.seek(0)
+    return head
+
+
+def _iter_base64_chunks(b64_data: str):
+    """Куски base64 без пробелов, каждый (кроме последнего) кратен 4 символам."""
+    carry = ""
+    for start in range(0, len(b64_data), DATA_URL_CHUNK_CHARS):
+        chunk = carry + _WHITESPACE.sub("", b64_data[start : start + DATA_URL_CHUNK_CHARS])
+        cut = len(chunk) - len(chunk) % 4
+        carry = chunk[cut:]
+        if cut:
+            yield chunk[:cut]
+    if carry:
+        yield carry  # неполная группа → binascii.Error при декодировании
+
+
 def _decode_data_url(data_url: str) -> NormalizedImage:
-    """data_url(base64) → bytes + mime с проверками размера и типа."""
-    m = DATA_URL_RE.match((data_url or "").strip())
-    if not m:
+    """data_url(base64) → временный файл + mime с проверками размера и типа."""
+    header, sep, b64_data = (data_url or "").strip().partition(",")
+    m = DATA_URL_HEADER_RE.match(header)
+    if not sep or not m or not b64_data:
         raise serializers.ValidationError("Неверный формат data_url (ожидается base64 data URL)")
 
     mime = m.group("mime").lower().strip()
-    b64_data = m.group("data").strip()
 
     if mime not in ALLOWED_MIME_TYPES:
         raise serializers.ValidationError(f"Неподдерживаемый тип изображения: {mime}")
@@ -77,38 +143,51 @@ def _decode_data_url(data_url: str) -> NormalizedImage:
     if len(b64_data) > int(MAX_IMAGE_BYTES * 1.4):
         raise serializers.ValidationError("Изображение слишком большое")
 
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY_BYTES)
+    size = 0
+    head = b""
     try:
-        raw = base64.b64decode(b64_data, validate=True)
-    except (binascii.Error, ValueError):
+        for chunk in _iter_base64_chunks(b64_data):
+            raw = base64.b64decode(chunk.encode("ascii"), validate=True)
+            size += len(raw)
+            if size > MAX_IMAGE_BYTES:
+                out.close()
+                raise serializers.ValidationError("Изображение слишком большое")
+            if len(head) < SNIFF_BYTES:
+                head += raw[: SNIFF_BYTES - len(head)]
+            out.write(raw)
+    except (binascii.Error, ValueError, UnicodeEncodeError):
+        out.close()
         raise serializers.ValidationError("Некорректный base64 в data_url")
 
-    if not raw:
+    if not size:
+        out.close()
         raise serializers.ValidationError("Пустое изображение")
-
-    if len(raw) > MAX_IMAGE_BYTES:
-        raise serializers.ValidationError("Изображение слишком большое")
-
-    detected = _detect_mime_from_bytes(raw)
+    out.seek(0)
 
     # Для HEIC/HEIF: доверяем MIME (byte sniffing ненадёжен для ftyp)
     # normalize_image() сам решит: конвертировать или controlled error
     if mime in ("image/heic", "image/heif"):
-        return NormalizedImage(bytes_data=raw, mime_type=mime)
+        return NormalizedImage(file=out, size=size, mime_type=mime)
+
+    detected = _detect_mime_from_bytes(head)
 
     # Для jpeg/png/webp: проверяем содержимое
     if detected is None:
+        out.close()
         raise serializers.ValidationError("Файл не похож на изображение (jpeg/png/webp)")
 
     if detected != mime:
+        out.close()
         raise serializers.ValidationError("Тип изображения не совпадает с содержимым файла")
 
-    return NormalizedImage(bytes_data=raw, mime_type=mime)
+    return NormalizedImage(file=out, size=size, mime_type=mime)
 
 
 def _normalize_uploaded_file(file_obj) -> NormalizedImage:
     """
-    multipart файл → bytes + mime с лимитами.
-    Важно: читаем файл только после проверки size.
+    multipart файл → файл + mime с лимитами.
+    Важно: файл целиком не читаем — только size и первые байты (сигнатура).
     """
     size = getattr(file_obj, "size", None)
     if size is None:
@@ -118,13 +197,11 @@ def _normalize_uploaded_file(file_obj) -> NormalizedImage:
     if size > MAX_IMAGE_BYTES:
         raise serializers.ValidationError("Файл изображения слишком большой")
 
-    raw = file_obj.read()
-    if not raw:
+    head = _sniff(file_obj)
+    if not head:
         raise serializers.ValidationError("Пустой файл")
-    if len(raw) > MAX_IMAGE_BYTES:
-        raise serializers.ValidationError("Файл изображения слишком большой")
 
-    detected = _detect_mime_from_bytes(raw)
+    detected = _detect_mime_from_bytes(head)
 
     # Для HEIC/HEIF: пытаемся определить по MIME заголовка (если есть)
     # или просто пропускаем (normalize_image разберётся)
@@ -132,14 +209,31 @@ def _normalize_uploaded_file(file_obj) -> NormalizedImage:
     if content_type:
         ct_lower = content_type.lower().split(";")[0].strip()
         if ct_lower in ("image/heic", "image/heif"):
-            return NormalizedImage(bytes_data=raw, mime_type=ct_lower)
+            return NormalizedImage(file=file_obj, size=size, mime_type=ct_lower)
 
     if detected is None:
         raise serializers.ValidationError("Файл не похож на изображение (jpeg/png/webp)")
     if detected not in ALLOWED_MIME_TYPES:
         raise serializers.ValidationError("Неподдерживаемый тип изображения")
 
-    return NormalizedImage(bytes_data=raw, mime_type=detected)
+    return NormalizedImage(file=file_obj, size=size, mime_type=detected)
+
+
+def _attach_meta(image: NormalizedImage, *, strict: bool) -> NormalizedImage:
+    """
+    NormalizedImage + ImageMeta.
+
+    strict=True (multipart jpeg/png/webp): не открывается Pillow → ValidationError
+    (раньше это проверял ImageField). Иначе (HEIC, data_url) — meta=None,
+    решение остаётся за normalize_image, как и до ImageMeta.
+    """
+    try:
+        meta = inspect_image(image.file, image.mime_type, image.size)
+    except ImageInspectError:
+        if strict:
+            raise serializers.ValidationError("Файл повреждён или не является изображением")
+        return image
+    return replace(image, meta=meta)
 
 
 class AIRecognizeRequestSerializer(serializers.Serializer):
@@ -162,7 +256,8 @@ class AIRecognizeRequestSerializer(serializers.Serializer):
     - user_comment: короткая подсказка для AI (опционально)
     """
 
-    image = serializers.ImageField(required=False, allow_null=True)
+    # FileField: содержимое проверяет inspect_image (один Pillow open на загрузку)
+    image = serializers.FileField(required=False, allow_null=True)
     # ⚠️ data_url: ТОЛЬКО для тестов/админки. В проде base64 запрещён!
     data_url = serializers.CharField(
         required=False,
@@ -207,12 +302,14 @@ class AIRecognizeRequestSerializer(serializers.Serializer):
         attrs["meal_type"] = attrs.get("meal_type") or "SNACK"
         attrs["date"] = attrs.get("date") or timezone.localdate()
 
-        # Нормализация изображения (bytes + mime)
+        # Нормализация изображения (файл + mime)
         if image:
-            attrs["normalized_image"] = _normalize_uploaded_file(image)
+            normalized = _normalize_uploaded_file(image)
+            strict = normalized.mime_type in BYTE_SNIFF_MIME_TYPES
+            attrs["normalized_image"] = _attach_meta(normalized, strict=strict)
             attrs["source_type"] = "file"
         else:
-            attrs["normalized_image"] = _decode_data_url(data_url or "")
+            attrs["normalized_image"] = _attach_meta(_decode_data_url(data_url or ""), strict=False)
             attrs["source_type"] = "data_url"
 
         return attrs
@@ -265,6 +362,40 @@ class CancelRequestSerializer(serializers.Serializer):
         return attrs
 
 
+class TaskStatusBatchRequestSerializer(serializers.Serializer):
+    """
+    Вход для GET /api/v1/ai/tasks/status/
+
+    Принимает ровно одно из:
+    - ids: "id1,id2,..." — task_id через запятую (не больше MAX_TASKS)
+    - meal_id: int — все задачи фото этого приёма пищи
+    """
+
+    MAX_TASKS = 20
+
+    ids = serializers.CharField(required=False, allow_blank=False, max_length=MAX_TASKS * 256)
+    meal_id = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        raw_ids = attrs.pop("ids", None)
+        if (raw_ids is None) == (attrs.get("meal_id") is None):
+            raise serializers.ValidationError("Укажите ids или meal_id")
+
+        if raw_ids is not None:
+            # dict.fromkeys: убираем дубли, сохраняя порядок
+            task_ids = list(dict.fromkeys(t.strip() for t in raw_ids.split(",") if t.strip()))
+            if not task_ids:
+                raise serializers.ValidationError({"ids": "Пустой список task_id"})
+            if len(task_ids) > self.MAX_TASKS:
+                raise serializers.ValidationError(
+                    {"ids": f"Не больше {self.MAX_TASKS} задач за запрос"}
+                )
+            if any(len(t) > 255 for t in task_ids):
+                raise serializers.ValidationError({"ids": "Слишком длинный task_id"})
+            attrs["task_ids"] = task_ids
+        return attrs
+
+
 class CancelResponseSerializer(serializers.Serializer):
     """
     Ответ для POST /api/v1/ai/cancel/
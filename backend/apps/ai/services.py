@@ -5,7 +5,7 @@ Responsibilities:
 - Structured logging для всех cancel событий
 - Создание CancelEvent в БД (audit trail)
 - Обновление MealPhoto.status = CANCELLED
-- Отзыв Celery tasks (best-effort)
+- Отзыв Celery tasks (best-effort) + кооперативная отмена запущенных (cancellation.py)
 """
 
 import logging
@@ -16,6 +16,7 @@ from celery import current_app as celery_app
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError, transaction
 
+from apps.nutrition.diary_cache import bump_diary_version_for_meals
 from apps.nutrition.models import CancelEvent, Meal, MealPhoto
 
 User = get_user_model()
@@ -218,10 +219,19 @@ class CancelService:
         if not task_ids:
             return 0
 
+        from django.core.cache import cache
+
+        from .cancellation import request_cancel
+
         revoked_count = 0
         for task_id in task_ids:
+            # Уже запущенная задача остановится сама (флаг + Redis уведомление);
+            # revoke без terminate — только для ещё не начатых задач в очереди
+            owner_id = cache.get(f"ai_task_owner:{task_id}")
+            if owner_id is not None and int(owner_id) == self.user.id:
+                request_cancel(task_id, self.user.id)
             try:
-                celery_app.control.revoke(task_id, terminate=True, signal="SIGKILL")
+                celery_app.control.revoke(task_id)
                 revoked_count += 1
                 logger.info("[AI][Cancel] REVOKED task_id=%s", task_id)
             except Exception as e:
@@ -255,7 +265,11 @@ class CancelService:
             queryset = queryset.filter(meal_id=meal_id)
 
         with transaction.atomic():
-            updated = queryset.select_for_update().update(status="CANCELLED")
+            locked = queryset.select_for_update(of=("self",))
+            meal_ids = list(locked.values_list("meal_id", flat=True))
+            updated = queryset.update(status="CANCELLED")
+            # .update() минует сигналы MealPhoto — ETag дневника сбрасываем явно
+            bump_diary_version_for_meals(meal_ids)
 
         if updated > 0:
             logger.info(
@@ -0,0 +1,84 @@
+"""
+stage_timings.py — время стадий AI задачи (для нагрузочных прогонов и метрик).
+
+Простыми словами:
+- задача открывает collect(): в нём любой код пути распознавания пишет время
+  своей стадии через record()/stage() — без передачи таймера через аргументы
+- вне collect() record()/stage() ничего не делают (бот, прямые вызовы сервиса)
+- итог {стадия: мс} задача кладёт в результат (timings_ms), он попадает
+  в запись состояния и в ответ TaskStatusView (result.timings_ms)
+- observe() пишет собранное время в гистограмму ai_recognition_stage_seconds
+  с метками stage/outcome/error_code (/metrics, см. apps.common.metrics)
+
+Стадии view (POST /api/v1/ai/recognize/, service="web"):
+- parse_validate — разбор multipart + AIRecognizeRequestSerializer
+- storage_write — сохранение фото в storage (MealPhoto.image)
+- enqueue — постановка цепочки задач + ключи владельца/состояния
+
+Стадии задачи (recognize_food_async, service="celery"):
+- queue_wait — от постановки в очередь до старта задачи (вкл. парковку)
+- normalize — нормализация фото (upload-time или inline)
+- proxy_rtt — вызов AI Proxy (без ожидания в limiter/circuit breaker)
+- db_persist — блокировка + запись items и MealPhoto
+- finalize — finalize Meal + COMMIT + учёт usage
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+from typing import Dict, Iterator, Optional
+
+from apps.common.metrics import Histogram, observe_many
+
+VIEW_STAGES = ("parse_validate", "storage_write", "enqueue")
+TASK_STAGES = ("queue_wait", "normalize", "proxy_rtt", "db_persist", "finalize")
+STAGES = VIEW_STAGES + TASK_STAGES
+
+STAGE_SECONDS = Histogram(
+    "ai_recognition_stage_seconds",
+    "Time spent in an AI recognition pipeline stage.",
+    ("stage", "outcome", "error_code"),
+)
+
+_current: ContextVar[Optional[Dict[str, int]]] = ContextVar("ai_stage_timings", default=None)
+
+
+@contextmanager
+def collect() -> Iterator[Dict[str, int]]:
+    """Собирает время стадий внутри контекста в возвращаемый dict."""
+    timings: Dict[str, int] = {}
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record(name: str, ms: Optional[float]) -> None:
+    """Добавляет время стадии (повторная стадия, напр. ретрай, суммируется)."""
+    timings = _current.get()
+    if timings is None or ms is None:
+        return
+    timings[name] = timings.get(name, 0) + max(0, int(ms))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Замеряет время блока как стадию name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def observe(timings: Dict[str, int], outcome: str, error_code: str = "") -> None:
+    """Время стадий (мс) → гистограмма STAGE_SECONDS одной записью на все стадии."""
+    labels = {"outcome": outcome, "error_code": error_code or ""}
+    observe_many(
+        (STAGE_SECONDS, {"stage": name, **labels}, ms / 1000)
+        for name, ms in timings.items()
+        if name in STAGES
+    )
@@ -0,0 +1,404 @@
+"""
+task_status.py — статус AI задачи для клиента + push-уведомления о смене статуса.
+
+Простыми словами:
+- build_status_payload() — ЕДИНЫЙ формат ответа {task_id, status, state, result?}
+  (polling TaskStatusView, SSE-стрим и события используют одну функцию)
+- publish() — задача сообщает о переходе PROCESSING/SUCCESS/FAILED
+  в Redis pub/sub канал ai_task_events:<task_id>
+- subscribe() — SSE-стрим слушает этот канал и отдаёт события клиенту сразу,
+  вместо десятков polling запросов
+- write_state()/read_state() — компактная запись состояния задачи в Redis
+  (ai_task_state:<task_id>): state, владелец, meal/photo, код ошибки.
+  Статус = один GET, полный результат лениво из MealPhoto.recognized_data
+- read_task_states() — legacy: state+result многих задач одним mget к result
+  backend (задачи, поставленные до появления записей состояния)
+
+Если кэш не Redis (dev/тесты на LocMemCache) — pub/sub недоступен:
+publish() ничего не делает, subscribe() возвращает None и стрим
+сам периодически перечитывает статус.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "ai_task_events:{task_id}"
+
+# Статусы для клиента, после которых стрим закрывается
+TERMINAL_STATUSES = frozenset({"success", "failed"})
+
+# Celery state, у которых есть result для build_status_payload
+READY_STATES = ("SUCCESS", "FAILURE")
+
+
+def build_status_payload(
+    task_id: str, state: str, result: Any = None, request_id: str = ""
+) -> Dict[str, Any]:
+    """
+    Celery state + результат задачи → ответ клиенту.
+
+    - SUCCESS без error → status=success, result с гарантированными items/totals
+    - SUCCESS с error (controlled error задачи) → status=failed
+    - FAILURE (исключение) → status=failed + INTERNAL_ERROR (детали только в логах)
+    - остальное → status=processing
+    """
+    if state == "SUCCESS":
+        payload: Dict[str, Any] = dict(result or {})
+
+        # Ensure items list exists for safe mapping on frontend
+        payload.setdefault("items", [])
+        payload.setdefault("totals", {})  # P0: Guarantee totals existence
+
+        # P1: Hygiene - Remove internal owner_id before sending to client
+        payload.pop("owner_id", None)
+
+        # Check if logic-level error exists in payload
+        if payload.get("error"):
+            return {
+                "task_id": task_id,
+                "status": "failed",
+                "state": state,
+                "error": payload["error"],
+                "result": payload,
+            }
+        return {"task_id": task_id, "status": "success", "state": state, "result": payload}
+
+    if state == "FAILURE":
+        from .error_contract import AIErrorRegistry
+
+        error_def = AIErrorRegistry.INTERNAL_ERROR
+        return {
+            "task_id": task_id,
+            "status": "failed",
+            "state": state,
+            "result": error_def.to_dict(trace_id=request_id),
+        }
+
+    return {"task_id": task_id, "status": "processing", "state": state}
+
+
+# ---------------------------------------------------------------------------
+# Запись состояния задачи
+# ---------------------------------------------------------------------------
+
+STATE_KEY = "ai_task_state:{task_id}"
+# Меняем при несовместимом изменении формата: старые записи игнорируются
+STATE_VERSION = 1
+STATE_TTL_S = 86400
+
+
+def make_state(
+    state: str,
+    *,
+    owner_id: Optional[int],
+    meal_id: Optional[int],
+    photo_id: Optional[int],
+    result: Any = None,
+    trace_id: str = "",
+) -> Dict[str, Any]:
+    """
+    Компактная запись состояния (без items/meta — только указатель на MealPhoto).
+
+    timings_ms (время стадий задачи, см. stage_timings) переносится из результата —
+    его отдаёт TaskStatusView в result.timings_ms.
+
+    error/failed берутся из результата задачи:
+    - error_code (Error Contract) → status=success + error_code, как и раньше
+    - error (legacy ветки задачи) → status=failed
+    """
+    error = None
+    failed = False
+    timings = None
+    if isinstance(result, dict):
+        if result.get("error"):
+            error = str(result["error"])
+            failed = True
+        elif result.get("error_code"):
+            error = str(result["error_code"])
+        timings = result.get("timings_ms")
+    record = {
+        "v": STATE_VERSION,
+        "state": state,
+        "owner_id": owner_id,
+        "meal_id": meal_id,
+        "photo_id": photo_id,
+        "error": error,
+        "failed": failed,
+        "trace_id": trace_id,
+        "ts": int(time.time()),
+    }
+    if timings:
+        record["timings_ms"] = timings
+    return record
+
+
+def write_state(task_id: str, record: Dict[str, Any]) -> None:
+    """Сохраняет запись состояния (best-effort: ошибка кэша не ломает задачу)."""
+    from django.core.cache import cache
+
+    try:
+        cache.set(STATE_KEY.format(task_id=task_id), record, timeout=STATE_TTL_S)
+    except Exception as e:
+        logger.warning(
+            "[AI State] write failed: task_id=%s error=%s", task_id, type(e).__name__
+        )
+
+
+def transition(
+    task_id: str,
+    state: str,
+    *,
+    owner_id: Optional[int],
+    meal_id: Optional[int],
+    photo_id: Optional[int],
+    result: Any = None,
+    trace_id: str = "",
+) -> None:
+    """Смена состояния задачи: запись состояния + событие для SSE-стрима."""
+    write_state(
+        task_id,
+        make_state(
+            state,
+            owner_id=owner_id,
+            meal_id=meal_id,
+            photo_id=photo_id,
+            result=result,
+            trace_id=trace_id,
+        ),
+    )
+    publish(
+        task_id, build_status_payload(task_id, state, result if state == "SUCCESS" else None)
+    )
+
+
+def _valid(record: Any) -> bool:
+    return isinstance(record, dict) and record.get("v") == STATE_VERSION
+
+
+def read_state(task_id: str) -> Optional[Dict[str, Any]]:
+    """Запись состояния задачи или None (нет записи / другая версия формата)."""
+    from django.core.cache import cache
+
+    record = cache.get(STATE_KEY.format(task_id=task_id))
+    return record if _valid(record) else None
+
+
+def read_states(task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Записи состояния нескольких задач одним cache.get_many."""
+    from django.core.cache import cache
+
+    if not task_ids:
+        return {}
+    cached = cache.get_many([STATE_KEY.format(task_id=t) for t in task_ids])
+    records = {}
+    for task_id in task_ids:
+        record = cached.get(STATE_KEY.format(task_id=task_id))
+        if _valid(record):
+            records[task_id] = record
+    return records
+
+
+def payloads_from_states(
+    records: Dict[str, Dict[str, Any]], request_id: str = ""
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Записи состояния → ответы клиенту (формат build_status_payload).
+
+    Результат SUCCESS читается из MealPhoto.recognized_data — одним запросом
+    на все задачи. Задачи, для которых результат так не восстановить
+    (нет photo_id у bot/legacy вызовов, фото удалено), в ответ не попадают —
+    для них вызывающий код идёт в result backend.
+    """
+    photo_ids = [
+        r["photo_id"]
+        for r in records.values()
+        if r["state"] == "SUCCESS" and not r.get("error") and r.get("photo_id")
+    ]
+    recognized: Dict[int, Any] = {}
+    if photo_ids:
+        from apps.nutrition.models import MealPhoto
+
+        recognized = dict(
+            MealPhoto.objects.filter(id__in=photo_ids, status="SUCCESS").values_list(
+                "id", "recognized_data"
+            )
+        )
+
+    payloads: Dict[str, Dict[str, Any]] = {}
+    for task_id, record in records.items():
+        state = record["state"]
+        if state == "FAILURE":
+            payloads[task_id] = build_status_payload(task_id, state, None, request_id)
+        elif state != "SUCCESS":
+            payloads[task_id] = build_status_payload(task_id, state)
+        elif record.get("error"):
+            payloads[task_id] = build_status_payload(
+                task_id, state, _error_result(record, request_id)
+            )
+        elif record.get("photo_id") in recognized:
+            payloads[task_id] = build_status_payload(
+                task_id, state, _success_result(record, recognized[record["photo_id"]])
+            )
+    return payloads
+
+
+def _success_result(record: Dict[str, Any], recognized_data: Any) -> Dict[str, Any]:
+    data = recognized_data or {}
+    totals = data.get("totals") or {}
+    return {
+        "meal_id": record.get("meal_id"),
+        "meal_photo_id": record.get("photo_id"),
+        "items": data.get("items") or [],
+        "total_calories": totals.get("calories", 0.0),
+        "totals": totals,
+        "meta": data.get("meta") or {},
+        **({"timings_ms": record["timings_ms"]} if record.get("timings_ms") else {}),
+    }
+
+
+def _error_result(record: Dict[str, Any], request_id: str) -> Dict[str, Any]:
+    from .error_contract import AIErrorRegistry
+
+    error_def = AIErrorRegistry.get_by_code(record["error"])
+    result = {
+        **error_def.to_dict(trace_id=record.get("trace_id") or request_id),
+        "items": [],
+        "totals": {},
+        "meal_id": record.get("meal_id"),
+        "meal_photo_id": record.get("photo_id"),
+    }
+    if record.get("failed"):
+        result["error"] = record["error"]
+    return result
+
+
+def read_task_states(task_ids: List[str]) -> Dict[str, Tuple[str, Any]]:
+    """
+    state + result нескольких задач за один round trip к result backend.
+
+    Redis backend (KeyValueStoreBackend) умеет mget: один MGET вместо
+    N отдельных GET через AsyncResult. Остальные backend'ы — по одной задаче.
+
+    Returns:
+        {task_id: (state, result)}; result есть только у SUCCESS/FAILURE
+    """
+    from celery import current_app
+    from celery.result import AsyncResult
+
+    backend = current_app.backend
+    if not task_ids:
+        return {}
+
+    if hasattr(backend, "mget") and hasattr(backend, "get_key_for_task"):
+        values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+        states: Dict[str, Tuple[str, Any]] = {}
+        for task_id, value in zip(task_ids, values):
+            if value is None:
+                states[task_id] = ("PENDING", None)
+                continue
+            meta = backend.decode_result(value)
+            state = meta["status"]
+            states[task_id] = (state, meta.get("result") if state in READY_STATES else None)
+        return states
+
+    states = {}
+    for task_id in task_ids:
+        res = AsyncResult(task_id)
+        state = res.state
+        states[task_id] = (state, res.result if state in READY_STATES else None)
+    return states
+
+
+def format_sse(data: Dict[str, Any]) -> str:
+    """Одно SSE-событие: event=<status>, data=<json>."""
+    body = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {data.get('status', 'processing')}\ndata: {body}\n\n"
+
+
+# ---------------------------------------------------------------------------
+# Redis pub/sub
+# ---------------------------------------------------------------------------
+
+
+def redis_client():
+    """redis.Redis из Django RedisCache или None (LocMemCache и т.п.)."""
+    from django.core.cache import cache
+
+    backend = getattr(cache, "_cache", None)
+    get_client = getattr(backend, "get_client", None)
+    if get_client is None:
+        return None
+    try:
+        return get_client(write=True)
+    except Exception:
+        return None
+
+
+def publish(task_id: str, data: Dict[str, Any]) -> None:
+    """Публикует смену статуса задачи (best-effort: ошибка не ломает задачу)."""
+    client = redis_client()
+    if client is None:
+        return
+    try:
+        client.publish(
+            CHANNEL.format(task_id=task_id), json.dumps(data, ensure_ascii=False, default=str)
+        )
+    except Exception as e:
+        logger.warning("[AI Events] publish failed: task_id=%s error=%s", task_id, type(e).__name__)
+
+
+class TaskEventSubscription:
+    """Подписка на события одной задачи."""
+
+    def __init__(self, pubsub) -> None:
+        self._pubsub = pubsub
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Ждёт следующее событие не дольше timeout секунд (None — событий не было)."""
+        message = self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if not message or message.get("type") != "message":
+            return None
+        try:
+            return json.loads(message["data"])
+        except (TypeError, ValueError):
+            return None
+
+
+@contextmanager
+def subscribe(task_id: str) -> Iterator[Optional[TaskEventSubscription]]:
+    """
+    Подписка на канал задачи (None, если pub/sub недоступен).
+
+    Подписываемся ДО чтения текущего статуса — так переход между
+    чтением и подпиской не потеряется.
+    """
+    client = redis_client()
+    if client is None:
+        yield None
+        return
+
+    pubsub = client.pubsub()
+    try:
+        pubsub.subscribe(CHANNEL.format(task_id=task_id))
+    except Exception as e:
+        logger.warning(
+            "[AI Events] subscribe failed: task_id=%s error=%s", task_id, type(e).__name__
+        )
+        pubsub.close()
+        yield None
+        return
+
+    try:
+        yield TaskEventSubscription(pubsub)
+    finally:
+        try:
+            pubsub.close()
+        except Exception:
+            pass
@@ -5,7 +5,8 @@ Multi-Photo Meal Architecture:
 - View создаёт MealPhoto с status=PENDING
 - Эта задача:
   1) Обновляет MealPhoto.status=PROCESSING
-  2) Вызывает AI Proxy
+  2) Читает фото через storage (by-reference) и вызывает AI Proxy:
+     нормализованный JPEG от стадии media (tasks_media.py), иначе MealPhoto.image
   3) Создаёт FoodItem записи (добавляет, не перезаписывает)
   4) Сохраняет recognized_data в MealPhoto
   5) Обновляет MealPhoto.status=SUCCESS/FAILED
@@ -17,16 +18,22 @@ Multi-Photo Meal Architecture:
 - Граммовка всегда >= 1 (иначе упадёт валидатор FoodItem)
 - DecimalField сохраняем через Decimal(str(x))
 - Никаких секретов в логах
+- Байты фото НЕ передаём через брокер: в kwargs только meal_photo_id
+  (image_bytes оставлен для legacy/bot вызовов без MealPhoto)
 """
 
 from __future__ import annotations
 
 from decimal import Decimal
+import functools
 import logging
+import time
 from typing import Any, Dict, List, Optional
 
 from celery import shared_task
-from django.db import transaction
+from celery.signals import task_postrun, task_revoked
+from django.conf import settings
+from django.db import IntegrityError, transaction
 
 from apps.ai_proxy import (
     AIProxyServerError,
@@ -36,6 +43,7 @@ from apps.ai_proxy import (
 from apps.ai_proxy.constants import LOW_CONFIDENCE_ZONES, NOT_FOOD_ZONES
 from apps.common.nutrition_utils import clamp_grams
 
+from . import batching, cancellation, scheduling, stage_timings, task_status
 from .error_contract import AIErrorDefinition, AIErrorRegistry
 
 logger = logging.getLogger(__name__)
@@ -53,17 +61,71 @@ def _to_decimal(value: Any, default: str = "0") -> Decimal:
 
 def _is_task_cancelled(task_id: str, user_id: int | None) -> bool:
     """
-    Check if task was cancelled by user via CancelTaskView.
+    Check if task was cancelled by user via CancelTaskView / CancelService.
     Returns True if task should abort without processing.
     """
-    from django.core.cache import cache
+    return cancellation.is_cancelled(task_id, user_id)
 
-    cancelled_by = cache.get(f"ai_task_cancelled:{task_id}")
-    if cancelled_by is not None:
-        # Verify it was cancelled by the same user (security)
-        if user_id is None or int(cancelled_by) == user_id:
-            return True
-    return False
+
+def _cancelled_response(
+    task_id: str,
+    stage: str,
+    meal_id: int,
+    meal_photo_id: Optional[int],
+    user_id: Optional[int],
+    rid: str,
+) -> Dict[str, Any]:
+    """Задача отменена на стадии stage: CANCELLED + время от отмены до освобождения."""
+    logger.info(
+        "[AI] Task cancelled: task=%s stage=%s user_id=%s rid=%s", task_id, stage, user_id, rid
+    )
+    cancellation.observe_release(task_id)
+    error_def = AIErrorRegistry.CANCELLED
+    _update_meal_photo_failed(meal_photo_id, error_def, trace_id=rid)
+    return _error_response(error_def, meal_id, meal_photo_id, user_id, trace_id=rid)
+
+
+def _read_photo_bytes(meal_photo) -> Optional[bytes]:
+    """
+    Читает сохранённое фото через storage layer (by-reference режим).
+
+    Returns:
+        bytes файла или None, если файла нет / он недоступен
+    """
+    if not meal_photo.image:
+        return None
+    try:
+        with meal_photo.image.open("rb") as f:
+            return f.read()
+    except (OSError, ValueError) as e:
+        logger.error("[AI] Failed to read MealPhoto %s image: %s", meal_photo.id, str(e))
+        return None
+
+
+def _read_normalized_photo(meal_photo) -> tuple[Optional[bytes], Optional[Dict[str, Any]]]:
+    """
+    Результат upload-time нормализации (apps.ai.tasks_media), если она уже отработала.
+
+    Returns:
+        (jpeg_bytes, metrics) — готовый JPEG
+        (None, metrics)       — стадия отклонила фото (action=reject)
+        (None, None)          — стадии не было / файл недоступен → нормализуем inline
+    """
+    metrics = meal_photo.normalization_metrics
+    if not metrics:
+        return None, None
+    if metrics.get("action") == "reject":
+        return None, metrics
+    if not meal_photo.normalized_image:
+        return None, None
+    try:
+        with meal_photo.normalized_image.open("rb") as f:
+            return f.read(), metrics
+    except (OSError, ValueError) as e:
+        logger.warning(
+            "[AI] Normalized image unavailable for MealPhoto %s: %s", meal_photo.id, str(e)
+        )
+        return None, None
 
 
 def _json_safe_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -173,7 +235,43 @@ def _update_meal_photo_failed(
         logger.error("[AI] Failed to update MealPhoto %s: %s", meal_photo_id, str(e))
 
 
-@shared_task(bind=True)
+def _task_outcome(result: Any) -> tuple:
+    """(outcome, error_code) результата задачи — метки гистограммы стадий."""
+    if not isinstance(result, dict):
+        return "success", ""
+    if result.get("error_code"):
+        return "error", str(result["error_code"])
+    if result.get("error"):
+        return "failed", str(result["error"])
+    return "success", ""
+
+
+def _with_stage_timings(fn):
+    """
+    Время стадий задачи (stage_timings) → поле timings_ms её результата
+    и гистограмма ai_recognition_stage_seconds (по исходу задачи).
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with stage_timings.collect() as timings:
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                stage_timings.observe(timings, "exception")
+                raise
+        stage_timings.observe(timings, *_task_outcome(result))
+        if timings and isinstance(result, dict):
+            result["timings_ms"] = timings
+        return result
+
+    return wrapper
+
+
+# Результат нужен только legacy polling (задачи без записи состояния, см. task_status);
+# AI_TASK_STORE_RESULT=false — result backend больше не хранит items/meta
+@shared_task(bind=True, ignore_result=not getattr(settings, "AI_TASK_STORE_RESULT", True))
+@_with_stage_timings
 def recognize_food_async(
     self,
     *,
@@ -181,11 +279,12 @@ def recognize_food_async(
     meal_photo_id: int,  # Required: MealPhoto already created by view
     meal_type: str = "SNACK",
     date: str | None = None,
-    image_bytes: bytes,
+    image_bytes: bytes | None = None,
     mime_type: str,
     user_comment: str = "",
     request_id: str = "",
     user_id: int | None = None,
+    enqueued_at: float | None = None,
 ) -> Dict[str, Any]:
     """
     Основная задача: распознать еду по фото и сохранить items в БД.
@@ -196,14 +295,26 @@ def recognize_food_async(
     - Добавляем FoodItem к Meal (не перезаписываем)
     - При ошибке одного фото — Meal сохраняется (другие могут успеть)
 
-    Возвращаемое значение будет доступно через Celery result backend (polling ручка).
+    By-reference режим (image_bytes=None):
+    - байты читаются из MealPhoto.image через storage, а не из сообщения брокера
+
+    Статус для клиента — запись состояния task_status (ai_task_state:<task_id>),
+    результат — MealPhoto.recognized_data. Возвращаемое значение дополнительно
+    хранится в result backend, пока AI_TASK_STORE_RESULT=true.
     """
     task_id = getattr(self.request, "id", None) or "unknown"
     rid = request_id or f"task-{str(task_id)[:8]}"
 
+    # Время в очереди (вкл. парковку планировщиком) по lane тарифа
+    delivery_info = getattr(self.request, "delivery_info", None) or {}
+    queue_wait_ms = scheduling.observe_queue_wait(
+        task_id=task_id, enqueued_at=enqueued_at, priority=delivery_info.get("priority")
+    )
+    stage_timings.record("queue_wait", queue_wait_ms)
+
     # Импортируем модели внутри задачи
-    from apps.nutrition.models import Meal, MealPhoto
-    from apps.nutrition.services import finalize_meal_if_complete
+    from apps.nutrition.models import MEAL_TOTAL_FIELDS, FoodItem, Meal, MealPhoto
+    from apps.nutrition.services import finalize_locked_meal
 
     logger.info(
         "[AI] start task=%s meal_id=%s photo_id=%s type=%s date=%s rid=%s user_id=%s",
@@ -244,13 +355,41 @@ def recognize_food_async(
                 "owner_id": user_id,
             }
 
-        # Update MealPhoto to PROCESSING
-        with transaction.atomic():
-            meal_photo.status = "PROCESSING"
-            meal_photo.save(update_fields=["status"])
+        # Update MealPhoto to PROCESSING (один UPDATE, отдельная транзакция не нужна)
+        meal_photo.status = "PROCESSING"
+        meal_photo.save(update_fields=["status"])
+        task_status.transition(
+            task_id,
+            "STARTED",
+            owner_id=user_id,
+            meal_id=meal_photo.meal_id,
+            photo_id=meal_photo_id,
+            trace_id=rid,
+        )
     else:
         logger.info("[AI] No meal_photo_id provided, continuing (bot/legacy call)")
 
+    # Upload-time нормализация уже сделана → берём готовый JPEG, здесь только I/O
+    normalization = None
+    bytes_from_photo = image_bytes is None and meal_photo is not None
+    if image_bytes is None and meal_photo is not None:
+        image_bytes, normalization = _read_normalized_photo(meal_photo)
+
+    # By-reference: фото уже сохранено view в MealPhoto.image — читаем его оттуда
+    if image_bytes is None:
+        image_bytes = _read_photo_bytes(meal_photo) if meal_photo else None
+        if not image_bytes:
+            logger.error(
+                "[AI] No image for task=%s photo_id=%s rid=%s", task_id, meal_photo_id, rid
+            )
+            error_def = AIErrorRegistry.PHOTO_NOT_FOUND
+            _update_meal_photo_failed(meal_photo_id, error_def, trace_id=rid)
+            return _error_response(error_def, meal_id, meal_photo_id, user_id, trace_id=rid)
+
+    # P0-Cancel: стадия чтения фото пройдена — проверяем отмену до тяжёлой работы
+    if _is_task_cancelled(task_id, user_id):
+        return _cancelled_response(task_id, "read", meal_id, meal_photo_id, user_id, rid)
+
     # 1) Validate mime_type (P0 Security/Integrity)
     if not mime_type or mime_type not in [
         "image/jpeg",
@@ -270,12 +409,18 @@ def recognize_food_async(
         }
 
     # P0-D: Hardened validation using magic bytes
+    # Сигнатура уже проверена при загрузке (MealPhoto.image_meta), а нормализованный
+    # JPEG сделали мы сами — повторный sniff только для legacy/bot вызовов
+    from apps.ai.image_meta import stored_meta
     from apps.ai.serializers import _detect_mime_from_bytes
 
-    detected = _detect_mime_from_bytes(image_bytes)
+    trusted = bytes_from_photo and (
+        normalization is not None or stored_meta(meal_photo) is not None
+    )
+    detected = None if trusted else _detect_mime_from_bytes(image_bytes)
 
     # For HEIC we rely on client MIME as signatures are complex (ftyp)
-    if not detected and mime_type not in ["image/heic", "image/heif"]:
+    if not trusted and not detected and mime_type not in ["image/heic", "image/heif"]:
         error_def = AIErrorRegistry.INVALID_IMAGE
         _update_meal_photo_failed(meal_photo_id, error_def, trace_id=rid)
         return _error_response(error_def, meal_id, meal_photo_id, user_id, trace_id=rid)
@@ -296,7 +441,11 @@ def recognize_food_async(
         parsed_date = date or datetime.date.today()
 
     # P0 Security Check: Verify meal ownership
-    meal = Meal.objects.filter(id=meal_id, user_id=user_id).first()
+    # (Meal уже загружен вместе с фото — без отдельного запроса)
+    if meal_photo is not None and meal_photo.meal_id == meal_id:
+        meal = meal_photo.meal if meal_photo.meal.user_id == user_id else None
+    else:
+        meal = Meal.objects.filter(id=meal_id, user_id=user_id).first()
     if not meal:
         logger.warning(
             "[AI] Meal not found or ownership mismatch: meal_id=%s user_id=%s", meal_id, user_id
@@ -307,27 +456,46 @@ def recognize_food_async(
 
     # P0-Cancel: Check if task was cancelled
     if _is_task_cancelled(task_id, user_id):
-        logger.info(
-            "[AI] Task cancelled: task=%s user_id=%s rid=%s",
-            task_id,
-            user_id,
-            rid,
-        )
-        error_def = AIErrorRegistry.CANCELLED
-        _update_meal_photo_failed(meal_photo_id, error_def, trace_id=rid)
-        return _error_response(error_def, meal_id, meal_photo_id, user_id, trace_id=rid)
+        return _cancelled_response(task_id, "proxy", meal_id, meal_photo_id, user_id, rid)
 
-    service = AIProxyService()
+    # Почти-дубликат недавнего фото пользователя → переиспользуем его результат
+    near_duplicate_lookup = None
+    if meal_photo_id and user_id:
+        from .dedup import find_near_duplicate
+
+        def near_duplicate_lookup(perceptual_hash: str) -> Optional[Dict[str, Any]]:
+            return find_near_duplicate(user_id, perceptual_hash, exclude_photo_id=meal_photo_id)
 
     # 1) Вызов AI Proxy (политика ошибок/ретраев)
+    #    Отмена во время вызова → задача выходит сразу, не дожидаясь ответа (cancellation.py)
     try:
-        result = service.recognize_food(
-            image_bytes=image_bytes,
-            content_type=mime_type,
-            user_comment=user_comment or "",
-            locale="ru",
-            request_id=rid,
-        )
+        with cancellation.watch(task_id, user_id) as cancel_token:
+            service = AIProxyService(client=cancellation.AbortableClient(cancel_token))
+            result = None
+            # Несколько фото одного приёма пищи → один batch-запрос (см. batching.py)
+            if meal_photo_id and not user_comment and batching.is_enabled():
+                result = batching.recognize_in_batch(
+                    service=service,
+                    meal_id=meal_id,
+                    meal_photo_id=meal_photo_id,
+                    image_bytes=image_bytes,
+                    content_type=mime_type,
+                    normalization=normalization,
+                    request_id=rid,
+                    cancel_token=cancel_token,
+                )
+            if result is None:
+                result = service.recognize_food(
+                    image_bytes=image_bytes,
+                    content_type=mime_type,
+                    user_comment=user_comment or "",
+                    locale="ru",
+                    request_id=rid,
+                    near_duplicate_lookup=near_duplicate_lookup,
+                    normalization=normalization,
+                )
+    except cancellation.TaskCancelled:
+        return _cancelled_response(task_id, "proxy", meal_id, meal_photo_id, user_id, rid)
     except Exception as e:
         logger.error("[AI] Proxy error: %r rid=%s", e, rid)
 
@@ -444,16 +612,35 @@ def recognize_food_async(
         _update_meal_photo_failed(meal_photo_id, error_def, trace_id=rid)
         return _error_response(error_def, meal_id, meal_photo_id, user_id, trace_id=rid)
 
-    # 3) Сохраняем в БД атомарно
+    # P0-Cancel: ответ получен, но пользователь уже отменил — в БД не пишем
+    if _is_task_cancelled(task_id, user_id):
+        return _cancelled_response(task_id, "save", meal_id, meal_photo_id, user_id, rid)
+
+    # 3) Сохраняем в БД атомарно — одна блокировка, один INSERT на все items,
+    #    finalize в той же транзакции (строка Meal заблокирована миллисекунды)
+    totals_out = {
+        "calories": float(totals.get("calories") or 0.0),
+        "protein": float(totals.get("protein") or 0.0),
+        "fat": float(totals.get("fat") or 0.0),
+        "carbohydrates": float(totals.get("carbohydrates") or 0.0),
+    }
+    # db_persist: блокировка + запись items/MealPhoto; finalize: finalize Meal + COMMIT + usage
+    persist_started = time.perf_counter()
     with transaction.atomic():
-        # Reload meal and photo with lock
-        meal = Meal.objects.select_for_update().get(id=meal_id)
-        meal_photo = MealPhoto.objects.select_for_update().get(id=meal_photo_id)
+        if meal_photo_id:
+            # SELECT ... FOR UPDATE по join блокирует и фото, и его Meal одним запросом
+            meal_photo = (
+                MealPhoto.objects.select_for_update().select_related("meal").get(id=meal_photo_id)
+            )
+            meal = meal_photo.meal
+        else:
+            meal_photo = None
+            meal = Meal.objects.select_for_update().get(id=meal_id)
 
         # Guard: Late SUCCESS after Cancel/Fail (BR-3)
         # If user cancelled while AI was processing, photo may be marked CANCELLED or FAILED
         # Do not attach results in this case (discard late arrival)
-        if meal_photo.status in {"CANCELLED", "FAILED"}:
+        if meal_photo is not None and meal_photo.status in {"CANCELLED", "FAILED"}:
             logger.info(
                 "[AI] Photo %s is in terminal state %s, discarding results (race condition guard)",
                 meal_photo_id,
@@ -471,73 +658,75 @@ def recognize_food_async(
             }
 
         # Add FoodItems (APPEND, not replace — multi-photo mode)
-        for it in safe_items:
-            meal.items.create(
-                name=it["name"],
-                grams=it["amount_grams"],
-                calories=_to_decimal(it["calories"], "0"),
-                protein=_to_decimal(it["protein"], "0"),
-                fat=_to_decimal(it["fat"], "0"),
-                carbohydrates=_to_decimal(it["carbohydrates"], "0"),
-            )
+        created_items = FoodItem.objects.bulk_create(
+            [
+                FoodItem(
+                    meal=meal,
+                    name=it["name"],
+                    grams=it["amount_grams"],
+                    calories=_to_decimal(it["calories"], "0"),
+                    protein=_to_decimal(it["protein"], "0"),
+                    fat=_to_decimal(it["fat"], "0"),
+                    carbohydrates=_to_decimal(it["carbohydrates"], "0"),
+                )
+                for it in safe_items
+            ]
+        )
+        # bulk_create минует FoodItem.save() — суммы Meal пишет finalize тем же UPDATE
+        totals_delta = {
+            name: sum((getattr(item, name) for item in created_items), Decimal("0"))
+            for name in MEAL_TOTAL_FIELDS
+        }
 
         # Update MealPhoto with success (if exists)
-        if meal_photo_id:
-            meal_photo = MealPhoto.objects.select_for_update().get(id=meal_photo_id)
+        if meal_photo is not None:
             meal_photo.status = "SUCCESS"
             meal_photo.recognized_data = {
                 "items": safe_items,
-                "totals": {
-                    "calories": float(totals.get("calories") or 0.0),
-                    "protein": float(totals.get("protein") or 0.0),
-                    "fat": float(totals.get("fat") or 0.0),
-                    "carbohydrates": float(totals.get("carbohydrates") or 0.0),
-                },
+                "totals": totals_out,
                 "meta": meta,
             }
-            meal_photo.save(update_fields=["status", "recognized_data"])
+            # dHash нормализованного фото — для поиска почти-дубликатов (apps.ai.dedup)
+            meal_photo.perceptual_hash = meta.get("perceptual_hash") or None
+            meal_photo.save(update_fields=["status", "recognized_data", "perceptual_hash"])
             logger.info(
                 "[AI] MealPhoto %s updated to SUCCESS with %s items", meal_photo_id, len(safe_items)
             )
         else:
             logger.info("[AI] Success for meal_id=%s (no photo to update)", meal.id)
 
-    # Check if meal should be finalized
-    finalize_meal_if_complete(meal)
+        finalize_started = time.perf_counter()
+        stage_timings.record("db_persist", (finalize_started - persist_started) * 1000)
+
+        # Check if meal should be finalized (Meal уже заблокирован выше)
+        finalize_locked_meal(meal, totals_delta=totals_delta)
 
     # 4) P0-1: Инкрементируем usage ТОЛЬКО после успешного сохранения
     # NOTE: В debug режиме (X-Debug-Mode: true) лимит не проверяется в views.py,
     #       но usage всё равно инкрементится здесь — это нормально (bypass check ≠ bypass accounting).
     #       Если нужна полная изоляция debug трафика, можно добавить проверку is_debug_mode здесь.
     if user_id:
-        try:
-            from django.contrib.auth import get_user_model
+        from apps.billing.usage import DailyUsage
 
-            from apps.billing.usage import DailyUsage
-
-            User = get_user_model()
-            user = User.objects.get(id=user_id)
-            DailyUsage.objects.increment_photo_ai_requests(user)
+        try:
+            # Один upsert: без загрузки User и перечитывания счётчика
+            DailyUsage.objects.add_photo_ai_requests(user_id)
             logger.info("[AI] usage incremented user_id=%s task=%s", user_id, task_id)
-        except User.DoesNotExist:
+        except IntegrityError:
             logger.warning(
                 "[AI] user not found for usage increment: user_id=%s task=%s", user_id, task_id
             )
         except Exception as usage_err:
             # Ошибка учёта usage не должна ломать успешный результат
             logger.error("[AI] usage increment failed: user_id=%s err=%s", user_id, str(usage_err))
+    stage_timings.record("finalize", (time.perf_counter() - finalize_started) * 1000)
 
     response: Dict[str, Any] = {
         "meal_id": int(meal.id),
         "meal_photo_id": int(meal_photo_id) if meal_photo_id else None,
         "items": safe_items,
-        "total_calories": float(totals.get("calories") or 0.0),
-        "totals": {
-            "calories": float(totals.get("calories") or 0.0),
-            "protein": float(totals.get("protein") or 0.0),
-            "fat": float(totals.get("fat") or 0.0),
-            "carbohydrates": float(totals.get("carbohydrates") or 0.0),
-        },
+        "total_calories": totals_out["calories"],
+        "totals": totals_out,
         "meta": meta,
         "owner_id": user_id,
     }
@@ -552,3 +741,78 @@ def recognize_food_async(
         float(totals.get("calories") or 0.0),
     )
     return response
+
+
+@task_postrun.connect(sender=recognize_food_async)
+def _publish_final_status(
+    sender=None, task_id=None, retval=None, state=None, kwargs=None, **extra
+):
+    """
+    SUCCESS/FAILED → запись состояния + Redis pub/sub (SSE-стрим получает результат сразу).
+
+    task_postrun срабатывает после записи результата в result backend
+    и покрывает все return-ветки задачи, включая исключения.
+    """
+    if not task_id or state not in ("SUCCESS", "FAILURE"):
+        return
+    task_kwargs = kwargs or {}
+    task_status.transition(
+        task_id,
+        state,
+        owner_id=task_kwargs.get("user_id"),
+        meal_id=task_kwargs.get("meal_id"),
+        photo_id=task_kwargs.get("meal_photo_id"),
+        result=retval if state == "SUCCESS" else None,
+        trace_id=task_kwargs.get("request_id") or "",
+    )
+
+
+@task_postrun.connect(sender=recognize_food_async)
+def _release_user_slot(sender=None, kwargs=None, **extra):
+    """Задача завершилась (любой исход) → слот пользователя следующей задаче (scheduling)."""
+    scheduling.release((kwargs or {}).get("user_id"))
+
+
+@task_revoked.connect(sender=recognize_food_async)
+def _release_user_slot_on_revoke(sender=None, request=None, **extra):
+    """Отозванная задача task_postrun не вызывает — слот освобождаем здесь."""
+    scheduling.release((getattr(request, "kwargs", None) or {}).get("user_id"))
+
+
+@shared_task(ignore_result=True)
+def fail_broken_chain(
+    *,
+    task_id: str,
+    meal_id: int,
+    meal_photo_id: Optional[int],
+    user_id: Optional[int],
+    request_id: str = "",
+):
+    """
+    Errback нормализации: цепочка normalize → recognize оборвалась до recognize_food_async
+    (жёсткий time_limit, исключение вне обработчика) — task_postrun не придёт.
+
+    Фото → FAILED, запись состояния → FAILURE, слот пользователя → следующей задаче.
+    """
+    logger.warning(
+        "[AI] normalize chain broken: task=%s photo_id=%s user_id=%s",
+        task_id,
+        meal_photo_id,
+        user_id,
+    )
+    _update_meal_photo_failed(meal_photo_id, AIErrorRegistry.INTERNAL_ERROR, trace_id=request_id)
+    task_status.transition(
+        task_id,
+        "FAILURE",
+        owner_id=user_id,
+        meal_id=meal_id,
+        photo_id=meal_photo_id,
+        trace_id=request_id,
+    )
+    scheduling.release(user_id)
+
+
+@shared_task(ignore_result=True)
+def drain_parked_tasks() -> int:
+    """Beat: запаркованные задачи пользователей с утёкшими слотами → в брокер."""
+    return scheduling.drain_stale()
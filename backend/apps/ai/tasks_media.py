@@ -0,0 +1,115 @@
+"""
+tasks_media.py — upload-time стадия нормализации фото (очередь media).
+
+Простыми словами:
+- нормализация (decode → EXIF → resize → JPEG) — чистый CPU
+- AI задача (recognize_food_async) — почти чистое ожидание HTTP
+- если делать оба шага в одном воркере, CPU-нагрузка и I/O-ожидание
+  делят один пул процессов и мешают друг другу
+
+Поэтому:
+- сразу после загрузки view ставит цепочку:
+  normalize_meal_photo (очередь media) → recognize_food_async (очередь ai)
+- media-воркер (prefork, concurrency = числу ядер) сохраняет нормализованный
+  JPEG рядом с MealPhoto.image (MealPhoto.normalized_image) + метрики
+- AI задача читает готовый JPEG и делает только I/O
+
+Правила:
+- задача НИКОГДА не падает: любая ошибка → лог, и цепочка идёт дальше
+  (AI задача нормализует inline, как раньше — fallback)
+- reject (битое/неподдерживаемое фото) тоже сохраняем в метриках:
+  AI задача вернёт controlled error без повторного decode
+- идемпотентность: повторный запуск (retry фото) не нормализует заново
+- размеры берём из MealPhoto.image_meta (см. image_meta.py), если он есть
+"""
+
+from __future__ import annotations
+
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from apps.ai.image_meta import stored_meta
+from apps.ai_proxy.utils import normalize_image
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, ignore_result=True, soft_time_limit=30, time_limit=60)
+def normalize_meal_photo(
+    self,
+    *,
+    meal_photo_id: int,
+    mime_type: str,
+    request_id: str = "",
+) -> None:
+    """
+    Нормализует MealPhoto.image и сохраняет результат в MealPhoto.normalized_image.
+    """
+    from apps.nutrition.models import MealPhoto
+
+    from .tasks import _read_photo_bytes
+
+    try:
+        # meal__user: upload_to строит путь по user.id
+        meal_photo = (
+            MealPhoto.objects.select_related("meal__user").filter(id=meal_photo_id).first()
+        )
+        if meal_photo is None or meal_photo.status == "CANCELLED":
+            return
+
+        # Уже нормализовано (retry фото) — повторно не декодируем
+        metrics = meal_photo.normalization_metrics or {}
+        if meal_photo.normalized_image or metrics.get("action") == "reject":
+            return
+
+        image_bytes = _read_photo_bytes(meal_photo)
+        if not image_bytes:
+            # AI задача сама вернёт PHOTO_NOT_FOUND
+            return
+
+        # Размеры из ImageMeta (загрузка): маленький JPEG не открываем Pillow повторно
+        meta = stored_meta(meal_photo)
+        known_size = None
+        if meta is not None and meta.size_bytes == len(image_bytes):
+            known_size = (meta.width, meta.height)
+
+        norm_bytes, _, metrics = normalize_image(
+            image_bytes=image_bytes,
+            content_type=mime_type,
+            fast_decode=getattr(settings, "AI_IMAGE_FAST_DECODE", True),
+            known_size=known_size,
+        )
+        metrics["stage"] = "upload"
+
+        update_fields = ["normalization_metrics"]
+        if metrics.get("action") == "ok":
+            meal_photo.normalized_image.save(
+                f"normalized_{meal_photo.id}.jpg", ContentFile(norm_bytes), save=False
+            )
+            update_fields.append("normalized_image")
+        meal_photo.normalization_metrics = metrics
+        meal_photo.save(update_fields=update_fields)
+
+        logger.info(
+            "[AI Media] normalized photo_id=%s action=%s reason=%s %s→%s decode_mode=%s "
+            "processing_ms=%s rid=%s",
+            meal_photo_id,
+            metrics.get("action"),
+            metrics.get("reason"),
+            metrics.get("original_px"),
+            metrics.get("normalized_px"),
+            metrics.get("decode_mode"),
+            metrics.get("processing_ms"),
+            request_id,
+        )
+    except Exception as e:
+        # Не роняем цепочку: AI задача нормализует inline
+        logger.exception(
+            "[AI Media] normalization stage failed: photo_id=%s error=%s rid=%s",
+            meal_photo_id,
+            type(e).__name__,
+            request_id,
+        )
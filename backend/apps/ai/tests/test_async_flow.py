@@ -29,8 +29,10 @@ class TestAIAsyncFlow:
         self.client = APIClient()
         cache.clear()
 
-    def test_recognize_returns_202(self, django_user_model):
+    def test_recognize_returns_202(self, django_user_model, settings):
         """P1-1: View returns 202 and does NOT create meal upfront."""
+        # Прямой dispatch без upload-time стадии (цепочку проверяет отдельный тест)
+        settings.AI_UPLOAD_NORMALIZATION_ENABLED = False
         user = django_user_model.objects.create_user(
             username="u1", password="pass", email="u1@t.com"
         )
@@ -42,7 +44,7 @@ class TestAIAsyncFlow:
         fake_task.id = "task-123"
 
         with patch(
-            "apps.ai.views.recognize_food_async.delay", return_value=fake_task
+            "apps.ai.views.recognize_food_async.apply_async", return_value=fake_task
         ) as delay_mock:
             resp = self.client.post(
                 url,
@@ -61,9 +63,41 @@ class TestAIAsyncFlow:
 
         # Verify ownership saved in cache
         assert cache.get(f"ai_task_owner:{fake_task.id}") == user.id
+        # Запись состояния: polling читает её вместо result backend
+        record = cache.get(f"ai_task_state:{fake_task.id}")
+        assert record["state"] == "PENDING"
+        assert record["owner_id"] == user.id
+        assert record["photo_id"] == body["meal_photo_id"]
 
         delay_mock.assert_called_once()
 
+    def test_recognize_dispatches_normalization_chain(self, django_user_model):
+        """Нормализация (очередь media) ставится перед AI задачей, task_id — от AI задачи."""
+        user = django_user_model.objects.create_user(
+            username="u_chain", password="pass", email="u_chain@t.com"
+        )
+        self.client.force_authenticate(user=user)
+
+        fake_task = Mock()
+        fake_task.id = "task-chain"
+
+        with patch("apps.ai.views.chain") as chain_mock:
+            chain_mock.return_value.apply_async.return_value = fake_task
+            resp = self.client.post(
+                reverse("ai:recognize-food"),
+                data={"data_url": _small_png_data_url(), "meal_type": "LUNCH"},
+                format="json",
+            )
+
+        assert resp.status_code == 202
+        assert resp.json()["task_id"] == "task-chain"
+        assert cache.get("ai_task_owner:task-chain") == user.id
+
+        normalize_sig, recognize_sig = chain_mock.call_args.args
+        assert normalize_sig.task == "apps.ai.tasks_media.normalize_meal_photo"
+        assert recognize_sig.task == "apps.ai.tasks.recognize_food_async"
+        assert normalize_sig.kwargs["meal_photo_id"] == recognize_sig.kwargs["meal_photo_id"]
+
     def test_task_status_processing(self, django_user_model):
         user = django_user_model.objects.create_user(
             username="u4", password="pass", email="u4@t.com"
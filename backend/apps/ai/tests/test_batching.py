@@ -0,0 +1,170 @@
+"""
+test_batching.py — тесты коалесинга фото одного приёма пищи в batch (batching.py).
+
+Проверяем:
+- лидер забирает PROCESSING фото своего Meal и делает ОДИН batch-вызов;
+  PENDING (задача запаркована / в очереди) не забирает
+- результаты забранных фото публикуются для их задач
+- follower получает результат лидера; без claim — распознаёт сам
+- solo (user_comment) фото в batch не попадают
+- падение batch-вызова → fallback для всех участников
+- отмена прерывает ожидание лидера и follower'а
+"""
+
+from __future__ import annotations
+
+from io import BytesIO
+from unittest.mock import Mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image
+import pytest
+
+from apps.ai import batching
+from apps.ai.cancellation import CancelToken, TaskCancelled
+from apps.ai_proxy.service import RecognizeFoodResult
+from apps.nutrition.models import Meal, MealPhoto
+
+
+def _jpeg_bytes() -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (32, 32), color=(10, 120, 60)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _result(name: str) -> RecognizeFoodResult:
+    return RecognizeFoodResult(
+        items=[{"name": name, "grams": 100, "calories": 100}], totals={"calories": 100}, meta={}
+    )
+
+
+@pytest.fixture(autouse=True)
+def _batch_settings(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.AI_BATCH_WINDOW_MS = 0
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def meal_photos(django_user_model):
+    user = django_user_model.objects.create_user(username="batch_u", password="pass")
+    meal = Meal.objects.create(user=user, meal_type="LUNCH", date="2025-12-01")
+    photos = []
+    for i in range(3):
+        photo = MealPhoto.objects.create(meal=meal, status="PROCESSING")
+        photo.image.save(f"ai_{i}.jpg", ContentFile(_jpeg_bytes()), save=True)
+        photos.append(photo)
+    return meal, photos
+
+
+def _lead(service, meal, photo, cancel_token=None):
+    return batching.recognize_in_batch(
+        service=service,
+        meal_id=meal.id,
+        meal_photo_id=photo.id,
+        image_bytes=_jpeg_bytes(),
+        content_type="image/jpeg",
+        cancel_token=cancel_token,
+    )
+
+
+@pytest.mark.django_db
+class TestRecognizeInBatch:
+    def test_leader_batches_meal_photos_in_one_call(self, meal_photos):
+        meal, (first, second, third) = meal_photos
+        service = Mock()
+        service.recognize_food_batch.return_value = [_result("a"), _result("b"), _result("c")]
+
+        own = _lead(service, meal, first)
+
+        service.recognize_food_batch.assert_called_once()
+        assert len(service.recognize_food_batch.call_args.kwargs["images"]) == 3
+        assert own.items[0]["name"] == "a"
+        assert cache.get(batching.RESULT_KEY.format(photo_id=second.id))["items"][0]["name"] == "b"
+        assert cache.get(batching.RESULT_KEY.format(photo_id=third.id))["items"][0]["name"] == "c"
+        # Лидерство освобождено — следующий Meal-batch может стартовать
+        assert cache.get(batching.LEADER_KEY.format(meal_id=meal.id)) is None
+
+    def test_follower_receives_leader_result(self, meal_photos):
+        meal, (first, second, _) = meal_photos
+        service = Mock()
+        service.recognize_food_batch.return_value = [_result("a"), _result("b"), _result("c")]
+        _lead(service, meal, first)
+
+        cache.set(batching.LEADER_KEY.format(meal_id=meal.id), first.id)
+        follower = _lead(Mock(), meal, second)
+
+        assert follower.items[0]["name"] == "b"
+
+    def test_solo_photo_not_batched(self, meal_photos):
+        meal, (first, second, third) = meal_photos
+        batching.opt_out(second.id)
+        batching.opt_out(third.id)
+        service = Mock()
+
+        assert _lead(service, meal, first) is None
+        service.recognize_food_batch.assert_not_called()
+
+    def test_batch_failure_falls_back_for_members(self, meal_photos):
+        meal, (first, second, _) = meal_photos
+        service = Mock()
+        service.recognize_food_batch.side_effect = RuntimeError("proxy down")
+
+        assert _lead(service, meal, first) is None
+        assert cache.get(batching.RESULT_KEY.format(photo_id=second.id)) == batching.FALLBACK
+
+    def test_unclaimed_follower_processes_alone(self, meal_photos):
+        meal, (first, second, _) = meal_photos
+        cache.set(batching.LEADER_KEY.format(meal_id=meal.id), first.id)
+        batching.CLAIM_GRACE_S, grace = 0.0, batching.CLAIM_GRACE_S
+        try:
+            assert _lead(Mock(), meal, second) is None
+        finally:
+            batching.CLAIM_GRACE_S = grace
+        assert cache.get(batching.CLAIM_KEY.format(photo_id=second.id)) == second.id
+
+    def test_pending_photo_not_claimed(self, meal_photos):
+        meal, (first, second, third) = meal_photos
+        MealPhoto.objects.filter(id=third.id).update(status="PENDING")
+        service = Mock()
+        service.recognize_food_batch.return_value = [_result("a"), _result("b")]
+
+        _lead(service, meal, first)
+
+        assert len(service.recognize_food_batch.call_args.kwargs["images"]) == 2
+        # Запаркованная задача стартует позже — распознает сама
+        assert cache.get(batching.CLAIM_KEY.format(photo_id=third.id)) is None
+
+    def test_cancel_interrupts_leader_window(self, meal_photos, settings):
+        meal, (first, _, _) = meal_photos
+        settings.AI_BATCH_WINDOW_MS = 60_000
+        token = CancelToken()
+        token.cancel()
+        service = Mock()
+
+        with pytest.raises(TaskCancelled):
+            _lead(service, meal, first, cancel_token=token)
+        service.recognize_food_batch.assert_not_called()
+        assert cache.get(batching.LEADER_KEY.format(meal_id=meal.id)) is None
+
+    def test_cancelled_leader_falls_back_for_members(self, meal_photos):
+        meal, (first, second, _) = meal_photos
+        service = Mock()
+        service.recognize_food_batch.side_effect = TaskCancelled()
+
+        with pytest.raises(TaskCancelled):
+            _lead(service, meal, first)
+        assert cache.get(batching.RESULT_KEY.format(photo_id=second.id)) == batching.FALLBACK
+
+    def test_cancel_interrupts_follower_wait(self, meal_photos):
+        meal, (first, second, _) = meal_photos
+        cache.set(batching.LEADER_KEY.format(meal_id=meal.id), first.id)
+        cache.set(batching.CLAIM_KEY.format(photo_id=second.id), first.id)
+        token = CancelToken()
+        token.cancel()
+
+        with pytest.raises(TaskCancelled):
+            _lead(Mock(), meal, second, cancel_token=token)
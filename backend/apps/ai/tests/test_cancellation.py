@@ -0,0 +1,152 @@
+"""
+test_cancellation.py — кооперативная отмена AI задачи во время вызова AI Proxy.
+
+Проверяем:
+- run_abortable() возвращается сразу при отмене, не дожидаясь ответа
+- watcher видит отмену владельца и игнорирует чужую
+- async-клиент: HTTP-корутина реально отменяется
+- задача, отменённая во время вызова AI Proxy, сразу выходит с CANCELLED
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import threading
+import time
+from unittest.mock import Mock
+
+from django.core.cache import cache
+from PIL import Image
+import pytest
+
+from apps.ai import cancellation
+from apps.ai_proxy.async_client import run_in_loop
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(settings):
+    cache.clear()
+    settings.AI_CANCEL_POLL_S = 0.05
+    yield
+    cache.clear()
+
+
+def _cancel_later(token, delay=0.05):
+    timer = threading.Timer(delay, token.cancel)
+    timer.start()
+    return timer
+
+
+class TestRunAbortable:
+    def test_returns_result(self):
+        token = cancellation.CancelToken()
+
+        assert cancellation.run_abortable(lambda: 42, token) == 42
+
+    def test_cancel_releases_caller_immediately(self):
+        token = cancellation.CancelToken()
+        release = threading.Event()
+        _cancel_later(token)
+
+        start = time.monotonic()
+        with pytest.raises(cancellation.TaskCancelled):
+            cancellation.run_abortable(lambda: release.wait(5), token)
+        release.set()
+
+        assert time.monotonic() - start < 1
+
+    def test_async_call_is_cancelled(self):
+        token = cancellation.CancelToken()
+        cancelled = threading.Event()
+
+        async def slow_call():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        _cancel_later(token)
+        with pytest.raises(cancellation.TaskCancelled):
+            cancellation.run_abortable(lambda: run_in_loop(slow_call()), token)
+
+        assert cancelled.wait(1)
+
+
+class TestWatch:
+    def test_owner_cancel_sets_token(self):
+        with cancellation.watch("t1", user_id=7) as token:
+            cancellation.request_cancel("t1", 7)
+            deadline = time.monotonic() + 1
+            while not token.cancelled and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        assert token.cancelled
+
+    def test_foreign_cancel_ignored(self):
+        with cancellation.watch("t1", user_id=7) as token:
+            cancellation.request_cancel("t1", 8)
+            time.sleep(0.2)
+
+        assert not token.cancelled
+
+
+class _BlockingClient:
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def recognize_food(self, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        raise AssertionError("result must be discarded")
+
+
+def _png_bytes() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), color=(200, 100, 50)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.django_db
+def test_task_cancelled_mid_call_exits_immediately(django_user_model, monkeypatch):
+    from apps.ai.tasks import recognize_food_async
+    from apps.nutrition.models import Meal, MealPhoto
+
+    user = django_user_model.objects.create_user(username="cancel-mid", password="pass")
+    meal = Meal.objects.create(user=user, meal_type="SNACK", date="2025-12-01")
+    photo = MealPhoto.objects.create(meal=meal)
+
+    client = _BlockingClient()
+    monkeypatch.setattr("apps.ai_proxy.service.default_client", lambda: client)
+    monkeypatch.setattr("apps.ai_proxy.recognition_cache.is_enabled", lambda: False)
+    release_ms = []
+    original = cancellation.observe_release
+    observe_release = Mock(side_effect=lambda task_id: release_ms.append(original(task_id)))
+    monkeypatch.setattr(cancellation, "observe_release", observe_release)
+
+    def cancel_when_started():
+        client.started.wait(5)
+        cancellation.request_cancel("unknown", user.id)  # .run() → task_id "unknown"
+
+    threading.Thread(target=cancel_when_started, daemon=True).start()
+
+    start = time.monotonic()
+    out = recognize_food_async.run(
+        meal_id=meal.id,
+        meal_photo_id=photo.id,
+        image_bytes=_png_bytes(),
+        mime_type="image/png",
+        request_id="rid-cancel",
+        user_id=user.id,
+    )
+    client.release.set()
+
+    assert time.monotonic() - start < 2
+    assert out["error_code"] == "CANCELLED"
+    photo.refresh_from_db()
+    assert photo.status == "CANCELLED"
+    observe_release.assert_called_once_with("unknown")
+    assert release_ms[0] is not None and release_ms[0] < 2000
+    assert not meal.items.exists()
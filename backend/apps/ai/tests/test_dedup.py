@@ -0,0 +1,120 @@
+"""
+test_dedup.py — поиск почти-дубликатов по перцептивному хешу.
+
+Проверяем:
+- dHash устойчив к пережатию и масштабу
+- find_near_duplicate находит только фото того же пользователя
+- порог расстояния Хэмминга соблюдается
+"""
+
+from __future__ import annotations
+
+from io import BytesIO
+
+from PIL import Image
+import pytest
+
+from apps.ai.dedup import find_near_duplicate
+from apps.ai_proxy.utils import compute_dhash, hamming_distance
+from apps.nutrition.models import Meal, MealPhoto
+
+
+def _gradient_jpeg(size=(640, 480), quality=90, flip=False) -> bytes:
+    img = Image.new("RGB", size)
+    w, h = size
+    img.putdata(
+        [
+            ((x * 255) // w, (y * 255) // h, ((x + y) * 127) // (w + h))
+            for y in range(h)
+            for x in range(w)
+        ]
+    )
+    if flip:
+        img = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _recognized(name: str) -> dict:
+    return {
+        "items": [
+            {
+                "name": name,
+                "amount_grams": 150,
+                "calories": 200.0,
+                "protein": 7.0,
+                "fat": 2.0,
+                "carbohydrates": 40.0,
+                "confidence": None,
+            }
+        ],
+        "totals": {"calories": 200.0, "protein": 7.0, "fat": 2.0, "carbohydrates": 40.0},
+        "meta": {},
+    }
+
+
+class TestDHash:
+    def test_recompressed_and_resized_are_close(self):
+        original = compute_dhash(_gradient_jpeg())
+        recompressed = compute_dhash(_gradient_jpeg(size=(320, 240), quality=40))
+
+        assert original is not None and len(original) == 16
+        assert hamming_distance(original, recompressed) <= 5
+
+    def test_different_images_are_far(self):
+        assert hamming_distance(
+            compute_dhash(_gradient_jpeg()), compute_dhash(_gradient_jpeg(flip=True))
+        ) > 20
+
+    def test_garbage_returns_none(self):
+        assert compute_dhash(b"not an image") is None
+
+
+@pytest.mark.django_db
+class TestFindNearDuplicate:
+    def _photo(self, user, perceptual_hash, status="SUCCESS", name="Гречка"):
+        meal = Meal.objects.create(user=user, meal_type="LUNCH", date="2025-12-01")
+        return MealPhoto.objects.create(
+            meal=meal,
+            status=status,
+            perceptual_hash=perceptual_hash,
+            recognized_data=_recognized(name),
+        )
+
+    def test_match_returns_service_format(self, django_user_model):
+        user = django_user_model.objects.create_user(username="dd1", password="pass")
+        earlier = self._photo(user, "ffff0000ffff0000")
+
+        match = find_near_duplicate(user.id, "ffff0000ffff0001")
+
+        assert match is not None
+        assert match["items"][0]["grams"] == 150
+        assert match["meta"]["near_duplicate_of"] == earlier.id
+        assert match["meta"]["hamming_distance"] == 1
+
+    def test_other_users_photos_ignored(self, django_user_model):
+        owner = django_user_model.objects.create_user(
+            username="dd2", password="pass", email="dd2@t.com"
+        )
+        other = django_user_model.objects.create_user(
+            username="dd3", password="pass", email="dd3@t.com"
+        )
+        self._photo(owner, "ffff0000ffff0000")
+
+        assert find_near_duplicate(other.id, "ffff0000ffff0000") is None
+
+    def test_threshold_and_status(self, django_user_model, settings):
+        settings.AI_NEAR_DUPLICATE_MAX_DISTANCE = 2
+        user = django_user_model.objects.create_user(username="dd4", password="pass")
+        self._photo(user, "ffff0000ffff0000")
+        self._photo(user, "0000000000000000", status="FAILED")
+
+        assert find_near_duplicate(user.id, "ffff0000ffff000f") is None
+        assert find_near_duplicate(user.id, "0000000000000000") is None
+
+    def test_excludes_current_photo(self, django_user_model):
+        user = django_user_model.objects.create_user(username="dd5", password="pass")
+        photo = self._photo(user, "ffff0000ffff0000")
+
+        assert find_near_duplicate(user.id, "ffff0000ffff0000", exclude_photo_id=photo.id) is None
@@ -0,0 +1,240 @@
+"""
+test_scheduling.py — приоритет по тарифу + лимит AI задач пользователя в работе.
+
+Проверяем:
+- платный план → PRIORITY_PAID, FREE → PRIORITY_FREE
+- до лимита задача уходит в брокер, сверх лимита — паркуется
+- завершение задачи отдаёт слот запаркованной (с её task_id и priority) или освобождает
+- истёкший счётчик (утечка слотов) не ломает FIFO; beat разбирает застрявшие задачи
+- обрыв цепочки на нормализации → фото FAILED + слот освобождается
+- без Redis задача ставится сразу
+- view ставит задачу с приоритетом и enqueued_at
+"""
+
+from __future__ import annotations
+
+import datetime
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.urls import reverse
+import pytest
+from rest_framework.test import APIClient
+
+from apps.ai import scheduling
+from apps.ai.error_contract import AIErrorRegistry
+from apps.ai.tasks import _release_user_slot, fail_broken_chain, recognize_food_async
+
+
+class FakeRedis:
+    """Python-версия Lua-скриптов планировщика (та же семантика, без сервера)."""
+
+    def __init__(self):
+        self.counters = {}
+        self.lists = {}
+
+    def eval(self, script, numkeys, inflight_key, parked_key, *args):
+        parked = self.lists.setdefault(parked_key, [])
+        if script == scheduling._ADMIT_SCRIPT:
+            limit, payload, _ttl = args
+            if self.counters.get(inflight_key, 0) + 1 <= int(limit):
+                self.counters[inflight_key] = self.counters.get(inflight_key, 0) + 1
+                if parked:
+                    parked.append(payload.encode())
+                    return parked.pop(0)
+                return 1
+            parked.append(payload.encode())
+            return 0
+
+        if script == scheduling._DRAIN_SCRIPT:
+            limit, _ttl = args
+            if inflight_key in self.counters:
+                return []
+            payloads = parked[: int(limit)]
+            del parked[: int(limit)]
+            if payloads:
+                self.counters[inflight_key] = len(payloads)
+            return payloads
+
+        if parked:
+            self.counters.setdefault(inflight_key, 1)
+            return parked.pop(0)
+        self.counters[inflight_key] = max(0, self.counters.get(inflight_key, 0) - 1)
+        return None
+
+    def expire(self, inflight_key):
+        """Счётчик истёк по TTL (слоты утекли)."""
+        self.counters.pop(inflight_key, None)
+
+    def scan_iter(self, match, count=None):
+        prefix = match.rstrip("*")
+        return [key.encode() for key, items in self.lists.items() if key.startswith(prefix)]
+
+
+def _signature(task_id, priority=scheduling.PRIORITY_FREE):
+    return recognize_food_async.si(
+        meal_id=1,
+        meal_photo_id=2,
+        date=datetime.date(2025, 12, 1),
+        mime_type="image/jpeg",
+        user_id=7,
+    ).set(task_id=task_id, priority=priority)
+
+
+def test_priority_for_plan():
+    assert scheduling.priority_for_plan(SimpleNamespace(code="PRO_MONTHLY")) == 0
+    assert scheduling.priority_for_plan(SimpleNamespace(code="FREE")) == 6
+    assert scheduling.priority_for_plan(None) == scheduling.PRIORITY_FREE
+
+
+class TestSubmitRelease:
+    def test_over_limit_parked_then_dispatched_on_release(self, settings):
+        settings.AI_USER_INFLIGHT_LIMIT = 1
+        fake_redis = FakeRedis()
+
+        with patch("apps.ai.task_status.redis_client", return_value=fake_redis), patch.object(
+            recognize_food_async, "apply_async", return_value=Mock(id="t1")
+        ) as apply_mock:
+            first = scheduling.submit(user_id=7, signature=_signature("t1"), task_id="t1")
+            second = scheduling.submit(user_id=7, signature=_signature("t2"), task_id="t2")
+
+            assert (first, second) == ("t1", "t2")
+            assert apply_mock.call_count == 1  # t2 запаркована
+
+            scheduling.release(7)
+
+        assert apply_mock.call_count == 2
+        options = apply_mock.call_args.kwargs
+        assert options["task_id"] == "t2"
+        assert options["priority"] == scheduling.PRIORITY_FREE
+        # Слот перешёл к t2 — счётчик не изменился
+        assert fake_redis.counters["ai_sched_inflight:7"] == 1
+
+    def test_release_without_parked_frees_slot(self):
+        fake_redis = FakeRedis()
+        fake_redis.counters["ai_sched_inflight:7"] = 1
+
+        with patch("apps.ai.task_status.redis_client", return_value=fake_redis):
+            scheduling.release(7)
+
+        assert fake_redis.counters["ai_sched_inflight:7"] == 0
+
+    def test_expired_counter_keeps_fifo(self, settings):
+        settings.AI_USER_INFLIGHT_LIMIT = 1
+        fake_redis = FakeRedis()
+
+        with patch("apps.ai.task_status.redis_client", return_value=fake_redis), patch.object(
+            recognize_food_async, "apply_async", return_value=Mock(id="t1")
+        ) as apply_mock:
+            scheduling.submit(user_id=7, signature=_signature("t1"), task_id="t1")
+            scheduling.submit(user_id=7, signature=_signature("t2"), task_id="t2")
+            # t1 потерялась без release, счётчик истёк по TTL
+            fake_redis.expire("ai_sched_inflight:7")
+            scheduling.submit(user_id=7, signature=_signature("t3"), task_id="t3")
+
+        # В брокер ушла t2 (старшая), t3 запаркована за ней
+        assert apply_mock.call_args.kwargs["task_id"] == "t2"
+        assert len(fake_redis.lists["ai_sched_parked:7"]) == 1
+        assert fake_redis.counters["ai_sched_inflight:7"] == 1
+
+    def test_drain_dispatches_parked_of_expired_counter(self, settings):
+        settings.AI_USER_INFLIGHT_LIMIT = 1
+        fake_redis = FakeRedis()
+
+        with patch("apps.ai.task_status.redis_client", return_value=fake_redis), patch.object(
+            recognize_food_async, "apply_async", return_value=Mock(id="t1")
+        ) as apply_mock:
+            scheduling.submit(user_id=7, signature=_signature("t1"), task_id="t1")
+            scheduling.submit(user_id=7, signature=_signature("t2"), task_id="t2")
+            # Счётчик жив — слот занят, разбирать нечего
+            assert scheduling.drain_stale() == 0
+
+            fake_redis.expire("ai_sched_inflight:7")
+            assert scheduling.drain_stale() == 1
+
+        assert apply_mock.call_args.kwargs["task_id"] == "t2"
+        assert fake_redis.lists["ai_sched_parked:7"] == []
+        assert fake_redis.counters["ai_sched_inflight:7"] == 1
+
+    def test_without_redis_dispatches_directly(self):
+        with patch.object(
+            recognize_food_async, "apply_async", return_value=Mock(id="t1")
+        ) as apply_mock:
+            task_id = scheduling.submit(user_id=7, signature=_signature("t1"), task_id="t1")
+
+        assert task_id == "t1"
+        apply_mock.assert_called_once()
+
+    def test_postrun_releases_user_slot(self):
+        with patch("apps.ai.tasks.scheduling.release") as release_mock:
+            _release_user_slot(kwargs={"user_id": 5})
+
+        release_mock.assert_called_once_with(5)
+
+    def test_broken_chain_fails_photo_and_releases_slot(self):
+        with patch("apps.ai.tasks.scheduling.release") as release_mock, patch(
+            "apps.ai.tasks._update_meal_photo_failed"
+        ) as failed_mock, patch("apps.ai.tasks.task_status.transition") as transition_mock:
+            fail_broken_chain(task_id="t1", meal_id=1, meal_photo_id=2, user_id=5)
+
+        release_mock.assert_called_once_with(5)
+        assert failed_mock.call_args.args[:2] == (2, AIErrorRegistry.INTERNAL_ERROR)
+        assert transition_mock.call_args.args == ("t1", "FAILURE")
+
+
+@pytest.mark.django_db
+def test_view_dispatches_with_plan_priority(django_user_model, settings):
+    settings.AI_UPLOAD_NORMALIZATION_ENABLED = False
+    cache.clear()
+    client = APIClient()
+    user = django_user_model.objects.create_user(
+        username="sched", password="pass", email="sched@t.com"
+    )
+    client.force_authenticate(user=user)
+
+    from apps.ai.tests.test_async_flow import _small_png_data_url
+
+    with patch.object(
+        recognize_food_async, "apply_async", side_effect=lambda *a, **kw: Mock(id=kw["task_id"])
+    ) as apply_mock:
+        resp = client.post(
+            reverse("ai:recognize-food"),
+            data={"data_url": _small_png_data_url(), "meal_type": "LUNCH"},
+            format="json",
+        )
+
+    assert resp.status_code == 202
+    options = apply_mock.call_args.kwargs
+    assert options["priority"] == scheduling.PRIORITY_FREE
+    assert resp.json()["task_id"] == options["task_id"]
+    assert apply_mock.call_args.args[1]["enqueued_at"] > 0
+
+
+@pytest.mark.django_db
+def test_view_chain_releases_slot_on_normalize_failure(django_user_model, settings):
+    settings.AI_UPLOAD_NORMALIZATION_ENABLED = True
+    cache.clear()
+    client = APIClient()
+    user = django_user_model.objects.create_user(
+        username="sched2", password="pass", email="sched2@t.com"
+    )
+    client.force_authenticate(user=user)
+
+    from apps.ai.tests.test_async_flow import _small_png_data_url
+
+    with patch(
+        "apps.ai.views.scheduling.submit", side_effect=lambda **kw: kw["task_id"]
+    ) as submit_mock:
+        resp = client.post(
+            reverse("ai:recognize-food"),
+            data={"data_url": _small_png_data_url(), "meal_type": "LUNCH"},
+            format="json",
+        )
+
+    assert resp.status_code == 202
+    normalize = submit_mock.call_args.kwargs["signature"].tasks[0]
+    (errback,) = normalize.options["link_error"]
+    assert errback["task"] == fail_broken_chain.name
+    assert errback["kwargs"]["task_id"] == resp.json()["task_id"]
+    assert errback["kwargs"]["user_id"] == user.id
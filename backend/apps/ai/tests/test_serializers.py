@@ -6,13 +6,27 @@ test_serializers.py — тесты валидации входных данны
 - image + data_url → ошибка
 - ничего → ошибка
 - defaults meal_type/date
+- data_url декодируется кусками (пробелы/переносы внутри base64 допустимы),
+  слишком большой — отказ по ходу декодирования
+- multipart файл не читается целиком: тот же объект уходит дальше
+- ImageMeta считается при загрузке: размеры, EXIF orientation, sha256
 """
 
 from __future__ import annotations
 
+import base64
+import hashlib
+from io import BytesIO
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
+from PIL import Image
 import pytest
+from rest_framework import serializers
 
+from apps.ai import serializers as ai_serializers
+from apps.ai.image_meta import ImageMeta, inspect_image
 from apps.ai.serializers import AIRecognizeRequestSerializer
 
 
@@ -53,6 +67,99 @@ class TestAISerializers:
         assert "meal_type" in s.errors
 
 
+class _HeadOnlyUpload(SimpleUploadedFile):
+    """Упадёт, если файл читают целиком."""
+
+    def read(self, size=-1):
+        assert size is not None and size > 0, "full read of upload"
+        return super().read(size)
+
+
+class TestStreamingIngestion:
+    def test_data_url_decoded_in_chunks(self):
+        raw = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 40
+        b64 = base64.b64encode(raw).decode()
+        wrapped = "\n".join(b64[i : i + 76] for i in range(0, len(b64), 76))
+
+        with patch.object(ai_serializers, "DATA_URL_CHUNK_CHARS", 1000):
+            image = ai_serializers._decode_data_url(f"data:image/jpeg;base64,{wrapped}")
+
+        assert image.mime_type == "image/jpeg"
+        assert image.size == len(raw)
+        assert image.file.read() == raw
+
+    def test_data_url_too_large_rejected_while_decoding(self):
+        b64 = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\0" * 4000).decode()
+
+        with patch.object(ai_serializers, "MAX_IMAGE_BYTES", 1000), patch.object(
+            ai_serializers, "DATA_URL_CHUNK_CHARS", 400
+        ):
+            with pytest.raises(serializers.ValidationError, match="слишком большое"):
+                ai_serializers._decode_data_url(f"data:image/png;base64,{b64}")
+
+    def test_data_url_mime_mismatch(self):
+        with pytest.raises(serializers.ValidationError, match="не совпадает"):
+            ai_serializers._decode_data_url(_small_png_data_url().replace("png", "jpeg", 1))
+
+    def test_uploaded_file_passed_without_copy(self):
+        raw = base64.b64decode(_small_png_data_url().split(",", 1)[1])
+        upload = _HeadOnlyUpload("photo.png", raw, content_type="image/png")
+
+        image = ai_serializers._normalize_uploaded_file(upload)
+
+        assert image.file is upload
+        assert image.as_django_file() is upload
+        assert (image.size, image.mime_type) == (len(raw), "image/png")
+
+
+class TestImageMeta:
+    def test_inspect_reads_header_exif_and_hash(self):
+        img = Image.new("RGB", (40, 30))
+        exif = img.getexif()
+        exif[0x0112] = 6
+        buf = BytesIO()
+        img.save(buf, format="JPEG", exif=exif)
+        raw = buf.getvalue()
+        upload = _HeadOnlyUpload("photo.jpg", raw, content_type="image/jpeg")
+
+        meta = inspect_image(upload, "image/jpeg", len(raw))
+
+        assert (meta.width, meta.height, meta.orientation) == (40, 30, 6)
+        assert meta.sha256 == hashlib.sha256(raw).hexdigest()
+        assert upload.tell() == 0
+        assert ImageMeta.from_dict(meta.to_dict()) == meta
+
+    def test_serializer_attaches_meta(self):
+        raw = base64.b64decode(_small_png_data_url().split(",", 1)[1])
+        upload = SimpleUploadedFile("photo.png", raw, content_type="image/png")
+
+        s = AIRecognizeRequestSerializer(data={"image": upload})
+        assert s.is_valid(), s.errors
+
+        meta = s.validated_data["normalized_image"].meta
+        assert (meta.mime_type, meta.width, meta.height, meta.size_bytes) == (
+            "image/png",
+            1,
+            1,
+            len(raw),
+        )
+
+    def test_corrupt_upload_rejected(self):
+        upload = SimpleUploadedFile("photo.jpg", b"\xff\xd8\xff" + b"x" * 64)
+
+        s = AIRecognizeRequestSerializer(data={"image": upload})
+
+        assert not s.is_valid()
+
+    def test_data_url_without_meta_still_accepted(self):
+        b64 = base64.b64encode(b"\xff\xd8\xff" + b"x" * 64).decode()
+
+        s = AIRecognizeRequestSerializer(data={"data_url": f"data:image/jpeg;base64,{b64}"})
+
+        assert s.is_valid(), s.errors
+        assert s.validated_data["normalized_image"].meta is None
+
+
 def _small_png_data_url() -> str:
     """Минимальный валидный PNG 1x1 (base64)."""
     return (
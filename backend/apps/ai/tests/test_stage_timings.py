@@ -0,0 +1,162 @@
+"""
+test_stage_timings.py — время стадий AI задачи (timings_ms в результате и статусе).
+
+Проверяем:
+- вне collect() record()/stage() ничего не делают
+- повторная стадия суммируется, stage() пишет время даже при исключении
+- задача кладёт собранное время в результат (timings_ms)
+- запись состояния переносит timings_ms в ответ TaskStatusView
+- гистограмма ai_recognition_stage_seconds: метки stage/outcome/error_code,
+  кумулятивные бакеты, /metrics/ закрыт токеном
+"""
+
+from __future__ import annotations
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+import pytest
+from rest_framework.test import APIClient
+
+from apps.ai import stage_timings, task_status
+from apps.ai.tasks import _with_stage_timings
+from apps.common import metrics
+from apps.nutrition.models import Meal, MealPhoto
+
+
+class TestStageTimings:
+    def test_noop_outside_collect(self):
+        stage_timings.record("normalize", 10)
+        with stage_timings.stage("proxy_rtt"):
+            pass
+
+        with stage_timings.collect() as timings:
+            pass
+        assert timings == {}
+
+    def test_repeated_stage_is_summed(self):
+        with stage_timings.collect() as timings:
+            stage_timings.record("proxy_rtt", 100.7)
+            stage_timings.record("proxy_rtt", 50)
+            stage_timings.record("normalize", None)
+
+        assert timings == {"proxy_rtt": 150}
+
+    def test_stage_recorded_on_exception(self):
+        with stage_timings.collect() as timings:
+            with pytest.raises(RuntimeError):
+                with stage_timings.stage("db_persist"):
+                    raise RuntimeError("boom")
+
+        assert "db_persist" in timings
+
+    def test_task_result_gets_timings(self):
+        @_with_stage_timings
+        def task():
+            stage_timings.record("queue_wait", 42)
+            return {"items": []}
+
+        assert task() == {"items": [], "timings_ms": {"queue_wait": 42}}
+
+
+class TestStageHistogram:
+    def setup_method(self):
+        metrics.reset_local()
+
+    def test_task_outcome_labels(self):
+        @_with_stage_timings
+        def task():
+            stage_timings.record("proxy_rtt", 3000)
+            return {"error_code": "EMPTY_RESULT", "items": []}
+
+        task()
+        text = metrics.render("web")
+
+        assert (
+            'ai_recognition_stage_seconds_count{service="web",stage="proxy_rtt",'
+            'outcome="error",error_code="EMPTY_RESULT"} 1'
+        ) in text
+        assert "# TYPE ai_recognition_stage_seconds histogram" in text
+
+    def test_exception_is_observed(self):
+        @_with_stage_timings
+        def task():
+            stage_timings.record("queue_wait", 5)
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            task()
+
+        assert 'stage="queue_wait",outcome="exception",error_code=""} 1' in metrics.render("web")
+
+    def test_buckets_are_cumulative(self):
+        stage_timings.observe({"db_persist": 20, "unknown_stage": 1}, "success")
+        stage_timings.observe({"db_persist": 700}, "success")
+        text = metrics.render("web")
+
+        labels = 'service="web",stage="db_persist",outcome="success",error_code=""'
+        assert f'ai_recognition_stage_seconds_bucket{{{labels},le="0.025"}} 1' in text
+        assert f'ai_recognition_stage_seconds_bucket{{{labels},le="1.0"}} 2' in text
+        assert f'ai_recognition_stage_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+        assert "unknown_stage" not in text
+
+    def test_services_are_separate(self):
+        metrics.set_service("celery")
+        try:
+            stage_timings.observe({"proxy_rtt": 100}, "success")
+        finally:
+            metrics.set_service("web")
+
+        assert 'service="celery"' in metrics.render("celery")
+        assert "proxy_rtt" not in metrics.render("web")
+
+
+class TestMetricsEndpoint:
+    def setup_method(self):
+        metrics.reset_local()
+        stage_timings.observe({"enqueue": 3}, "accepted")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_required(self, client):
+        assert client.get("/metrics/").status_code == 401
+        resp = client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+
+        assert resp.status_code == 200
+        assert resp["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert 'stage="enqueue",outcome="accepted"' in resp.content.decode()
+
+    @override_settings(METRICS_TOKEN="", DEBUG=False)
+    def test_disabled_without_token_in_production(self, client):
+        assert client.get("/metrics/").status_code == 404
+
+
+@pytest.mark.django_db
+class TestTimingsInStatus:
+    def setup_method(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def test_timings_from_state_record(self, django_user_model):
+        user = django_user_model.objects.create_user(
+            username="timings", password="pass", email="timings@t.com"
+        )
+        self.client.force_authenticate(user=user)
+        meal = Meal.objects.create(user=user, meal_type="LUNCH", date="2025-12-01")
+        photo = MealPhoto.objects.create(
+            meal=meal, status="SUCCESS", recognized_data={"items": [], "totals": {}}
+        )
+        timings = {"queue_wait": 5, "proxy_rtt": 3000, "db_persist": 12}
+        task_status.write_state(
+            "t-timings",
+            task_status.make_state(
+                "SUCCESS",
+                owner_id=user.id,
+                meal_id=meal.id,
+                photo_id=photo.id,
+                result={"items": [], "timings_ms": timings},
+            ),
+        )
+
+        resp = self.client.get(reverse("ai:task-status", kwargs={"task_id": "t-timings"}))
+
+        assert resp.json()["result"]["timings_ms"] == timings
@@ -0,0 +1,369 @@
+"""
+test_task_status.py — статус AI задачи: единый формат + SSE-стрим + pub/sub события.
+
+Проверяем:
+- build_status_payload: success / controlled error / FAILURE / processing
+- GET /ai/task/<id>/stream/: 404 для чужой задачи, text/event-stream без буферизации
+- стрим закрывается на терминальном статусе, события приходят из pub/sub
+- задача публикует финальный статус (task_postrun)
+- GET /ai/tasks/status/: статусы многих задач за один get_many + один mget
+- записи состояния ai_task_state:<id>: статус без result backend,
+  результат SUCCESS — из MealPhoto.recognized_data
+"""
+
+from __future__ import annotations
+
+import json
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.urls import reverse
+import pytest
+from rest_framework.test import APIClient
+
+from apps.ai import task_status
+from apps.ai.tasks import _publish_final_status
+from apps.nutrition.models import Meal, MealPhoto
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self._messages = list(messages)
+        self.closed = False
+
+    def subscribe(self, channel):
+        self.channel = channel
+
+    def get_message(self, ignore_subscribe_messages=True, timeout=0.0):
+        if not self._messages:
+            return None
+        return {"type": "message", "data": json.dumps(self._messages.pop(0))}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self, messages=()):
+        self.published = []
+        self._pubsub = FakePubSub(messages)
+
+    def publish(self, channel, data):
+        self.published.append((channel, json.loads(data)))
+
+    def pubsub(self):
+        return self._pubsub
+
+
+def _events(resp):
+    body = b"".join(resp.streaming_content).decode()
+    return [
+        json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")
+    ]
+
+
+class TestBuildStatusPayload:
+    def test_success(self):
+        data = task_status.build_status_payload("t1", "SUCCESS", {"items": [1], "owner_id": 5})
+
+        assert data["status"] == "success"
+        assert data["result"]["totals"] == {}
+        assert "owner_id" not in data["result"]
+
+    def test_controlled_error_is_failed(self):
+        data = task_status.build_status_payload("t1", "SUCCESS", {"error": "AI_TIMEOUT"})
+
+        assert data["status"] == "failed"
+        assert data["error"] == "AI_TIMEOUT"
+
+    def test_failure_hides_exception(self):
+        data = task_status.build_status_payload("t1", "FAILURE", RuntimeError("secret"))
+
+        assert data["status"] == "failed"
+        assert data["result"]["error_code"] == "INTERNAL_ERROR"
+
+    def test_processing(self):
+        assert task_status.build_status_payload("t1", "STARTED")["status"] == "processing"
+
+
+@pytest.mark.django_db
+class TestTaskStatusStream:
+    def setup_method(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def _login(self, django_user_model, name="sse"):
+        user = django_user_model.objects.create_user(
+            username=name, password="pass", email=f"{name}@t.com"
+        )
+        self.client.force_authenticate(user=user)
+        return user
+
+    def test_not_owner_gets_404(self, django_user_model):
+        self._login(django_user_model)
+        cache.set("ai_task_owner:t-other", 999999)
+
+        resp = self.client.get(reverse("ai:task-status-stream", kwargs={"task_id": "t-other"}))
+
+        assert resp.status_code == 404
+
+    def test_terminal_state_single_event(self, django_user_model):
+        user = self._login(django_user_model)
+        cache.set("ai_task_owner:t-done", user.id)
+        fake_res = Mock(state="SUCCESS", result={"items": [], "meal_id": 1})
+
+        with patch("apps.ai.views.AsyncResult", return_value=fake_res):
+            resp = self.client.get(reverse("ai:task-status-stream", kwargs={"task_id": "t-done"}))
+            events = _events(resp)
+
+        assert resp["Content-Type"] == "text/event-stream"
+        assert resp["X-Accel-Buffering"] == "no"
+        assert [e["status"] for e in events] == ["success"]
+
+    def test_events_pushed_from_pubsub(self, django_user_model):
+        user = self._login(django_user_model, name="sse2")
+        cache.set("ai_task_owner:t-run", user.id)
+        fake_redis = FakeRedis(
+            messages=[task_status.build_status_payload("t-run", "SUCCESS", {"items": [1]})]
+        )
+
+        with patch("apps.ai.views.AsyncResult", return_value=Mock(state="PENDING")), patch(
+            "apps.ai.task_status.redis_client", return_value=fake_redis
+        ):
+            resp = self.client.get(reverse("ai:task-status-stream", kwargs={"task_id": "t-run"}))
+            events = _events(resp)
+
+        assert [e["status"] for e in events] == ["processing", "success"]
+        assert fake_redis._pubsub.channel == "ai_task_events:t-run"
+        assert fake_redis._pubsub.closed
+
+
+class TestPublishFinalStatus:
+    def test_success_published(self):
+        fake_redis = FakeRedis()
+
+        with patch("apps.ai.task_status.redis_client", return_value=fake_redis):
+            _publish_final_status(task_id="t1", retval={"items": []}, state="SUCCESS")
+
+        channel, data = fake_redis.published[0]
+        assert channel == "ai_task_events:t1"
+        assert data["status"] == "success"
+
+    def test_no_redis_is_noop(self):
+        _publish_final_status(task_id="t1", retval={"items": []}, state="SUCCESS")
+
+
+class FakeKVBackend:
+    """Минимальный KeyValueStoreBackend: считаем вызовы mget."""
+
+    def __init__(self, metas):
+        self._metas = metas
+        self.mget_calls = []
+
+    def get_key_for_task(self, task_id):
+        return f"celery-task-meta-{task_id}"
+
+    def mget(self, keys):
+        self.mget_calls.append(keys)
+        return [self._metas.get(k[len("celery-task-meta-"):]) for k in keys]
+
+    def decode_result(self, value):
+        return dict(value)
+
+
+class TestReadTaskStates:
+    def test_single_mget_for_all_tasks(self):
+        backend = FakeKVBackend(
+            {
+                "a": {"status": "SUCCESS", "result": {"items": []}},
+                "b": {"status": "STARTED", "result": None},
+            }
+        )
+
+        with patch("celery.current_app") as app:
+            app.backend = backend
+            states = task_status.read_task_states(["a", "b", "c"])
+
+        assert len(backend.mget_calls) == 1
+        assert states == {
+            "a": ("SUCCESS", {"items": []}),
+            "b": ("STARTED", None),
+            "c": ("PENDING", None),
+        }
+
+
+@pytest.mark.django_db
+class TestTaskStatusBatch:
+    def setup_method(self):
+        self.client = APIClient()
+        self.url = reverse("ai:task-status-batch")
+        cache.clear()
+
+    def _login(self, django_user_model, name="batch"):
+        user = django_user_model.objects.create_user(
+            username=name, password="pass", email=f"{name}@t.com"
+        )
+        self.client.force_authenticate(user=user)
+        return user
+
+    def test_by_ids_hides_foreign_tasks(self, django_user_model):
+        user = self._login(django_user_model)
+        cache.set("ai_task_owner:t1", user.id)
+        cache.set("ai_task_photo:t1", 11)
+        cache.set("ai_task_owner:t2", user.id)
+        cache.set("ai_task_owner:t-foreign", 999999)
+        states = {"t1": ("SUCCESS", {"items": [1], "owner_id": user.id}), "t2": ("STARTED", None)}
+
+        with patch(
+            "apps.ai.task_status.read_task_states", return_value=states
+        ) as read_mock, patch("apps.ai.views.AsyncResult", return_value=Mock(ready=lambda: False)):
+            resp = self.client.get(self.url, {"ids": "t1,t2,t-foreign,t-unknown,t1"})
+
+        assert resp.status_code == 200
+        body = resp.json()
+        read_mock.assert_called_once_with(["t1", "t2"])
+        assert body["tasks"]["t1"]["status"] == "success"
+        assert body["tasks"]["t1"]["meal_photo_id"] == 11
+        assert "owner_id" not in body["tasks"]["t1"]["result"]
+        assert body["tasks"]["t2"]["status"] == "processing"
+        assert body["not_found"] == ["t-foreign", "t-unknown"]
+
+    def test_by_meal_id(self, django_user_model):
+        user = self._login(django_user_model, name="batch2")
+        meal = Meal.objects.create(user=user, meal_type="LUNCH", date="2025-12-01")
+        p1 = MealPhoto.objects.create(meal=meal, status="PROCESSING")
+        p2 = MealPhoto.objects.create(meal=meal, status="PENDING")
+        cache.set(f"ai_photo_task:{p1.id}", "t-p1")
+        cache.set(f"ai_photo_task:{p2.id}", "t-p2")
+
+        with patch(
+            "apps.ai.task_status.read_task_states",
+            side_effect=lambda ids: {t: ("PENDING", None) for t in ids},
+        ):
+            resp = self.client.get(self.url, {"meal_id": meal.id})
+
+        assert resp.status_code == 200
+        tasks = resp.json()["tasks"]
+        assert {t: d["meal_photo_id"] for t, d in tasks.items()} == {"t-p1": p1.id, "t-p2": p2.id}
+
+    def test_foreign_meal_is_404(self, django_user_model):
+        other = django_user_model.objects.create_user(
+            username="other", password="pass", email="other@t.com"
+        )
+        meal = Meal.objects.create(user=other, meal_type="LUNCH", date="2025-12-01")
+        MealPhoto.objects.create(meal=meal, status="PENDING")
+        self._login(django_user_model, name="batch3")
+
+        resp = self.client.get(self.url, {"meal_id": meal.id})
+
+        assert resp.status_code == 404
+
+    def test_requires_exactly_one_selector(self, django_user_model):
+        self._login(django_user_model, name="batch4")
+
+        assert self.client.get(self.url).status_code == 400
+        assert self.client.get(self.url, {"ids": "a", "meal_id": 1}).status_code == 400
+        too_many = ",".join(f"t{i}" for i in range(21))
+        assert self.client.get(self.url, {"ids": too_many}).status_code == 400
+
+
+@pytest.mark.django_db
+class TestTaskStateRecords:
+    def setup_method(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def _login(self, django_user_model, name="state"):
+        user = django_user_model.objects.create_user(
+            username=name, password="pass", email=f"{name}@t.com"
+        )
+        self.client.force_authenticate(user=user)
+        return user
+
+    def _record(self, task_id, state, user, photo=None, result=None):
+        task_status.write_state(
+            task_id,
+            task_status.make_state(
+                state,
+                owner_id=user.id,
+                meal_id=photo.meal_id if photo else None,
+                photo_id=photo.id if photo else None,
+                result=result,
+            ),
+        )
+
+    def test_make_state_error_kinds(self):
+        contract = task_status.make_state(
+            "SUCCESS", owner_id=1, meal_id=2, photo_id=3, result={"error_code": "EMPTY_RESULT"}
+        )
+        legacy = task_status.make_state(
+            "SUCCESS", owner_id=1, meal_id=2, photo_id=3, result={"error": "CANCELLED"}
+        )
+
+        assert (contract["error"], contract["failed"]) == ("EMPTY_RESULT", False)
+        assert (legacy["error"], legacy["failed"]) == ("CANCELLED", True)
+        assert "items" not in contract
+
+    def test_success_read_from_meal_photo(self, django_user_model):
+        user = self._login(django_user_model)
+        meal = Meal.objects.create(user=user, meal_type="LUNCH", date="2025-12-01")
+        photo = MealPhoto.objects.create(
+            meal=meal,
+            status="SUCCESS",
+            recognized_data={"items": [{"name": "Рис"}], "totals": {"calories": 130.0}},
+        )
+        self._record("t-ok", "SUCCESS", user, photo=photo)
+
+        with patch("apps.ai.views.AsyncResult", side_effect=AssertionError("backend read")):
+            resp = self.client.get(reverse("ai:task-status", kwargs={"task_id": "t-ok"}))
+
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["status"] == "success"
+        assert body["result"]["items"] == [{"name": "Рис"}]
+        assert body["result"]["total_calories"] == 130.0
+        assert body["result"]["meal_photo_id"] == photo.id
+
+    def test_error_record_rebuilds_contract(self, django_user_model):
+        user = self._login(django_user_model, name="state2")
+        self._record("t-err", "SUCCESS", user, result={"error_code": "LOW_CONFIDENCE"})
+
+        with patch("apps.ai.views.AsyncResult", side_effect=AssertionError("backend read")):
+            resp = self.client.get(reverse("ai:task-status", kwargs={"task_id": "t-err"}))
+
+        result = resp.json()["result"]
+        assert result["error_code"] == "LOW_CONFIDENCE"
+        assert result["items"] == []
+
+    def test_foreign_record_is_404(self, django_user_model):
+        other = django_user_model.objects.create_user(
+            username="other2", password="pass", email="other2@t.com"
+        )
+        self._record("t-foreign", "STARTED", other)
+        self._login(django_user_model, name="state3")
+
+        resp = self.client.get(reverse("ai:task-status", kwargs={"task_id": "t-foreign"}))
+
+        assert resp.status_code == 404
+
+    def test_stale_version_falls_back_to_backend(self, django_user_model):
+        user = self._login(django_user_model, name="state4")
+        cache.set("ai_task_state:t-old", {"v": 0, "state": "SUCCESS", "owner_id": user.id})
+        cache.set("ai_task_owner:t-old", user.id)
+
+        with patch("apps.ai.views.AsyncResult", return_value=Mock(state="STARTED")):
+            resp = self.client.get(reverse("ai:task-status", kwargs={"task_id": "t-old"}))
+
+        assert resp.json()["status"] == "processing"
+
+    def test_postrun_writes_final_state(self):
+        _publish_final_status(
+            task_id="t-final",
+            retval={"items": [1], "owner_id": 7},
+            state="SUCCESS",
+            kwargs={"user_id": 7, "meal_id": 3, "meal_photo_id": 5, "request_id": "rid"},
+        )
+
+        record = task_status.read_state("t-final")
+        assert record["state"] == "SUCCESS"
+        assert (record["owner_id"], record["photo_id"], record["error"]) == (7, 5, None)
@@ -5,10 +5,12 @@ test_tasks.py — тесты Celery задачи recognize_food_async.
 - grams=0 → grams=1 (clamp)
 - Decimal поля сохраняются корректно
 - FoodItem создаётся в БД
+- успешный путь укладывается в бюджет запросов к БД (не зависит от числа items)
 """
 
 from __future__ import annotations
 
+from decimal import Decimal
 from unittest.mock import Mock, patch
 
 import pytest
@@ -134,6 +136,7 @@ class TestAITasks:
 
         meal.refresh_from_db()
         assert meal.items.count() == 2
+        assert meal.total_calories == Decimal("150")
         assert out["total_calories"] == 150.0
 
     def test_usage_incremented_after_success(self, django_user_model):
@@ -152,7 +155,7 @@ class TestAITasks:
             svc.recognize_food.return_value = fake_result
 
             with patch(
-                "apps.billing.usage.DailyUsage.objects.increment_photo_ai_requests"
+                "apps.billing.usage.DailyUsage.objects.add_photo_ai_requests"
             ) as mock_inc:
                 from apps.ai.tasks import recognize_food_async
 
@@ -165,7 +168,7 @@ class TestAITasks:
                 )
 
                 # EXPECTED: Called once after success
-                mock_inc.assert_called_once_with(user)
+                mock_inc.assert_called_once_with(user.id)
 
     def test_usage_not_incremented_on_ai_error(self, django_user_model):
         """P0-1: On AI error, usage counter should NOT increment."""
@@ -180,7 +183,7 @@ class TestAITasks:
             svc.recognize_food.side_effect = AIProxyValidationError("Bad")
 
             with patch(
-                "apps.billing.usage.DailyUsage.objects.increment_photo_ai_requests"
+                "apps.billing.usage.DailyUsage.objects.add_photo_ai_requests"
             ) as mock_inc:
                 from apps.ai.tasks import recognize_food_async
 
@@ -283,3 +286,122 @@ class TestAITasks:
 
             # EXPECTED: meal_a still exists because ownership check failed (meal was None in task)
             assert Meal.objects.filter(id=meal_a.id).exists()
+
+    def test_by_reference_reads_image_from_storage(self, django_user_model, settings, tmp_path):
+        """Без image_bytes задача читает фото из MealPhoto.image (by-reference режим)."""
+        from django.core.files.base import ContentFile
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        user = django_user_model.objects.create_user(username="tu_ref", password="pass")
+        meal = Meal.objects.create(user=user, meal_type="SNACK", date="2025-12-01")
+        photo = MealPhoto.objects.create(meal=meal)
+        stored = b"\x89PNG\r\n\x1a\n" + b"y" * 10
+        photo.image.save("ai_ref.png", ContentFile(stored), save=True)
+
+        fake_result = Mock()
+        fake_result.items = [{"name": "Ref", "grams": 100, "calories": 100}]
+        fake_result.totals = {"calories": 100}
+        fake_result.meta = {}
+
+        with patch("apps.ai.tasks.AIProxyService") as svc_cls:
+            svc = svc_cls.return_value
+            svc.recognize_food.return_value = fake_result
+
+            from apps.ai.tasks import recognize_food_async
+
+            out = recognize_food_async.run(
+                meal_id=meal.id,
+                meal_photo_id=photo.id,
+                mime_type="image/png",
+                user_id=user.id,
+            )
+
+        assert svc.recognize_food.call_args.kwargs["image_bytes"] == stored
+        assert out["items"][0]["name"] == "Ref"
+
+    def test_by_reference_missing_image_fails_photo(self, django_user_model):
+        """By-reference без сохранённого файла → PHOTO_NOT_FOUND, AI Proxy не вызывается."""
+        user = django_user_model.objects.create_user(username="tu_ref2", password="pass")
+        meal = Meal.objects.create(user=user, meal_type="SNACK", date="2025-12-01")
+        photo = MealPhoto.objects.create(meal=meal)
+
+        with patch("apps.ai.tasks.AIProxyService") as svc_cls:
+            from apps.ai.tasks import recognize_food_async
+
+            out = recognize_food_async.run(
+                meal_id=meal.id,
+                meal_photo_id=photo.id,
+                mime_type="image/png",
+                user_id=user.id,
+            )
+
+            svc_cls.return_value.recognize_food.assert_not_called()
+
+        assert out["error_code"] == "PHOTO_NOT_FOUND"
+        photo.refresh_from_db()
+        assert photo.status == "FAILED"
+
+    @pytest.mark.parametrize("items_count", [1, 8])
+    def test_success_path_query_budget(
+        self, django_user_model, django_assert_max_num_queries, items_count
+    ):
+        """
+        Бюджет запросов успешного пути (с SAVEPOINT/RELEASE тестовой транзакции):
+        фото+meal, PROCESSING, lock фото+meal, INSERT items, UPDATE фото,
+        агрегат статусов, UPDATE meal, upsert usage.
+        """
+        user = django_user_model.objects.create_user(username=f"tu_q{items_count}", password="p")
+        meal = Meal.objects.create(user=user, meal_type="SNACK", date="2025-12-01")
+        photo = MealPhoto.objects.create(meal=meal)
+
+        fake_result = Mock()
+        fake_result.items = [
+            {"name": f"Item {i}", "grams": 100, "calories": 10} for i in range(items_count)
+        ]
+        fake_result.totals = {"calories": 10.0 * items_count}
+        fake_result.meta = {}
+
+        with patch("apps.ai.tasks.AIProxyService") as svc_cls:
+            svc_cls.return_value.recognize_food.return_value = fake_result
+            from apps.ai.tasks import recognize_food_async
+
+            with django_assert_max_num_queries(10):
+                recognize_food_async.run(
+                    meal_id=meal.id,
+                    meal_photo_id=photo.id,
+                    image_bytes=b"\x89PNG\r\n\x1a\n" + b"x" * 10,
+                    mime_type="image/png",
+                    user_id=user.id,
+                )
+
+        meal.refresh_from_db()
+        assert meal.items.count() == items_count
+        assert meal.status == "COMPLETE"
+
+    def test_usage_upsert_counts_each_success(self, django_user_model):
+        """Upsert usage: первая запись создаёт строку дня, следующие — увеличивают счётчик."""
+        from apps.billing.usage import DailyUsage
+
+        user = django_user_model.objects.create_user(username="tu_ups", password="pass")
+        meal = Meal.objects.create(user=user, meal_type="SNACK", date="2025-12-01")
+        photos = [MealPhoto.objects.create(meal=meal) for _ in range(2)]
+
+        fake_result = Mock()
+        fake_result.items = [{"name": "T", "grams": 100, "calories": 100}]
+        fake_result.totals = {"calories": 100}
+        fake_result.meta = {}
+
+        with patch("apps.ai.tasks.AIProxyService") as svc_cls:
+            svc_cls.return_value.recognize_food.return_value = fake_result
+            from apps.ai.tasks import recognize_food_async
+
+            for photo in photos:
+                recognize_food_async.run(
+                    meal_id=meal.id,
+                    meal_photo_id=photo.id,
+                    image_bytes=b"\x89PNG\r\n\x1a\n" + b"x" * 10,
+                    mime_type="image/png",
+                    user_id=user.id,
+                )
+
+        assert DailyUsage.objects.get_today(user).photo_ai_requests == 2
@@ -0,0 +1,127 @@
+"""
+test_tasks_media.py — тесты upload-time стадии нормализации (normalize_meal_photo).
+
+Проверяем:
+- нормализованный JPEG сохраняется рядом с MealPhoto.image + метрики
+- recognize_food_async берёт готовый JPEG и не нормализует повторно
+- reject сохраняется в метриках и доходит до AI задачи как controlled error
+- повторный запуск не декодирует фото заново
+- маленький JPEG с MealPhoto.image_meta не открывается Pillow повторно
+"""
+
+from __future__ import annotations
+
+from io import BytesIO
+from unittest.mock import Mock, patch
+
+from django.core.files.base import ContentFile
+from PIL import Image
+import pytest
+
+from apps.ai.image_meta import ImageMeta
+from apps.ai.tasks import recognize_food_async
+from apps.ai.tasks_media import normalize_meal_photo
+from apps.nutrition.models import Meal, MealPhoto
+
+
+def _jpeg_bytes(size=(2000, 1500)) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", size, color=(120, 80, 40)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def photo(django_user_model, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    user = django_user_model.objects.create_user(username="media_u", password="pass")
+    meal = Meal.objects.create(user=user, meal_type="SNACK", date="2025-12-01")
+    photo = MealPhoto.objects.create(meal=meal)
+    photo.image.save("ai_media.jpg", ContentFile(_jpeg_bytes()), save=True)
+    return photo
+
+
+@pytest.mark.django_db
+class TestNormalizeMealPhoto:
+    def test_saves_normalized_derivative_and_metrics(self, photo):
+        normalize_meal_photo.run(meal_photo_id=photo.id, mime_type="image/jpeg")
+
+        photo.refresh_from_db()
+        assert photo.normalization_metrics["action"] == "ok"
+        assert photo.normalization_metrics["stage"] == "upload"
+        assert photo.normalized_image.name.startswith(photo.image.name.rsplit("/", 1)[0])
+        with photo.normalized_image.open("rb") as f, Image.open(f) as img:
+            assert img.format == "JPEG"
+            assert max(img.size) == 1024
+
+    def test_recognize_task_uses_normalized_image(self, photo):
+        normalize_meal_photo.run(meal_photo_id=photo.id, mime_type="image/jpeg")
+        photo.refresh_from_db()
+        with photo.normalized_image.open("rb") as f:
+            normalized = f.read()
+
+        fake_result = Mock()
+        fake_result.items = [{"name": "Каша", "grams": 100, "calories": 100}]
+        fake_result.totals = {"calories": 100}
+        fake_result.meta = {}
+
+        with patch("apps.ai.tasks.AIProxyService") as svc_cls:
+            svc = svc_cls.return_value
+            svc.recognize_food.return_value = fake_result
+
+            recognize_food_async.run(
+                meal_id=photo.meal_id,
+                meal_photo_id=photo.id,
+                mime_type="image/jpeg",
+                user_id=photo.meal.user_id,
+            )
+
+        kwargs = svc.recognize_food.call_args.kwargs
+        assert kwargs["image_bytes"] == normalized
+        assert kwargs["normalization"]["stage"] == "upload"
+
+    def test_reject_recorded_and_passed_to_recognize_task(self, photo):
+        photo.image.save("broken.jpg", ContentFile(b"\xff\xd8\xff" + b"x" * 32), save=True)
+
+        normalize_meal_photo.run(meal_photo_id=photo.id, mime_type="image/jpeg")
+        photo.refresh_from_db()
+        assert photo.normalization_metrics["action"] == "reject"
+        assert not photo.normalized_image
+
+        with patch("apps.ai.tasks.AIProxyService") as svc_cls:
+            svc_cls.return_value.recognize_food.return_value = Mock(
+                items=[], totals={}, meta={"is_error": True, "error_code": "IMAGE_DECODE_FAILED"}
+            )
+            recognize_food_async.run(
+                meal_id=photo.meal_id,
+                meal_photo_id=photo.id,
+                mime_type="image/jpeg",
+                user_id=photo.meal.user_id,
+            )
+
+        kwargs = svc_cls.return_value.recognize_food.call_args.kwargs
+        assert kwargs["normalization"]["action"] == "reject"
+
+    def test_already_normalized_is_skipped(self, photo):
+        normalize_meal_photo.run(meal_photo_id=photo.id, mime_type="image/jpeg")
+
+        with patch("apps.ai.tasks_media.normalize_image") as normalize_mock:
+            normalize_meal_photo.run(meal_photo_id=photo.id, mime_type="image/jpeg")
+
+        normalize_mock.assert_not_called()
+
+    def test_small_jpeg_with_meta_skips_pillow(self, photo):
+        raw = _jpeg_bytes(size=(64, 48))
+        photo.image.save("small.jpg", ContentFile(raw), save=False)
+        photo.image_meta = ImageMeta("image/jpeg", 64, 48, 1, "0" * 64, len(raw)).to_dict()
+        photo.save()
+
+        with patch("apps.ai_proxy.utils.Image.open", side_effect=AssertionError("decoded")):
+            normalize_meal_photo.run(meal_photo_id=photo.id, mime_type="image/jpeg")
+
+        photo.refresh_from_db()
+        assert photo.normalization_metrics["reason"] == "already_ok"
+        assert photo.normalization_metrics["decode_mode"] == "meta"
+        assert photo.normalization_metrics["original_px"] == "64x48"
+
+    def test_missing_photo_does_not_raise(self):
+        normalize_meal_photo.run(meal_photo_id=999999, mime_type="image/jpeg")
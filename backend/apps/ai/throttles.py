@@ -38,7 +38,8 @@ class TaskStatusThrottle(UserRateThrottle):
     """
     Ограничение polling эндпоинта статуса задачи.
 
-    Используется на GET /ai/task/<task_id>/
+    Используется на GET /ai/task/<task_id>/, /ai/task/<task_id>/stream/
+    и GET /ai/tasks/status/ (один batch-запрос = одно срабатывание)
     """
 
     scope = "task_status"
@@ -9,7 +9,14 @@ from __future__ import annotations
 
 from django.urls import path
 
-from .views import AIRecognitionView, CancelTaskView, CancelView, TaskStatusView
+from .views import (
+    AIRecognitionView,
+    CancelTaskView,
+    CancelView,
+    TaskStatusBatchView,
+    TaskStatusStreamView,
+    TaskStatusView,
+)
 
 app_name = "ai"
 
@@ -18,6 +25,10 @@ urlpatterns = [
     path("recognize/", AIRecognitionView.as_view(), name="recognize-food"),
     # Проверять статус задачи по task_id (polling)
     path("task/<str:task_id>/", TaskStatusView.as_view(), name="task-status"),
+    # Статус задачи через Server-Sent Events (push вместо polling)
+    path("task/<str:task_id>/stream/", TaskStatusStreamView.as_view(), name="task-status-stream"),
+    # Статусы нескольких задач одним запросом (?ids=... или ?meal_id=...)
+    path("tasks/status/", TaskStatusBatchView.as_view(), name="task-status-batch"),
     # Отменить задачу (fire-and-forget, legacy)
     path("task/<str:task_id>/cancel/", CancelTaskView.as_view(), name="cancel-task"),
     # Новый cancel endpoint с идемпотентностью и аудитом
@@ -9,6 +9,11 @@ POST /api/v1/ai/recognize/
 - Находит или создаёт Meal через get_or_create_draft_meal()
 - Создаёт MealPhoto с status=PENDING
 - Запускает Celery задачу и возвращает 202 + task_id + meal_id
+- В задачу уходит только meal_photo_id: байты фото читаются из storage
+  (не гоняем мегабайты через брокер/result backend)
+- Задача ставится цепочкой: normalize_meal_photo (очередь media, CPU)
+  → recognize_food_async (очередь ai, I/O), см. tasks_media.py
+- Приоритет по тарифу и лимит задач пользователя в работе — scheduling.py
 
 Multi-Photo Meal Grouping:
 - Если meal_id передан, фото прикрепляется к существующему meal
@@ -17,17 +22,30 @@ Multi-Photo Meal Grouping:
 
 GET /api/v1/ai/task/<task_id>/
 - polling статуса фоновой задачи
+
+GET /api/v1/ai/task/<task_id>/stream/
+- тот же статус через Server-Sent Events (push из Redis pub/sub)
+
+GET /api/v1/ai/tasks/status/?ids=a,b,c | ?meal_id=
+- статусы нескольких задач одним запросом (multi-photo upload)
+
+Время стадий POST (parse_validate / storage_write / enqueue) → гистограмма
+ai_recognition_stage_seconds (см. stage_timings, /metrics)
 """
 
 from __future__ import annotations
 
+import functools
 import logging
-from typing import Any, Dict
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import uuid
 
+from celery import chain
 from celery.result import AsyncResult
 from django.conf import settings
 from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from rest_framework import status
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
@@ -35,8 +53,11 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .serializers import AIRecognizeRequestSerializer
-from .tasks import recognize_food_async
+from . import batching, cancellation, scheduling, stage_timings, task_status
+from .serializers import MAX_REQUEST_BYTES, AIRecognizeRequestSerializer
+from .task_status import build_status_payload
+from .tasks import fail_broken_chain, recognize_food_async
+from .tasks_media import normalize_meal_photo
 from .throttles import (
     AIRecognitionPerDayThrottle,
     AIRecognitionPerMinuteThrottle,
@@ -50,6 +71,29 @@ def _new_request_id() -> str:
     return uuid.uuid4().hex
 
 
+def _observe_stages(method):
+    """Время стадий запроса (stage_timings) → гистограмма по исходу (accepted / http_<код>)."""
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        with stage_timings.collect() as timings:
+            try:
+                response = method(self, request, *args, **kwargs)
+            except Exception as e:
+                stage_timings.observe(timings, "rejected", getattr(e, "default_code", ""))
+                raise
+        data = response.data if isinstance(response.data, dict) else {}
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_202_ACCEPTED):
+            stage_timings.observe(timings, "accepted")
+        else:
+            stage_timings.observe(
+                timings, f"http_{response.status_code}", data.get("error_code") or ""
+            )
+        return response
+
+    return wrapper
+
+
 class AIRecognitionView(APIView):
     """
     POST /api/v1/ai/recognize/
@@ -65,11 +109,25 @@ class AIRecognitionView(APIView):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
     throttle_classes = [AIRecognitionPerMinuteThrottle, AIRecognitionPerDayThrottle]
 
+    @_observe_stages
     def post(self, request, *args, **kwargs):
         request_id = _new_request_id()
 
-        s = AIRecognizeRequestSerializer(data=request.data)
-        s.is_valid(raise_exception=True)
+        # Заведомо слишком большое тело — отказ до чтения и разбора multipart
+        if int(request.META.get("CONTENT_LENGTH") or 0) > MAX_REQUEST_BYTES:
+            from .error_contract import AIErrorRegistry
+
+            resp = Response(
+                AIErrorRegistry.IMAGE_TOO_LARGE.to_dict(trace_id=request_id),
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+            resp["X-Request-ID"] = request_id
+            return resp
+
+        # request.data — ленивый разбор multipart: он тоже входит в parse_validate
+        with stage_timings.stage("parse_validate"):
+            s = AIRecognizeRequestSerializer(data=request.data)
+            s.is_valid(raise_exception=True)
 
         normalized = s.validated_data["normalized_image"]
         meal_type = s.validated_data["meal_type"]
@@ -86,6 +144,7 @@ class AIRecognitionView(APIView):
 
         is_debug_mode = settings.DEBUG and request.headers.get("X-Debug-Mode") == "true"
 
+        plan = None
         if not client_meal_photo_id and not is_debug_mode:  # Only check limit for NEW photos (not retry, not debug)
             plan = get_effective_plan_for_user(request.user)
             limit = plan.daily_photo_limit  # None = безлимит
@@ -113,8 +172,6 @@ class AIRecognitionView(APIView):
 
         import mimetypes
 
-        from django.core.files.base import ContentFile
-
         from apps.nutrition.models import MealPhoto
         from apps.nutrition.services import get_or_create_draft_meal
 
@@ -185,9 +242,12 @@ class AIRecognitionView(APIView):
             meal_photo = MealPhoto.objects.create(
                 meal=meal,
                 status="PENDING",
+                # Метаданные из serializer: дальше файл повторно не разбирают
+                image_meta=normalized.meta.to_dict() if normalized.meta else None,
             )
-            # Save image file
-            meal_photo.image.save(filename, ContentFile(normalized.bytes_data), save=True)
+            # Save image file: файл загрузки уходит в storage без чтения в память
+            with stage_timings.stage("storage_write"):
+                meal_photo.image.save(filename, normalized.as_django_file(), save=True)
 
             logger.info(
                 "[AI] Created MealPhoto id=%s for meal_id=%s user_id=%s rid=%s",
@@ -204,26 +264,79 @@ class AIRecognitionView(APIView):
 
         # 1) Async — основной режим (быстро и безопасно)
         if getattr(settings, "AI_ASYNC_ENABLED", True):
-            task = recognize_food_async.delay(
+            task_kwargs = dict(
                 meal_id=meal.id,
                 meal_photo_id=meal_photo.id,  # NEW: track which photo
                 meal_type=meal_type,
                 date=meal_date,
-                image_bytes=normalized.bytes_data,
                 mime_type=mime_type,
                 user_comment=user_comment,
                 request_id=request_id,
                 user_id=request.user.id,
             )
+            if user_comment and batching.is_enabled():
+                # Комментарий относится к этому фото — в batch приёма пищи не берём
+                batching.opt_out(meal_photo.id)
+
+            # Приоритет по тарифу (lane) + время постановки для метрики queue wait
+            if plan is None:
+                plan = get_effective_plan_for_user(request.user)
+            priority = scheduling.priority_for_plan(plan)
+            task_kwargs["enqueued_at"] = time.time()
+            # task_id задаём заранее: запаркованная задача уйдёт в брокер позже
+            options = {"task_id": str(uuid.uuid4()), "priority": priority}
+
+            if getattr(settings, "AI_UPLOAD_NORMALIZATION_ENABLED", True):
+                # CPU-стадия (очередь media) → I/O-стадия (очередь ai).
+                # task_id цепочки = id recognize_food_async (polling/cancel как раньше)
+                signature = chain(
+                    normalize_meal_photo.si(
+                        meal_photo_id=meal_photo.id, mime_type=mime_type, request_id=request_id
+                    )
+                    .set(priority=priority)
+                    # Обрыв до recognize: фото FAILED + слот пользователя освобождается
+                    .on_error(
+                        fail_broken_chain.si(
+                            task_id=options["task_id"],
+                            meal_id=meal.id,
+                            meal_photo_id=meal_photo.id,
+                            user_id=request.user.id,
+                            request_id=request_id,
+                        )
+                    ),
+                    recognize_food_async.si(**task_kwargs).set(**options),
+                )
+            else:
+                signature = recognize_food_async.si(**task_kwargs).set(**options)
+
+            # Сверх лимита задач пользователя в работе — задача паркуется (scheduling.py)
+            enqueue_started = time.perf_counter()
+            task_id = scheduling.submit(
+                user_id=request.user.id, signature=signature, task_id=options["task_id"]
+            )
 
             # P0 Security Check: link task to user in cache (24h TTL)
-            cache.set(f"ai_task_owner:{task.id}", request.user.id, timeout=86400)
+            cache.set(f"ai_task_owner:{task_id}", request.user.id, timeout=86400)
             # Store photo ID for immediate cancellation feedback
-            cache.set(f"ai_task_photo:{task.id}", meal_photo.id, timeout=86400)
+            cache.set(f"ai_task_photo:{task_id}", meal_photo.id, timeout=86400)
+            # Обратная связь photo → task: batch-статус по meal_id
+            cache.set(f"ai_photo_task:{meal_photo.id}", task_id, timeout=86400)
+            # Запись состояния: polling/стрим читают её вместо result backend
+            task_status.write_state(
+                task_id,
+                task_status.make_state(
+                    "PENDING",
+                    owner_id=request.user.id,
+                    meal_id=meal.id,
+                    photo_id=meal_photo.id,
+                    trace_id=request_id,
+                ),
+            )
+            stage_timings.record("enqueue", (time.perf_counter() - enqueue_started) * 1000)
 
             # Return meal_id so frontend can group subsequent photos
             data = {
-                "task_id": str(task.id),
+                "task_id": str(task_id),
                 "meal_id": meal.id,
                 "meal_photo_id": meal_photo.id,
                 "status": "processing",
@@ -239,7 +352,6 @@ class AIRecognitionView(APIView):
                 meal_photo_id=meal_photo.id,
                 meal_type=meal_type,
                 date=meal_date,
-                image_bytes=normalized.bytes_data,
                 mime_type=mime_type,
                 user_comment=user_comment,
                 request_id=request_id,
@@ -252,6 +364,66 @@ class AIRecognitionView(APIView):
         return resp
 
 
+def _verify_task_owner(request: Request, task_id: str) -> Tuple[bool, Optional[AsyncResult]]:
+    """
+    SECURITY: задача принадлежит request.user?
+
+    Returns:
+        (owner_verified, AsyncResult если его уже пришлось прочитать в fallback)
+    """
+    res = None
+    owner_id = cache.get(f"ai_task_owner:{task_id}")
+    owner_verified = False
+
+    if owner_id is not None:
+        if int(owner_id) == request.user.id:
+            owner_verified = True
+    else:
+        # P0-B: FALLBACK - Если кэш пуст, проверяем payload (даже если SUCCESS=error)
+        res = AsyncResult(task_id)
+        # Мы доверяем результату, ТОЛЬКО если в нём есть owner_id, совпадающий с request.user
+        if res.ready():  # SUCCESS or FAILURE (but mainly SUCCESS carries payload)
+            payload = res.result
+            if isinstance(payload, dict):
+                # Вариант 1: owner_id в payload (самый надёжный transient fallback)
+                res_owner = payload.get("owner_id")
+                if res_owner and int(res_owner) == request.user.id:
+                    # P0-Security: Double verification via DB if meal exists
+                    meal_id = payload.get("meal_id")
+                    if meal_id:
+                        try:
+                            from apps.nutrition.models import Meal
+
+                            if Meal.objects.filter(
+                                id=meal_id, user_id=request.user.id
+                            ).exists():
+                                cache.set(
+                                    f"ai_task_owner:{task_id}", request.user.id, timeout=86400
+                                )
+                                owner_verified = True
+                        except Exception:
+                            pass
+                    else:
+                        # Trust owner_id for error/empty results (no DB record to verify)
+                        cache.set(f"ai_task_owner:{task_id}", request.user.id, timeout=86400)
+                        owner_verified = True
+
+                # Вариант 2 can be removed or kept as legacy fallback, but Variant 1 covers it better now.
+                # Keeping it simple as requested logic loop is closed by the block above for owner_id.
+
+    return owner_verified, res
+
+
+def _task_not_found(request_id: str) -> Response:
+    from .error_contract import AIErrorRegistry
+
+    # Use PHOTO_NOT_FOUND for unauthorized access (don't reveal task existence)
+    error_def = AIErrorRegistry.PHOTO_NOT_FOUND
+    resp = Response(error_def.to_dict(trace_id=request_id), status=status.HTTP_404_NOT_FOUND)
+    resp["X-Request-ID"] = request_id
+    return resp
+
+
 class TaskStatusView(APIView):
     """
     GET /api/v1/ai/task/<task_id>/
@@ -264,45 +436,26 @@ class TaskStatusView(APIView):
     def get(self, request: Request, task_id: str) -> Response:
         request_id = request.headers.get("X-Request-ID", "")
 
-        # 1) SECURITY: Проверка владения задачей
-        owner_id = cache.get(f"ai_task_owner:{task_id}")
-        owner_verified = False
+        # 0) Запись состояния: владелец + статус одним GET, результат — из MealPhoto
+        record = task_status.read_state(task_id)
+        if record is not None:
+            if record.get("owner_id") != request.user.id:
+                logger.warning(
+                    "Unauthorized access attempt to AI task result: user_id=%s task_id=%s rid=%s",
+                    request.user.id,
+                    task_id,
+                    request_id,
+                )
+                return _task_not_found(request_id)
+            data = task_status.payloads_from_states({task_id: record}, request_id).get(task_id)
+            if data is not None:
+                resp = Response(data, status=status.HTTP_200_OK)
+                resp["X-Request-ID"] = request_id
+                return resp
 
-        if owner_id is not None:
-            if int(owner_id) == request.user.id:
-                owner_verified = True
-        else:
-            # P0-B: FALLBACK - Если кэш пуст, проверяем payload (даже если SUCCESS=error)
-            res = AsyncResult(task_id)
-            # Мы доверяем результату, ТОЛЬКО если в нём есть owner_id, совпадающий с request.user
-            if res.ready():  # SUCCESS or FAILURE (but mainly SUCCESS carries payload)
-                payload = res.result
-                if isinstance(payload, dict):
-                    # Вариант 1: owner_id в payload (самый надёжный transient fallback)
-                    res_owner = payload.get("owner_id")
-                    if res_owner and int(res_owner) == request.user.id:
-                        # P0-Security: Double verification via DB if meal exists
-                        meal_id = payload.get("meal_id")
-                        if meal_id:
-                            try:
-                                from apps.nutrition.models import Meal
-
-                                if Meal.objects.filter(
-                                    id=meal_id, user_id=request.user.id
-                                ).exists():
-                                    cache.set(
-                                        f"ai_task_owner:{task_id}", request.user.id, timeout=86400
-                                    )
-                                    owner_verified = True
-                            except Exception:
-                                pass
-                        else:
-                            # Trust owner_id for error/empty results (no DB record to verify)
-                            cache.set(f"ai_task_owner:{task_id}", request.user.id, timeout=86400)
-                            owner_verified = True
-
-                    # Вариант 2 can be removed or kept as legacy fallback, but Variant 1 covers it better now.
-                    # Keeping it simple as requested logic loop is closed by the block above for owner_id.
+        # 1) Legacy: задача без записи состояния → result backend
+        # SECURITY: Проверка владения задачей
+        owner_verified, res = _verify_task_owner(request, task_id)
 
         if not owner_verified:
             logger.warning(
@@ -311,80 +464,258 @@ class TaskStatusView(APIView):
                 task_id,
                 request_id,
             )
+            return _task_not_found(request_id)
 
-            from .error_contract import AIErrorRegistry
-
-            # Use PHOTO_NOT_FOUND for unauthorized access (don't reveal task existence)
-            error_def = AIErrorRegistry.PHOTO_NOT_FOUND
-            resp = Response(
-                error_def.to_dict(trace_id=request_id),
-                status=status.HTTP_404_NOT_FOUND
-            )
-            resp["X-Request-ID"] = request_id
-            return resp
-
-        # res is already defined above in fallback block or needs to be
-        if "res" not in locals():
+        if res is None:
             res = AsyncResult(task_id)
 
         state = res.state
+        if state == "FAILURE":
+            # Клиенту — безопасно и кратко. В логи — подробнее.
+            logger.warning("AI task failed: task_id=%s error=%r", task_id, res.result)
 
         # P0-API: Consistent Payload
-        if state == "SUCCESS":
-            payload: Dict[str, Any] = res.result or {}
-
-            # Ensure items list exists for safe mapping on frontend
-            payload.setdefault("items", [])
-            payload.setdefault("totals", {})  # P0: Guarantee totals existence
-
-            # P1: Hygiene - Remove internal owner_id before sending to client
-            payload.pop("owner_id", None)
-
-            # Check if logic-level error exists in payload
-            if payload.get("error"):
-                data = {
-                    "task_id": task_id,
-                    "status": "failed",
-                    "state": state,
-                    "error": payload["error"],
-                    "result": payload,
-                }
+        data = build_status_payload(
+            task_id, state, res.result if state in ("SUCCESS", "FAILURE") else None, request_id
+        )
+        resp = Response(data, status=status.HTTP_200_OK)
+        resp["X-Request-ID"] = request_id
+        return resp
+
+
+class TaskStatusStreamView(APIView):
+    """
+    GET /api/v1/ai/task/<task_id>/stream/
+    Server-Sent Events: статус задачи приходит сразу при смене (вместо polling).
+
+    - первое событие — текущий статус (как у TaskStatusView)
+    - дальше события из Redis pub/sub: processing → success | failed
+    - после success/failed стрим закрывается
+    - каждые AI_TASK_STREAM_HEARTBEAT_S — комментарий-пинг (держит соединение)
+    - через AI_TASK_STREAM_TIMEOUT_S стрим закрывается — клиент переподключается
+    """
+
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [TaskStatusThrottle]
+
+    def get(self, request: Request, task_id: str):
+        request_id = request.headers.get("X-Request-ID", "")
+
+        record = task_status.read_state(task_id)
+        if record is not None:
+            owner_verified = record.get("owner_id") == request.user.id
+        else:
+            owner_verified, _ = _verify_task_owner(request, task_id)
+        if not owner_verified:
+            logger.warning(
+                "Unauthorized access attempt to AI task stream: user_id=%s task_id=%s rid=%s",
+                request.user.id,
+                task_id,
+                request_id,
+            )
+            return _task_not_found(request_id)
+
+        resp = StreamingHttpResponse(
+            _task_event_stream(task_id, request_id), content_type="text/event-stream"
+        )
+        resp["Cache-Control"] = "no-cache"
+        # nginx: не буферизовать ответ, иначе события придут пачкой в конце
+        resp["X-Accel-Buffering"] = "no"
+        resp["X-Request-ID"] = request_id
+        return resp
+
+
+def _current_task_status(task_id: str, request_id: str) -> Dict[str, Any]:
+    record = task_status.read_state(task_id)
+    if record is not None:
+        data = task_status.payloads_from_states({task_id: record}, request_id).get(task_id)
+        if data is not None:
+            return data
+
+    res = AsyncResult(task_id)
+    state = res.state
+    return build_status_payload(
+        task_id, state, res.result if state in ("SUCCESS", "FAILURE") else None, request_id
+    )
+
+
+def _task_event_stream(task_id: str, request_id: str) -> Iterator[str]:
+    timeout_s = float(getattr(settings, "AI_TASK_STREAM_TIMEOUT_S", 60))
+    heartbeat_s = float(getattr(settings, "AI_TASK_STREAM_HEARTBEAT_S", 15))
+    deadline = time.monotonic() + timeout_s
+
+    with task_status.subscribe(task_id) as subscription:
+        data = _current_task_status(task_id, request_id)
+        yield task_status.format_sse(data)
+        last_status = data["status"]
+
+        while last_status not in task_status.TERMINAL_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            if subscription is None:
+                # Нет pub/sub (LocMemCache) — перечитываем статус раз в секунду
+                time.sleep(min(1.0, remaining))
+                data = _current_task_status(task_id, request_id)
+                if data["status"] == last_status:
+                    continue
             else:
-                data = {"task_id": task_id, "status": "success", "state": state, "result": payload}
+                data = subscription.get(timeout=min(heartbeat_s, remaining))
+                if data is None:
+                    yield ": ping\n\n"
+                    continue
 
-            resp = Response(data, status=status.HTTP_200_OK)
-            resp["X-Request-ID"] = request_id
-            return resp
+            yield task_status.format_sse(data)
+            last_status = data.get("status", last_status)
 
-        if state == "FAILURE":
-            # Клиенту — безопасно и кратко. В логи — подробнее.
-            logger.warning("AI task failed: task_id=%s error=%r", task_id, res.result)
 
-            from .error_contract import AIErrorRegistry
+class TaskStatusBatchView(APIView):
+    """
+    GET /api/v1/ai/tasks/status/?ids=<id1,id2,...>
+    GET /api/v1/ai/tasks/status/?meal_id=<id>
 
-            error_def = AIErrorRegistry.INTERNAL_ERROR
-            data = {
-                "task_id": task_id,
-                "status": "failed",
-                "state": state,
-                "result": error_def.to_dict(trace_id=request_id),
-            }
-            resp = Response(data, status=status.HTTP_200_OK)
-            resp["X-Request-ID"] = request_id
-            return resp
+    Статусы всех задач multi-photo загрузки одним запросом вместо
+    polling каждого task_id:
+    - владение и state всех задач — один cache.get_many записей состояния
+    - результаты SUCCESS — один запрос к MealPhoto.recognized_data
+    - задачи без записи (legacy) — один mget к result backend
 
-        data = {"task_id": task_id, "status": "processing", "state": state}
-        resp = Response(data, status=status.HTTP_200_OK)
+    Выход:
+    {
+        "tasks": {"<task_id>": {task_id, status, state, result?, meal_photo_id}},
+        "not_found": ["<task_id>", ...]   # нет задачи или она чужая
+    }
+    """
+
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [TaskStatusThrottle]
+
+    def get(self, request: Request) -> Response:
+        from .serializers import TaskStatusBatchRequestSerializer
+
+        request_id = request.headers.get("X-Request-ID", "")
+
+        s = TaskStatusBatchRequestSerializer(data=request.query_params)
+        s.is_valid(raise_exception=True)
+
+        meal_id = s.validated_data.get("meal_id")
+        not_found: List[str] = []
+        if meal_id is not None:
+            photo_by_task = _tasks_for_meal(request, meal_id)
+            if photo_by_task is None:
+                return _task_not_found(request_id)
+            task_ids = list(photo_by_task)
+        else:
+            photo_by_task = {}
+            task_ids = s.validated_data["task_ids"]
+
+        # 1) Записи состояния: владение + статус одним get_many,
+        #    результаты SUCCESS — одним запросом к MealPhoto
+        records = task_status.read_states(task_ids)
+        owned_records = {}
+        for task_id, record in records.items():
+            if record.get("owner_id") == request.user.id:
+                owned_records[task_id] = record
+            else:
+                not_found.append(task_id)
+        tasks: Dict[str, Dict[str, Any]] = {}
+        for task_id, data in task_status.payloads_from_states(owned_records, request_id).items():
+            data["meal_photo_id"] = owned_records[task_id].get("photo_id")
+            tasks[task_id] = data
+
+        # 2) Legacy: задачи без записи состояния → result backend
+        legacy_ids = [t for t in task_ids if t not in tasks and t not in not_found]
+        if meal_id is None and legacy_ids:
+            legacy_photos, legacy_not_found = _owned_tasks(request, legacy_ids)
+            photo_by_task.update(legacy_photos)
+            not_found.extend(legacy_not_found)
+            legacy_ids = list(legacy_photos)
+
+        states = task_status.read_task_states(legacy_ids)
+        for task_id, (state, result) in states.items():
+            if state == "FAILURE":
+                logger.warning("AI task failed: task_id=%s error=%r", task_id, result)
+            data = build_status_payload(task_id, state, result, request_id)
+            data["meal_photo_id"] = photo_by_task[task_id]
+            tasks[task_id] = data
+
+        resp = Response({"tasks": tasks, "not_found": not_found}, status=status.HTTP_200_OK)
         resp["X-Request-ID"] = request_id
         return resp
 
 
+def _owned_tasks(
+    request: Request, task_ids: List[str]
+) -> Tuple[Dict[str, Optional[int]], List[str]]:
+    """
+    Задачи из task_ids, принадлежащие request.user.
+
+    Returns:
+        ({task_id: meal_photo_id}, [task_id, которых нет или они чужие])
+    """
+    keys = [f"ai_task_owner:{t}" for t in task_ids] + [f"ai_task_photo:{t}" for t in task_ids]
+    cached = cache.get_many(keys)
+
+    owned: Dict[str, Optional[int]] = {}
+    not_found: List[str] = []
+    for task_id in task_ids:
+        owner_id = cached.get(f"ai_task_owner:{task_id}")
+        if owner_id is not None:
+            verified = int(owner_id) == request.user.id
+        else:
+            # Кэш владельца истёк — тот же fallback, что у одиночного статуса
+            verified, _ = _verify_task_owner(request, task_id)
+
+        if verified:
+            owned[task_id] = cached.get(f"ai_task_photo:{task_id}")
+        else:
+            not_found.append(task_id)
+
+    if not_found:
+        logger.warning(
+            "Unauthorized or unknown AI tasks in batch status: user_id=%s count=%d",
+            request.user.id,
+            len(not_found),
+        )
+    return owned, not_found
+
+
+def _tasks_for_meal(request: Request, meal_id: int) -> Optional[Dict[str, int]]:
+    """
+    Задачи всех фото приёма пищи: {task_id: meal_photo_id}.
+
+    Владение проверяется по Meal (один запрос к БД), дальше — один cache.get_many.
+    None — приёма пищи нет или он чужой.
+    """
+    from apps.nutrition.models import MealPhoto
+
+    photo_ids = list(
+        MealPhoto.objects.filter(meal_id=meal_id, meal__user=request.user).values_list(
+            "id", flat=True
+        )
+    )
+    if not photo_ids:
+        from apps.nutrition.models import Meal
+
+        if not Meal.objects.filter(id=meal_id, user=request.user).exists():
+            return None
+        return {}
+
+    cached = cache.get_many([f"ai_photo_task:{photo_id}" for photo_id in photo_ids])
+    return {
+        str(cached[f"ai_photo_task:{photo_id}"]): photo_id
+        for photo_id in photo_ids
+        if f"ai_photo_task:{photo_id}" in cached
+    }
+
+
 class CancelTaskView(APIView):
     """
     POST /api/v1/ai/task/<task_id>/cancel/
 
-    Marks a task as cancelled. The Celery task will check this flag
-    before creating a Meal, preventing orphan diary entries.
+    Marks a task as cancelled. The Celery task checks this flag between stages
+    and aborts an in-flight AI Proxy call (apps.ai.cancellation).
 
     Fire-and-forget from frontend perspective - always returns 200.
     """
@@ -418,8 +749,8 @@ class CancelTaskView(APIView):
             )
             return Response({"ok": True}, status=status.HTTP_200_OK)
 
-        # Set cancellation flag (24h TTL same as task ownership)
-        cache.set(f"ai_task_cancelled:{task_id}", request.user.id, timeout=86400)
+        # Флаг отмены (24h TTL как у ownership) + уведомление запущенной задаче
+        cancellation.request_cancel(task_id, request.user.id)
 
         # P0 Immediate Feedback: Update MealPhoto status and finalize
         meal_photo_id = cache.get(f"ai_task_photo:{task_id}")
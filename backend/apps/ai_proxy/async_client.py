@@ -0,0 +1,249 @@
+"""
+async_client.py — asyncio-клиент AI Proxy + event loop на процесс.
+
+Простыми словами:
+- вызов AI Proxy — это 5–35 секунд ожидания сети
+- в prefork-воркере один процесс = один вызов: процесс простаивает всё это время,
+  и пропускная способность очереди ai = числу процессов
+- здесь все вызовы процесса идут через ОДИН event loop и ОДИН httpx пул
+  (keep-alive), поэтому один процесс держит десятки запросов одновременно
+
+Режим AI_PROXY_CLIENT_MODE=async:
+- воркер очереди ai запускается с пулом потоков:
+    celery -A config worker -Q ai -P threads --concurrency=32
+- каждая задача (поток) делает свою работу с БД как обычно,
+  а HTTP-вызов отдаёт в общий loop и ждёт future (поток не держит сокет)
+- AIProxyService ничего не знает о режиме: EventLoopAIProxyClient
+  имеет тот же sync-интерфейс, что и AIProxyClient
+
+Логика запроса/ответа общая с AIProxyClient (_build_request/_interpret_response),
+поэтому Error Contract и исключения одинаковые в обоих режимах.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextvars import ContextVar
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from django.conf import settings
+import httpx
+
+from . import hedging
+from .client import (
+    AIProxyClient,
+    AIProxyConfig,
+    AIProxyResult,
+    _build_batch_request,
+    _build_request,
+    _default_headers,
+    _interpret_response,
+    _split_batch_result,
+)
+from .exceptions import AIProxyServerError, AIProxyTimeoutError
+from .utils import join_url
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncAIProxyClient:
+    """
+    asyncio-версия AIProxyClient (httpx.AsyncClient с keep-alive пулом).
+
+    httpx.AsyncClient привязан к event loop, поэтому создаётся лениво —
+    при первом запросе внутри того loop, где клиент используется.
+    """
+
+    _RECOGNIZE_PATH = AIProxyClient._RECOGNIZE_PATH
+
+    def __init__(
+        self,
+        config: Optional[AIProxyConfig] = None,
+        *,
+        connect_timeout_s: float = 5.0,
+        read_timeout_s: float = 35.0,
+        max_connections: Optional[int] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self._config = config or AIProxyConfig.from_django_settings()
+        self._timeout = httpx.Timeout(read_timeout_s, connect=connect_timeout_s)
+        pool_size = max_connections or int(getattr(settings, "AI_PROXY_POOL_MAXSIZE", 32))
+        self._limits = httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size
+        )
+        self._default_headers = _default_headers(self._config)
+        self._transport = transport  # для тестов (httpx.MockTransport)
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self._timeout, limits=self._limits, transport=self._transport
+            )
+        return self._http
+
+    async def recognize_food(
+        self,
+        *,
+        image_bytes: bytes,
+        content_type: str,
+        user_comment: str = "",
+        locale: str = "ru",
+        request_id: str = "",
+    ) -> AIProxyResult:
+        """
+        То же, что AIProxyClient.recognize_food(), но без блокировки потока.
+
+        Hedge (AI_HEDGE_ENABLED): проигравший запрос отменяется сразу.
+        """
+        url = join_url(self._config.url, self._RECOGNIZE_PATH)
+        headers, files, data = _build_request(
+            self._default_headers,
+            image_bytes=image_bytes,
+            content_type=content_type,
+            user_comment=user_comment,
+            locale=locale,
+            request_id=request_id,
+        )
+
+        if hedging.is_enabled():
+            return await hedging.acall_hedged(
+                lambda: self._post_recognize(url, headers, files, data, request_id),
+                request_id=request_id,
+            )
+        return await self._post_recognize(url, headers, files, data, request_id)
+
+    async def _post_recognize(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        files: Dict[str, Any],
+        data: Dict[str, str],
+        request_id: str,
+    ) -> AIProxyResult:
+        try:
+            resp = await self._get_http().post(url, headers=headers, files=files, data=data)
+        except httpx.TimeoutException as e:
+            raise AIProxyTimeoutError(f"AI Proxy timeout: {e}") from e
+        except httpx.HTTPError as e:
+            raise AIProxyServerError(f"AI Proxy network error: {e}") from e
+
+        return _interpret_response(resp.status_code, resp.text or "", url, request_id)
+
+    async def recognize_food_batch(
+        self,
+        *,
+        images: Sequence[Tuple[bytes, str]],
+        user_comment: str = "",
+        locale: str = "ru",
+        request_id: str = "",
+    ) -> List[AIProxyResult]:
+        """То же, что AIProxyClient.recognize_food_batch(), но без блокировки потока."""
+        url = join_url(self._config.url, AIProxyClient._RECOGNIZE_BATCH_PATH)
+        headers, files, data = _build_batch_request(
+            self._default_headers,
+            images=images,
+            user_comment=user_comment,
+            locale=locale,
+            request_id=request_id,
+        )
+
+        try:
+            resp = await self._get_http().post(url, headers=headers, files=files, data=data)
+        except httpx.TimeoutException as e:
+            raise AIProxyTimeoutError(f"AI Proxy timeout: {e}") from e
+        except httpx.HTTPError as e:
+            raise AIProxyServerError(f"AI Proxy network error: {e}") from e
+
+        result = _interpret_response(resp.status_code, resp.text or "", url, request_id)
+        return _split_batch_result(result, len(images))
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+# ---------------------------------------------------------------------------
+# Event loop на процесс
+# ---------------------------------------------------------------------------
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_shared_async_client: Optional[AsyncAIProxyClient] = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Фоновый event loop процесса (daemon-поток, запускается лениво).
+
+    После fork создаётся заново: поток и сокеты родителя в дочернем процессе мертвы.
+    """
+    global _loop, _loop_pid, _shared_async_client
+
+    pid = os.getpid()
+    if _loop is not None and _loop_pid == pid:
+        return _loop
+
+    with _loop_lock:
+        if _loop is None or _loop_pid != pid:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="ai-proxy-loop", daemon=True
+            )
+            thread.start()
+            _loop = loop
+            _loop_pid = pid
+            _shared_async_client = None
+    return _loop
+
+
+# Регистрация отмены текущего вызова: hook(cancel) — вызывающий (apps.ai.cancellation)
+# может отменить запрос, не дожидаясь ответа AI Proxy
+abort_hook: ContextVar[Optional[Callable[[Callable[[], Any]], None]]] = ContextVar(
+    "ai_proxy_abort_hook", default=None
+)
+
+
+def run_in_loop(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Выполняет корутину в loop процесса и блокирует только вызывающий поток."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    hook = abort_hook.get()
+    if hook is not None:
+        hook(future.cancel)
+    return future.result(timeout)
+
+
+def get_shared_async_client() -> AsyncAIProxyClient:
+    """Один AsyncAIProxyClient (и httpx пул) на процесс."""
+    global _shared_async_client
+
+    get_event_loop()  # сбрасывает клиент после fork
+    with _loop_lock:
+        if _shared_async_client is None:
+            _shared_async_client = AsyncAIProxyClient()
+        return _shared_async_client
+
+
+class EventLoopAIProxyClient:
+    """
+    Sync-фасад над общим AsyncAIProxyClient (интерфейс как у AIProxyClient).
+
+    AIProxyService вызывает recognize_food() из потока задачи Celery,
+    сам HTTP-запрос выполняется в общем event loop процесса.
+    """
+
+    def __init__(self, async_client: Optional[AsyncAIProxyClient] = None) -> None:
+        self._async_client = async_client or get_shared_async_client()
+
+    def recognize_food(self, **kwargs: Any) -> AIProxyResult:
+        return run_in_loop(self._async_client.recognize_food(**kwargs))
+
+    def recognize_food_batch(self, **kwargs: Any) -> List[AIProxyResult]:
+        return run_in_loop(self._async_client.recognize_food_batch(**kwargs))
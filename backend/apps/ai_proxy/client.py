@@ -19,11 +19,15 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import logging
-from typing import Any, Dict, Optional
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from django.conf import settings
 import requests
+import requests.adapters
 
+from . import hedging
 from .exceptions import (
     AIProxyAuthenticationError,
     AIProxyServerError,
@@ -103,6 +107,8 @@ class AIProxyClient:
 
     # Реальный endpoint AI Proxy (из твоего FastAPI кода)
     _RECOGNIZE_PATH = "/api/v1/ai/recognize-food"
+    # Несколько фото одного приёма пищи за один запрос (AI_BATCH_RECOGNITION_ENABLED)
+    _RECOGNIZE_BATCH_PATH = "/api/v1/ai/recognize-food/batch"
 
     def __init__(
         self,
@@ -114,14 +120,12 @@ class AIProxyClient:
         self._config = config or AIProxyConfig.from_django_settings()
         self._timeout = (connect_timeout_s, read_timeout_s)
 
-        # requests.Session — чуть быстрее и проще (keep-alive)
-        self._session = requests.Session()
+        # Один requests.Session на процесс (keep-alive пул): задача создаёт новый
+        # AIProxyService на каждый вызов, но TCP/TLS handshake делается один раз
+        self._session = get_shared_session()
 
         # Секрет кладём только в заголовок. В логи никогда не выводим.
-        self._default_headers = {
-            "Accept": "application/json",
-            "X-API-Key": self._config.secret,
-        }
+        self._default_headers = _default_headers(self._config)
 
     def _build_url(self, path: str) -> str:
         return join_url(self._config.url, path)
@@ -153,30 +157,34 @@ class AIProxyClient:
         - AIProxyServerError: 5xx или network error (ретраить)
         - AIProxyAuthenticationError: 401/403 (не ретраить)
         - AIProxyValidationError: некорректный запрос БЕЗ Error Contract (не ретраить)
-        """
-        if not image_bytes:
-            raise AIProxyValidationError("Пустое изображение (image_bytes пустой)")
 
+        AI_HEDGE_ENABLED: долгий ответ → второй такой же запрос (hedging.py)
+        """
         url = self._build_url(self._RECOGNIZE_PATH)
+        headers, files, data = _build_request(
+            self._default_headers,
+            image_bytes=image_bytes,
+            content_type=content_type,
+            user_comment=user_comment,
+            locale=locale,
+            request_id=request_id,
+        )
 
-        headers = dict(self._default_headers)
-        if request_id:
-            # AI Proxy middleware читает X-Request-ID и добавляет его в ответ
-            headers["X-Request-ID"] = request_id
-            # AI Proxy gate логирует по X-Trace-Id (2026-01-16)
-            headers["X-Trace-Id"] = request_id
-
-        # multipart/form-data:
-        # image — файл, user_comment/locale — поля формы
-        files = {
-            "image": ("image", image_bytes, content_type),
-        }
-        data = {
-            "locale": locale or "ru",
-        }
-        if user_comment:
-            data["user_comment"] = user_comment
+        if hedging.is_enabled():
+            return hedging.call_hedged(
+                lambda: self._post_recognize(url, headers, files, data, request_id),
+                request_id=request_id,
+            )
+        return self._post_recognize(url, headers, files, data, request_id)
 
+    def _post_recognize(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        files: Dict[str, Any],
+        data: Dict[str, str],
+        request_id: str,
+    ) -> AIProxyResult:
         try:
             resp = self._session.post(
                 url,
@@ -192,65 +200,238 @@ class AIProxyClient:
             # Сеть/соединение — временная проблема (ретраим)
             raise AIProxyServerError(f"AI Proxy network error: {e}") from e
 
-        # Пытаемся разобрать JSON (AI Proxy всегда возвращает JSON)
-        body_text = resp.text or ""
-        payload, preview = safe_json_loads(body_text)
-        status = resp.status_code
-
-        # Debug logging для диагностики (2026-01-16)
-        # Note: 'preview' only contains data on JSON parse errors
-        # For successful JSON parses, we need to log body_text or payload
-        logger.info(
-            "[AI Proxy] Request to %s | status=%d | trace_id=%s | response=%s",
-            url,
-            status,
-            request_id or "none",
-            body_text[:300] if body_text else "empty"  # Log actual response body
+        return _interpret_response(resp.status_code, resp.text or "", url, request_id)
+
+    def recognize_food_batch(
+        self,
+        *,
+        images: Sequence[Tuple[bytes, str]],
+        user_comment: str = "",
+        locale: str = "ru",
+        request_id: str = "",
+    ) -> List[AIProxyResult]:
+        """
+        Отправляет несколько фото одним запросом (multipart, поле images).
+
+        Возвращает AIProxyResult на каждое фото в том же порядке.
+        Исключения — как у recognize_food().
+        """
+        url = self._build_url(self._RECOGNIZE_BATCH_PATH)
+        headers, files, data = _build_batch_request(
+            self._default_headers,
+            images=images,
+            user_comment=user_comment,
+            locale=locale,
+            request_id=request_id,
         )
 
-        # ------------------------------------------------------------
-        # НОВАЯ ЛОГИКА (2026-01-16): различаем structured errors vs exceptions
-        # ------------------------------------------------------------
+        try:
+            resp = self._session.post(
+                url,
+                headers=headers,
+                files=files,
+                data=data,
+                timeout=self._timeout,
+            )
+        except requests.Timeout as e:
+            raise AIProxyTimeoutError(f"AI Proxy timeout: {e}") from e
+        except requests.RequestException as e:
+            raise AIProxyServerError(f"AI Proxy network error: {e}") from e
 
-        # Шаг 1: Проверяем, есть ли Error Contract в payload
-        # Если есть error_code — это бизнес-ответ (UNSUPPORTED_CONTENT, EMPTY_RESULT, etc.)
-        # Возвращаем AIProxyResult(ok=False), а НЕ exception
-        if isinstance(payload, dict) and "error_code" in payload:
-            # AI Proxy вернул structured error (может быть с любым HTTP status: 400, 429, даже 200)
-            return AIProxyResult(ok=False, payload=payload, status_code=status)
+        result = _interpret_response(resp.status_code, resp.text or "", url, request_id)
+        return _split_batch_result(result, len(images))
 
-        # Шаг 2: Проверяем HTTP статусы для технических ошибок
 
-        # 401/403 — authentication error (не ретраить)
-        if status in (401, 403):
-            detail = payload.get("detail") if isinstance(payload, dict) else None
-            raise AIProxyAuthenticationError(
-                f"AI Proxy auth error {status}: {detail or preview or 'unauthorized'}"
-            )
+# ---------------------------------------------------------------------------
+# Общая часть sync/async клиентов
+# ---------------------------------------------------------------------------
 
-        # 400/413/422/429 — validation error БЕЗ Error Contract (не ретраить)
-        # Если бы был Error Contract, мы бы вернули его выше
-        if status in (400, 413, 422, 429):
-            detail = payload.get("detail") if isinstance(payload, dict) else None
-            raise AIProxyValidationError(
-                f"AI Proxy validation error {status}: {detail or preview or 'bad request'}"
-            )
+_shared_session: Optional[requests.Session] = None
+_shared_session_pid: Optional[int] = None
+_shared_session_lock = threading.Lock()
 
-        # 5xx — server error (ретраить)
-        if 500 <= status <= 599:
-            detail = payload.get("detail") if isinstance(payload, dict) else None
-            raise AIProxyServerError(
-                f"AI Proxy server error {status}: {detail or preview or 'server error'}"
-            )
 
-        # Любой другой неожиданный статус — считаем server error (ретраить ограниченно)
-        if status < 200 or status >= 300:
-            raise AIProxyServerError(
-                f"AI Proxy unexpected status {status}: {preview or body_text[:200]}"
+def get_shared_session() -> requests.Session:
+    """
+    requests.Session на процесс (keep-alive пул соединений к AI Proxy).
+
+    После fork (prefork воркер Celery) создаётся новая сессия:
+    сокеты родителя в дочернем процессе использовать нельзя.
+    """
+    global _shared_session, _shared_session_pid
+
+    pid = os.getpid()
+    if _shared_session is not None and _shared_session_pid == pid:
+        return _shared_session
+
+    with _shared_session_lock:
+        if _shared_session is None or _shared_session_pid != pid:
+            pool_size = int(getattr(settings, "AI_PROXY_POOL_MAXSIZE", 32))
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=pool_size, pool_block=False
             )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _shared_session = session
+            _shared_session_pid = pid
+    return _shared_session
+
+
+def _default_headers(config: AIProxyConfig) -> Dict[str, str]:
+    return {
+        "Accept": "application/json",
+        "X-API-Key": config.secret,
+    }
+
+
+def _build_request(
+    default_headers: Dict[str, str],
+    *,
+    image_bytes: bytes,
+    content_type: str,
+    user_comment: str,
+    locale: str,
+    request_id: str,
+) -> Tuple[Dict[str, str], Dict[str, Any], Dict[str, str]]:
+    """Заголовки + multipart (files/data) — одинаково для sync и async клиента."""
+    if not image_bytes:
+        raise AIProxyValidationError("Пустое изображение (image_bytes пустой)")
+
+    headers = dict(default_headers)
+    if request_id:
+        # AI Proxy middleware читает X-Request-ID и добавляет его в ответ
+        headers["X-Request-ID"] = request_id
+        # AI Proxy gate логирует по X-Trace-Id (2026-01-16)
+        headers["X-Trace-Id"] = request_id
+
+    # multipart/form-data:
+    # image — файл, user_comment/locale — поля формы
+    files = {
+        "image": ("image", image_bytes, content_type),
+    }
+    data = {
+        "locale": locale or "ru",
+    }
+    if user_comment:
+        data["user_comment"] = user_comment
+    return headers, files, data
+
+
+def _build_batch_request(
+    default_headers: Dict[str, str],
+    *,
+    images: Sequence[Tuple[bytes, str]],
+    user_comment: str,
+    locale: str,
+    request_id: str,
+) -> Tuple[Dict[str, str], List[Tuple[str, Tuple[str, bytes, str]]], Dict[str, str]]:
+    """Как _build_request(), но несколько файлов в поле images (порядок сохраняется)."""
+    if not images or any(not image_bytes for image_bytes, _ in images):
+        raise AIProxyValidationError("Пустое изображение в batch запросе")
+
+    headers, _, data = _build_request(
+        default_headers,
+        image_bytes=images[0][0],
+        content_type=images[0][1],
+        user_comment=user_comment,
+        locale=locale,
+        request_id=request_id,
+    )
+    files = [
+        ("images", (f"image_{i}", image_bytes, content_type))
+        for i, (image_bytes, content_type) in enumerate(images)
+    ]
+    return headers, files, data
+
+
+def _split_batch_result(result: AIProxyResult, count: int) -> List[AIProxyResult]:
+    """
+    Ответ batch endpoint → AIProxyResult на каждое фото.
+
+    Формат успеха: {"results": [<ответ как у одиночного endpoint>, ...]}
+    Error Contract на весь запрос → та же ошибка для каждого фото.
+    """
+    if not result.ok:
+        return [result] * count
+
+    results = result.payload.get("results")
+    if not isinstance(results, list) or len(results) != count:
+        raise AIProxyServerError(
+            f"AI Proxy batch response mismatch: expected {count} results"
+        )
+
+    return [
+        AIProxyResult(
+            ok=not (isinstance(item, dict) and "error_code" in item),
+            payload=item if isinstance(item, dict) else {},
+            status_code=result.status_code,
+        )
+        for item in results
+    ]
+
+
+def _interpret_response(status: int, body_text: str, url: str, request_id: str) -> AIProxyResult:
+    """
+    HTTP ответ AI Proxy → AIProxyResult или исключение (общая логика sync/async).
+    """
+    # Пытаемся разобрать JSON (AI Proxy всегда возвращает JSON)
+    payload, preview = safe_json_loads(body_text)
+
+    # Debug logging для диагностики (2026-01-16)
+    # Note: 'preview' only contains data on JSON parse errors
+    # For successful JSON parses, we need to log body_text or payload
+    logger.info(
+        "[AI Proxy] Request to %s | status=%d | trace_id=%s | response=%s",
+        url,
+        status,
+        request_id or "none",
+        body_text[:300] if body_text else "empty"  # Log actual response body
+    )
+
+    # ------------------------------------------------------------
+    # НОВАЯ ЛОГИКА (2026-01-16): различаем structured errors vs exceptions
+    # ------------------------------------------------------------
+
+    # Шаг 1: Проверяем, есть ли Error Contract в payload
+    # Если есть error_code — это бизнес-ответ (UNSUPPORTED_CONTENT, EMPTY_RESULT, etc.)
+    # Возвращаем AIProxyResult(ok=False), а НЕ exception
+    if isinstance(payload, dict) and "error_code" in payload:
+        # AI Proxy вернул structured error (может быть с любым HTTP status: 400, 429, даже 200)
+        return AIProxyResult(ok=False, payload=payload, status_code=status)
+
+    # Шаг 2: Проверяем HTTP статусы для технических ошибок
+
+    # 401/403 — authentication error (не ретраить)
+    if status in (401, 403):
+        detail = payload.get("detail") if isinstance(payload, dict) else None
+        raise AIProxyAuthenticationError(
+            f"AI Proxy auth error {status}: {detail or preview or 'unauthorized'}"
+        )
+
+    # 400/413/422/429 — validation error БЕЗ Error Contract (не ретраить)
+    # Если бы был Error Contract, мы бы вернули его выше
+    if status in (400, 413, 422, 429):
+        detail = payload.get("detail") if isinstance(payload, dict) else None
+        raise AIProxyValidationError(
+            f"AI Proxy validation error {status}: {detail or preview or 'bad request'}"
+        )
+
+    # 5xx — server error (ретраить)
+    if 500 <= status <= 599:
+        detail = payload.get("detail") if isinstance(payload, dict) else None
+        raise AIProxyServerError(
+            f"AI Proxy server error {status}: {detail or preview or 'server error'}"
+        )
+
+    # Любой другой неожиданный статус — считаем server error (ретраить ограниченно)
+    if status < 200 or status >= 300:
+        raise AIProxyServerError(
+            f"AI Proxy unexpected status {status}: {preview or body_text[:200]}"
+        )
 
-        # Шаг 3: Успех (2xx + нет error_code)
-        if not payload:
-            raise AIProxyServerError("AI Proxy returned empty or non-object JSON response")
+    # Шаг 3: Успех (2xx + нет error_code)
+    if not payload:
+        raise AIProxyServerError("AI Proxy returned empty or non-object JSON response")
 
-        return AIProxyResult(ok=True, payload=payload, status_code=status)
+    return AIProxyResult(ok=True, payload=payload, status_code=status)
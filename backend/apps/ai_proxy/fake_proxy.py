@@ -0,0 +1,441 @@
+"""
+fake_proxy.py — локальная замена AI Proxy для нагрузочного тестирования.
+
+Простыми словами:
+- настоящий AI Proxy нагружать нельзя (платный LLM, общий сервис)
+- это маленькое ASGI-приложение с теми же endpoint'ами:
+    POST /api/v1/ai/recognize-food        — ответ в формате normalize_proxy_response
+    POST /api/v1/ai/recognize-food/batch  — {"results": [...]} на каждое фото
+    GET  /health, GET /stats              — проверка и счётчики
+- латентность, доля ошибок и пропускная способность задаются env-переменными
+  FAKE_AI_PROXY_* (см. FakeProxyConfig) — прогоны воспроизводимы (SEED)
+
+Запуск (без зависимостей; uvicorn используется, если установлен):
+    python -m apps.ai_proxy.fake_proxy --port 8001
+    AI_PROXY_URL=http://127.0.0.1:8001 AI_PROXY_SECRET=fake ...
+
+В тестах — без сети, прямо через httpx:
+    AsyncAIProxyClient(transport=httpx.ASGITransport(app=FakeAIProxy(config)))
+
+Модуль не зависит от Django: его можно запускать отдельно от backend.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import json
+import math
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+RECOGNIZE_PATH = "/api/v1/ai/recognize-food"
+RECOGNIZE_BATCH_PATH = "/api/v1/ai/recognize-food/batch"
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+# Блюда для "реалистичного" ответа (поля как у настоящего AI Proxy)
+MENU: List[Dict[str, Any]] = [
+    {"food_name_ru": "Гречка отварная", "kcal_100g": 110, "p": 4.2, "f": 1.1, "c": 21.3},
+    {"food_name_ru": "Куриная грудка", "kcal_100g": 165, "p": 31.0, "f": 3.6, "c": 0.0},
+    {"food_name_ru": "Салат овощной", "kcal_100g": 45, "p": 1.2, "f": 2.5, "c": 4.8},
+    {"food_name_ru": "Рис отварной", "kcal_100g": 130, "p": 2.7, "f": 0.3, "c": 28.0},
+    {"food_name_ru": "Омлет", "kcal_100g": 154, "p": 10.6, "f": 11.7, "c": 1.6},
+    {"food_name_ru": "Борщ", "kcal_100g": 49, "p": 1.1, "f": 2.2, "c": 6.7},
+]
+
+ERROR_CONTRACTS: List[Dict[str, Any]] = [
+    {
+        "error_code": "UNSUPPORTED_CONTENT",
+        "user_title": "Похоже, на фото не еда",
+        "user_message": "Сфотографируйте блюдо крупнее при хорошем освещении.",
+        "user_actions": ["retake"],
+        "allow_retry": False,
+    },
+    {
+        "error_code": "EMPTY_RESULT",
+        "user_title": "Не удалось распознать",
+        "user_message": "Попробуйте сделать фото крупнее.",
+        "user_actions": ["retake", "manual"],
+        "allow_retry": True,
+    },
+]
+
+
+def _env_float(environ: Mapping[str, str], name: str, default: float) -> float:
+    return float(environ.get(name, default))
+
+
+@dataclass(frozen=True)
+class FakeProxyConfig:
+    """
+    Поведение fake AI Proxy (все поля — env FAKE_AI_PROXY_<ИМЯ>).
+
+    Латентность:
+    - latency_dist: fixed | uniform | normal | lognormal
+    - latency_ms: медиана (lognormal) / среднее (normal, uniform) / значение (fixed)
+    - latency_spread: sigma для lognormal; ст. отклонение (мс) для normal;
+      полуширина (мс) для uniform
+    - latency_max_ms: верхняя граница одного ответа
+
+    Ошибки (доли от 0 до 1 на запрос, взаимоисключающие — сумма не больше 1):
+    - error_contract_rate: 400 + Error Contract (UNSUPPORTED_CONTENT / EMPTY_RESULT)
+    - server_error_rate: 502 без Error Contract
+    - timeout_rate: ответ через timeout_s (клиент отвалится по таймауту)
+
+    Пропускная способность:
+    - max_concurrency: > 0 — запросы сверх лимита ждут очереди (как перегруженный LLM)
+    - max_rps: > 0 — сверх лимита сразу 429 (как rate limit провайдера)
+    """
+
+    latency_dist: str = "lognormal"
+    latency_ms: float = 3000.0
+    latency_spread: float = 0.4
+    latency_max_ms: float = 30000.0
+    error_contract_rate: float = 0.0
+    server_error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_s: float = 60.0
+    max_concurrency: int = 0
+    max_rps: float = 0.0
+    secret: str = ""
+    seed: Optional[int] = None
+
+    @staticmethod
+    def from_env(environ: Optional[Mapping[str, str]] = None) -> "FakeProxyConfig":
+        env = os.environ if environ is None else environ
+        prefix = "FAKE_AI_PROXY_"
+        dist = env.get(prefix + "LATENCY_DIST", "lognormal").lower()
+        if dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"{prefix}LATENCY_DIST must be one of {LATENCY_DISTRIBUTIONS}")
+        seed = env.get(prefix + "SEED")
+        return FakeProxyConfig(
+            latency_dist=dist,
+            latency_ms=_env_float(env, prefix + "LATENCY_MS", 3000),
+            latency_spread=_env_float(env, prefix + "LATENCY_SPREAD", 0.4),
+            latency_max_ms=_env_float(env, prefix + "LATENCY_MAX_MS", 30000),
+            error_contract_rate=_env_float(env, prefix + "ERROR_CONTRACT_RATE", 0),
+            server_error_rate=_env_float(env, prefix + "SERVER_ERROR_RATE", 0),
+            timeout_rate=_env_float(env, prefix + "TIMEOUT_RATE", 0),
+            timeout_s=_env_float(env, prefix + "TIMEOUT_S", 60),
+            max_concurrency=int(env.get(prefix + "MAX_CONCURRENCY", 0)),
+            max_rps=_env_float(env, prefix + "MAX_RPS", 0),
+            secret=env.get(prefix + "SECRET", ""),
+            seed=int(seed) if seed else None,
+        )
+
+
+@dataclass
+class FakeProxyStats:
+    requests: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    outcomes: Dict[str, int] = field(default_factory=dict)
+
+    def count(self, outcome: str) -> None:
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class FakeAIProxy:
+    """ASGI-приложение fake AI Proxy."""
+
+    def __init__(self, config: Optional[FakeProxyConfig] = None) -> None:
+        self.config = config or FakeProxyConfig.from_env()
+        self.stats = FakeProxyStats()
+        self._rng = random.Random(self.config.seed)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._rps_tokens = self.config.max_rps
+        self._rps_updated = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Поведение
+    # ------------------------------------------------------------------
+
+    def sample_latency_s(self) -> float:
+        cfg = self.config
+        if cfg.latency_dist == "fixed":
+            ms = cfg.latency_ms
+        elif cfg.latency_dist == "uniform":
+            ms = self._rng.uniform(
+                cfg.latency_ms - cfg.latency_spread, cfg.latency_ms + cfg.latency_spread
+            )
+        elif cfg.latency_dist == "normal":
+            ms = self._rng.gauss(cfg.latency_ms, cfg.latency_spread)
+        else:
+            ms = self._rng.lognormvariate(math.log(max(cfg.latency_ms, 1.0)), cfg.latency_spread)
+        return max(0.0, min(ms, cfg.latency_max_ms)) / 1000
+
+    def choose_outcome(self) -> str:
+        """ok | error_contract | server_error | timeout"""
+        roll = self._rng.random()
+        cfg = self.config
+        for outcome, rate in (
+            ("timeout", cfg.timeout_rate),
+            ("server_error", cfg.server_error_rate),
+            ("error_contract", cfg.error_contract_rate),
+        ):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return "ok"
+
+    def recognition_payload(self, request_id: str) -> Dict[str, Any]:
+        items = []
+        total = {"calories": 0.0, "protein_g": 0.0, "fat_g": 0.0, "carbs_g": 0.0}
+        for dish in self._rng.sample(MENU, self._rng.randint(1, 3)):
+            grams = self._rng.randint(80, 300)
+            item = {
+                "food_name_ru": dish["food_name_ru"],
+                "portion_weight_g": grams,
+                "calories": round(dish["kcal_100g"] * grams / 100),
+                "protein_g": round(dish["p"] * grams / 100, 1),
+                "fat_g": round(dish["f"] * grams / 100, 1),
+                "carbs_g": round(dish["c"] * grams / 100, 1),
+                "confidence": round(self._rng.uniform(0.7, 0.98), 2),
+            }
+            items.append(item)
+            total["calories"] += item["calories"]
+            for key in ("protein_g", "fat_g", "carbs_g"):
+                total[key] = round(total[key] + item[key], 1)
+        return {
+            "result": {"items": items, "total": total, "model_notes": "fake-ai-proxy"},
+            "confidence": 0.9,
+            "zone": "food_likely",
+            "is_food": True,
+            "trace_id": request_id,
+        }
+
+    def error_contract(self, request_id: str) -> Dict[str, Any]:
+        return {**self._rng.choice(ERROR_CONTRACTS), "trace_id": request_id}
+
+    def _take_rps_token(self) -> bool:
+        if self.config.max_rps <= 0:
+            return True
+        now = time.monotonic()
+        self._rps_tokens = min(
+            self.config.max_rps,
+            self._rps_tokens + (now - self._rps_updated) * self.config.max_rps,
+        )
+        self._rps_updated = now
+        if self._rps_tokens >= 1:
+            self._rps_tokens -= 1
+            return True
+        return False
+
+    # ------------------------------------------------------------------
+    # ASGI
+    # ------------------------------------------------------------------
+
+    async def __call__(self, scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await _lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"].rstrip("/")
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        request_id = headers.get("x-request-id", "")
+
+        if method == "GET" and path == "/health":
+            await _respond(send, 200, {"status": "ok", "fake": True}, request_id)
+            return
+        if method == "GET" and path == "/stats":
+            await _respond(send, 200, self._stats_payload(), request_id)
+            return
+        if method != "POST" or path not in (RECOGNIZE_PATH, RECOGNIZE_BATCH_PATH):
+            await _respond(send, 404, {"detail": "Not Found"}, request_id)
+            return
+
+        body = await _read_body(receive)
+        if self.config.secret and headers.get("x-api-key") != self.config.secret:
+            await _respond(send, 401, {"detail": "Invalid API key"}, request_id)
+            return
+        if not body or "multipart/form-data" not in headers.get("content-type", ""):
+            await _respond(send, 422, {"detail": "image is required"}, request_id)
+            return
+
+        self.stats.requests += 1
+        if not self._take_rps_token():
+            self.stats.count("rate_limited")
+            await _respond(send, 429, {"detail": "rate limited"}, request_id)
+            return
+
+        batch = path == RECOGNIZE_BATCH_PATH
+        photos = body.count(b'name="images"') if batch else 1
+        status, payload = await self._process(request_id, photos, batch)
+        await _respond(send, status, payload, request_id)
+
+    async def _process(
+        self, request_id: str, photos: int, batch: bool
+    ) -> Tuple[int, Dict[str, Any]]:
+        if self.config.max_concurrency > 0 and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+
+        if self._semaphore is not None:
+            async with self._semaphore:
+                return await self._handle(request_id, photos, batch)
+        return await self._handle(request_id, photos, batch)
+
+    async def _handle(
+        self, request_id: str, photos: int, batch: bool
+    ) -> Tuple[int, Dict[str, Any]]:
+        self.stats.in_flight += 1
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+        try:
+            outcome = self.choose_outcome()
+            self.stats.count(outcome)
+            if outcome == "timeout":
+                await asyncio.sleep(self.config.timeout_s)
+                return 504, {"detail": "upstream timeout"}
+
+            await asyncio.sleep(self.sample_latency_s())
+            if outcome == "server_error":
+                return 502, {"detail": "fake upstream error"}
+            if outcome == "error_contract":
+                return 400, self.error_contract(request_id)
+            if batch:
+                return 200, {
+                    "results": [self.recognition_payload(request_id) for _ in range(photos)]
+                }
+            return 200, self.recognition_payload(request_id)
+        finally:
+            self.stats.in_flight -= 1
+
+    def _stats_payload(self) -> Dict[str, Any]:
+        return {
+            "requests": self.stats.requests,
+            "in_flight": self.stats.in_flight,
+            "max_in_flight": self.stats.max_in_flight,
+            "outcomes": dict(self.stats.outcomes),
+        }
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _respond(send: Send, status: int, payload: Dict[str, Any], request_id: str) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    if request_id:
+        headers.append((b"x-request-id", request_id.encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+# ---------------------------------------------------------------------------
+# Встроенный HTTP/1.1 сервер (только для fake proxy, если нет uvicorn)
+# ---------------------------------------------------------------------------
+
+
+async def _serve_connection(app: FakeAIProxy, reader, writer) -> None:
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = []
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers.append((name.strip().lower().encode(), value.strip().encode()))
+            header_map = dict(headers)
+            length = int(header_map.get(b"content-length", b"0"))
+            body = await reader.readexactly(length) if length else b""
+            path, _, query = target.partition("?")
+
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": method,
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "headers": headers,
+            }
+            delivered = False
+
+            async def receive() -> Dict[str, Any]:
+                nonlocal delivered
+                if delivered:
+                    await asyncio.Event().wait()  # ответ отправлен — больше данных не будет
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            response: Dict[str, Any] = {"status": 500, "headers": [], "body": b""}
+
+            async def send(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    response["status"] = message["status"]
+                    response["headers"] = message.get("headers", [])
+                else:
+                    response["body"] += message.get("body", b"")
+
+            await app(scope, receive, send)
+
+            out = [f"HTTP/1.1 {response['status']} FAKE".encode()]
+            out += [name + b": " + value for name, value in response["headers"]]
+            writer.write(b"\r\n".join(out) + b"\r\n\r\n" + response["body"])
+            await writer.drain()
+            if header_map.get(b"connection", b"").lower() == b"close":
+                return
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return
+    finally:
+        writer.close()
+
+
+async def serve(app: FakeAIProxy, host: str, port: int) -> None:
+    server = await asyncio.start_server(
+        lambda r, w: _serve_connection(app, r, w), host, port, backlog=1024
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fake AI Proxy (FAKE_AI_PROXY_* env)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args(argv)
+
+    app = FakeAIProxy()
+    print(f"Fake AI Proxy on http://{args.host}:{args.port} config={app.config}")
+    try:
+        import uvicorn
+    except ImportError:
+        asyncio.run(serve(app, args.host, args.port))
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+hedging.py — hedged requests к AI Proxy (контроль хвоста латентности).
+
+Простыми словами:
+- медиана распознавания нормальная, а p99 портят единичные "зависшие" вызовы
+- если ответа нет дольше обычного (перцентиль AI_HEDGE_PERCENTILE недавних
+  вызовов), отправляем ВТОРОЙ такой же запрос (тот же X-Request-ID) и берём
+  первый успешный ответ; проигравший отменяется
+- hedge — это дополнительная нагрузка на AI Proxy, поэтому бюджет:
+  каждый вызов "зарабатывает" AI_HEDGE_BUDGET_RATIO токена (0.05 → не больше
+  ~5% лишних запросов), hedge тратит 1 токен; нет токена — ждём первый запрос
+- hedge — такой же вызов AI Proxy для лимитера (resilience.py): он занимает свой
+  слот (без ожидания), нет слота — hedge не отправляем; sync-проигравший первый
+  запрос держит слот guard'а, пока не доработает в фоне
+
+Правила:
+- задержка hedge = перцентиль успешных латентностей процесса (скользящее окно),
+  в пределах [AI_HEDGE_MIN_DELAY_MS, AI_HEDGE_MAX_DELAY_MS]; пока данных мало
+  (< AI_HEDGE_MIN_SAMPLES) — AI_HEDGE_MAX_DELAY_MS
+- первый запрос упал до hedge → ошибка как раньше (ретраи делает Celery)
+- упали оба → ошибка первого запроса
+- статистика (hedged / wins / budget_skipped / limiter_skipped) — get_hedge_stats()
+- состояние на процесс: бюджет на процесс ⇒ бюджет на кластер
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from django.conf import settings
+
+from . import resilience
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LATENCY_WINDOW = 500
+# Бюджет не копится бесконечно: после долгой тишины не бахнуть пачкой hedge
+MAX_BUDGET_TOKENS = 10.0
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "AI_HEDGE_ENABLED", False))
+
+
+class HedgePolicy:
+    """Задержка hedge по перцентилю латентности + бюджет лишних запросов."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._tokens = 0.0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_skipped = 0
+        self.limiter_skipped = 0
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay_s(self) -> float:
+        min_s = float(getattr(settings, "AI_HEDGE_MIN_DELAY_MS", 2000)) / 1000
+        max_s = float(getattr(settings, "AI_HEDGE_MAX_DELAY_MS", 20000)) / 1000
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < int(getattr(settings, "AI_HEDGE_MIN_SAMPLES", 50)):
+            return max_s
+        percentile = float(getattr(settings, "AI_HEDGE_PERCENTILE", 95))
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return max(min_s, min(max_s, samples[index]))
+
+    def on_request(self) -> None:
+        ratio = float(getattr(settings, "AI_HEDGE_BUDGET_RATIO", 0.05))
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(MAX_BUDGET_TOKENS, self._tokens + ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self.hedged += 1
+                return True
+            self.budget_skipped += 1
+            return False
+
+    def on_no_slot(self) -> None:
+        """Токен потрачен, но слота лимитера нет — hedge не отправлен, токен возвращается."""
+        with self._lock:
+            self._tokens = min(MAX_BUDGET_TOKENS, self._tokens + 1.0)
+            self.hedged -= 1
+            self.limiter_skipped += 1
+
+    def on_hedge_win(self) -> None:
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": is_enabled(),
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "budget_skipped": self.budget_skipped,
+                "limiter_skipped": self.limiter_skipped,
+                "budget_tokens": round(self._tokens, 2),
+                "samples": len(self._latencies),
+            }
+
+
+_policy = HedgePolicy()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+def get_policy() -> HedgePolicy:
+    return _policy
+
+
+def get_hedge_stats() -> Dict[str, Any]:
+    """Счётчики hedging процесса (health check, метрики)."""
+    return {**_policy.stats(), "delay_ms": int(_policy.delay_s() * 1000)}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Пул потоков для sync-клиента (после fork — новый, потоки родителя мертвы)."""
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            workers = 2 * int(getattr(settings, "AI_PROXY_POOL_MAXSIZE", 32))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-hedge")
+            _executor_pid = pid
+    return _executor
+
+
+def _log_hedge(request_id: str, delay_s: float) -> None:
+    logger.info(
+        "[AI Hedge] fired request_id=%s delay_ms=%d", request_id or "none", int(delay_s * 1000)
+    )
+
+
+def _hedge_slot(policy: HedgePolicy) -> Optional[str]:
+    """Бюджет + слот лимитера AI Proxy для hedge; None — hedge не отправляем."""
+    if not policy.try_spend():
+        return None
+    slot = resilience.try_acquire_slot()
+    if slot is None:
+        policy.on_no_slot()
+    return slot
+
+
+def call_hedged(
+    attempt: Callable[[], T],
+    *,
+    request_id: str = "",
+    policy: Optional[HedgePolicy] = None,
+) -> T:
+    """
+    Sync-версия: attempt() — один HTTP-вызов AI Proxy (блокирующий).
+
+    Оба запроса выполняются в пуле потоков; проигравший, если уже начался,
+    дорабатывает в фоне (requests нельзя прервать), его ответ отбрасывается,
+    а соединение возвращается в keep-alive пул. Слот лимитера проигравшего
+    освобождается, только когда он действительно закончится.
+    """
+    policy = policy or _policy
+    policy.on_request()
+    delay = policy.delay_s()
+    started = time.monotonic()
+    executor = _get_executor()
+
+    primary = executor.submit(attempt)
+    done, _ = wait([primary], timeout=delay)
+    slot = None if done else _hedge_slot(policy)
+    if slot is None:
+        result = primary.result()
+        policy.record_latency(time.monotonic() - started)
+        return result
+
+    _log_hedge(request_id, delay)
+    hedge = executor.submit(attempt)
+    hedge.add_done_callback(lambda _: resilience.release_slot(slot))
+    pending = {primary, hedge}
+    first_error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in _primary_first(done, primary):
+            error = future.exception()
+            if error is not None:
+                if first_error is None or future is primary:
+                    first_error = error
+                continue
+            for loser in pending:
+                if not loser.cancel() and loser is primary:
+                    # Слот первого запроса — у guard вызывающего: держим до конца запроса
+                    resilience.hold_slot_until(loser)
+            return _hedge_result(policy, future.result(), future is hedge, started, request_id)
+    assert first_error is not None
+    raise first_error
+
+
+async def acall_hedged(
+    attempt: Callable[[], Awaitable[T]],
+    *,
+    request_id: str = "",
+    policy: Optional[HedgePolicy] = None,
+) -> T:
+    """Asyncio-версия: проигравший запрос действительно отменяется (task.cancel())."""
+    policy = policy or _policy
+    policy.on_request()
+    delay = policy.delay_s()
+    started = time.monotonic()
+
+    primary = asyncio.ensure_future(attempt())
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    # Слот — запрос к кэшу: не блокируем event loop
+    slot = None if done else await asyncio.to_thread(_hedge_slot, policy)
+    if slot is None:
+        result = await primary
+        policy.record_latency(time.monotonic() - started)
+        return result
+
+    _log_hedge(request_id, delay)
+    hedge = asyncio.ensure_future(attempt())
+    pending = {primary, hedge}
+    first_error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in _primary_first(done, primary):
+                error = task.exception()
+                if error is not None:
+                    if first_error is None or task is primary:
+                        first_error = error
+                    continue
+                return _hedge_result(policy, task.result(), task is hedge, started, request_id)
+    finally:
+        for task in pending:
+            task.cancel()
+        resilience.release_slot(slot)
+    assert first_error is not None
+    raise first_error
+
+
+def _primary_first(done, primary):
+    # Оба завершились одновременно → ответ/ошибка первого запроса важнее
+    return sorted(done, key=lambda f: f is not primary)
+
+
+def _hedge_result(
+    policy: HedgePolicy, result: T, hedge_won: bool, started: float, request_id: str
+) -> T:
+    policy.record_latency(time.monotonic() - started)
+    if hedge_won:
+        policy.on_hedge_win()
+        logger.info("[AI Hedge] hedge won request_id=%s", request_id or "none")
+    return result
+
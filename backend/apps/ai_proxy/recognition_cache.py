@@ -0,0 +1,126 @@
+"""
+recognition_cache.py — кэш результатов распознавания по хешу фото.
+
+Простыми словами:
+- пользователи часто отправляют одно и то же фото повторно
+  (retry, двойной тап, "Повторить" после FAILED)
+- каждый такой запрос — полный round trip в AI Proxy (5–35 с) и платный вызов модели
+- если нормализованный JPEG, комментарий и locale совпали — ответ тот же,
+  поэтому отдаём его из Redis за миллисекунды
+
+Ключ:
+- sha256(нормализованный JPEG) + sha256(user_comment) + locale
+- нормализация детерминирована, поэтому хеш после normalize_image() стабилен
+
+Ограничения размера:
+- у каждой записи TTL (AI_RECOGNITION_CACHE_TTL)
+- слишком большие записи не кэшируем (AI_RECOGNITION_CACHE_MAX_ENTRY_BYTES)
+- общий объём ограничивает Redis (maxmemory + allkeys-lru вытесняет старые записи)
+
+Правила:
+- кэшируем ТОЛЬКО успешные результаты (ошибки/пустые ответы не кэшируем)
+- любые ошибки кэша НЕ ломают распознавание (fail-open)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Версию поднимаем при изменении формата RecognizeFoodResult / adapter.py
+CACHE_KEY_PREFIX = "ai_recognition:v1"
+
+STATS_HITS_KEY = "ai_recognition_stats:hits"
+STATS_MISSES_KEY = "ai_recognition_stats:misses"
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "AI_RECOGNITION_CACHE_ENABLED", True))
+
+
+def make_cache_key(image_bytes: bytes, user_comment: str = "", locale: str = "ru") -> str:
+    """
+    Ключ кэша для нормализованного изображения.
+
+    user_comment хешируем отдельно: он может содержать кириллицу/пробелы,
+    а ключ должен быть коротким и безопасным для Redis.
+    """
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    comment_hash = hashlib.sha256((user_comment or "").strip().encode("utf-8")).hexdigest()[:16]
+    return f"{CACHE_KEY_PREFIX}:{image_hash}:{comment_hash}:{locale or 'ru'}"
+
+
+def get_cached_result(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает закэшированный результат ({items, totals, meta}) или None.
+    Инкрементирует счётчики hit/miss.
+    """
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        logger.warning("[AI Cache] get failed: %s", type(e).__name__)
+        return None
+
+    _bump(STATS_HITS_KEY if cached is not None else STATS_MISSES_KEY)
+    return cached
+
+
+def set_cached_result(key: str, payload: Dict[str, Any]) -> bool:
+    """
+    Сохраняет успешный результат распознавания.
+
+    Returns:
+        True если запись сохранена, False если пропущена (слишком большая / ошибка кэша)
+    """
+    max_bytes = int(getattr(settings, "AI_RECOGNITION_CACHE_MAX_ENTRY_BYTES", 64 * 1024))
+    try:
+        size = len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        return False
+
+    if size > max_bytes:
+        logger.info("[AI Cache] skip oversized entry: size=%dB limit=%dB", size, max_bytes)
+        return False
+
+    ttl = int(getattr(settings, "AI_RECOGNITION_CACHE_TTL", 24 * 60 * 60))
+    try:
+        cache.set(key, payload, timeout=ttl)
+    except Exception as e:
+        logger.warning("[AI Cache] set failed: %s", type(e).__name__)
+        return False
+    return True
+
+
+def get_recognition_cache_stats() -> Dict[str, Any]:
+    """Счётчики для capacity planning: hits, misses, hit_ratio."""
+    try:
+        values = cache.get_many([STATS_HITS_KEY, STATS_MISSES_KEY])
+    except Exception:
+        values = {}
+
+    hits = int(values.get(STATS_HITS_KEY) or 0)
+    misses = int(values.get(STATS_MISSES_KEY) or 0)
+    total = hits + misses
+    return {
+        "enabled": is_enabled(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def _bump(counter_key: str) -> None:
+    """Атомарный инкремент счётчика (без TTL — счётчик живёт до рестарта Redis)."""
+    try:
+        cache.add(counter_key, 0, timeout=None)
+        cache.incr(counter_key)
+    except Exception:
+        # Счётчики — best-effort, распознавание важнее
+        pass
@@ -0,0 +1,382 @@
+"""
+resilience.py — circuit breaker + адаптивный лимит параллельных вызовов AI Proxy.
+
+Простыми словами:
+- когда AI Proxy деградирует, каждая задача всё равно ждёт полный таймаут
+  (5 с connect + 35 с read) и только потом падает; воркеры забиты ожиданием,
+  очередь ai копится минутами
+- состояние общее для ВСЕХ воркеров (Django cache = Redis), поэтому
+  деградацию замечает весь кластер, а не каждый процесс по отдельности
+
+Circuit breaker:
+- CLOSED: вызовы идут как обычно, считаем вызовы/ошибки в окне
+  (корзины по BUCKET_S секунд, окно AI_CB_WINDOW_S)
+- доля ошибок (таймаут/5xx/сеть) >= AI_CB_FAILURE_RATE при >= AI_CB_MIN_CALLS
+  вызовах → OPEN на AI_CB_OPEN_S: задачи сразу получают AI_SERVER_ERROR
+- по истечении OPEN → HALF_OPEN: пропускаем не больше AI_CB_HALF_OPEN_PROBES
+  пробных вызовов; успех → CLOSED, ошибка → снова OPEN
+
+Адаптивный лимит (AIMD):
+- не больше limit вызовов одновременно на весь кластер; слот — ключ в кэше
+  с TTL (воркер убит → слот освободится сам, счётчик не "утекает")
+- успех с латентностью <= AI_LIMITER_LATENCY_TARGET_MS → limit растёт на 1
+  за каждые limit успехов (additive increase)
+- ошибка или медленный ответ → limit / 2 (multiplicative decrease),
+  не чаще раза в DECREASE_COOLDOWN_S
+- нет слота за AI_LIMITER_WAIT_S → AI_SERVER_ERROR сразу, без похода в AI Proxy
+
+Правила:
+- в breaker/limiter считаются только успех и таймаут/5xx/сеть; остальные исключения
+  (4xx, отмена задачи, ошибки вне вызова) — не признак состояния AI Proxy, не считаем
+- слот держится, пока вызов реально идёт: sync-вызов, брошенный отменённой задачей,
+  дорабатывает в фоне — слот освобождается по его завершении (hold_slot_until)
+- любые ошибки кэша → fail-open (распознавание важнее защиты)
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .exceptions import AIProxyServerError, AIProxyTimeoutError
+
+logger = logging.getLogger(__name__)
+
+BUCKET_S = 10
+
+CALLS_KEY = "ai_cb:calls:{bucket}"
+FAILURES_KEY = "ai_cb:failures:{bucket}"
+OPEN_UNTIL_KEY = "ai_cb:open_until"
+PROBES_KEY = "ai_cb:probes"
+
+LIMIT_KEY = "ai_limiter:limit"
+SUCCESSES_KEY = "ai_limiter:successes"
+DECREASED_KEY = "ai_limiter:decreased"
+SLOT_KEY = "ai_limiter:slot:{index}"
+
+DECREASE_COOLDOWN_S = 5
+LIMITER_POLL_S = 0.2
+# Слот живёт не дольше самого долгого вызова (connect 5 + read 35) + запас
+SLOT_TTL_S = 45
+
+# Вызовы, которые дорабатывают в фоне после выхода из guard (см. hold_slot_until)
+_background_calls: ContextVar[Optional[List[Future]]] = ContextVar(
+    "ai_proxy_background_calls", default=None
+)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "AI_PROXY_RESILIENCE_ENABLED", True))
+
+
+def _setting(name: str, default: Any) -> Any:
+    return type(default)(getattr(settings, name, default))
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+
+class CircuitBreaker:
+    """Общий для кластера circuit breaker вызовов AI Proxy."""
+
+    def _window_buckets(self, now: float) -> List[int]:
+        current = int(now // BUCKET_S)
+        count = max(1, _setting("AI_CB_WINDOW_S", 60) // BUCKET_S)
+        return [current - i for i in range(count)]
+
+    def window_counts(self, now: Optional[float] = None) -> Dict[str, int]:
+        buckets = self._window_buckets(now or time.time())
+        keys = [CALLS_KEY.format(bucket=b) for b in buckets] + [
+            FAILURES_KEY.format(bucket=b) for b in buckets
+        ]
+        values = cache.get_many(keys)
+        calls = sum(int(values.get(CALLS_KEY.format(bucket=b)) or 0) for b in buckets)
+        failures = sum(int(values.get(FAILURES_KEY.format(bucket=b)) or 0) for b in buckets)
+        return {"calls": calls, "failures": failures}
+
+    def state(self, now: Optional[float] = None) -> str:
+        open_until = cache.get(OPEN_UNTIL_KEY)
+        if open_until is None:
+            return STATE_CLOSED
+        return STATE_OPEN if (now or time.time()) < float(open_until) else STATE_HALF_OPEN
+
+    def allow(self) -> bool:
+        """Можно ли сейчас вызывать AI Proxy (в HALF_OPEN — ограниченно)."""
+        state = self.state()
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_OPEN:
+            return False
+        # HALF_OPEN: пропускаем несколько пробных вызовов
+        cache.add(PROBES_KEY, 0, timeout=_setting("AI_CB_OPEN_S", 30))
+        return cache.incr(PROBES_KEY) <= _setting("AI_CB_HALF_OPEN_PROBES", 2)
+
+    def record(self, success: bool) -> None:
+        now = time.time()
+        state = self.state(now)
+        if state == STATE_HALF_OPEN:
+            if success:
+                self._close()
+            else:
+                self._open(now, reason="probe failed")
+            return
+
+        bucket = int(now // BUCKET_S)
+        ttl = _setting("AI_CB_WINDOW_S", 60) + BUCKET_S
+        self._bump(CALLS_KEY.format(bucket=bucket), ttl)
+        if success:
+            return
+        self._bump(FAILURES_KEY.format(bucket=bucket), ttl)
+
+        if state == STATE_CLOSED:
+            counts = self.window_counts(now)
+            if counts["calls"] >= _setting("AI_CB_MIN_CALLS", 20) and counts[
+                "failures"
+            ] >= counts["calls"] * _setting("AI_CB_FAILURE_RATE", 0.5):
+                self._open(now, reason=f"failures={counts['failures']}/{counts['calls']}")
+
+    def _open(self, now: float, reason: str) -> None:
+        open_s = _setting("AI_CB_OPEN_S", 30)
+        # Ключ живёт дольше OPEN: после истечения open_until это HALF_OPEN
+        cache.set(OPEN_UNTIL_KEY, now + open_s, timeout=open_s * 10)
+        cache.delete(PROBES_KEY)
+        logger.warning("[AI Breaker] OPEN for %ss: %s", open_s, reason)
+
+    def _close(self) -> None:
+        buckets = self._window_buckets(time.time())
+        cache.delete_many(
+            [OPEN_UNTIL_KEY, PROBES_KEY]
+            + [CALLS_KEY.format(bucket=b) for b in buckets]
+            + [FAILURES_KEY.format(bucket=b) for b in buckets]
+        )
+        logger.info("[AI Breaker] CLOSED: AI Proxy recovered")
+
+    @staticmethod
+    def _bump(key: str, ttl: int) -> None:
+        cache.add(key, 0, timeout=ttl)
+        cache.incr(key)
+
+
+# ---------------------------------------------------------------------------
+# Adaptive concurrency limiter (AIMD)
+# ---------------------------------------------------------------------------
+
+
+class ConcurrencyLimiter:
+    """Общий для кластера AIMD-лимит одновременных вызовов AI Proxy."""
+
+    def limit(self) -> int:
+        value = cache.get(LIMIT_KEY)
+        if value is None:
+            return self._clamp(_setting("AI_LIMITER_INITIAL", 16))
+        return self._clamp(int(value))
+
+    def _clamp(self, value: int) -> int:
+        return max(_setting("AI_LIMITER_MIN", 2), min(_setting("AI_LIMITER_MAX", 64), value))
+
+    def inflight(self) -> int:
+        keys = [SLOT_KEY.format(index=i) for i in range(_setting("AI_LIMITER_MAX", 64))]
+        return len(cache.get_many(keys))
+
+    def acquire(self) -> Optional[str]:
+        """Занимает слот; None — свободного слота нет за AI_LIMITER_WAIT_S."""
+        deadline = time.monotonic() + _setting("AI_LIMITER_WAIT_S", 5.0)
+        while True:
+            slot = self.try_acquire()
+            if slot is not None:
+                return slot
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(LIMITER_POLL_S)
+
+    def try_acquire(self) -> Optional[str]:
+        """Одна попытка занять слот, без ожидания."""
+        keys = [SLOT_KEY.format(index=i) for i in range(self.limit())]
+        taken = cache.get_many(keys)
+        free = [k for k in keys if k not in taken]
+        random.shuffle(free)  # разные воркеры не бьются за один ключ
+        for key in free[:3]:
+            if cache.add(key, 1, timeout=SLOT_TTL_S):
+                return key
+        return None
+
+    def release(self, slot: str) -> None:
+        cache.delete(slot)
+
+    def on_success(self, latency_ms: int) -> None:
+        if latency_ms > _setting("AI_LIMITER_LATENCY_TARGET_MS", 15000):
+            self._decrease(reason=f"slow call {latency_ms}ms")
+            return
+        limit = self.limit()
+        cache.add(SUCCESSES_KEY, 0, timeout=None)
+        if cache.incr(SUCCESSES_KEY) >= limit:
+            cache.set(SUCCESSES_KEY, 0, timeout=None)
+            cache.set(LIMIT_KEY, self._clamp(limit + 1), timeout=None)
+
+    def on_failure(self) -> None:
+        self._decrease(reason="error")
+
+    def _decrease(self, reason: str) -> None:
+        # Пачка одновременных ошибок — одно уменьшение, а не limit / 2^N
+        if not cache.add(DECREASED_KEY, 1, timeout=DECREASE_COOLDOWN_S):
+            return
+        limit = self.limit()
+        new_limit = self._clamp(limit // 2)
+        cache.set(LIMIT_KEY, new_limit, timeout=None)
+        cache.set(SUCCESSES_KEY, 0, timeout=None)
+        logger.warning("[AI Limiter] limit %s → %s (%s)", limit, new_limit, reason)
+
+
+# ---------------------------------------------------------------------------
+# Guard для AIProxyService
+# ---------------------------------------------------------------------------
+
+
+class AIProxyGuard:
+    """Breaker + limiter вокруг одного вызова AI Proxy."""
+
+    def __init__(
+        self,
+        breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+    ) -> None:
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or ConcurrencyLimiter()
+
+    @contextmanager
+    def call(self, request_id: str = "") -> Iterator[None]:
+        if not is_enabled():
+            yield
+            return
+
+        try:
+            allowed = self.breaker.allow()
+        except Exception:
+            allowed = True  # fail-open
+        if not allowed:
+            logger.warning("[AI Breaker] fail fast (open) request_id=%s", request_id)
+            raise AIProxyServerError("AI Proxy circuit breaker is open")
+
+        try:
+            slot = self.limiter.acquire()
+        except Exception:
+            slot = ""  # fail-open: кэш недоступен — идём без лимита
+        if slot is None:
+            logger.warning(
+                "[AI Limiter] no slot (limit=%s) request_id=%s", self.limiter.limit(), request_id
+            )
+            raise AIProxyServerError("AI Proxy concurrency limit reached")
+
+        started = time.monotonic()
+        # None — исход ничего не говорит о состоянии AI Proxy (4xx, отмена задачи)
+        success: Optional[bool] = None
+        background: List[Future] = []
+        context_token = _background_calls.set(background)
+        try:
+            yield
+            success = True
+        except (AIProxyTimeoutError, AIProxyServerError):
+            success = False
+            raise
+        finally:
+            _background_calls.reset(context_token)
+            latency_ms = int((time.monotonic() - started) * 1000)
+            try:
+                if slot and background:
+                    self._release_after(slot, background)
+                elif slot:
+                    self.limiter.release(slot)
+                if success is not None:
+                    self.breaker.record(success)
+                    if success:
+                        self.limiter.on_success(latency_ms)
+                    else:
+                        self.limiter.on_failure()
+            except Exception as e:
+                logger.warning("[AI Breaker] state update failed: %s", type(e).__name__)
+
+    def _release_after(self, slot: str, futures: List[Future]) -> None:
+        """Слот освобождается, когда завершится последний из фоновых вызовов."""
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def _on_done(_: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._release_quietly(slot)
+
+        for future in futures:
+            future.add_done_callback(_on_done)
+
+    def _release_quietly(self, slot: str) -> None:
+        try:
+            self.limiter.release(slot)
+        except Exception:
+            pass  # слот истечёт по SLOT_TTL_S
+
+
+def try_acquire_slot() -> Optional[str]:
+    """
+    Слот лимитера для дополнительного запроса (hedge), без ожидания.
+
+    Returns:
+        ключ слота | "" (лимитер выключен / кэш недоступен — fail-open) | None (слотов нет)
+    """
+    if not is_enabled():
+        return ""
+    try:
+        return ConcurrencyLimiter().try_acquire()
+    except Exception:
+        return ""
+
+
+def release_slot(slot: Optional[str]) -> None:
+    """Освобождает слот try_acquire_slot() (ошибки кэша — слот истечёт по SLOT_TTL_S)."""
+    if not slot:
+        return
+    try:
+        ConcurrencyLimiter().release(slot)
+    except Exception:
+        pass
+
+
+def hold_slot_until(future: Future) -> None:
+    """
+    Текущий вызов guard бросается, но продолжает выполняться в фоне (future):
+    слот лимитера освободится, когда future завершится, а не при выходе из guard.
+    """
+    pending = _background_calls.get()
+    if pending is not None:
+        pending.append(future)
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    """Состояние breaker/limiter для мониторинга (health check, метрики)."""
+    breaker = CircuitBreaker()
+    limiter = ConcurrencyLimiter()
+    counts = breaker.window_counts()
+    return {
+        "enabled": is_enabled(),
+        "breaker_state": breaker.state(),
+        "window_calls": counts["calls"],
+        "window_failures": counts["failures"],
+        "limit": limiter.limit(),
+        "inflight": limiter.inflight(),
+    }
@@ -15,13 +15,20 @@ service.py — высокоуровневый сервис для распозн
 - tasks.py остаётся стабильным
 """
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 import logging
-from typing import Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 
+from django.conf import settings
+
+from . import recognition_cache
 from .adapter import normalize_proxy_response
-from .client import AIProxyClient
-from .utils import normalize_image
+from .client import AIProxyClient, AIProxyResult
+from .resilience import AIProxyGuard
+from .utils import compute_dhash, normalize_image
+
+# Поиск почти-дубликата по dHash: возвращает {items, totals, meta} или None
+NearDuplicateLookup = Callable[[str], Optional[Dict[str, Any]]]
 
 logger = logging.getLogger(__name__)
 
@@ -41,13 +48,56 @@ class RecognizeFoodResult:
     meta: dict[str, Any]
 
 
+def default_client():
+    if getattr(settings, "AI_PROXY_CLIENT_MODE", "sync") == "async":
+        from .async_client import EventLoopAIProxyClient
+
+        return EventLoopAIProxyClient()
+    return AIProxyClient()
+
+
+@dataclass
+class BatchImage:
+    """Одно фото для recognize_food_batch() (поля как у recognize_food())."""
+
+    image_bytes: bytes
+    content_type: str
+    normalization: Optional[Dict[str, Any]] = None
+
+
+def _cached_result(
+    cached: Dict[str, Any], request_id: str, perceptual_hash: Optional[str]
+) -> RecognizeFoodResult:
+    return RecognizeFoodResult(
+        items=cached.get("items") or [],
+        totals=cached.get("totals") or {},
+        meta={
+            **(cached.get("meta") or {}),
+            "request_id": request_id,
+            "cache_hit": True,
+            "perceptual_hash": perceptual_hash,
+        },
+    )
+
+
 class AIProxyService:
     """
     Сервис-обёртка над AIProxyClient.
+
+    Клиент по умолчанию выбирается AI_PROXY_CLIENT_MODE:
+    - sync  — AIProxyClient (requests, общий keep-alive пул процесса)
+    - async — EventLoopAIProxyClient (httpx в общем event loop процесса)
+
+    Каждый вызов AI Proxy идёт через AIProxyGuard: при деградации AI Proxy
+    задачи падают сразу с AIProxyServerError (→ AI_SERVER_ERROR), а не ждут таймаут.
     """
 
-    def __init__(self, client: Optional[AIProxyClient] = None) -> None:
-        self._client = client or AIProxyClient()
+    def __init__(
+        self, client: Optional[AIProxyClient] = None, guard: Optional[AIProxyGuard] = None
+    ) -> None:
+        self._client = client or default_client()
+        # Circuit breaker + адаптивный лимит параллельных вызовов (resilience.py)
+        self._guard = guard or AIProxyGuard()
 
     def recognize_food(
         self,
@@ -57,6 +107,8 @@ class AIProxyService:
         user_comment: str = "",
         locale: str = "ru",
         request_id: str = "",
+        near_duplicate_lookup: Optional[NearDuplicateLookup] = None,
+        normalization: Optional[Dict[str, Any]] = None,
     ) -> RecognizeFoodResult:
         """
         Распознаёт еду по фото.
@@ -69,20 +121,168 @@ class AIProxyService:
         HARD SLA:
         - Нормализация выполняется ровно 1 раз (до base64, до ретраев)
         - В Vision уходит ТОЛЬКО: JPEG, <=1024px longest side
+
+        Кэш (recognition_cache):
+        - повторное фото (тот же нормализованный JPEG + comment + locale)
+          отдаётся из Redis без вызова AI Proxy, meta.cache_hit=True
+
+        Upload-time нормализация (normalization):
+        - если фото уже нормализовано стадией media (apps.ai.tasks_media),
+          сюда передаются её метрики, а image_bytes — готовый JPEG;
+          повторно не декодируем (задача делает только I/O)
+        - metrics.action=reject → сразу controlled error
+
+        Почти-дубликаты (near_duplicate_lookup):
+        - по нормализованному JPEG считается dHash (meta.perceptual_hash)
+        - если lookup нашёл похожее фото — его результат переиспользуется
+          без вызова AI Proxy, meta.near_duplicate_of=<photo_id>
         """
-        # 1. Image Normalization (exactly ONCE per request)
-        try:
-            norm_bytes, norm_content_type, norm_metrics = normalize_image(
+        prepared = self._prepare_image(image_bytes, content_type, request_id, normalization)
+        if isinstance(prepared, RecognizeFoodResult):
+            return prepared
+        image_bytes, content_type = prepared, "image/jpeg"
+
+        # 4. Perceptual hash (дёшево: нормализованный JPEG <=1024px)
+        perceptual_hash = compute_dhash(image_bytes)
+
+        # 5. Recognition cache lookup (by hash of normalized JPEG)
+        cache_key = None
+        if recognition_cache.is_enabled():
+            cache_key = recognition_cache.make_cache_key(image_bytes, user_comment, locale)
+            cached = recognition_cache.get_cached_result(cache_key)
+            if cached is not None:
+                logger.info("[AI Cache] hit request_id=%s", request_id)
+                return _cached_result(cached, request_id, perceptual_hash)
+
+        # 6. Near-duplicate lookup (то же блюдо, пережатое/обрезанное)
+        if near_duplicate_lookup and perceptual_hash and not user_comment:
+            reused = near_duplicate_lookup(perceptual_hash)
+            if reused and reused.get("items"):
+                logger.info(
+                    "[AI Dedup] near-duplicate request_id=%s of_photo=%s",
+                    request_id,
+                    (reused.get("meta") or {}).get("near_duplicate_of"),
+                )
+                return RecognizeFoodResult(
+                    items=reused["items"],
+                    totals=reused.get("totals") or {},
+                    meta={
+                        **(reused.get("meta") or {}),
+                        "request_id": request_id,
+                        "perceptual_hash": perceptual_hash,
+                    },
+                )
+
+        # 7. API Request (uses same normalized bytes for any retries)
+        # client.recognize_food() теперь возвращает AIProxyResult
+        from apps.ai.stage_timings import stage
+
+        with self._guard.call(request_id), stage("proxy_rtt"):
+            result: AIProxyResult = self._client.recognize_food(
                 image_bytes=image_bytes,
                 content_type=content_type,
+                user_comment=user_comment,
+                locale=locale,
+                request_id=request_id,
+            )
+
+        return self._result_from_proxy(result, request_id, perceptual_hash, cache_key)
+
+    def recognize_food_batch(
+        self,
+        *,
+        images: List[BatchImage],
+        user_comment: str = "",
+        locale: str = "ru",
+        request_id: str = "",
+    ) -> List[RecognizeFoodResult]:
+        """
+        Распознаёт несколько фото одного приёма пищи ОДНИМ запросом к AI Proxy.
+
+        - каждое фото проходит те же шаги, что в recognize_food()
+          (reject/final assert → ошибка только этого фото)
+        - попадания в recognition cache в AI Proxy не отправляются
+        - результат — RecognizeFoodResult на каждое фото, в том же порядке
+        """
+        results: List[Optional[RecognizeFoodResult]] = [None] * len(images)
+        to_send: List[tuple[int, bytes, Optional[str], Optional[str]]] = []
+
+        for index, image in enumerate(images):
+            prepared = self._prepare_image(
+                image.image_bytes, image.content_type, request_id, image.normalization
             )
+            if isinstance(prepared, RecognizeFoodResult):
+                results[index] = prepared
+                continue
+
+            perceptual_hash = compute_dhash(prepared)
+            cache_key = None
+            if recognition_cache.is_enabled():
+                cache_key = recognition_cache.make_cache_key(prepared, user_comment, locale)
+                cached = recognition_cache.get_cached_result(cache_key)
+                if cached is not None:
+                    results[index] = _cached_result(cached, request_id, perceptual_hash)
+                    continue
+            to_send.append((index, prepared, perceptual_hash, cache_key))
+
+        if to_send:
+            from apps.ai.stage_timings import stage
+
+            with self._guard.call(request_id), stage("proxy_rtt"):
+                proxy_results = self._client.recognize_food_batch(
+                    images=[(jpeg, "image/jpeg") for _, jpeg, _, _ in to_send],
+                    user_comment=user_comment,
+                    locale=locale,
+                    request_id=request_id,
+                )
+            for (index, _, perceptual_hash, cache_key), proxy_result in zip(
+                to_send, proxy_results
+            ):
+                results[index] = self._result_from_proxy(
+                    proxy_result, request_id, perceptual_hash, cache_key
+                )
+
+        return [r for r in results if r is not None]
+
+    def _prepare_image(
+        self,
+        image_bytes: bytes,
+        content_type: str,
+        request_id: str,
+        normalization: Optional[Dict[str, Any]],
+    ) -> Union[bytes, RecognizeFoodResult]:
+        """
+        Шаги 1–3: нормализация + final assert.
+
+        Returns:
+            bytes нормализованного JPEG или RecognizeFoodResult с controlled error
+        """
+        # 1. Image Normalization (exactly ONCE per request)
+        try:
+            if normalization is not None:
+                # Уже сделано upload-time стадией
+                norm_bytes, norm_content_type, norm_metrics = (
+                    image_bytes,
+                    "image/jpeg",
+                    normalization,
+                )
+            else:
+                norm_bytes, norm_content_type, norm_metrics = normalize_image(
+                    image_bytes=image_bytes,
+                    content_type=content_type,
+                    fast_decode=getattr(settings, "AI_IMAGE_FAST_DECODE", True),
+                )
+
+            from apps.ai.stage_timings import record
+
+            record("normalize", norm_metrics.get("processing_ms"))
 
             # Log metrics (internal debugging only, NO bytes/base64)
             logger.info(
                 "Image normalization: request_id=%s, action=%s, reason=%s, "
                 "content_type_in=%s, content_type_out=%s, "
                 "original=%sB (%s, longest=%dpx), normalized=%sB (%s, longest=%dpx), "
-                "processing_ms=%d",
+                "decode_mode=%s, processing_ms=%d, stage=%s",
                 request_id,
                 norm_metrics.get("action", "unknown"),
                 norm_metrics.get("reason", "unknown"),
@@ -94,7 +294,9 @@ class AIProxyService:
                 norm_metrics.get("normalized_size_bytes", 0),
                 norm_metrics.get("normalized_px", "0x0"),
                 norm_metrics.get("normalized_longest_side", 0),
+                norm_metrics.get("decode_mode", "full"),
                 norm_metrics.get("processing_ms", 0),
+                norm_metrics.get("stage", "inline"),
             )
 
             # 2. Check action: if reject → controlled error, NO client call
@@ -174,19 +376,17 @@ class AIProxyService:
                 },
             )
 
-        # 4. API Request (uses same normalized bytes for any retries)
-        # client.recognize_food() теперь возвращает AIProxyResult
-        from .client import AIProxyResult
-
-        result: AIProxyResult = self._client.recognize_food(
-            image_bytes=image_bytes,
-            content_type=content_type,
-            user_comment=user_comment,
-            locale=locale,
-            request_id=request_id,
-        )
+        return image_bytes
 
-        # Шаг 5: Обрабатываем AIProxyResult
+    def _result_from_proxy(
+        self,
+        result: AIProxyResult,
+        request_id: str,
+        perceptual_hash: Optional[str],
+        cache_key: Optional[str],
+    ) -> RecognizeFoodResult:
+        """Шаги 8–9: AIProxyResult → RecognizeFoodResult (+ запись в кэш)."""
+        # Шаг 8: Обрабатываем AIProxyResult
         if not result.ok:
             # AI Proxy вернул structured error (UNSUPPORTED_CONTENT, EMPTY_RESULT, etc.)
             # result.payload уже содержит Error Contract
@@ -201,11 +401,17 @@ class AIProxyService:
                 },
             )
 
-        # Шаг 6: Успех — нормализуем payload
+        # Шаг 9: Успех — нормализуем payload
         # normalize_proxy_response теперь включает totals
         normalized = normalize_proxy_response(result.payload, request_id=request_id)
         items = normalized.get("items") or []
         totals = normalized.get("totals") or {}
-        meta = normalized.get("meta") or {}
+        meta = {**(normalized.get("meta") or {}), "perceptual_hash": perceptual_hash}
+
+        recognized = RecognizeFoodResult(items=items, totals=totals, meta=meta)
+
+        # Кэшируем только непустой успешный результат
+        if cache_key and items:
+            recognition_cache.set_cached_result(cache_key, asdict(recognized))
 
-        return RecognizeFoodResult(items=items, totals=totals, meta=meta)
+        return recognized
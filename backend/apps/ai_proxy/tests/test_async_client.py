@@ -0,0 +1,107 @@
+"""
+test_async_client.py — unit tests for AsyncAIProxyClient / EventLoopAIProxyClient.
+
+Проверяем:
+- тот же Error Contract, что и у sync клиента (ok / structured error / исключения)
+- один event loop процесса держит много запросов одновременно
+- AIProxyClient переиспользует один requests.Session на процесс
+"""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import httpx
+import pytest
+
+from apps.ai_proxy.async_client import (
+    AsyncAIProxyClient,
+    EventLoopAIProxyClient,
+    run_in_loop,
+)
+from apps.ai_proxy.client import AIProxyClient, AIProxyConfig
+from apps.ai_proxy.exceptions import AIProxyServerError, AIProxyTimeoutError
+
+CONFIG = AIProxyConfig(url="http://test-proxy", secret="test-secret")
+SUCCESS = {"items": [{"food_name_ru": "Гречка"}], "total": {"calories": 200}}
+
+
+def _client(handler) -> AsyncAIProxyClient:
+    return AsyncAIProxyClient(config=CONFIG, transport=httpx.MockTransport(handler))
+
+
+def _recognize(client: AsyncAIProxyClient, **kwargs):
+    return run_in_loop(
+        client.recognize_food(image_bytes=b"jpeg", content_type="image/jpeg", **kwargs)
+    )
+
+
+class TestAsyncAIProxyClient:
+    def test_success_payload(self):
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen["headers"] = request.headers
+            return httpx.Response(200, json=SUCCESS)
+
+        result = _recognize(_client(handler), request_id="rid-1")
+
+        assert result.ok is True
+        assert result.payload == SUCCESS
+        assert seen["headers"]["X-API-Key"] == "test-secret"
+        assert seen["headers"]["X-Request-ID"] == "rid-1"
+
+    def test_error_contract_returns_structured_error(self):
+        def handler(request):
+            return httpx.Response(400, json={"error_code": "UNSUPPORTED_CONTENT"})
+
+        result = _recognize(_client(handler))
+
+        assert result.ok is False
+        assert result.payload["error_code"] == "UNSUPPORTED_CONTENT"
+
+    def test_5xx_raises_server_error(self):
+        def handler(request):
+            return httpx.Response(502, json={"detail": "bad gateway"})
+
+        with pytest.raises(AIProxyServerError):
+            _recognize(_client(handler))
+
+    def test_timeout_raises_timeout_error(self):
+        def handler(request):
+            raise httpx.ReadTimeout("timeout", request=request)
+
+        with pytest.raises(AIProxyTimeoutError):
+            _recognize(_client(handler))
+
+
+class TestEventLoopAIProxyClient:
+    def test_many_requests_in_flight_on_one_loop(self):
+        async def handler(request):
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json=SUCCESS)
+
+        facade = EventLoopAIProxyClient(async_client=_client(handler))
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            results = list(
+                pool.map(
+                    lambda _: facade.recognize_food(
+                        image_bytes=b"jpeg", content_type="image/jpeg"
+                    ),
+                    range(20),
+                )
+            )
+        elapsed = time.monotonic() - start
+
+        assert all(r.ok for r in results)
+        # 20 × 0.2 с последовательно = 4 с; в одном loop — около 0.2 с
+        assert elapsed < 1.5
+
+
+class TestSharedSession:
+    def test_sync_clients_share_session(self):
+        assert AIProxyClient(config=CONFIG)._session is AIProxyClient(config=CONFIG)._session
@@ -184,3 +184,38 @@ class TestAIProxyClient:
             assert result.ok is False
             assert result.status_code == 200
             assert result.payload["error_code"] == "EMPTY_RESULT"
+
+
+class TestAIProxyClientBatch:
+    """Tests for AIProxyClient.recognize_food_batch()."""
+
+    def test_results_split_per_image_in_order(self, client, mock_response):
+        payload = {
+            "results": [
+                {"items": [{"food_name_ru": "Суп"}]},
+                {"error_code": "UNSUPPORTED_CONTENT"},
+            ]
+        }
+
+        with patch.object(client._session, "post") as mock_post:
+            mock_post.return_value = mock_response(200, payload)
+
+            results = client.recognize_food_batch(
+                images=[(b"img-1", "image/jpeg"), (b"img-2", "image/jpeg")]
+            )
+
+            files = mock_post.call_args.kwargs["files"]
+            assert [name for name, _ in files] == ["images", "images"]
+            assert mock_post.call_args.args[0].endswith("/recognize-food/batch")
+
+        assert [r.ok for r in results] == [True, False]
+        assert results[1].payload["error_code"] == "UNSUPPORTED_CONTENT"
+
+    def test_count_mismatch_raises_server_error(self, client, mock_response):
+        with patch.object(client._session, "post") as mock_post:
+            mock_post.return_value = mock_response(200, {"results": [{"items": []}]})
+
+            with pytest.raises(AIProxyServerError):
+                client.recognize_food_batch(
+                    images=[(b"img-1", "image/jpeg"), (b"img-2", "image/jpeg")]
+                )
@@ -0,0 +1,130 @@
+"""
+test_fake_proxy.py — локальный fake AI Proxy (нагрузочные прогоны).
+
+Проверяем:
+- ответ проходит через AsyncAIProxyClient + normalize_proxy_response как настоящий
+- Error Contract / 5xx / 401 дают те же результаты и исключения клиента
+- max_concurrency ограничивает одновременные запросы
+- конфиг из env, распределения латентности в пределах
+- встроенный HTTP сервер работает с sync AIProxyClient
+"""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+import threading
+
+import httpx
+import pytest
+
+from apps.ai_proxy.adapter import normalize_proxy_response
+from apps.ai_proxy.async_client import AsyncAIProxyClient, run_in_loop
+from apps.ai_proxy.client import AIProxyClient, AIProxyConfig
+from apps.ai_proxy.exceptions import AIProxyAuthenticationError, AIProxyServerError
+from apps.ai_proxy.fake_proxy import FakeAIProxy, FakeProxyConfig, serve
+
+CONFIG = AIProxyConfig(url="http://fake-proxy", secret="fake-secret")
+
+
+def _fake(**overrides) -> FakeAIProxy:
+    params = {"latency_dist": "fixed", "latency_ms": 1, "secret": "fake-secret", "seed": 1}
+    return FakeAIProxy(FakeProxyConfig(**{**params, **overrides}))
+
+
+def _client(app: FakeAIProxy) -> AsyncAIProxyClient:
+    return AsyncAIProxyClient(config=CONFIG, transport=httpx.ASGITransport(app=app))
+
+
+def _recognize(client: AsyncAIProxyClient):
+    return run_in_loop(
+        client.recognize_food(image_bytes=b"jpeg", content_type="image/jpeg", request_id="rid")
+    )
+
+
+def test_success_payload_normalizes():
+    result = _recognize(_client(_fake()))
+
+    assert result.ok is True
+    normalized = normalize_proxy_response(result.payload, request_id="rid")
+    assert normalized["items"]
+    assert all(item["grams"] >= 1 for item in normalized["items"])
+    assert normalized["totals"]["calories"] == sum(i["calories"] for i in normalized["items"])
+
+
+def test_error_contract_and_server_error():
+    contract = _recognize(_client(_fake(error_contract_rate=1.0)))
+    assert contract.ok is False
+    assert contract.payload["error_code"] in ("UNSUPPORTED_CONTENT", "EMPTY_RESULT")
+    assert contract.payload["trace_id"] == "rid"
+
+    with pytest.raises(AIProxyServerError):
+        _recognize(_client(_fake(server_error_rate=1.0)))
+
+
+def test_wrong_secret_is_401():
+    with pytest.raises(AIProxyAuthenticationError):
+        _recognize(_client(_fake(secret="other")))
+
+
+def test_max_concurrency_queues_requests():
+    app = _fake(latency_ms=50, max_concurrency=2)
+    client = _client(app)
+
+    async def burst():
+        return await asyncio.gather(
+            *(
+                client.recognize_food(image_bytes=b"jpeg", content_type="image/jpeg")
+                for _ in range(6)
+            )
+        )
+
+    results = run_in_loop(burst())
+
+    assert all(r.ok for r in results)
+    assert app.stats.max_in_flight == 2
+
+
+def test_config_from_env_and_latency_bounds():
+    config = FakeProxyConfig.from_env(
+        {
+            "FAKE_AI_PROXY_LATENCY_DIST": "lognormal",
+            "FAKE_AI_PROXY_LATENCY_MS": "3000",
+            "FAKE_AI_PROXY_LATENCY_MAX_MS": "5000",
+            "FAKE_AI_PROXY_SERVER_ERROR_RATE": "0.1",
+            "FAKE_AI_PROXY_SEED": "7",
+        }
+    )
+    app = FakeAIProxy(config)
+    samples = [app.sample_latency_s() for _ in range(500)]
+
+    assert config.server_error_rate == 0.1
+    assert max(samples) <= 5.0
+    assert 2.0 < sorted(samples)[250] < 4.5  # медиана около LATENCY_MS
+
+    with pytest.raises(ValueError):
+        FakeProxyConfig.from_env({"FAKE_AI_PROXY_LATENCY_DIST": "pareto"})
+
+
+def test_builtin_server_with_sync_client():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(serve(_fake(), "127.0.0.1", port), loop)
+
+    config = AIProxyConfig(url=f"http://127.0.0.1:{port}", secret="fake-secret")
+    client = AIProxyClient(config=config)
+    for _ in range(50):
+        try:
+            result = client.recognize_food(image_bytes=b"jpeg", content_type="image/jpeg")
+            break
+        except AIProxyServerError:  # сервер ещё не поднялся
+            threading.Event().wait(0.02)
+    server.cancel()
+
+    assert result.ok is True
+    assert result.payload["result"]["items"]
@@ -0,0 +1,213 @@
+"""
+test_hedging.py — hedged requests к AI Proxy.
+
+Проверяем:
+- задержка hedge = перцентиль латентности в пределах [min, max]
+- медленный первый запрос → второй такой же (тот же X-Request-ID), побеждает быстрый
+- без бюджета второй запрос не отправляется
+- hedge занимает слот лимитера AI Proxy; нет слота — не отправляется;
+  проигравший sync-запрос держит слот guard'а до своего завершения
+- async: проигравший запрос отменяется
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+import httpx
+import pytest
+
+from apps.ai_proxy import hedging, resilience
+from apps.ai_proxy.async_client import AsyncAIProxyClient, run_in_loop
+from apps.ai_proxy.client import AIProxyClient, AIProxyConfig
+from apps.ai_proxy.exceptions import AIProxyServerError
+
+CONFIG = AIProxyConfig(url="http://test-proxy", secret="test-secret")
+SUCCESS = {"items": [{"food_name_ru": "Гречка"}], "total": {"calories": 200}}
+
+
+@pytest.fixture
+def hedge_settings(settings):
+    settings.AI_HEDGE_ENABLED = True
+    settings.AI_HEDGE_MIN_DELAY_MS = 10
+    settings.AI_HEDGE_MAX_DELAY_MS = 50
+    settings.AI_HEDGE_MIN_SAMPLES = 10
+    settings.AI_HEDGE_PERCENTILE = 90
+    settings.AI_HEDGE_BUDGET_RATIO = 1.0
+    return settings
+
+
+@pytest.fixture
+def policy(hedge_settings):
+    policy = hedging.HedgePolicy()
+    with patch.object(hedging, "_policy", policy):
+        yield policy
+
+
+def _response(payload):
+    resp = Mock()
+    resp.status_code = 200
+    resp.text = json.dumps(payload)
+    return resp
+
+
+class TestHedgePolicy:
+    def test_delay_is_max_until_enough_samples(self, policy):
+        policy.record_latency(0.02)
+
+        assert policy.delay_s() == pytest.approx(0.05)
+
+    def test_delay_is_clamped_percentile(self, policy):
+        for i in range(10):
+            policy.record_latency(0.001 * (i + 1) * 3)  # 3..30 мс
+
+        # p90 → 30 мс (между min=10 и max=50)
+        assert policy.delay_s() == pytest.approx(0.03)
+
+    def test_budget_allows_fraction_of_requests(self, policy, hedge_settings):
+        hedge_settings.AI_HEDGE_BUDGET_RATIO = 0.05
+        allowed = 0
+        for _ in range(100):
+            policy.on_request()
+            allowed += policy.try_spend()
+
+        assert allowed == 5
+        assert policy.budget_skipped == 95
+
+
+class TestSyncHedging:
+    def test_slow_primary_is_hedged_with_same_request_id(self, policy):
+        calls = itertools.count()
+        release = threading.Event()
+
+        def post(url, headers, files, data, timeout):
+            if next(calls) == 0:
+                release.wait(2)  # "зависший" первый запрос
+                return _response({"items": [], "slow": True})
+            return _response(SUCCESS)
+
+        client = AIProxyClient(config=CONFIG)
+        with patch.object(client._session, "post", side_effect=post) as mock_post:
+            result = client.recognize_food(
+                image_bytes=b"jpeg", content_type="image/jpeg", request_id="rid-1"
+            )
+            release.set()
+
+        assert result.payload == SUCCESS
+        assert mock_post.call_count == 2
+        request_ids = {c.kwargs["headers"]["X-Request-ID"] for c in mock_post.call_args_list}
+        assert request_ids == {"rid-1"}
+        assert (policy.hedged, policy.hedge_wins) == (1, 1)
+
+    def test_fast_primary_is_not_hedged(self, policy):
+        client = AIProxyClient(config=CONFIG)
+        with patch.object(client._session, "post", return_value=_response(SUCCESS)) as mock_post:
+            client.recognize_food(image_bytes=b"jpeg", content_type="image/jpeg")
+
+        assert mock_post.call_count == 1
+        assert policy.hedged == 0
+
+    def test_no_budget_waits_for_primary(self, policy, hedge_settings):
+        hedge_settings.AI_HEDGE_BUDGET_RATIO = 0.0
+
+        def post(*args, **kwargs):
+            time.sleep(0.1)
+            return _response(SUCCESS)
+
+        client = AIProxyClient(config=CONFIG)
+        with patch.object(client._session, "post", side_effect=post) as mock_post:
+            result = client.recognize_food(image_bytes=b"jpeg", content_type="image/jpeg")
+
+        assert result.ok is True
+        assert mock_post.call_count == 1
+        assert policy.budget_skipped == 1
+
+    def test_both_fail_raises_primary_error(self, policy):
+        attempts = itertools.count()
+
+        def attempt():
+            n = next(attempts)
+            time.sleep(0.1 if n == 0 else 0)
+            raise AIProxyServerError(f"attempt-{n}")
+
+        with pytest.raises(AIProxyServerError, match="attempt-0"):
+            hedging.call_hedged(attempt)
+
+    def test_no_limiter_slot_skips_hedge(self, policy, settings):
+        settings.AI_PROXY_RESILIENCE_ENABLED = True
+        settings.AI_LIMITER_INITIAL = settings.AI_LIMITER_MIN = 2
+        cache.clear()
+        slots = [resilience.try_acquire_slot(), resilience.try_acquire_slot()]
+        attempts = itertools.count()
+
+        def attempt():
+            next(attempts)
+            time.sleep(0.1)
+            return "ok"
+
+        try:
+            assert hedging.call_hedged(attempt) == "ok"
+        finally:
+            for slot in slots:
+                resilience.release_slot(slot)
+
+        assert next(attempts) == 1  # только первый запрос
+        assert (policy.hedged, policy.limiter_skipped) == (0, 1)
+
+    def test_slow_primary_loser_holds_guard_slot(self, policy, settings):
+        settings.AI_PROXY_RESILIENCE_ENABLED = True
+        cache.clear()
+        calls = itertools.count()
+        release = threading.Event()
+
+        def attempt():
+            if next(calls) == 0:
+                release.wait(2)
+                return "slow"
+            return "fast"
+
+        guard = resilience.AIProxyGuard()
+        with guard.call():
+            assert hedging.call_hedged(attempt) == "fast"
+
+        # Слот hedge освобождён, слот guard'а держит доработывающий первый запрос
+        assert resilience.get_resilience_stats()["inflight"] == 1
+        release.set()
+        time.sleep(0.05)
+        assert resilience.get_resilience_stats()["inflight"] == 0
+
+
+class TestAsyncHedging:
+    def test_loser_is_cancelled(self, policy):
+        cancelled = []
+        calls = itertools.count()
+
+        async def handler(request):
+            assert request.headers["X-Request-ID"] == "rid-2"
+            if next(calls) == 0:
+                try:
+                    await asyncio.sleep(2)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+            return httpx.Response(200, json=SUCCESS)
+
+        client = AsyncAIProxyClient(config=CONFIG, transport=httpx.MockTransport(handler))
+        start = time.monotonic()
+        result = run_in_loop(
+            client.recognize_food(
+                image_bytes=b"jpeg", content_type="image/jpeg", request_id="rid-2"
+            )
+        )
+
+        assert result.ok is True
+        assert time.monotonic() - start < 1
+        run_in_loop(asyncio.sleep(0.05))  # отмена доходит до handler на следующем шаге loop
+        assert cancelled == [True]
+        assert policy.hedge_wins == 1
@@ -0,0 +1,195 @@
+"""
+test_resilience.py — circuit breaker + AIMD лимит вызовов AI Proxy.
+
+Проверяем:
+- breaker открывается при доле ошибок >= порога (и не раньше AI_CB_MIN_CALLS)
+- OPEN → вызов не идёт в AI Proxy, сразу AIProxyServerError
+- HALF_OPEN пропускает ограниченное число проб, успех закрывает breaker
+- limiter: ошибка → limit / 2 (один раз за cooldown), limit успехов → +1
+- нет свободного слота → fail fast
+- отмена/чужие исключения не считаются ни успехом, ни ошибкой
+- брошенный, но ещё идущий вызов держит слот до своего завершения
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Future
+import time
+from unittest.mock import Mock
+
+from django.core.cache import cache
+import pytest
+
+from apps.ai_proxy.exceptions import (
+    AIProxyServerError,
+    AIProxyTimeoutError,
+    AIProxyValidationError,
+)
+from apps.ai_proxy.resilience import (
+    OPEN_UNTIL_KEY,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    AIProxyGuard,
+    ConcurrencyLimiter,
+    get_resilience_stats,
+    hold_slot_until,
+)
+
+
+@pytest.fixture(autouse=True)
+def resilience_settings(settings):
+    cache.clear()
+    settings.AI_PROXY_RESILIENCE_ENABLED = True
+    settings.AI_CB_MIN_CALLS = 4
+    settings.AI_CB_FAILURE_RATE = 0.5
+    settings.AI_CB_HALF_OPEN_PROBES = 1
+    settings.AI_LIMITER_INITIAL = 8
+    settings.AI_LIMITER_MIN = 2
+    settings.AI_LIMITER_MAX = 16
+    settings.AI_LIMITER_WAIT_S = 0
+    yield settings
+    cache.clear()
+
+
+def _fail(guard):
+    with pytest.raises(AIProxyTimeoutError):
+        with guard.call():
+            raise AIProxyTimeoutError("timeout")
+
+
+class TestCircuitBreaker:
+    def test_opens_after_failure_rate_reached(self):
+        guard = AIProxyGuard()
+        with guard.call():
+            pass
+        _fail(guard)
+        _fail(guard)
+        assert guard.breaker.state() == STATE_CLOSED  # 3 вызова < AI_CB_MIN_CALLS
+
+        _fail(guard)
+
+        assert guard.breaker.state() == STATE_OPEN
+
+    def test_open_fails_fast_without_calling_proxy(self):
+        guard = AIProxyGuard()
+        cache.set(OPEN_UNTIL_KEY, time.time() + 30)
+        proxy_call = Mock()
+
+        with pytest.raises(AIProxyServerError):
+            with guard.call():
+                proxy_call()
+
+        proxy_call.assert_not_called()
+
+    def test_half_open_limits_probes_and_closes_on_success(self):
+        guard = AIProxyGuard()
+        cache.set(OPEN_UNTIL_KEY, time.time() - 1)
+        assert guard.breaker.state() == STATE_HALF_OPEN
+
+        with guard.call():
+            # Пока проба в работе — второй вызов не пропускается
+            with pytest.raises(AIProxyServerError):
+                with guard.call():
+                    pass
+
+        assert guard.breaker.state() == STATE_CLOSED
+
+    def test_half_open_probe_failure_reopens(self):
+        guard = AIProxyGuard()
+        cache.set(OPEN_UNTIL_KEY, time.time() - 1)
+
+        _fail(guard)
+
+        assert guard.breaker.state() == STATE_OPEN
+
+    def test_validation_errors_do_not_count(self):
+        guard = AIProxyGuard()
+        for _ in range(5):
+            with pytest.raises(AIProxyValidationError):
+                with guard.call():
+                    raise AIProxyValidationError("bad image")
+
+        assert guard.breaker.state() == STATE_CLOSED
+        assert guard.breaker.window_counts()["failures"] == 0
+
+    def test_non_proxy_errors_are_neutral(self):
+        guard = AIProxyGuard()
+        cache.set(OPEN_UNTIL_KEY, time.time() - 1)
+
+        # Отмена задачи во время пробы — breaker не закрывается
+        with pytest.raises(RuntimeError):
+            with guard.call():
+                raise RuntimeError("task cancelled")
+
+        assert guard.breaker.state() == STATE_HALF_OPEN
+        assert guard.limiter.limit() == 8
+
+
+class TestConcurrencyLimiter:
+    def test_failure_halves_limit_once_per_cooldown(self):
+        limiter = ConcurrencyLimiter()
+
+        limiter.on_failure()
+        limiter.on_failure()
+
+        assert limiter.limit() == 4
+
+    def test_additive_increase_after_limit_successes(self):
+        limiter = ConcurrencyLimiter()
+        for _ in range(8):
+            limiter.on_success(latency_ms=100)
+
+        assert limiter.limit() == 9
+
+    def test_slow_success_decreases_limit(self, resilience_settings):
+        resilience_settings.AI_LIMITER_LATENCY_TARGET_MS = 1000
+        limiter = ConcurrencyLimiter()
+
+        limiter.on_success(latency_ms=5000)
+
+        assert limiter.limit() == 4
+
+    def test_no_free_slot_fails_fast(self, resilience_settings):
+        resilience_settings.AI_LIMITER_INITIAL = 2
+        guard = AIProxyGuard()
+        slots = [guard.limiter.acquire(), guard.limiter.acquire()]
+        assert all(slots)
+
+        with pytest.raises(AIProxyServerError):
+            with guard.call():
+                pass
+
+        assert get_resilience_stats()["inflight"] == 2
+        guard.limiter.release(slots[0])
+        with guard.call():
+            pass
+
+    def test_background_call_holds_slot_until_done(self):
+        guard = AIProxyGuard()
+        call = Future()
+
+        with pytest.raises(RuntimeError):
+            with guard.call():
+                hold_slot_until(call)
+                raise RuntimeError("task cancelled")
+
+        assert get_resilience_stats()["inflight"] == 1
+        call.set_result(None)
+        assert get_resilience_stats()["inflight"] == 0
+
+
+def test_service_uses_guard(monkeypatch):
+    from apps.ai_proxy import service as service_module
+
+    monkeypatch.setattr(service_module.recognition_cache, "is_enabled", lambda: False)
+    monkeypatch.setattr(service_module, "compute_dhash", lambda data: None)
+    client = Mock()
+    cache.set(OPEN_UNTIL_KEY, time.time() + 30)
+
+    svc = service_module.AIProxyService(client=client)
+    monkeypatch.setattr(svc, "_prepare_image", lambda *args: b"jpeg")
+    with pytest.raises(AIProxyServerError):
+        svc.recognize_food(image_bytes=b"x", content_type="image/jpeg", request_id="rid")
+
+    client.recognize_food.assert_not_called()
@@ -0,0 +1,185 @@
+"""
+test_service.py — unit tests for AIProxyService.
+
+Проверяем:
+- повторное фото отдаётся из recognition cache без вызова AI Proxy
+- structured error не кэшируется
+- другой user_comment → другой ключ кэша
+- batch: один вызов AI Proxy на несколько фото, reject не отправляется
+"""
+
+from __future__ import annotations
+
+from io import BytesIO
+from unittest.mock import Mock
+
+from django.core.cache import cache
+from PIL import Image
+import pytest
+
+from apps.ai_proxy.client import AIProxyResult
+from apps.ai_proxy.recognition_cache import get_recognition_cache_stats
+from apps.ai_proxy.service import AIProxyService, BatchImage
+
+
+def _jpeg_bytes(size=(64, 64), color=(200, 100, 50)) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", size, color=color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _success_payload() -> dict:
+    return {
+        "items": [
+            {
+                "food_name_ru": "Гречка",
+                "portion_weight_g": 150,
+                "calories": 200,
+                "protein_g": 7,
+                "fat_g": 2,
+                "carbs_g": 40,
+            }
+        ],
+        "total": {"calories": 200, "protein_g": 7, "fat_g": 2, "carbs_g": 40},
+    }
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def proxy_client():
+    client = Mock()
+    client.recognize_food.return_value = AIProxyResult(
+        ok=True, payload=_success_payload(), status_code=200
+    )
+    return client
+
+
+class TestRecognitionCache:
+    def test_duplicate_photo_served_from_cache(self, proxy_client):
+        service = AIProxyService(client=proxy_client)
+        image = _jpeg_bytes()
+
+        first = service.recognize_food(
+            image_bytes=image, content_type="image/jpeg", request_id="r1"
+        )
+        second = service.recognize_food(
+            image_bytes=image, content_type="image/jpeg", request_id="r2"
+        )
+
+        assert proxy_client.recognize_food.call_count == 1
+        assert second.items == first.items
+        assert second.meta["cache_hit"] is True
+        assert second.meta["request_id"] == "r2"
+
+        stats = get_recognition_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_structured_error_not_cached(self, proxy_client):
+        proxy_client.recognize_food.return_value = AIProxyResult(
+            ok=False, payload={"error_code": "UNSUPPORTED_CONTENT"}, status_code=400
+        )
+        service = AIProxyService(client=proxy_client)
+        image = _jpeg_bytes()
+
+        service.recognize_food(image_bytes=image, content_type="image/jpeg")
+        service.recognize_food(image_bytes=image, content_type="image/jpeg")
+
+        assert proxy_client.recognize_food.call_count == 2
+
+    def test_user_comment_is_part_of_key(self, proxy_client):
+        service = AIProxyService(client=proxy_client)
+        image = _jpeg_bytes()
+
+        service.recognize_food(image_bytes=image, content_type="image/jpeg", user_comment="суп")
+        service.recognize_food(image_bytes=image, content_type="image/jpeg", user_comment="каша")
+
+        assert proxy_client.recognize_food.call_count == 2
+
+    def test_cache_disabled(self, proxy_client, settings):
+        settings.AI_RECOGNITION_CACHE_ENABLED = False
+        service = AIProxyService(client=proxy_client)
+        image = _jpeg_bytes()
+
+        service.recognize_food(image_bytes=image, content_type="image/jpeg")
+        service.recognize_food(image_bytes=image, content_type="image/jpeg")
+
+        assert proxy_client.recognize_food.call_count == 2
+
+
+class TestNearDuplicateLookup:
+    def test_lookup_result_reused_without_proxy_call(self, proxy_client, settings):
+        settings.AI_RECOGNITION_CACHE_ENABLED = False
+        reused = {
+            "items": [{"name": "Гречка", "grams": 150, "calories": 200.0}],
+            "totals": {"calories": 200.0},
+            "meta": {"near_duplicate_of": 7},
+        }
+        lookup = Mock(return_value=reused)
+        service = AIProxyService(client=proxy_client)
+
+        result = service.recognize_food(
+            image_bytes=_jpeg_bytes(), content_type="image/jpeg", near_duplicate_lookup=lookup
+        )
+
+        proxy_client.recognize_food.assert_not_called()
+        lookup.assert_called_once_with(result.meta["perceptual_hash"])
+        assert result.meta["near_duplicate_of"] == 7
+
+    def test_no_match_calls_proxy_and_reports_hash(self, proxy_client, settings):
+        settings.AI_RECOGNITION_CACHE_ENABLED = False
+        service = AIProxyService(client=proxy_client)
+
+        result = service.recognize_food(
+            image_bytes=_jpeg_bytes(),
+            content_type="image/jpeg",
+            near_duplicate_lookup=Mock(return_value=None),
+        )
+
+        proxy_client.recognize_food.assert_called_once()
+        assert len(result.meta["perceptual_hash"]) == 16
+
+
+class TestRecognizeFoodBatch:
+    def test_one_proxy_call_for_all_photos(self, settings):
+        settings.AI_RECOGNITION_CACHE_ENABLED = False
+        client = Mock()
+        client.recognize_food_batch.return_value = [
+            AIProxyResult(ok=True, payload=_success_payload(), status_code=200),
+            AIProxyResult(ok=False, payload={"error_code": "UNSUPPORTED_CONTENT"}, status_code=200),
+        ]
+        service = AIProxyService(client=client)
+
+        results = service.recognize_food_batch(
+            images=[
+                BatchImage(_jpeg_bytes(), "image/jpeg"),
+                BatchImage(_jpeg_bytes(color=(1, 2, 3)), "image/jpeg"),
+            ]
+        )
+
+        client.recognize_food_batch.assert_called_once()
+        client.recognize_food.assert_not_called()
+        assert results[0].items and not results[0].meta.get("is_error")
+        assert results[1].meta["error_code"] == "UNSUPPORTED_CONTENT"
+
+    def test_rejected_image_not_sent(self, settings):
+        settings.AI_RECOGNITION_CACHE_ENABLED = False
+        client = Mock()
+        client.recognize_food_batch.return_value = [
+            AIProxyResult(ok=True, payload=_success_payload(), status_code=200),
+        ]
+        service = AIProxyService(client=client)
+
+        results = service.recognize_food_batch(
+            images=[BatchImage(b"broken", "image/jpeg"), BatchImage(_jpeg_bytes(), "image/jpeg")]
+        )
+
+        assert len(client.recognize_food_batch.call_args.kwargs["images"]) == 1
+        assert results[0].meta["error_code"] == "IMAGE_DECODE_FAILED"
+        assert results[1].items
@@ -0,0 +1,71 @@
+"""
+test_utils.py — unit tests for normalize_image() fast decode path.
+
+Проверяем:
+- большой JPEG декодируется через draft() (DCT scaling), но не меньше целевого размера
+- результат совпадает по размеру с полным decode
+- fast_decode=False — старый путь (полный decode)
+- EXIF-ориентация учитывается и в быстром пути
+"""
+
+from __future__ import annotations
+
+from io import BytesIO
+
+from PIL import Image
+
+from apps.ai_proxy.utils import normalize_image
+
+
+def _jpeg_bytes(size, exif_orientation=None) -> bytes:
+    buf = BytesIO()
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    kwargs = {}
+    if exif_orientation:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        kwargs["exif"] = exif
+    img.save(buf, format="JPEG", quality=90, **kwargs)
+    return buf.getvalue()
+
+
+def _size(image_bytes: bytes) -> tuple:
+    with Image.open(BytesIO(image_bytes)) as img:
+        return img.size
+
+
+class TestNormalizeImageFastDecode:
+    def test_large_jpeg_uses_draft_decode(self):
+        out, content_type, metrics = normalize_image(_jpeg_bytes((4000, 3000)), "image/jpeg")
+
+        assert metrics["action"] == "ok"
+        assert metrics["decode_mode"] == "draft"
+        # 4000x3000 → 1/2 (1/4 дал бы 1000px < 1024)
+        assert metrics["decode_px"] == "2000x1500"
+        assert content_type == "image/jpeg"
+        assert _size(out) == (1024, 768)
+
+    def test_full_decode_same_output_size(self):
+        src = _jpeg_bytes((4000, 3000))
+
+        fast, _, fast_metrics = normalize_image(src, "image/jpeg", fast_decode=True)
+        full, _, full_metrics = normalize_image(src, "image/jpeg", fast_decode=False)
+
+        assert full_metrics["decode_mode"] == "full"
+        assert full_metrics["decode_px"] == "4000x3000"
+        assert _size(fast) == _size(full)
+
+    def test_exif_rotation_applied_after_draft(self):
+        # orientation=6: повернуть на 90° → портрет
+        out, _, metrics = normalize_image(
+            _jpeg_bytes((4000, 3000), exif_orientation=6), "image/jpeg"
+        )
+
+        assert metrics["decode_mode"] == "draft"
+        assert _size(out) == (768, 1024)
+
+    def test_small_jpeg_not_drafted(self):
+        _, _, metrics = normalize_image(_jpeg_bytes((1200, 900)), "image/jpeg")
+
+        assert metrics["action"] == "ok"
+        assert metrics["decode_mode"] == "full"
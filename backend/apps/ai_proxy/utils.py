@@ -112,6 +112,8 @@ def normalize_image(
     max_side: int = 1024,
     quality: int = 85,
     max_fallback_size: int = 512 * 1024,
+    fast_decode: bool = True,
+    known_size: Optional[Tuple[int, int]] = None,
 ) -> Tuple[bytes, str, Dict[str, Any]]:
     """
     Нормализует изображение перед отправкой в Vision API.
@@ -127,6 +129,15 @@ def normalize_image(
     - size <= 512KB
 
     Во всех остальных случаях при ошибке → action="reject".
+
+    fast_decode=True (быстрый путь для больших фото):
+    - JPEG декодируется сразу в масштабе 1/2, 1/4 или 1/8 (DCT scaling, draft()),
+      но не меньше целевого размера — финальный LANCZOS делает качество
+    - для остальных форматов resize с reducing_gap (reduce() + LANCZOS)
+    - fast_decode=False — старый путь: полный decode + LANCZOS (для сравнения)
+
+    known_size=(w, h) — размеры из ImageMeta (посчитаны при загрузке):
+    для already_ok JPEG файл не открывается Pillow повторно.
     """
     start_time = time.perf_counter()
 
@@ -146,6 +157,8 @@ def normalize_image(
         "normalized_px": "0x0",
         "original_longest_side": 0,
         "normalized_longest_side": 0,  # 0 при reject
+        "decode_mode": "full",
+        "decode_px": "0x0",
         "processing_ms": 0,
     }
 
@@ -168,6 +181,20 @@ def normalize_image(
     if is_heic and not HEIF_SUPPORTED:
         return _finish_reject("unsupported_format")
 
+    # Размеры уже известны (ImageMeta) и оригинал в SLA → без Pillow
+    if known_size is not None and is_jpeg:
+        w, h = known_size
+        longest = max(w, h)
+        if longest <= max_side and metrics["original_size_bytes"] <= max_fallback_size:
+            metrics["original_px"] = metrics["normalized_px"] = f"{w}x{h}"
+            metrics["original_longest_side"] = metrics["normalized_longest_side"] = longest
+            metrics["action"] = "ok"
+            metrics["reason"] = "already_ok"
+            metrics["decode_mode"] = "meta"
+            metrics["normalized_size_bytes"] = metrics["original_size_bytes"]
+            metrics["processing_ms"] = int((time.perf_counter() - start_time) * 1000)
+            return image_bytes, "image/jpeg", metrics
+
     # Попытка открыть изображение для проверки/нормализации
     try:
         with Image.open(BytesIO(image_bytes)) as img:
@@ -192,6 +219,15 @@ def normalize_image(
                 return image_bytes, "image/jpeg", metrics
 
             # Нормализация требуется
+            # 0. Fast path: JPEG DCT scaling до ближайшего масштаба >= целевого размера
+            # (draft() работает только до load(), поэтому — до exif_transpose)
+            if fast_decode and img.format == "JPEG" and longest > max_side:
+                ratio = max_side / longest
+                img.draft("RGB", (max(1, int(w * ratio)), max(1, int(h * ratio))))
+                if img.size != (w, h):
+                    metrics["decode_mode"] = "draft"
+            metrics["decode_px"] = f"{img.size[0]}x{img.size[1]}"
+
             # 1. EXIF Rotate
             img = ImageOps.exif_transpose(img)
 
@@ -210,7 +246,12 @@ def normalize_image(
                 else:
                     new_h = max_side
                     new_w = int(curr_w * (max_side / curr_h))
-                img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+                # reducing_gap: сначала быстрый reduce() в целое число раз, затем LANCZOS
+                img = img.resize(
+                    (new_w, new_h),
+                    Image.Resampling.LANCZOS,
+                    reducing_gap=3.0 if fast_decode else None,
+                )
 
             # 4. Save as JPEG
             out_buf = BytesIO()
@@ -242,3 +283,50 @@ def normalize_image(
         logger.warning("Image normalization failed: %s", type(e).__name__)
         # Ошибка декодирования → reject (fallback запрещён при неизвестных размерах)
         return _finish_reject("decode_failed")
+
+
+# ---------------------------------------------------------------------------
+# Перцептивный хеш (поиск почти-дубликатов фото)
+# ---------------------------------------------------------------------------
+# dHash: 64 бита, сравниваются соседние пиксели 9x8 grayscale-миниатюры.
+# Устойчив к пережатию (Telegram), масштабу и лёгкой обрезке.
+# Сравнение — расстояние Хэмминга (0 = идентичные, 64 = противоположные).
+# ---------------------------------------------------------------------------
+
+DHASH_SIZE = 8
+
+
+def compute_dhash(image_bytes: bytes) -> Optional[str]:
+    """
+    Считает dHash изображения (64 бита, 16 hex-символов).
+
+    Рассчитан на нормализованный JPEG (<=1024px), поэтому дёшев:
+    draft() декодирует JPEG сразу в уменьшенном масштабе.
+
+    Returns:
+        hex-строка или None, если изображение не удалось декодировать
+    """
+    if not image_bytes:
+        return None
+    try:
+        with Image.open(BytesIO(image_bytes)) as img:
+            img.draft("L", (DHASH_SIZE * 4, DHASH_SIZE * 4))
+            small = img.convert("L").resize(
+                (DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BILINEAR
+            )
+            pixels = list(small.getdata())
+    except Exception as e:
+        logger.warning("dHash failed: %s", type(e).__name__)
+        return None
+
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:016x}"
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """Расстояние Хэмминга между двумя hex-хешами одинаковой длины."""
+    return (int(hash_a, 16) ^ int(hash_b, 16)).bit_count()
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("billing", "0017_add_old_price_to_subscription_plan"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(fields=["user", "-created_at"], name="payments_user_id_2c5fd7_idx"),
+        ),
+    ]
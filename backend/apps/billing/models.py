@@ -380,6 +380,8 @@ class Payment(models.Model):
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["-created_at"]),
+            # История платежей пользователя (keyset-пагинация по created_at)
+            models.Index(fields=["user", "-created_at"]),
             models.Index(fields=["status"]),
             models.Index(fields=["yookassa_payment_id"]),
             # DB guard для recurring: предотвращает двойное списание за один период
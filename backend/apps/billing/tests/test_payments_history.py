@@ -0,0 +1,74 @@
+"""
+billing/test_payments_history.py
+
+GET /api/v1/billing/payments/ — keyset-пагинация истории платежей:
+- ?limit= — размер страницы (как раньше), next — ссылка на следующую
+- платежи с одинаковым created_at не теряются и не дублируются на границе страниц
+- битый cursor → 404
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status as http_status
+from rest_framework.test import APIClient
+
+from apps.billing.models import Payment
+
+
+class PaymentsHistoryTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="payer", password="testpass123")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("billing:payments-history")
+
+        now = timezone.now()
+        self.payments = []
+        for i in range(5):
+            payment = Payment.objects.create(
+                user=self.user,
+                amount=Decimal("299"),
+                yookassa_payment_id=f"history-{i}",
+                description=f"Payment {i}",
+            )
+            self.payments.append(payment)
+        # Два платежа в одну и ту же секунду — граница страницы по id
+        Payment.objects.filter(pk=self.payments[0].pk).update(created_at=now)
+        Payment.objects.filter(pk=self.payments[1].pk).update(created_at=now)
+        for i, payment in enumerate(self.payments[2:], start=1):
+            Payment.objects.filter(pk=payment.pk).update(created_at=now - timedelta(days=i))
+
+    def test_pages_cover_history_once(self):
+        seen = []
+        url = f"{self.url}?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, http_status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        expected = [
+            str(p.pk) for p in Payment.objects.filter(user=self.user).order_by("-created_at", "id")
+        ]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_default_limit_has_no_next(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNone(response.data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, http_status.HTTP_404_NOT_FOUND)
@@ -16,12 +16,13 @@ billing/usage.py
 - запись на день уникальна: (user, date)
 - get_today использует get_or_create
 - increment делаем через select_for_update внутри транзакции, чтобы не было race condition
+- горячий путь AI задачи — add_photo_ai_requests(): один upsert без чтения строки
 """
 
 from __future__ import annotations
 
 from django.conf import settings
-from django.db import models, transaction
+from django.db import connections, models, transaction
 from django.db.models import F
 from django.utils import timezone
 
@@ -77,6 +78,33 @@ class DailyUsageManager(models.Manager):
             usage.refresh_from_db(fields=["photo_ai_requests"])
             return usage
 
+    def add_photo_ai_requests(self, user_id: int, amount: int = 1) -> None:
+        """
+        Увеличивает счётчик photo_ai_requests на today ОДНИМ запросом.
+
+        INSERT ... ON CONFLICT (user_id, date) DO UPDATE — без get_or_create,
+        блокировки и перечитывания (их делает increment_photo_ai_requests).
+        Синтаксис общий для PostgreSQL и SQLite 3.24+.
+        """
+        if amount <= 0:
+            return
+
+        connection = connections[self.db]
+        ops = connection.ops
+        table = ops.quote_name(self.model._meta.db_table)
+        now = ops.adapt_datetimefield_value(timezone.now())
+        sql = (
+            f"INSERT INTO {table} (user_id, date, photo_ai_requests, created_at, updated_at) "
+            "VALUES (%s, %s, %s, %s, %s) "
+            "ON CONFLICT (user_id, date) DO UPDATE SET "
+            f"photo_ai_requests = {table}.photo_ai_requests + EXCLUDED.photo_ai_requests, "
+            "updated_at = EXCLUDED.updated_at"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql, [user_id, ops.adapt_datefield_value(_get_today()), amount, now, now]
+            )
+
     def reset_today(self, user):
         """
         Обнуляет счётчик на сегодня (полезно для админских операций / тестов).
@@ -35,6 +35,7 @@ from yookassa.domain.exceptions import (
 )
 
 from apps.common.audit import SecurityAuditLogger
+from apps.common.pagination import KeysetPagination
 
 from .models import Payment, Subscription, SubscriptionPlan
 from .serializers import (
@@ -475,23 +476,26 @@ def get_payment_method_details(request):
     )
 
 
+class PaymentHistoryPagination(KeysetPagination):
+    """Новые платежи первыми; ?limit= — размер страницы (как раньше), ?cursor= — следующая."""
+
+    ordering = ("-created_at", "id")
+    page_size = 10
+    page_size_query_param = "limit"
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_payments_history(request):
     """
     GET /api/v1/billing/payments/
-    Query: ?limit=10
+    Query: ?limit=10&cursor=<next>
 
-    История платежей (простая, без пагинации страницами).
+    История платежей: keyset-пагинация (без COUNT и OFFSET).
+    Первая страница — как раньше; next — ссылка на следующую или null.
     """
-    limit_raw = request.query_params.get("limit", 10)
-    try:
-        limit = int(limit_raw)
-        limit = max(1, min(limit, 100))
-    except (TypeError, ValueError):
-        limit = 10
-
-    payments = Payment.objects.filter(user=request.user).order_by("-created_at")[:limit]
+    paginator = PaymentHistoryPagination()
+    payments = paginator.paginate_queryset(Payment.objects.filter(user=request.user), request)
 
     status_map = {
         "PENDING": "pending",
@@ -515,7 +519,7 @@ def get_payments_history(request):
             }
         )
 
-    return Response({"results": results}, status=status.HTTP_200_OK)
+    return paginator.get_paginated_response(results)
 
 
 # =====================================================================
@@ -0,0 +1,234 @@
+"""
+metrics.py — Prometheus-гистограммы без prometheus_client.
+
+Простыми словами:
+- gunicorn и Celery — это много процессов; счётчики в памяти процесса
+  на один /metrics не сложить
+- поэтому наблюдения пишутся в Redis (hash на серию: бакеты + sum + count),
+  одной pipeline на пачку наблюдений — все процессы одного сервиса
+  складываются в одну серию
+- /metrics отдаёт текстовый формат Prometheus:
+    gunicorn — Django view (service="web", см. config/urls.py)
+    Celery   — маленький HTTP-сервер в главном процессе воркера
+               (service="celery", METRICS_CELERY_PORT, см. config/celery.py)
+- без Redis (LocMemCache в тестах) — хранилище в памяти процесса
+
+Правила:
+- запись метрик best-effort: ошибка Redis не ломает запрос/задачу
+- серии не истекают (счётчики монотонны; сброс Redis = reset counter для Prometheus)
+- метки с малой кардинальностью: stage/outcome/error_code, НЕ user_id/task_id
+"""
+
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import math
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Секунды: от миллисекунд (parse/enqueue) до таймаута AI Proxy
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+SERIES_KEY = "metrics:series:{service}"
+HIST_KEY = "metrics:h:{service}:{name}:{labels}"
+
+_service = "web"
+_registry: Dict[str, "Histogram"] = {}
+_local: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+_local_lock = threading.Lock()
+
+
+def set_service(service: str) -> None:
+    """Роль процесса (метка service): web — gunicorn, celery — воркер."""
+    global _service
+    _service = service
+
+
+def current_service() -> str:
+    return _service
+
+
+class Histogram:
+    """Гистограмма Prometheus с фиксированными метками (значения — в секундах)."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        _registry[name] = self
+
+    def bucket_index(self, value: float) -> int:
+        """Индекс первого бакета le >= value (len(buckets) — только +Inf)."""
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                return i
+        return len(self.buckets)
+
+    def labels_key(self, labels: Mapping[str, str]) -> str:
+        return json.dumps([str(labels.get(n, "")) for n in self.labelnames], ensure_ascii=False)
+
+    def observe(self, value: float, **labels: str) -> None:
+        observe_many([(self, labels, value)])
+
+
+def observe_many(observations: Iterable[Tuple[Histogram, Mapping[str, str], float]]) -> None:
+    """Записывает пачку наблюдений одной Redis pipeline (best-effort)."""
+    observations = [(h, labels, max(0.0, float(v))) for h, labels, v in observations]
+    if not observations:
+        return
+
+    client = _redis_client()
+    if client is None:
+        _observe_local(observations)
+        return
+    try:
+        series_key = SERIES_KEY.format(service=_service)
+        pipe = client.pipeline(transaction=False)
+        for histogram, labels, value in observations:
+            key = HIST_KEY.format(
+                service=_service, name=histogram.name, labels=histogram.labels_key(labels)
+            )
+            pipe.sadd(series_key, key)
+            pipe.hincrby(key, f"b{histogram.bucket_index(value)}", 1)
+            pipe.hincrby(key, "count", 1)
+            pipe.hincrbyfloat(key, "sum", value)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("[Metrics] observe failed: error=%s", type(e).__name__)
+
+
+def _observe_local(observations) -> None:
+    with _local_lock:
+        for histogram, labels, value in observations:
+            data = _local.setdefault((_service, histogram.name, histogram.labels_key(labels)), {})
+            bucket = f"b{histogram.bucket_index(value)}"
+            data[bucket] = data.get(bucket, 0) + 1
+            data["count"] = data.get("count", 0) + 1
+            data["sum"] = data.get("sum", 0.0) + value
+
+
+def _read_series(service: str) -> List[Tuple[str, str, Dict[str, float]]]:
+    """[(name, labels_key, {поле: значение})] для сервиса."""
+    client = _redis_client()
+    if client is None:
+        with _local_lock:
+            return [
+                (name, labels, dict(data))
+                for (svc, name, labels), data in _local.items()
+                if svc == service
+            ]
+
+    keys = sorted(_str(k) for k in client.smembers(SERIES_KEY.format(service=service)))
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+    prefix = HIST_KEY.format(service=service, name="", labels="")[:-1]
+    series = []
+    for key, raw in zip(keys, pipe.execute()):
+        # metrics:h:<service>:<name>:<labels json> — в имени метрики ":" нет
+        name, _, labels = key[len(prefix) :].partition(":")
+        series.append((name, labels, {_str(f): float(v) for f, v in (raw or {}).items()}))
+    return series
+
+
+def _str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _redis_client():
+    """redis.Redis из Django RedisCache или None (LocMemCache и т.п.)."""
+    from django.core.cache import cache
+
+    get_client = getattr(getattr(cache, "_cache", None), "get_client", None)
+    if get_client is None:
+        return None
+    try:
+        return get_client(write=True)
+    except Exception:
+        return None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_le(le: float) -> str:
+    return "+Inf" if math.isinf(le) else repr(float(le))
+
+
+def render(service: Optional[str] = None) -> str:
+    """Текстовый формат Prometheus для всех гистограмм сервиса."""
+    service = service or _service
+    try:
+        series = _read_series(service)
+    except Exception as e:
+        logger.warning("[Metrics] read failed: error=%s", type(e).__name__)
+        series = []
+
+    by_name: Dict[str, List[Tuple[str, Dict[str, float]]]] = {}
+    for name, labels, data in series:
+        by_name.setdefault(name, []).append((labels, data))
+
+    lines = []
+    for name in sorted(by_name):
+        histogram = _registry.get(name)
+        if histogram is None:
+            continue
+        lines.append(f"# HELP {name} {histogram.documentation}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels_key, data in by_name[name]:
+            values = json.loads(labels_key)
+            pairs = [("service", service)] + list(zip(histogram.labelnames, values))
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+            cumulative = 0
+            for i, le in enumerate(histogram.buckets + (math.inf,)):
+                cumulative += int(data.get(f"b{i}", 0))
+                lines.append(f'{name}_bucket{{{label_str},le="{_format_le(le)}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_str}}} {data.get('sum', 0.0)}")
+            lines.append(f"{name}_count{{{label_str}}} {int(data.get('count', 0))}")
+    return "\n".join(lines) + "\n"
+
+
+def reset_local() -> None:
+    """Очищает хранилище в памяти процесса (тесты)."""
+    with _local_lock:
+        _local.clear()
+
+
+def start_http_server(port: int, service: Optional[str] = None) -> ThreadingHTTPServer:
+    """GET /metrics в фоновом потоке (процессы без Django HTTP, т.е. Celery)."""
+    service = service or _service
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0].rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = render(service).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # noqa: A002 — сигнатура BaseHTTPRequestHandler
+            return
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("[Metrics] /metrics on port %s service=%s", port, service)
+    return server
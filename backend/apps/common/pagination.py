@@ -0,0 +1,144 @@
+"""
+Keyset (cursor) pagination for long, append-mostly histories.
+
+PageNumberPagination runs COUNT(*) and skips rows with a growing OFFSET, so
+the cost of a page grows with the user's history. KeysetPagination instead
+remembers the ordering values of the last row on the page and asks for rows
+strictly "after" it:
+
+    WHERE date <= d AND (date < d OR (date = d AND created_at < c) OR (... AND id > i))
+    ORDER BY date DESC, created_at DESC, id
+    LIMIT page_size + 1
+
+Every page is one indexed range scan, no matter how deep the client scrolls.
+The cursor is opaque to clients (base64 of the last row's values). There is no
+total count and no "previous" link: the API serves forward infinite scroll.
+
+The last ordering field must be unique (primary key), otherwise rows with equal
+values on a page boundary could be skipped.
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _json_default(value):
+    # DjangoJSONEncoder обрезает микросекунды datetime — курсору нужна точная граница
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a multi-column ordering, e.g. ("-date", "-created_at", "id").
+
+    Subclasses set ordering (model field names, "-" for descending) and page sizes.
+    """
+
+    ordering = ("-created_at", "id")
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [queryset.model._meta.get_field(name.lstrip("-")) for name in self.ordering]
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+
+        rows = list(queryset[: self.page_size + 1])
+        page = rows[: self.page_size]
+        self.next_position = None
+        if len(rows) > self.page_size:
+            self.next_position = [getattr(page[-1], field.attname) for field in self.fields]
+        return page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _after(self, position):
+        """Rows strictly after position in self.ordering (lexicographic, mixed directions)."""
+        condition = Q()
+        equal = {}
+        for name, field, value in zip(self.ordering, self.fields, position):
+            lookup = "lt" if name.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{field.attname}__{lookup}": value})
+            equal[field.attname] = value
+        # Граница по первому полю отдельным условием — индекс используется как range scan
+        first = self.ordering[0]
+        bound = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{self.fields[0].attname}__{bound}": position[0]}) & condition
+
+    def encode_cursor(self, position) -> str:
+        raw = json.dumps(position, default=_json_default, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError(values)
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except Exception:
+            # binascii.Error, ValueError, django ValidationError из to_python
+            raise NotFound(self.invalid_cursor_message) from None
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Курсор следующей страницы (из поля next)",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Размер страницы (1..{self.max_page_size})",
+                "schema": {"type": "integer"},
+            },
+        ]
@@ -6,6 +6,20 @@ from django.core.exceptions import ValidationError
 from django.utils.deconstruct import deconstructible
 
 
+def _stored_image_meta(value):
+    """
+    Return instance.image_meta for an already stored file, else None.
+
+    image_meta (see apps/ai/image_meta.py) is computed once at upload, so
+    validators trust it instead of re-opening a committed file. A freshly
+    assigned file (not committed yet) is always checked directly.
+    """
+    if not getattr(value, "_committed", False):
+        return None
+    meta = getattr(getattr(value, "instance", None), "image_meta", None)
+    return meta if isinstance(meta, dict) else None
+
+
 @deconstructible
 class FileSizeValidator:
     """
@@ -38,10 +52,12 @@ class FileSizeValidator:
         Raises:
             ValidationError: If file size exceeds maximum
         """
-        if value.size > self.max_bytes:
+        meta = _stored_image_meta(value)
+        size = meta["size_bytes"] if meta and "size_bytes" in meta else value.size
+        if size > self.max_bytes:
             raise ValidationError(
                 f'Размер файла не должен превышать {self.max_mb} MB. '
-                f'Текущий размер: {value.size / (1024 * 1024):.2f} MB'
+                f'Текущий размер: {size / (1024 * 1024):.2f} MB'
             )
 
     def __eq__(self, other):
@@ -85,10 +101,14 @@ class ImageDimensionValidator:
         Raises:
             ValidationError: If dimensions exceed maximum
         """
+        meta = _stored_image_meta(value)
         try:
-            from PIL import Image
-            image = Image.open(value)
-            width, height = image.size
+            if meta and "width" in meta and "height" in meta:
+                width, height = meta["width"], meta["height"]
+            else:
+                from PIL import Image
+                image = Image.open(value)
+                width, height = image.size
 
             if width > self.max_width or height > self.max_height:
                 raise ValidationError(
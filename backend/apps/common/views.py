@@ -2,12 +2,14 @@
 Common views for FoodMind AI.
 """
 
+import hmac
 import sys
 import time
 
 from django.conf import settings
 from django.core.cache import cache
 from django.db import connection
+from django.http import Http404, HttpResponse
 from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -30,6 +32,7 @@ def health_check(request):
         - Database connectivity (SELECT 1)
         - Redis connectivity (cache ping)
         - Celery workers status (optional)
+        - AI recognition cache hit/miss counters (optional)
         - Environment info (APP_ENV, timestamp)
     """
     health_status = {
@@ -82,6 +85,30 @@ def health_check(request):
         health_status["checks"]["celery"] = f"warning: {str(e)}"
         health_status["celery_workers"] = 0
 
+    # AI recognition cache counters (capacity planning, non-critical)
+    try:
+        from apps.ai_proxy.recognition_cache import get_recognition_cache_stats
+
+        health_status["ai_recognition_cache"] = get_recognition_cache_stats()
+    except Exception as e:
+        health_status["ai_recognition_cache"] = f"warning: {str(e)}"
+
+    # AI Proxy circuit breaker / concurrency limiter (non-critical)
+    try:
+        from apps.ai_proxy.resilience import get_resilience_stats
+
+        health_status["ai_proxy_resilience"] = get_resilience_stats()
+    except Exception as e:
+        health_status["ai_proxy_resilience"] = f"warning: {str(e)}"
+
+    # AI Proxy hedged requests (счётчики процесса, non-critical)
+    try:
+        from apps.ai_proxy.hedging import get_hedge_stats
+
+        health_status["ai_proxy_hedging"] = get_hedge_stats()
+    except Exception as e:
+        health_status["ai_proxy_hedging"] = f"warning: {str(e)}"
+
     return Response(health_status, status=200)
 
 
@@ -137,3 +164,29 @@ def liveness_check(request):
     Simple check that the service is running.
     """
     return Response({"status": "alive"}, status=200)
+
+
+def metrics(request):
+    """
+    Prometheus metrics endpoint (text exposition format).
+
+    GET /metrics/
+
+    Histograms of this service (service="web"), aggregated over all gunicorn
+    workers via Redis (see apps.common.metrics).
+
+    Auth:
+        - METRICS_TOKEN set → "Authorization: Bearer <token>" required
+        - METRICS_TOKEN empty → available only with DEBUG (404 in production)
+    """
+    from apps.common.metrics import CONTENT_TYPE, render
+
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        provided = request.META.get("HTTP_AUTHORIZATION", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(provided.encode(), token.encode()):
+            return HttpResponse("Unauthorized", status=401)
+    elif not settings.DEBUG:
+        raise Http404
+
+    return HttpResponse(render("web"), content_type=CONTENT_TYPE)
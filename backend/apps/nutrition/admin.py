@@ -4,6 +4,7 @@ Admin configuration for nutrition app.
 
 from django.contrib import admin
 
+from .diary_cache import bump_goal_version
 from .models import DailyGoal, FoodItem, Meal, MealPhoto
 
 
@@ -175,7 +176,10 @@ class DailyGoalAdmin(admin.ModelAdmin):
 
     def deactivate_goals(self, request, queryset):
         """Deactivate selected goals."""
+        user_ids = set(queryset.values_list("user_id", flat=True))
         updated = queryset.update(is_active=False)
+        for user_id in user_ids:
+            bump_goal_version(user_id)
         self.message_user(request, f"Деактивировано целей: {updated}")
 
     deactivate_goals.short_description = "Деактивировать выбранные цели"
@@ -0,0 +1,170 @@
+"""
+Conditional GET support for the daily diary (GET /api/v1/meals/?date=).
+
+Every (user, date) has a version token in the cache, replaced after each
+committed write that can change that day's diary: meal, food item or photo
+saves/deletes and the queryset .update() paths that bypass signals. Goals are
+shown on every day, so they have one per-user token instead.
+
+The ETag is built from both tokens: If-None-Match is answered with 304 after a
+single cache round trip (get_many), without touching the database.
+
+Tokens are "<unix ms>.<random>": the timestamp gives Last-Modified, the random
+part keeps two bumps in the same millisecond distinct. A missing token (evicted
+or never written) is simply created again — clients get a new ETag and one
+full response.
+
+Bumps are coalesced per transaction (defer_for_days): a request that saves ten
+food items of one meal registers one on_commit callback and writes each touched
+day's token once.
+"""
+
+import logging
+import secrets
+import time
+from typing import Any, Callable, Dict, Iterable, Set, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+DAY_VERSION_KEY = "diary_version:{user_id}:{day}"
+GOAL_VERSION_KEY = "diary_goal_version:{user_id}"
+
+VERSION_TTL_S = 7 * 86400
+
+
+def _new_token() -> str:
+    return f"{int(time.time() * 1000)}.{secrets.token_hex(3)}"
+
+
+def _token_seconds(token: str) -> int:
+    try:
+        return int(token.split(".", 1)[0]) // 1000
+    except ValueError:
+        return 0
+
+
+def _set_safely(mapping: Dict[str, str]) -> None:
+    # Кэш недоступен — ETag просто не совпадёт после восстановления; запись не падает
+    try:
+        cache.set_many(mapping, timeout=VERSION_TTL_S)
+    except Exception as e:
+        logger.warning("[DiaryCache] version bump failed keys=%s error=%s", list(mapping), e)
+
+
+class PendingDays:
+    """
+    (user, day) pairs touched by one transaction — given directly or as meal ids
+    (resolved to days on commit). Flushed once, as an on_commit callback.
+    """
+
+    def __init__(self, flush: Callable[[Set[Tuple[int, Any]]], None]) -> None:
+        self.days: Set[Tuple[int, Any]] = set()
+        self.meal_ids: Set[int] = set()
+        self.flushed = False
+        self._flush = flush
+
+    def __call__(self) -> None:
+        self.flushed = True
+        days = set(self.days)
+        if self.meal_ids:
+            from .models import Meal
+
+            # Удалённый приём пищи сюда не попадёт — его день добавил post_delete
+            meals = Meal.objects.filter(pk__in=self.meal_ids)
+            days.update(meals.values_list("user_id", "date").distinct())
+        if days:
+            self._flush(days)
+
+
+def defer_for_days(
+    name: str,
+    flush: Callable[[Set[Tuple[int, Any]]], None],
+    *,
+    days: Iterable[Tuple[int, Any]] = (),
+    meal_ids: Iterable[int] = (),
+) -> None:
+    """
+    Run flush(days) after the current transaction commits — once per transaction
+    for each name, however many writes add days to it. Outside a transaction
+    flush runs right away.
+    """
+    connection = transaction.get_connection()
+    pending = PendingDays(flush)
+    if connection.in_atomic_block:
+        attr = f"_pending_days_{name}"
+        current = getattr(connection, attr, None)
+        # Колбэк прошлой транзакции уже выполнен или отброшен откатом — нужен новый
+        if (
+            current is not None
+            and not current.flushed
+            and any(entry[1] is current for entry in connection.run_on_commit)
+        ):
+            pending = current
+        else:
+            setattr(connection, attr, pending)
+            transaction.on_commit(pending)
+    pending.days.update(days)
+    pending.meal_ids.update(meal_ids)
+    if not connection.in_atomic_block:
+        pending()
+
+
+def bump_days_now(days: Iterable[Tuple[int, Any]]) -> None:
+    """Replace the tokens of (user, day) pairs immediately (caller is already past commit)."""
+    _set_safely(
+        {DAY_VERSION_KEY.format(user_id=user_id, day=day): _new_token() for user_id, day in days}
+    )
+
+
+def bump_diary_version(user_id: int, day) -> None:
+    """Replace the (user, day) token after the current transaction commits."""
+    defer_for_days("diary", bump_days_now, days=[(user_id, day)])
+
+
+def bump_diary_version_for_meals(meal_ids: Iterable[int]) -> None:
+    """Same as bump_diary_version() for the days of meals (resolved on commit)."""
+    meal_ids = set(meal_ids)
+    if meal_ids:
+        defer_for_days("diary", bump_days_now, meal_ids=meal_ids)
+
+
+def bump_goal_version(user_id: int) -> None:
+    """Replace the per-user goal token after the current transaction commits."""
+    transaction.on_commit(
+        lambda: _set_safely({GOAL_VERSION_KEY.format(user_id=user_id): _new_token()})
+    )
+
+
+def current_versions(user_id: int, day) -> Tuple[str, str]:
+    """(day token, goal token) — one get_many; missing tokens are created."""
+    keys = [
+        DAY_VERSION_KEY.format(user_id=user_id, day=day),
+        GOAL_VERSION_KEY.format(user_id=user_id),
+    ]
+    found = cache.get_many(keys)
+    tokens = []
+    for key in keys:
+        if key not in found:
+            # add(): параллельный запрос мог уже создать токен — берём его
+            cache.add(key, _new_token(), timeout=VERSION_TTL_S)
+            found[key] = cache.get(key) or _new_token()
+        tokens.append(found[key])
+    return tokens[0], tokens[1]
+
+
+def make_version(day_token: str, goal_token: str, variant: str = "") -> str:
+    """Version of one diary response; variant separates response shapes (summary_only)."""
+    return f"{day_token}-{goal_token}{variant}"
+
+
+def make_etag(version: str) -> str:
+    """Weak ETag (payload is re-serialized JSON, not byte-stable across encodings)."""
+    return f'W/"{version}"'
+
+
+def last_modified(day_token: str, goal_token: str) -> int:
+    """Unix seconds of the latest change (for Last-Modified / If-Modified-Since)."""
+    return max(_token_seconds(day_token), _token_seconds(goal_token))
@@ -0,0 +1,118 @@
+"""
+Django management command for reconciling DailyNutritionSummary with meals.
+
+Summaries are rebuilt on commit by every write path (see nutrition/services.py).
+A rebuild that failed (DB error after commit, worker killed) leaves a stale row;
+this command recomputes expected rollups in SQL and fixes differing days.
+
+Usage:
+    python manage.py rebuild_daily_summaries [--verify] [--user-id ID] [--from DATE] [--to DATE]
+
+Options:
+    --verify: Only report mismatches; exit with an error if any are found
+    --user-id: Check only this user
+    --from / --to: Date range (YYYY-MM-DD, inclusive)
+"""
+
+from datetime import date
+from decimal import Decimal
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+
+from apps.nutrition.models import MEAL_TOTAL_FIELDS, DailyNutritionSummary, Meal, MealPhoto
+from apps.nutrition.services import refresh_daily_summary
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ("meals_count", "photos_count", *MEAL_TOTAL_FIELDS)
+
+
+class Command(BaseCommand):
+    help = "Reconcile DailyNutritionSummary rows with meals, items and photos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report mismatches (non-zero exit code if any)",
+        )
+        parser.add_argument("--user-id", type=int, help="Check only this user")
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+
+    def _scope(self, queryset, prefix, options):
+        filters = {}
+        if options["user_id"]:
+            filters[f"{prefix}user_id"] = options["user_id"]
+        if options["date_from"]:
+            filters[f"{prefix}date__gte"] = options["date_from"]
+        if options["date_to"]:
+            filters[f"{prefix}date__lte"] = options["date_to"]
+        return queryset.filter(**filters)
+
+    def _expected(self, options):
+        """{(user_id, date): {field: value}} computed from meals in SQL."""
+        visible = self._scope(Meal.objects.exclude(status="FAILED"), "", options)
+        expected = {
+            (row.pop("user_id"), row.pop("date")): dict(row, photos_count=0)
+            for row in visible.order_by()
+            .values("user_id", "date")
+            .annotate(
+                meals_count=Count("id"),
+                **{
+                    name: Sum(field, default=Decimal("0"))
+                    for name, field in MEAL_TOTAL_FIELDS.items()
+                },
+            )
+        }
+        photos = (
+            MealPhoto.objects.filter(status="SUCCESS", meal__in=visible)
+            .order_by()
+            .values("meal__user_id", "meal__date")
+            .annotate(n=Count("id"))
+        )
+        for row in photos:
+            expected[(row["meal__user_id"], row["meal__date"])]["photos_count"] = row["n"]
+        return expected
+
+    def handle(self, *args, **options):
+        verify = options["verify"]
+
+        expected = self._expected(options)
+        stored = {
+            (row.pop("user_id"), row.pop("date")): row
+            for row in self._scope(DailyNutritionSummary.objects, "", options).values(
+                "user_id", "date", *SUMMARY_FIELDS
+            )
+        }
+
+        mismatched = sorted(
+            key
+            for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        )
+
+        fixed = 0
+        if not verify:
+            for user_id, day in mismatched:
+                refresh_daily_summary(user_id, day)
+                fixed += 1
+
+        self.stdout.write(f"Days checked: {len(expected.keys() | stored.keys())}")
+        self.stdout.write(f"Days with stale summaries: {len(mismatched)}")
+        if mismatched:
+            logger.warning(
+                "[DailySummary] drift found: count=%s sample=%s", len(mismatched), mismatched[:20]
+            )
+
+        if verify:
+            if mismatched:
+                raise CommandError(
+                    f"{len(mismatched)} daily summaries differ from meals "
+                    f"(e.g. {mismatched[:10]}). Run without --verify to fix."
+                )
+            self.stdout.write(self.style.SUCCESS("All daily summaries match meals"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt days: {fixed}"))
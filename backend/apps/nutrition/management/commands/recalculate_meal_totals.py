@@ -0,0 +1,105 @@
+"""
+Django management command for backfilling / verifying denormalized Meal totals.
+
+Meal.total_calories / total_protein / total_fat / total_carbohydrates are kept
+in sync by FoodItem.save()/delete() and Meal.add_to_totals(). This command
+compares them with the sums of FoodItem rows (computed in SQL) and fixes drift.
+
+Usage:
+    python manage.py recalculate_meal_totals [--verify] [--user-id ID] [--batch-size N]
+
+Options:
+    --verify: Only report mismatches; exit with an error if any are found
+    --user-id: Check only meals of this user
+    --batch-size: Meals per query (default 1000)
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.nutrition.models import MEAL_TOTAL_FIELDS, FoodItem, Meal
+
+logger = logging.getLogger(__name__)
+
+
+def _item_sum(field):
+    """Coalesce(SUM(items.<field>), 0) as a correlated subquery."""
+    sums = (
+        FoodItem.objects.filter(meal_id=OuterRef("pk"))
+        .order_by()
+        .values("meal_id")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    output = DecimalField(max_digits=9, decimal_places=2)
+    return Coalesce(Subquery(sums, output_field=output), Value(0, output_field=output))
+
+
+class Command(BaseCommand):
+    help = "Backfill or verify denormalized Meal nutrition totals against FoodItem rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report mismatches (non-zero exit code if any)",
+        )
+        parser.add_argument("--user-id", type=int, help="Check only meals of this user")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Meals per query")
+
+    def handle(self, *args, **options):
+        verify = options["verify"]
+        batch_size = options["batch_size"]
+
+        meals = Meal.objects.all()
+        if options["user_id"]:
+            meals = meals.filter(user_id=options["user_id"])
+        meals = meals.annotate(
+            **{f"expected_{name}": _item_sum(name) for name in MEAL_TOTAL_FIELDS}
+        ).order_by("pk")
+
+        checked = 0
+        mismatched = []
+        last_pk = 0
+        while True:
+            batch = list(meals.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+            for meal in batch:
+                if any(
+                    getattr(meal, field) != getattr(meal, f"expected_{name}")
+                    for name, field in MEAL_TOTAL_FIELDS.items()
+                ):
+                    mismatched.append(meal.pk)
+
+        fixed = 0
+        if not verify:
+            for meal_id in mismatched:
+                # Lock the meal: concurrent FoodItem writes wait until totals are rebuilt
+                with transaction.atomic():
+                    meal = Meal.objects.select_for_update().filter(pk=meal_id).first()
+                    if meal is not None and meal.recalculate_totals():
+                        fixed += 1
+
+        self.stdout.write(f"Meals checked: {checked}")
+        self.stdout.write(f"Meals with drifted totals: {len(mismatched)}")
+        if mismatched:
+            logger.warning(
+                "[MealTotals] drift found: count=%s sample=%s", len(mismatched), mismatched[:20]
+            )
+
+        if verify:
+            if mismatched:
+                raise CommandError(
+                    f"{len(mismatched)} meals have totals that differ from their items "
+                    f"(e.g. {mismatched[:10]}). Run without --verify to fix."
+                )
+            self.stdout.write(self.style.SUCCESS("All meal totals match their items"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed meals: {fixed}"))
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0008_add_cancel_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealphoto',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, help_text='dHash нормализованного фото (64 бита, hex) для поиска почти-дубликатов', max_length=16, null=True, verbose_name='Перцептивный хеш'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+import apps.common.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0009_mealphoto_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealphoto',
+            name='normalized_image',
+            field=models.ImageField(blank=True, help_text='JPEG <=1024px, подготовленный upload-time стадией (очередь media)', upload_to=apps.common.storage.upload_to_meal_photos, verbose_name='Нормализованное фото'),
+        ),
+        migrations.AddField(
+            model_name='mealphoto',
+            name='normalization_metrics',
+            field=models.JSONField(blank=True, help_text='action/reason, размеры до/после, decode_mode, processing_ms', null=True, verbose_name='Метрики нормализации'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0010_mealphoto_normalized_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealphoto',
+            name='image_meta',
+            field=models.JSONField(blank=True, help_text='mime, размеры, EXIF orientation, sha256, размер — считаются один раз при загрузке', null=True, verbose_name='Метаданные фото'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Denormalized per-meal nutrition totals + backfill from existing FoodItem rows
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_meal_totals(apps, schema_editor):
+    """Set Meal.total_* to the sums of its items (one UPDATE for all meals)."""
+    Meal = apps.get_model("nutrition", "Meal")
+    FoodItem = apps.get_model("nutrition", "FoodItem")
+
+    def item_sum(field):
+        sums = (
+            FoodItem.objects.filter(meal_id=OuterRef("pk"))
+            .order_by()
+            .values("meal_id")
+            .annotate(total=Sum(field))
+            .values("total")
+        )
+        return Coalesce(
+            Subquery(sums, output_field=DecimalField(max_digits=9, decimal_places=2)),
+            Value(0, output_field=DecimalField(max_digits=9, decimal_places=2)),
+        )
+
+    Meal.objects.filter(pk__in=FoodItem.objects.values("meal_id")).update(
+        total_calories=item_sum("calories"),
+        total_protein=item_sum("protein"),
+        total_fat=item_sum("fat"),
+        total_carbohydrates=item_sum("carbohydrates"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0011_mealphoto_image_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='total_calories',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=9, verbose_name='Калории (всего)'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_protein',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8, verbose_name='Белки (всего)'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_fat',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8, verbose_name='Жиры (всего)'),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_carbohydrates',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8, verbose_name='Углеводы (всего)'),
+        ),
+        migrations.RunPython(backfill_meal_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# DailyNutritionSummary rollup + backfill from existing meals
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_daily_summaries(apps, schema_editor):
+    """One row per (user, date) with visible (non-FAILED) meals."""
+    Meal = apps.get_model("nutrition", "Meal")
+    MealPhoto = apps.get_model("nutrition", "MealPhoto")
+    DailyNutritionSummary = apps.get_model("nutrition", "DailyNutritionSummary")
+
+    visible = Meal.objects.exclude(status="FAILED")
+    photos = {
+        (row["meal__user_id"], row["meal__date"]): row["n"]
+        for row in MealPhoto.objects.filter(status="SUCCESS", meal__in=visible)
+        .values("meal__user_id", "meal__date")
+        .annotate(n=models.Count("id"))
+    }
+    rows = (
+        visible.order_by()
+        .values("user_id", "date")
+        .annotate(
+            meals_count=models.Count("id"),
+            calories=models.Sum("total_calories", default=Decimal("0")),
+            protein=models.Sum("total_protein", default=Decimal("0")),
+            fat=models.Sum("total_fat", default=Decimal("0")),
+            carbohydrates=models.Sum("total_carbohydrates", default=Decimal("0")),
+        )
+    )
+    DailyNutritionSummary.objects.bulk_create(
+        (
+            DailyNutritionSummary(
+                photos_count=photos.get((row["user_id"], row["date"]), 0), **row
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0012_meal_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNutritionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('calories', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Калории')),
+                ('protein', models.DecimalField(decimal_places=2, default=0, max_digits=9, verbose_name='Белки (г)')),
+                ('fat', models.DecimalField(decimal_places=2, default=0, max_digits=9, verbose_name='Жиры (г)')),
+                ('carbohydrates', models.DecimalField(decimal_places=2, default=0, max_digits=9, verbose_name='Углеводы (г)')),
+                ('meals_count', models.PositiveIntegerField(default=0, verbose_name='Приёмов пищи')),
+                ('photos_count', models.PositiveIntegerField(default=0, help_text='Успешно распознанные фото (SUCCESS)', verbose_name='Фото')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итоги дня',
+                'verbose_name_plural': 'Итоги дней',
+                'db_table': 'nutrition_daily_summaries',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='uniq_daily_summary_user_date')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_summaries, migrations.RunPython.noop),
+    ]
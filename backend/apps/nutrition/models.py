@@ -2,13 +2,32 @@
 Models for nutrition tracking - meals, food items, and daily goals.
 """
 
+from decimal import Decimal
+
 from django.conf import settings
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from apps.common.storage import upload_to_food_photos, upload_to_meal_photos
 from apps.common.validators import FileSizeValidator, ImageDimensionValidator
 
+# FoodItem nutrient field → denormalized Meal total column
+MEAL_TOTAL_FIELDS = {
+    "calories": "total_calories",
+    "protein": "total_protein",
+    "fat": "total_fat",
+    "carbohydrates": "total_carbohydrates",
+}
+
+_CENT = Decimal("0.01")
+
+
+def _to_cents(value) -> Decimal:
+    """Quantize like the DecimalField(decimal_places=2) column stores it."""
+    return Decimal(str(value or 0)).quantize(_CENT)
+
 
 class Meal(models.Model):
     """
@@ -58,6 +77,21 @@ class Meal(models.Model):
         ],
     )
 
+    # Denormalized sums over items: maintained by FoodItem.save()/delete() and
+    # Meal.totals_expressions() (bulk inserts), verified by recalculate_meal_totals
+    total_calories = models.DecimalField(
+        max_digits=9, decimal_places=2, default=0, editable=False, verbose_name="Калории (всего)"
+    )
+    total_protein = models.DecimalField(
+        max_digits=8, decimal_places=2, default=0, editable=False, verbose_name="Белки (всего)"
+    )
+    total_fat = models.DecimalField(
+        max_digits=8, decimal_places=2, default=0, editable=False, verbose_name="Жиры (всего)"
+    )
+    total_carbohydrates = models.DecimalField(
+        max_digits=8, decimal_places=2, default=0, editable=False, verbose_name="Углеводы (всего)"
+    )
+
     class Meta:
         db_table = "nutrition_meals"
         verbose_name = "Приём пищи"
@@ -73,25 +107,78 @@ class Meal(models.Model):
     def __str__(self):
         return f"{self.get_meal_type_display()} - {self.date} ({self.user.username})"
 
-    @property
-    def total_calories(self):
-        """Calculate total calories for this meal."""
-        return sum(item.calories for item in self.items.all())
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Diary day and visibility as loaded: a change refreshes both summaries
+        if {"user_id", "date", "status"} <= set(field_names):
+            instance._loaded_day = instance._summary_key()
+        return instance
 
-    @property
-    def total_protein(self):
-        """Calculate total protein for this meal."""
-        return sum(item.protein for item in self.items.all())
+    def _summary_key(self):
+        """(user_id, date, counted in diary) for DailyNutritionSummary."""
+        return self.user_id, self.date, self.status != "FAILED"
 
-    @property
-    def total_fat(self):
-        """Calculate total fat for this meal."""
-        return sum(item.fat for item in self.items.all())
+    def save(self, *args, **kwargs):
+        """
+        Plain save() of an existing meal never writes the total columns.
 
-    @property
-    def total_carbohydrates(self):
-        """Calculate total carbohydrates for this meal."""
-        return sum(item.carbohydrates for item in self.items.all())
+        Totals are changed only by atomic UPDATEs (add_to_totals /
+        recalculate_totals), so a stale instance cannot overwrite them.
+        """
+        if not args and not self._state.adding and kwargs.get("update_fields") is None:
+            skip = set(MEAL_TOTAL_FIELDS.values()) | self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                f.name
+                for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in skip
+            ]
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def totals_expressions(deltas):
+        """
+        {total column: F(column) + delta} for non-zero nutrient deltas.
+
+        Args:
+            deltas: calories/protein/fat/carbohydrates amounts (may be negative)
+        """
+        updates = {}
+        for name, value in deltas.items():
+            value = _to_cents(value)
+            if value:
+                field = MEAL_TOTAL_FIELDS[name]
+                updates[field] = models.F(field) + value
+        return updates
+
+    @classmethod
+    def add_to_totals(cls, meal_id, **deltas):
+        """Atomically add nutrient deltas to a meal's totals (one UPDATE)."""
+        updates = cls.totals_expressions(deltas)
+        if updates:
+            cls.objects.filter(pk=meal_id).update(**updates)
+
+    def recalculate_totals(self) -> bool:
+        """
+        Recompute totals from items and store them if they drifted.
+
+        Returns:
+            True if stored totals were wrong and have been fixed
+        """
+        sums = self.items.aggregate(
+            **{name: models.Sum(name, default=Decimal("0")) for name in MEAL_TOTAL_FIELDS}
+        )
+        expected = {MEAL_TOTAL_FIELDS[name]: _to_cents(value) for name, value in sums.items()}
+        if all(getattr(self, field) == value for field, value in expected.items()):
+            return False
+        Meal.objects.filter(pk=self.pk).update(**expected)
+        for field, value in expected.items():
+            setattr(self, field, value)
+
+        from .services import schedule_summary_refresh
+
+        schedule_summary_refresh(self.user_id, self.date)
+        return True
 
 
 class FoodItem(models.Model):
@@ -150,6 +237,73 @@ class FoodItem(models.Model):
         """Get user from parent meal."""
         return self.meal.user
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Values currently counted in Meal totals (None if some were deferred)
+        loaded = {"meal_id", *MEAL_TOTAL_FIELDS} <= set(field_names)
+        instance._counted = instance._nutrition() if loaded else None
+        return instance
+
+    def _nutrition(self):
+        """(meal_id, {nutrient: Decimal}) as stored in the database."""
+        return self.meal_id, {name: _to_cents(getattr(self, name)) for name in MEAL_TOTAL_FIELDS}
+
+    def _apply_to_meal(self, meal_id, deltas, sign):
+        """Add/subtract nutrient values to Meal totals (DB row + cached instance)."""
+        deltas = {name: sign * value for name, value in deltas.items()}
+        Meal.add_to_totals(meal_id, **deltas)
+        if any(deltas.values()):
+            from .services import schedule_summary_refresh_for_meal
+
+            schedule_summary_refresh_for_meal(meal_id)
+        else:
+            # КБЖУ не изменились (название, граммы) — сводка та же, ответ дневника нет
+            from .diary_cache import bump_diary_version_for_meals
+
+            bump_diary_version_for_meals([meal_id])
+        if FoodItem.meal.is_cached(self) and self.meal.pk == meal_id:
+            for name, value in deltas.items():
+                field = MEAL_TOTAL_FIELDS[name]
+                setattr(self.meal, field, _to_cents(getattr(self.meal, field)) + value)
+
+    def save(self, *args, **kwargs):
+        """Save the item and move its contribution in Meal totals in one transaction."""
+        with transaction.atomic():
+            counted = None
+            if not self._state.adding:
+                counted = getattr(self, "_counted", None)
+                if counted is None:
+                    row = (
+                        FoodItem.objects.filter(pk=self.pk)
+                        .values("meal_id", *MEAL_TOTAL_FIELDS)
+                        .first()
+                    )
+                    if row is not None:
+                        meal_id = row.pop("meal_id")
+                        counted = meal_id, {name: _to_cents(v) for name, v in row.items()}
+
+            super().save(*args, **kwargs)
+
+            new_meal_id, new_values = self._nutrition()
+            if counted is not None:
+                old_meal_id, old_values = counted
+                if old_meal_id == new_meal_id:
+                    new_values = {name: new_values[name] - old_values[name] for name in new_values}
+                else:
+                    self._apply_to_meal(old_meal_id, old_values, -1)
+            self._apply_to_meal(new_meal_id, new_values, 1)
+            self._counted = self._nutrition()
+
+    def delete(self, *args, **kwargs):
+        """Delete the item and subtract its contribution from Meal totals."""
+        with transaction.atomic():
+            meal_id, values = getattr(self, "_counted", None) or self._nutrition()
+            result = super().delete(*args, **kwargs)
+            self._apply_to_meal(meal_id, values, -1)
+        self._counted = None
+        return result
+
 
 class MealPhoto(models.Model):
     """
@@ -178,6 +332,24 @@ class MealPhoto(models.Model):
             ImageDimensionValidator(max_width=4096, max_height=4096),
         ],
     )
+    normalized_image = models.ImageField(
+        upload_to=upload_to_meal_photos,
+        blank=True,
+        verbose_name="Нормализованное фото",
+        help_text="JPEG <=1024px, подготовленный upload-time стадией (очередь media)",
+    )
+    normalization_metrics = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name="Метрики нормализации",
+        help_text="action/reason, размеры до/после, decode_mode, processing_ms",
+    )
+    image_meta = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name="Метаданные фото",
+        help_text="mime, размеры, EXIF orientation, sha256, размер — считаются один раз при загрузке",
+    )
     recognized_data = models.JSONField(
         default=dict,
         blank=True,
@@ -195,6 +367,13 @@ class MealPhoto(models.Model):
         verbose_name="Код ошибки",
         help_text="Структурированный код ошибки: UPSTREAM_TIMEOUT, INVALID_IMAGE, RATE_LIMIT, etc.",
     )
+    perceptual_hash = models.CharField(
+        max_length=16,
+        blank=True,
+        null=True,
+        verbose_name="Перцептивный хеш",
+        help_text="dHash нормализованного фото (64 бита, hex) для поиска почти-дубликатов",
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
 
     class Meta:
@@ -209,6 +388,12 @@ class MealPhoto(models.Model):
     def __str__(self):
         return f"Photo for {self.meal} ({self.get_status_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.status if "status" in field_names else None
+        return instance
+
     @property
     def user(self):
         """Get user from parent meal."""
@@ -378,6 +563,51 @@ class DailyGoal(models.Model):
         }
 
 
+class DailyNutritionSummary(models.Model):
+    """
+    Per-user per-day rollup of the diary (meals that are not FAILED).
+
+    Rebuilt for one (user, date) after each committed write that can change it
+    (see services.schedule_summary_refresh); stats over any range read at most
+    one small row per day. Reconciled by the rebuild_daily_summaries command.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="daily_summaries",
+        verbose_name="Пользователь",
+    )
+    date = models.DateField(verbose_name="Дата")
+    calories = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, verbose_name="Калории"
+    )
+    protein = models.DecimalField(
+        max_digits=9, decimal_places=2, default=0, verbose_name="Белки (г)"
+    )
+    fat = models.DecimalField(max_digits=9, decimal_places=2, default=0, verbose_name="Жиры (г)")
+    carbohydrates = models.DecimalField(
+        max_digits=9, decimal_places=2, default=0, verbose_name="Углеводы (г)"
+    )
+    meals_count = models.PositiveIntegerField(default=0, verbose_name="Приёмов пищи")
+    photos_count = models.PositiveIntegerField(
+        default=0, verbose_name="Фото", help_text="Успешно распознанные фото (SUCCESS)"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        db_table = "nutrition_daily_summaries"
+        verbose_name = "Итоги дня"
+        verbose_name_plural = "Итоги дней"
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "date"], name="uniq_daily_summary_user_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}: {self.calories} ккал ({self.meals_count} приёмов)"
+
+
 class CancelEvent(models.Model):
     """
     Audit log for cancel requests from frontend.
@@ -443,3 +673,58 @@ class CancelEvent(models.Model):
     def __str__(self):
         noop_str = " (noop)" if self.noop else ""
         return f"Cancel by {self.user.username} - run_id={self.run_id}{noop_str} ({self.created_at})"
+
+
+# =============================================================================
+# DailyNutritionSummary refresh and diary version triggers (instance saves/deletes).
+# Queryset .update() paths call services.schedule_summary_refresh* and
+# diary_cache.bump_* explicitly.
+# =============================================================================
+
+
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Meal)
+def meal_changed_refresh_summary(sender, instance, **kwargs):
+    """Refresh summaries when a meal appears, disappears, moves or changes visibility."""
+    from .diary_cache import bump_diary_version
+    from .services import schedule_summary_refresh
+
+    current = instance._summary_key()
+    loaded = getattr(instance, "_loaded_day", None)
+    deleted = "created" not in kwargs
+    if deleted or kwargs["created"] or loaded != current:
+        schedule_summary_refresh(instance.user_id, instance.date)
+        if loaded is not None and loaded[:2] != current[:2]:
+            schedule_summary_refresh(loaded[0], loaded[1])
+    else:
+        # Любое другое изменение (тип приёма, статус) тоже меняет ответ дневника
+        bump_diary_version(instance.user_id, instance.date)
+    instance._loaded_day = current
+
+
+@receiver(post_save, sender=MealPhoto)
+@receiver(post_delete, sender=MealPhoto)
+def meal_photo_changed_refresh_summary(sender, instance, **kwargs):
+    """photos_count counts SUCCESS photos: refresh when a photo enters or leaves SUCCESS."""
+    from .diary_cache import bump_diary_version_for_meals
+    from .services import schedule_summary_refresh_for_meal
+
+    loaded = getattr(instance, "_loaded_status", None)
+    if "created" not in kwargs:  # post_delete
+        changed = "SUCCESS" in (loaded, instance.status)
+    else:
+        changed = loaded != instance.status and "SUCCESS" in (loaded, instance.status)
+    if changed:
+        schedule_summary_refresh_for_meal(instance.meal_id)
+    else:
+        bump_diary_version_for_meals([instance.meal_id])
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=DailyGoal)
+@receiver(post_delete, sender=DailyGoal)
+def daily_goal_changed_bump_diary(sender, instance, **kwargs):
+    """The active goal is part of every diary day: invalidate all of the user's ETags."""
+    from .diary_cache import bump_goal_version
+
+    bump_goal_version(instance.user_id)
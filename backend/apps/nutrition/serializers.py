@@ -150,7 +150,7 @@ class MealSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "status", "status_display"]
 
     def get_total(self, obj):
-        """Calculate total nutrition for all items in meal."""
+        """Total nutrition for all items in meal (stored Meal.total_* columns)."""
         return {
             "calories": float(obj.total_calories),
             "protein": float(obj.total_protein),
@@ -3,30 +3,45 @@ Business logic services for nutrition app.
 """
 
 from datetime import date, timedelta
+from decimal import Decimal
 import logging
 from typing import Dict, Optional, Tuple
 
 from django.db import models, transaction
+from django.db.models.functions import TruncMonth, TruncWeek
 from django.utils import timezone
 
-from .models import DailyGoal, Meal
+from . import diary_cache
+from .models import MEAL_TOTAL_FIELDS, DailyGoal, DailyNutritionSummary, Meal, MealPhoto
 
 logger = logging.getLogger(__name__)
 
 # Time window for grouping photos into the same meal (in minutes)
 DRAFT_WINDOW_MINUTES = 10
 
+# Range stats: longest allowed range and bucket kinds (bucket -> SQL expression over date)
+RANGE_STATS_MAX_DAYS = 366
+RANGE_STATS_BUCKETS = {
+    "day": models.F("date"),
+    "week": TruncWeek("date", output_field=models.DateField()),
+    "month": TruncMonth("date", output_field=models.DateField()),
+}
+# Day counts as "on target" when calories are within ±10% of the goal
+GOAL_ADHERENCE_TOLERANCE = Decimal("0.10")
 
-def get_daily_stats(user, target_date: date) -> Dict:
+
+def get_daily_stats(user, target_date: date, include_meals: bool = True) -> Dict:
     """
     Get daily nutrition statistics for a user.
 
     Args:
         user: Django User instance
         target_date: Date to get stats for
+        include_meals: False → totals only, from one DailyNutritionSummary row
+            (no meals/items/photos are loaded; "meals" is None)
 
     Returns:
-        Dict with daily_goal, total_consumed, progress, meals
+        Dict with daily_goal, total_consumed, progress, meals, meals_count, photos_count
     """
     # Get active daily goal
     try:
@@ -34,21 +49,36 @@ def get_daily_stats(user, target_date: date) -> Dict:
     except DailyGoal.DoesNotExist:
         daily_goal = None
 
-    # Get all meals for the date
-    # BR-1: Only show meals with at least one SUCCESS photo (exclude FAILED meals with all photos cancelled)
-    # N+1 Prevention: Prefetch items and photos
-    meals = (
-        Meal.objects.filter(user=user, date=target_date)
-        .exclude(status="FAILED")
-        .prefetch_related("items")
-        .prefetch_related("photos")  # Prevent N+1 when serializer accesses photos
-    )
+    if include_meals:
+        # Get all meals for the date
+        # BR-1: Only show meals with at least one SUCCESS photo (exclude FAILED meals with all photos cancelled)
+        # N+1 Prevention: Prefetch items and photos
+        meals = (
+            Meal.objects.filter(user=user, date=target_date)
+            .exclude(status="FAILED")
+            .prefetch_related("items")
+            .prefetch_related("photos")  # Prevent N+1 when serializer accesses photos
+        )
 
-    # Calculate total consumed
-    total_calories = sum(meal.total_calories for meal in meals)
-    total_protein = sum(meal.total_protein for meal in meals)
-    total_fat = sum(meal.total_fat for meal in meals)
-    total_carbs = sum(meal.total_carbohydrates for meal in meals)
+        # Calculate total consumed (stored Meal.total_* columns — items are not iterated)
+        total_calories = sum(meal.total_calories for meal in meals)
+        total_protein = sum(meal.total_protein for meal in meals)
+        total_fat = sum(meal.total_fat for meal in meals)
+        total_carbs = sum(meal.total_carbohydrates for meal in meals)
+        meals_count = len(meals)
+        photos_count = sum(
+            1 for meal in meals for photo in meal.photos.all() if photo.status == "SUCCESS"
+        )
+    else:
+        meals = None
+        summary = DailyNutritionSummary.objects.filter(user=user, date=target_date).first()
+        summary = summary or DailyNutritionSummary(user=user, date=target_date)
+        total_calories = summary.calories
+        total_protein = summary.protein
+        total_fat = summary.fat
+        total_carbs = summary.carbohydrates
+        meals_count = summary.meals_count
+        photos_count = summary.photos_count
 
     # Calculate progress percentage
     if daily_goal:
@@ -85,9 +115,86 @@ def get_daily_stats(user, target_date: date) -> Dict:
         },
         "progress": progress,
         "meals": meals,
+        "meals_count": meals_count,
+        "photos_count": photos_count,
     }
 
 
+# ---------------------------------------------------------------------------
+# DailyNutritionSummary (rollup per user/day)
+# ---------------------------------------------------------------------------
+# Write paths don't touch the summary inside their transaction (no extra locks
+# on hot rows): they schedule a rebuild of the affected (user, date) on commit.
+# Requests are coalesced per transaction: ten food items saved in one request
+# rebuild their day once, not ten times. The rebuild locks the summary row,
+# then aggregates committed meals — so concurrent rebuilds of one day
+# serialize and the last one sees everything. A failed rebuild only logs;
+# rebuild_daily_summaries reconciles drift.
+# ---------------------------------------------------------------------------
+
+
+def schedule_summary_refresh(user_id: int, day) -> None:
+    """Rebuild the (user, day) summary after the current transaction commits."""
+    diary_cache.defer_for_days("summary", _refresh_days, days=[(user_id, day)])
+
+
+def schedule_summary_refresh_for_meal(meal_id: int) -> None:
+    """Same as schedule_summary_refresh() for the day of a meal (resolved on commit)."""
+    diary_cache.defer_for_days("summary", _refresh_days, meal_ids=[meal_id])
+
+
+def _refresh_days(days) -> None:
+    # Порядок (user, date) одинаковый у всех процессов — блокировки строк без deadlock
+    for user_id, day in sorted(days):
+        try:
+            refresh_daily_summary(user_id, day)
+        except Exception as e:
+            logger.warning(
+                "[DailySummary] refresh failed user_id=%s date=%s error=%s",
+                user_id,
+                day,
+                type(e).__name__,
+            )
+    # Версия дневника — ПОСЛЕ пересчёта сводки: summary_only ответ,
+    # закэшированный под новой версией, уже видит новую сводку
+    diary_cache.bump_days_now(days)
+
+
+def compute_daily_summary(user_id: int, day) -> Dict:
+    """Summary values for one day straight from meals/photos (two small aggregates)."""
+    meals = Meal.objects.filter(user_id=user_id, date=day).exclude(status="FAILED")
+    values = meals.aggregate(
+        meals_count=models.Count("id"),
+        **{
+            name: models.Sum(field, default=Decimal("0"))
+            for name, field in MEAL_TOTAL_FIELDS.items()
+        },
+    )
+    values["photos_count"] = MealPhoto.objects.filter(meal__in=meals, status="SUCCESS").count()
+    return values
+
+
+def refresh_daily_summary(user_id: int, day) -> Optional[DailyNutritionSummary]:
+    """
+    Rebuild DailyNutritionSummary for (user, day); delete it if the day is empty.
+
+    Returns:
+        The summary row, or None if the day has no visible meals
+    """
+    with transaction.atomic():
+        summary, _ = DailyNutritionSummary.objects.select_for_update().get_or_create(
+            user_id=user_id, date=day
+        )
+        values = compute_daily_summary(user_id, day)
+        if not values["meals_count"]:
+            summary.delete()
+            return None
+        for field, value in values.items():
+            setattr(summary, field, value)
+        summary.save()
+        return summary
+
+
 def get_weekly_stats(user, start_date: date) -> Dict:
     """
     Get weekly nutrition statistics for a user.
@@ -101,11 +208,6 @@ def get_weekly_stats(user, start_date: date) -> Dict:
     """
     end_date = start_date + timedelta(days=6)
 
-    # Get all meals for the week
-    meals = Meal.objects.filter(
-        user=user, date__gte=start_date, date__lte=end_date
-    ).prefetch_related("items")
-
     # Initialize daily data
     daily_data = {}
     for i in range(7):
@@ -118,15 +220,16 @@ def get_weekly_stats(user, start_date: date) -> Dict:
             "carbs": 0,
         }
 
-    # Sum up nutrition for each day
-    for meal in meals:
-        date_key = meal.date.isoformat()
-        if date_key in daily_data:
-            for item in meal.items.all():
-                daily_data[date_key]["calories"] += float(item.calories)
-                daily_data[date_key]["protein"] += float(item.protein)
-                daily_data[date_key]["fat"] += float(item.fat)
-                daily_data[date_key]["carbs"] += float(item.carbohydrates)
+    # Sum up nutrition for each day: at most 7 DailyNutritionSummary rows
+    summaries = DailyNutritionSummary.objects.filter(
+        user=user, date__gte=start_date, date__lte=end_date
+    ).values("date", "calories", "protein", "fat", "carbohydrates")
+    for row in summaries:
+        day = daily_data[row["date"].isoformat()]
+        day["calories"] = float(row["calories"])
+        day["protein"] = float(row["protein"])
+        day["fat"] = float(row["fat"])
+        day["carbs"] = float(row["carbohydrates"])
 
     # Calculate averages
     total_calories = sum(day["calories"] for day in daily_data.values())
@@ -149,6 +252,162 @@ def get_weekly_stats(user, start_date: date) -> Dict:
     }
 
 
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start: date, bucket: str) -> date:
+    if bucket == "week":
+        return start + timedelta(days=7)
+    if bucket == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _round(value) -> Optional[float]:
+    return None if value is None else round(float(value), 1)
+
+
+def _adherence(days_on_target: int, days_logged: int) -> Dict:
+    percent = round(days_on_target / days_logged * 100, 1) if days_logged else None
+    return {"days_on_target": days_on_target, "percent": percent}
+
+
+def get_range_stats(user, date_from: date, date_to: date, bucket: str = "day") -> Dict:
+    """
+    Nutrition statistics over an arbitrary range, grouped by day / week / month.
+
+    Grouping and aggregation run in the database over DailyNutritionSummary
+    (one row per logged day): exactly two queries — active goal and one
+    GROUP BY — regardless of range length. Averages, min/max are over logged
+    days (days with at least one meal); empty buckets are returned with zeros.
+
+    Args:
+        user: Django User instance
+        date_from: First day of the range (inclusive)
+        date_to: Last day of the range (inclusive)
+        bucket: "day", "week" (starts on Monday) or "month"
+
+    Returns:
+        Dict with from, to, bucket, daily_goal, buckets, overall
+
+    Raises:
+        ValueError: If bucket is unknown or the range is empty / too long
+    """
+    if bucket not in RANGE_STATS_BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(RANGE_STATS_BUCKETS)}")
+    if date_to < date_from:
+        raise ValueError("'to' must not be earlier than 'from'")
+    if (date_to - date_from).days + 1 > RANGE_STATS_MAX_DAYS:
+        raise ValueError(f"Range is limited to {RANGE_STATS_MAX_DAYS} days")
+
+    daily_goal = DailyGoal.objects.filter(user=user, is_active=True).values("calories").first()
+
+    aggregates = {
+        "days_logged": models.Count("id"),
+        "meals_count": models.Sum("meals_count"),
+        "photos_count": models.Sum("photos_count"),
+    }
+    for name in MEAL_TOTAL_FIELDS:
+        aggregates[f"sum_{name}"] = models.Sum(name)
+        aggregates[f"avg_{name}"] = models.Avg(name)
+        aggregates[f"min_{name}"] = models.Min(name)
+        aggregates[f"max_{name}"] = models.Max(name)
+    if daily_goal:
+        goal_calories = Decimal(daily_goal["calories"])
+        tolerance = goal_calories * GOAL_ADHERENCE_TOLERANCE
+        aggregates["days_on_target"] = models.Count(
+            "id",
+            filter=models.Q(
+                calories__gte=goal_calories - tolerance,
+                calories__lte=goal_calories + tolerance,
+            ),
+        )
+
+    rows = (
+        DailyNutritionSummary.objects.filter(user=user, date__gte=date_from, date__lte=date_to)
+        .annotate(bucket_start=RANGE_STATS_BUCKETS[bucket])
+        .order_by()
+        .values("bucket_start")
+        .annotate(**aggregates)
+    )
+    by_start = {row["bucket_start"]: row for row in rows}
+
+    def macros(row, prefix):
+        # Ключ "carbs" — как в get_weekly_stats
+        return {
+            ("carbs" if name == "carbohydrates" else name): _round(row.get(f"{prefix}_{name}"))
+            for name in MEAL_TOTAL_FIELDS
+        }
+
+    buckets = []
+    start = _bucket_start(date_from, bucket)
+    while start <= date_to:
+        next_start = _next_bucket(start, bucket)
+        row = by_start.get(start, {})
+        days_logged = row.get("days_logged", 0)
+        # Дни бакета внутри запрошенного диапазона (неделя/месяц могут выходить за него)
+        days_total = (min(next_start, date_to + timedelta(days=1)) - max(start, date_from)).days
+        buckets.append(
+            {
+                "start": start.isoformat(),
+                "end": (next_start - timedelta(days=1)).isoformat(),
+                "days_total": days_total,
+                "days_logged": days_logged,
+                "meals_count": row.get("meals_count") or 0,
+                "photos_count": row.get("photos_count") or 0,
+                "totals": {key: value or 0.0 for key, value in macros(row, "sum").items()},
+                "averages": macros(row, "avg"),
+                "min": macros(row, "min"),
+                "max": macros(row, "max"),
+                "goal_adherence": _adherence(row.get("days_on_target", 0), days_logged)
+                if daily_goal
+                else None,
+            }
+        )
+        start = next_start
+
+    # Итоги по всему диапазону — из бакетов, без отдельного запроса
+    logged = [item for item in buckets if item["days_logged"]]
+    days_logged = sum(item["days_logged"] for item in logged)
+    overall = {
+        "days_total": (date_to - date_from).days + 1,
+        "days_logged": days_logged,
+        "totals": {
+            key: round(sum(item["totals"][key] for item in buckets), 1)
+            for key in buckets[0]["totals"]
+        },
+    }
+    overall["averages"] = {
+        key: round(total / days_logged, 1) if days_logged else None
+        for key, total in overall["totals"].items()
+    }
+    overall["min"] = {
+        key: min((item["min"][key] for item in logged), default=None) for key in overall["totals"]
+    }
+    overall["max"] = {
+        key: max((item["max"][key] for item in logged), default=None) for key in overall["totals"]
+    }
+    if daily_goal:
+        days_on_target = sum(item["goal_adherence"]["days_on_target"] for item in buckets)
+        overall["goal_adherence"] = _adherence(days_on_target, days_logged)
+    else:
+        overall["goal_adherence"] = None
+
+    return {
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "bucket": bucket,
+        "goal_calories": daily_goal["calories"] if daily_goal else None,
+        "buckets": buckets,
+        "overall": overall,
+    }
+
+
 def create_auto_goal(user) -> DailyGoal:
     """
     Calculate and create a DailyGoal based on user profile.
@@ -270,41 +529,69 @@ def finalize_meal_if_complete(meal: Meal) -> None:
     with transaction.atomic():
         # Reload meal with lock
         meal = Meal.objects.select_for_update().get(id=meal.id)
+        finalize_locked_meal(meal)
 
-        photos = meal.photos.all()
-        if not photos.exists():
-            # No photos at all - shouldn't happen, but handle gracefully
-            logger.warning("[MealService] Meal %s has no photos, deleting orphan", meal.id)
-            meal.delete()
-            return
-
-        # Check if any photos are still processing
-        pending_or_processing = photos.filter(status__in=["PENDING", "PROCESSING"]).exists()
-        if pending_or_processing:
-            # Still processing
-            if meal.status != "PROCESSING":
-                meal.status = "PROCESSING"
-                meal.save(update_fields=["status"])
-            return
-
-        # All photos are in terminal states (SUCCESS, FAILED, or CANCELLED)
-        successful_photos = photos.filter(status="SUCCESS").exists()
-
-        if successful_photos:
-            # At least one success - mark meal as complete
-            if meal.status != "COMPLETE":
-                meal.status = "COMPLETE"
-                meal.save(update_fields=["status"])
-                logger.info("[MealService] Finalized meal_id=%s as COMPLETE", meal.id)
-        else:
-            # All photos failed or were cancelled
-            if meal.status != "FAILED":
-                meal.status = "FAILED"
-                meal.save(update_fields=["status"])
-                logger.info(
-                    "[MealService] Finalized meal_id=%s as FAILED (all photos failed/cancelled)",
-                    meal.id,
-                )
+
+def finalize_locked_meal(meal: Meal, totals_delta: Optional[Dict] = None) -> None:
+    """
+    То же, что finalize_meal_if_complete(), для Meal, уже заблокированного
+    вызывающим кодом (select_for_update в его транзакции).
+
+    Статусы всех фото — одним агрегирующим запросом.
+    totals_delta — прибавка к Meal.total_* после bulk-вставки items
+    (bulk_create минует FoodItem.save): пишется тем же UPDATE, что и статус.
+    """
+    active = ["PENDING", "PROCESSING"]
+    counts = meal.photos.aggregate(
+        total=models.Count("id"),
+        active=models.Count("id", filter=models.Q(status__in=active)),
+        success=models.Count("id", filter=models.Q(status="SUCCESS")),
+    )
+
+    if not counts["total"]:
+        # No photos at all - shouldn't happen, but handle gracefully
+        logger.warning("[MealService] Meal %s has no photos, deleting orphan", meal.id)
+        meal.delete()
+        return
+
+    if counts["active"]:
+        # Still processing
+        new_status = "PROCESSING"
+    elif counts["success"]:
+        # All photos are in terminal states, at least one success - meal is complete
+        new_status = "COMPLETE"
+    else:
+        # All photos failed or were cancelled
+        new_status = "FAILED"
+
+    updates = Meal.totals_expressions(totals_delta or {})
+    status_changed = meal.status != new_status
+    if status_changed:
+        updates["status"] = new_status
+    if not updates:
+        return
+
+    Meal.objects.filter(pk=meal.pk).update(**updates)
+    # .update() минует сигналы Meal — сводку дня пересчитываем явно,
+    # если изменились суммы или видимость в дневнике (FAILED)
+    if len(updates) > int(status_changed) or "FAILED" in (meal.status, new_status):
+        schedule_summary_refresh(meal.user_id, meal.date)
+    else:
+        diary_cache.bump_diary_version(meal.user_id, meal.date)
+    meal.status = new_status
+    for field in updates:
+        if field != "status":
+            # Сумма изменена выражением F(): поле становится deferred —
+            # Django перечитает его из БД только при обращении
+            meal.__dict__.pop(field, None)
+
+    if status_changed and new_status == "COMPLETE":
+        logger.info("[MealService] Finalized meal_id=%s as COMPLETE", meal.id)
+    elif status_changed and new_status == "FAILED":
+        logger.info(
+            "[MealService] Finalized meal_id=%s as FAILED (all photos failed/cancelled)",
+            meal.id,
+        )
 
 
 def cleanup_orphan_meals(user, older_than_minutes: int = 30) -> int:
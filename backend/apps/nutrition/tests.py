@@ -1,15 +1,24 @@
 from datetime import date
-from io import BytesIO
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
 from PIL import Image
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from .models import DailyGoal, Meal, MealPhoto, FoodItem
-from .services import get_daily_stats
+from .models import DailyGoal, DailyNutritionSummary, Meal, MealPhoto, FoodItem
+from .services import (
+    finalize_locked_meal,
+    get_daily_stats,
+    get_weekly_stats,
+    refresh_daily_summary,
+)
 
 User = get_user_model()
 
@@ -459,3 +468,368 @@ class MealPhotoCancelTestCase(TestCase):
                         "SUCCESS",
                         f"Photo {photo['id']}: non-SUCCESS photo leaked into API response (status={photo['status']})",
                     )
+
+
+class MealTotalsTestCase(TestCase):
+    """Denormalized Meal.total_* columns stay in sync with FoodItem writes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="totals_user", password="testpass123")
+        self.client.force_authenticate(user=self.user)
+        self.meal = Meal.objects.create(user=self.user, meal_type="LUNCH", date=date.today())
+
+    def _item(self, meal=None, **values):
+        data = {"calories": 200, "protein": 10, "fat": 5, "carbohydrates": 30, **values}
+        return FoodItem.objects.create(meal=meal or self.meal, name="Food", grams=100, **data)
+
+    def _stored(self, meal=None):
+        meal = Meal.objects.get(pk=(meal or self.meal).pk)
+        return (meal.total_calories, meal.total_protein, meal.total_fat, meal.total_carbohydrates)
+
+    def test_create_update_delete(self):
+        item = self._item()
+        self._item(calories="100.50", protein="2.25")
+        self.assertEqual(self._stored(), (Decimal("300.50"), Decimal("12.25"), 10, 60))
+
+        item.calories = 150
+        item.save()
+        self.assertEqual(self._stored()[0], Decimal("250.50"))
+
+        item.delete()
+        self.assertEqual(self._stored(), (Decimal("100.50"), Decimal("2.25"), 5, 30))
+
+    def test_item_moved_to_other_meal(self):
+        other = Meal.objects.create(user=self.user, meal_type="DINNER", date=date.today())
+        item = self._item()
+
+        item.meal = other
+        item.save()
+
+        self.assertEqual(self._stored()[0], 0)
+        self.assertEqual(self._stored(other)[0], 200)
+
+    def test_stale_meal_save_keeps_totals(self):
+        stale = Meal.objects.get(pk=self.meal.pk)
+        self._item()
+
+        stale.status = "COMPLETE"
+        stale.save()
+
+        self.assertEqual(self._stored()[0], 200)
+
+    def test_api_patch_updates_totals(self):
+        item = self._item()
+
+        response = self.client.patch(
+            f"/api/v1/meals/{self.meal.id}/items/{item.id}/", {"calories": 50}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._stored()[0], 50)
+
+    def test_recalculate_command_verifies_and_fixes(self):
+        self._item()
+        Meal.objects.filter(pk=self.meal.pk).update(total_calories=999)
+
+        with self.assertRaises(CommandError):
+            call_command("recalculate_meal_totals", "--verify", stdout=StringIO())
+
+        call_command("recalculate_meal_totals", stdout=StringIO())
+        self.assertEqual(self._stored()[0], 200)
+        call_command("recalculate_meal_totals", "--verify", stdout=StringIO())
+
+
+class DailyNutritionSummaryTestCase(TestCase):
+    """DailyNutritionSummary is rebuilt on commit by write paths and by the repair command."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="summary_user", password="testpass123")
+        self.client.force_authenticate(user=self.user)
+        self.today = date.today()
+
+    def _meal_with_item(self, calories=200, photo_status="SUCCESS"):
+        with self.captureOnCommitCallbacks(execute=True):
+            meal = Meal.objects.create(
+                user=self.user, meal_type="LUNCH", date=self.today, status="COMPLETE"
+            )
+            MealPhoto.objects.create(meal=meal, status=photo_status)
+            FoodItem.objects.create(
+                meal=meal,
+                name="Food",
+                grams=100,
+                calories=calories,
+                protein=10,
+                fat=5,
+                carbohydrates=30,
+            )
+        return meal
+
+    def _summary(self):
+        return DailyNutritionSummary.objects.filter(user=self.user, date=self.today).first()
+
+    def test_write_paths_update_summary(self):
+        meal = self._meal_with_item()
+        self._meal_with_item(calories=100, photo_status="CANCELLED")
+
+        summary = self._summary()
+        self.assertEqual(summary.calories, 300)
+        self.assertEqual(summary.meals_count, 2)
+        self.assertEqual(summary.photos_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            meal.items.first().delete()
+        self.assertEqual(self._summary().calories, 100)
+
+    def test_refresh_coalesced_per_transaction(self):
+        with patch(
+            "apps.nutrition.services.refresh_daily_summary", wraps=refresh_daily_summary
+        ) as refresh_mock:
+            meal = self._meal_with_item()
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                for calories in (50, 60, 70):
+                    FoodItem.objects.create(
+                        meal=meal,
+                        name="Extra",
+                        grams=50,
+                        calories=calories,
+                        protein=1,
+                        fat=1,
+                        carbohydrates=1,
+                    )
+
+        # Четыре записи в первой транзакции и три во второй — по одному пересчёту дня
+        self.assertEqual(refresh_mock.call_count, 2)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._summary().calories, 380)
+
+    def test_meal_moved_to_other_day(self):
+        meal = self._meal_with_item()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            meal.date = date(2020, 1, 1)
+            meal.save()
+
+        self.assertIsNone(self._summary())
+        moved = DailyNutritionSummary.objects.get(user=self.user, date=date(2020, 1, 1))
+        self.assertEqual(moved.calories, 200)
+
+    def test_failed_meal_leaves_summary(self):
+        meal = self._meal_with_item()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MealPhoto.objects.filter(meal=meal).update(status="FAILED")
+            meal.status = "PROCESSING"
+            finalize_locked_meal(meal)
+
+        self.assertIsNone(self._summary())
+
+    def test_weekly_stats_read_summaries(self):
+        self._meal_with_item()
+
+        stats = get_weekly_stats(self.user, self.today)
+
+        self.assertEqual(stats["daily_data"][0]["calories"], 200.0)
+        self.assertEqual(stats["daily_data"][0]["carbs"], 30.0)
+
+    def test_summary_only_diary_skips_meals(self):
+        self._meal_with_item()
+
+        # daily goal, summary row
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/v1/meals/?date={self.today}&summary_only=true")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("meals", response.data)
+        self.assertEqual(response.data["total_consumed"]["calories"], 200.0)
+        self.assertEqual(response.data["meals_count"], 1)
+
+    def test_rebuild_command_fixes_stale_rows(self):
+        self._meal_with_item()
+        DailyNutritionSummary.objects.filter(user=self.user).update(calories=1)
+        DailyNutritionSummary.objects.create(user=self.user, date=date(2020, 1, 1), meals_count=3)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_daily_summaries", "--verify", stdout=StringIO())
+
+        call_command("rebuild_daily_summaries", stdout=StringIO())
+
+        self.assertEqual(self._summary().calories, 200)
+        self.assertFalse(DailyNutritionSummary.objects.filter(date=date(2020, 1, 1)).exists())
+        call_command("rebuild_daily_summaries", "--verify", stdout=StringIO())
+
+
+class RangeStatsTestCase(TestCase):
+    """GET /api/v1/stats/range/ aggregates DailyNutritionSummary rows in the database."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="range_user", password="testpass123")
+        self.client.force_authenticate(user=self.user)
+        self.url = "/api/v1/stats/range/"
+        DailyGoal.objects.create(
+            user=self.user, calories=2000, protein=100, fat=70, carbohydrates=250, is_active=True
+        )
+        # Mon 2025-01-06, Tue 2025-01-07 (on target), Mon 2025-01-13
+        for day, calories in ((6, 1000), (7, 2100), (13, 3000)):
+            DailyNutritionSummary.objects.create(
+                user=self.user,
+                date=date(2025, 1, day),
+                calories=calories,
+                protein=50,
+                fat=20,
+                carbohydrates=100,
+                meals_count=2,
+            )
+
+    def test_day_buckets_fill_gaps(self):
+        response = self.client.get(self.url, {"from": "2025-01-06", "to": "2025-01-08"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        buckets = response.data["buckets"]
+        self.assertEqual([b["start"] for b in buckets], ["2025-01-06", "2025-01-07", "2025-01-08"])
+        self.assertEqual(buckets[1]["totals"]["calories"], 2100.0)
+        self.assertEqual(buckets[2]["days_logged"], 0)
+        self.assertIsNone(buckets[2]["averages"]["calories"])
+        self.assertEqual(response.data["overall"]["averages"]["calories"], 1550.0)
+        self.assertEqual(response.data["overall"]["goal_adherence"]["days_on_target"], 1)
+
+    def test_week_buckets(self):
+        response = self.client.get(
+            self.url, {"from": "2025-01-07", "to": "2025-01-19", "bucket": "week"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first, second = response.data["buckets"]
+        self.assertEqual(first["start"], "2025-01-06")
+        self.assertEqual(first["days_total"], 6)
+        self.assertEqual(first["days_logged"], 1)
+        self.assertEqual(first["goal_adherence"], {"days_on_target": 1, "percent": 100.0})
+        self.assertEqual(second["max"]["calories"], 3000.0)
+        self.assertEqual(second["meals_count"], 2)
+
+    def test_year_range_query_count(self):
+        # daily goal, grouped summaries
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                self.url, {"from": "2024-02-01", "to": "2025-01-31", "bucket": "month"}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["buckets"]), 12)
+        january = response.data["buckets"][-1]
+        self.assertEqual(january["min"]["calories"], 1000.0)
+        self.assertEqual(january["averages"]["carbs"], 100.0)
+
+    def test_invalid_params(self):
+        for params in (
+            {"from": "2025-01-06"},
+            {"from": "2025-01-06", "to": "bad"},
+            {"from": "2025-01-06", "to": "2025-01-01"},
+            {"from": "2025-01-06", "to": "2025-01-08", "bucket": "year"},
+            {"from": "2023-01-01", "to": "2025-01-01"},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class DiaryConditionalGetTestCase(TestCase):
+    """GET /api/v1/meals/?date= sends ETag and answers If-None-Match with 304."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="etag_user", password="testpass123")
+        self.client.force_authenticate(user=self.user)
+        self.today = date.today()
+        self.url = f"/api/v1/meals/?date={self.today}"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.meal = Meal.objects.create(
+                user=self.user, meal_type="LUNCH", date=self.today, status="COMPLETE"
+            )
+            self.item = FoodItem.objects.create(
+                meal=self.meal,
+                name="Soup",
+                grams=300,
+                calories=150,
+                protein=5,
+                fat=3,
+                carbohydrates=20,
+            )
+
+    def _etag(self, url=None):
+        response = self.client.get(url or self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Last-Modified", response)
+        return response["ETag"]
+
+    def test_not_modified_without_queries(self):
+        etag = self._etag()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_item_edit_changes_etag(self):
+        etag = self._etag()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.name = "Borscht"
+            self.item.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["meals"][0]["items"][0]["name"], "Borscht")
+
+    def test_goal_change_changes_etag(self):
+        etag = self._etag()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DailyGoal.objects.create(
+                user=self.user, calories=2000, protein=100, fat=70, carbohydrates=250
+            )
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["daily_goal"]["calories"], 2000)
+
+    def test_summary_only_has_own_etag(self):
+        self.assertNotEqual(self._etag(), self._etag(f"{self.url}&summary_only=true"))
+
+
+class MealHistoryPaginationTestCase(TestCase):
+    """GET /api/v1/meals/ without date: keyset pages over (-date, -created_at, id)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="history_user", password="testpass123")
+        self.client.force_authenticate(user=self.user)
+        for day in (1, 1, 1, 2, 3):
+            Meal.objects.create(user=self.user, meal_type="LUNCH", date=date(2025, 1, day))
+
+    def test_pages_follow_meal_ordering(self):
+        seen = []
+        url = "/api/v1/meals/?page_size=2"
+        while url:
+            # meals page, items prefetch, photos prefetch — no COUNT
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(meal["id"] for meal in response.data["results"])
+            url = response.data["next"]
+
+        expected = list(
+            Meal.objects.filter(user=self.user)
+            .order_by("-date", "-created_at", "id")
+            .values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/v1/meals/", {"cursor": "e30"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -13,6 +13,10 @@ Goals endpoints (internal):
 - POST /api/v1/goals/calculate/ - calculate goal
 - POST /api/v1/goals/set-auto/ - set auto goal
 - PUT/PATCH /api/v1/goals/ - update goal manually
+
+Statistics:
+- GET /api/v1/stats/weekly/?start_date=YYYY-MM-DD - 7 days from start_date
+- GET /api/v1/stats/range/?from=&to=&bucket=day|week|month - arbitrary range, bucketed
 """
 
 from django.urls import path
@@ -38,4 +42,5 @@ urlpatterns = [
     path("goals/set-auto/", views.SetAutoGoalView.as_view(), name="set-auto-goal"),
     # Statistics
     path("stats/weekly/", views.WeeklyStatsView.as_view(), name="weekly-stats"),
+    path("stats/range/", views.RangeStatsView.as_view(), name="range-stats"),
 ]
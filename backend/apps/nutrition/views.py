@@ -9,13 +9,17 @@ import logging
 
 from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 from rest_framework import generics, status, views
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from apps.common.pagination import KeysetPagination
+
+from . import diary_cache
 from .models import DailyGoal, FoodItem, Meal, MealPhoto
 from .serializers import (
     CalculateGoalsSerializer,
@@ -25,21 +29,36 @@ from .serializers import (
     MealCreateSerializer,
     MealSerializer,
 )
-from .services import create_auto_goal, get_daily_stats, get_weekly_stats
+from .services import (
+    RANGE_STATS_BUCKETS,
+    RANGE_STATS_MAX_DAYS,
+    create_auto_goal,
+    get_daily_stats,
+    get_range_stats,
+    get_weekly_stats,
+)
 
 logger = logging.getLogger(__name__)
 
 
+class MealHistoryPagination(KeysetPagination):
+    """Meal history newest first; pages use the (user, date) index, not OFFSET."""
+
+    ordering = ("-date", "-created_at", "id")
+
+
 @extend_schema(tags=["Meals"])
 class MealListCreateView(generics.ListCreateAPIView):
     """
     GET /api/v1/meals/?date=YYYY-MM-DD - Get daily diary with nutrition stats
-    GET /api/v1/meals/ - List all meals (with pagination)
+    GET /api/v1/meals/?date=YYYY-MM-DD&summary_only=true - Only totals/progress (no meals)
+        Both diary forms send ETag/Last-Modified; If-None-Match → 304 without DB queries.
+    GET /api/v1/meals/ - List all meals (keyset pagination: ?cursor=&page_size=, no count)
     POST /api/v1/meals/ - Create new meal
     """
 
     permission_classes = [IsAuthenticated]
-    pagination_class = PageNumberPagination
+    pagination_class = MealHistoryPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -79,13 +98,22 @@ class MealListCreateView(generics.ListCreateAPIView):
                 location=OpenApiParameter.QUERY,
                 description="Дата в формате YYYY-MM-DD (опционально)",
                 required=False,
-            )
+            ),
+            OpenApiParameter(
+                name="summary_only",
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                description="Только итоги дня (без списка meals): одна строка сводки вместо "
+                "приёмов пищи, блюд и фото. Вместо meals — meals_count и photos_count",
+                required=False,
+            ),
         ],
         responses={
             200: OpenApiResponse(
                 description="Daily diary with meals and nutrition stats",
                 response=DailyStatsSerializer,
             ),
+            304: OpenApiResponse(description="Дневник не изменился (If-None-Match / ETag)"),
         },
     )
     def get(self, request, *args, **kwargs):
@@ -105,23 +133,44 @@ class MealListCreateView(generics.ListCreateAPIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            stats = get_daily_stats(request.user, target_date)
-
-            data = {
-                "date": stats["date"],
-                "daily_goal": DailyGoalSerializer(stats["daily_goal"]).data
-                if stats["daily_goal"]
-                else None,
-                "total_consumed": stats["total_consumed"],
-                "progress": stats["progress"],
-                "meals": MealSerializer(stats["meals"], many=True).data,
-            }
-
-            return Response(data)
+            summary_only = request.query_params.get("summary_only", "").lower() in ("1", "true")
+
+            # Conditional GET: версия дня + версия цели из кэша (один get_many)
+            day_token, goal_token = diary_cache.current_versions(request.user.id, target_date)
+            version = diary_cache.make_version(day_token, goal_token, "s" if summary_only else "")
+            etag = diary_cache.make_etag(version)
+            last_modified = diary_cache.last_modified(day_token, goal_token)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = self._daily_diary(request, target_date, summary_only)
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            response["Cache-Control"] = "private, no-cache"
+            return response
         else:
             # Return simple list of meals
             return super().list(request, *args, **kwargs)
 
+    def _daily_diary(self, request, target_date, summary_only):
+        """Daily stats response (full diary or summary_only)."""
+        stats = get_daily_stats(request.user, target_date, include_meals=not summary_only)
+
+        data = {
+            "date": stats["date"],
+            "daily_goal": DailyGoalSerializer(stats["daily_goal"]).data
+            if stats["daily_goal"]
+            else None,
+            "total_consumed": stats["total_consumed"],
+            "progress": stats["progress"],
+        }
+        if summary_only:
+            data["meals_count"] = stats["meals_count"]
+            data["photos_count"] = stats["photos_count"]
+        else:
+            data["meals"] = MealSerializer(stats["meals"], many=True).data
+
+        return Response(data)
+
     @extend_schema(
         summary="Создать новый приём пищи",
         description="Создаёт новый приём пищи (завтрак, обед, ужин или перекус).",
@@ -547,3 +596,74 @@ class WeeklyStatsView(views.APIView):
 
         result = get_weekly_stats(request.user, start_date)
         return Response(result)
+
+
+@extend_schema(tags=["Nutrition - Statistics"])
+class RangeStatsView(views.APIView):
+    """
+    GET /api/v1/stats/range/?from=YYYY-MM-DD&to=YYYY-MM-DD&bucket=day|week|month
+
+    Returns nutrition statistics for an arbitrary range grouped into buckets:
+    totals, averages, min/max per logged day and goal adherence.
+    Aggregated in the database from daily summaries (two queries for any range).
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Получить статистику за период",
+        description="Статистика КБЖУ за произвольный период (до "
+        f"{RANGE_STATS_MAX_DAYS} дней) по дням, неделям или месяцам: суммы, средние, "
+        "минимум/максимум за день и доля дней в пределах ±10% от цели по калориям.",
+        parameters=[
+            OpenApiParameter(
+                name="from",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description="Первый день периода в формате YYYY-MM-DD",
+                required=True,
+            ),
+            OpenApiParameter(
+                name="to",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description="Последний день периода (включительно) в формате YYYY-MM-DD",
+                required=True,
+            ),
+            OpenApiParameter(
+                name="bucket",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description="Группировка: day (по умолчанию), week (с понедельника), month",
+                required=False,
+                enum=list(RANGE_STATS_BUCKETS),
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(description="Статистика по бакетам и итог за период"),
+            400: OpenApiResponse(description="Невалидные параметры"),
+        },
+    )
+    def get(self, request):
+        date_from_str = request.query_params.get("from")
+        date_to_str = request.query_params.get("to")
+        if not date_from_str or not date_to_str:
+            return Response(
+                {"error": "from and to parameters are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            date_from = datetime.strptime(date_from_str, "%Y-%m-%d").date()
+            date_to = datetime.strptime(date_to_str, "%Y-%m-%d").date()
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        bucket = request.query_params.get("bucket", "day")
+        try:
+            result = get_range_stats(request.user, date_from, date_to, bucket)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
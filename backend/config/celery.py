@@ -5,6 +5,13 @@ Usage:
     # Start worker (requires DJANGO_SETTINGS_MODULE set via env)
     celery -A config worker -l info -Q ai,billing,default
 
+    # Start media worker (CPU-bound normalization; prefork concurrency = CPU cores
+    # available to the worker — set it explicitly, in a container Celery sees host cores)
+    celery -A config worker -l info -Q media --concurrency=1
+
+    # AI_PROXY_CLIENT_MODE=async: ai worker on threads, HTTP on a shared event loop
+    celery -A config worker -l info -Q ai -P threads --concurrency=32
+
     # Start beat (for periodic tasks)
     celery -A config beat -l info
 """
@@ -14,6 +21,7 @@ import os
 
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_init
 
 # CRITICAL: DJANGO_SETTINGS_MODULE must be set explicitly via environment
 # DO NOT use setdefault here - it can cause local settings to load in production
@@ -44,6 +52,7 @@ logger = logging.getLogger(__name__)
 @app.on_after_finalize.connect
 def register_additional_tasks(sender, **kwargs):
     """Import tasks from non-standard modules after Celery is configured."""
+    from apps.ai import tasks_media  # noqa: F401
     from apps.billing import tasks_digest  # noqa: F401
 
 
@@ -55,7 +64,8 @@ def register_additional_tasks(sender, **kwargs):
 #
 # Queues:
 # - billing: Payment webhooks, recurring payments (high priority)
-# - ai: AI recognition tasks (can be slow, isolated)
+# - ai: AI recognition tasks (can be slow, isolated; I/O-bound)
+# - media: Upload-time image normalization (CPU-bound, prefork = CPU cores)
 # - default: Everything else
 # =============================================================================
 
@@ -69,8 +79,20 @@ app.conf.task_routes = {
     "apps.billing.tasks_digest.*": {"queue": "billing"},
     # AI tasks -> ai queue
     "apps.ai.tasks.*": {"queue": "ai"},
+    # Image normalization -> media queue (separate CPU pool)
+    "apps.ai.tasks_media.*": {"queue": "media"},
 }
 
+# Priority lanes внутри очереди (apps.ai.scheduling): платный план → priority 0, FREE → 6.
+# Redis-брокер хранит отдельный список на каждый шаг; 0 — самый высокий приоритет.
+app.conf.broker_transport_options = {
+    "priority_steps": [0, 3, 6, 9],
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+# Без prefetch воркер не забирает задачи впрок — иначе приоритет не успевает сработать
+app.conf.worker_prefetch_multiplier = 1
+
 
 # =============================================================================
 # Celery Beat Schedule (Periodic Tasks)
@@ -103,6 +125,11 @@ app.conf.beat_schedule = {
             hour=10, minute=0, day_of_week=1
         ),  # Mon 10:00 MSK (CELERY_TIMEZONE=Europe/Moscow)
     },
+    # AI scheduling: запаркованные задачи пользователей с утёкшими слотами
+    "ai-drain-parked-tasks": {
+        "task": "apps.ai.tasks.drain_parked_tasks",
+        "schedule": crontab(minute="*/5"),  # каждые 5 минут
+    },
     # P4-DIG-02: Weekly digest health check (silent degradation guard)
     "billing-digest-health-check": {
         "task": "apps.billing.tasks_digest.check_weekly_digest_health",
@@ -177,6 +204,29 @@ def log_worker_queues(sender, **kwargs):
     logger.info("[CELERY QUEUES] Worker queue configuration:")
     logger.info("  task_default_queue: %s", sender.conf.task_default_queue)
     logger.info("  ⚠️  REMINDER: Worker MUST be started with -Q ai,billing,default")
+    logger.info("  ⚠️  REMINDER: A separate worker MUST consume -Q media (image normalization)")
+
+
+# =============================================================================
+# Prometheus /metrics (apps.common.metrics)
+# =============================================================================
+# Метка service="celery" для всех процессов воркера (prefork-дети наследуют её
+# при fork). Главный процесс отдаёт /metrics на METRICS_CELERY_PORT: данные
+# в Redis, поэтому видны наблюдения всех процессов пула.
+@worker_init.connect
+def start_metrics_server(sender=None, **kwargs):
+    from django.conf import settings
+
+    from apps.common import metrics
+
+    metrics.set_service("celery")
+    port = getattr(settings, "METRICS_CELERY_PORT", 0)
+    if port:
+        try:
+            metrics.start_http_server(port)
+        except OSError as e:
+            # Порт занят (второй воркер на хосте) — воркер работает без /metrics
+            logger.warning("[CELERY] metrics server not started: port=%s error=%s", port, e)
 
 
 @app.task(bind=True, ignore_result=True)
@@ -163,6 +163,12 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Загрузки больше порога Django пишет во временный файл (не в память воркера);
+# FileSystemStorage затем переносит его в MEDIA_ROOT без копирования (apps.ai.serializers)
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.environ.get("FILE_UPLOAD_MAX_MEMORY_SIZE", str(1024 * 1024))
+)
+
 USE_X_FORWARDED_HOST = True
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -278,8 +284,95 @@ TRUSTED_PROXIES = [p.strip() for p in os.environ.get("TRUSTED_PROXIES", "").spli
 
 AI_PROXY_URL = os.environ.get("AI_PROXY_URL", "")
 AI_PROXY_SECRET = os.environ.get("AI_PROXY_SECRET", "")
+# sync  — requests (одна задача = один поток/процесс на всё время вызова)
+# async — httpx в общем event loop процесса (воркер ai: -P threads --concurrency=N)
+AI_PROXY_CLIENT_MODE = os.environ.get("AI_PROXY_CLIENT_MODE", "sync").lower()
+# Размер keep-alive пула соединений к AI Proxy на процесс
+AI_PROXY_POOL_MAXSIZE = int(os.environ.get("AI_PROXY_POOL_MAXSIZE", "32"))
+
+# Circuit breaker + адаптивный (AIMD) лимит вызовов AI Proxy, общие для всех воркеров
+# (apps.ai_proxy.resilience). Состояние — в Redis (Django cache)
+AI_PROXY_RESILIENCE_ENABLED = (
+    os.environ.get("AI_PROXY_RESILIENCE_ENABLED", "True").lower() == "true"
+)
+AI_CB_WINDOW_S = int(os.environ.get("AI_CB_WINDOW_S", "60"))
+AI_CB_MIN_CALLS = int(os.environ.get("AI_CB_MIN_CALLS", "20"))
+AI_CB_FAILURE_RATE = float(os.environ.get("AI_CB_FAILURE_RATE", "0.5"))
+AI_CB_OPEN_S = int(os.environ.get("AI_CB_OPEN_S", "30"))
+AI_CB_HALF_OPEN_PROBES = int(os.environ.get("AI_CB_HALF_OPEN_PROBES", "2"))
+AI_LIMITER_INITIAL = int(os.environ.get("AI_LIMITER_INITIAL", "16"))
+AI_LIMITER_MIN = int(os.environ.get("AI_LIMITER_MIN", "2"))
+AI_LIMITER_MAX = int(os.environ.get("AI_LIMITER_MAX", "64"))
+AI_LIMITER_LATENCY_TARGET_MS = int(os.environ.get("AI_LIMITER_LATENCY_TARGET_MS", "15000"))
+AI_LIMITER_WAIT_S = float(os.environ.get("AI_LIMITER_WAIT_S", "5"))
+
+# Hedged requests: нет ответа дольше перцентиля латентности → второй такой же запрос,
+# берём первый ответ (apps.ai_proxy.hedging). Бюджет — доля лишних запросов
+AI_HEDGE_ENABLED = os.environ.get("AI_HEDGE_ENABLED", "False").lower() == "true"
+AI_HEDGE_PERCENTILE = float(os.environ.get("AI_HEDGE_PERCENTILE", "95"))
+AI_HEDGE_MIN_DELAY_MS = int(os.environ.get("AI_HEDGE_MIN_DELAY_MS", "2000"))
+AI_HEDGE_MAX_DELAY_MS = int(os.environ.get("AI_HEDGE_MAX_DELAY_MS", "20000"))
+AI_HEDGE_MIN_SAMPLES = int(os.environ.get("AI_HEDGE_MIN_SAMPLES", "50"))
+AI_HEDGE_BUDGET_RATIO = float(os.environ.get("AI_HEDGE_BUDGET_RATIO", "0.05"))
+# Отмена запущенной AI задачи: как часто watcher перепроверяет флаг (сек);
+# с Redis pub/sub отмена приходит сразу, опрос — страховка (apps.ai.cancellation)
+AI_CANCEL_POLL_S = float(os.environ.get("AI_CANCEL_POLL_S", "1.0"))
 AI_ASYNC_ENABLED = os.environ.get("AI_ASYNC_ENABLED", "True").lower() == "true"
 
+# Кэш результатов распознавания по хешу нормализованного фото (Redis, TTL)
+AI_RECOGNITION_CACHE_ENABLED = (
+    os.environ.get("AI_RECOGNITION_CACHE_ENABLED", "True").lower() == "true"
+)
+AI_RECOGNITION_CACHE_TTL = int(os.environ.get("AI_RECOGNITION_CACHE_TTL", str(24 * 60 * 60)))
+AI_RECOGNITION_CACHE_MAX_ENTRY_BYTES = int(
+    os.environ.get("AI_RECOGNITION_CACHE_MAX_ENTRY_BYTES", str(64 * 1024))
+)
+
+# Нормализация фото отдельной стадией сразу после загрузки (очередь media, CPU-пул).
+# False → нормализация inline в AI задаче (как раньше)
+AI_UPLOAD_NORMALIZATION_ENABLED = (
+    os.environ.get("AI_UPLOAD_NORMALIZATION_ENABLED", "True").lower() == "true"
+)
+
+# SSE-стрим статуса задачи (GET /api/v1/ai/task/<id>/stream/)
+AI_TASK_STREAM_TIMEOUT_S = int(os.environ.get("AI_TASK_STREAM_TIMEOUT_S", "60"))
+AI_TASK_STREAM_HEARTBEAT_S = int(os.environ.get("AI_TASK_STREAM_HEARTBEAT_S", "15"))
+
+# Хранить результат recognize_food_async в Celery result backend.
+# Статус читается из записей состояния (ai_task_state:<id>), результат — из MealPhoto;
+# backend нужен только задачам, поставленным до появления записей. После выката → False
+AI_TASK_STORE_RESULT = os.environ.get("AI_TASK_STORE_RESULT", "True").lower() == "true"
+
+# Планировщик AI задач (apps.ai.scheduling): приоритет по тарифу + лимит задач пользователя
+# в очереди/в работе; сверх лимита задачи паркуются в Redis и уходят по мере завершения
+AI_FAIR_SCHEDULING_ENABLED = (
+    os.environ.get("AI_FAIR_SCHEDULING_ENABLED", "True").lower() == "true"
+)
+AI_USER_INFLIGHT_LIMIT = int(os.environ.get("AI_USER_INFLIGHT_LIMIT", "2"))
+
+# Batch: фото одного приёма пищи, пришедшие в окне AI_BATCH_WINDOW_MS, → один запрос
+# к AI Proxy (POST /api/v1/ai/recognize-food/batch). Включать, когда proxy его поддерживает
+AI_BATCH_RECOGNITION_ENABLED = (
+    os.environ.get("AI_BATCH_RECOGNITION_ENABLED", "False").lower() == "true"
+)
+AI_BATCH_WINDOW_MS = int(os.environ.get("AI_BATCH_WINDOW_MS", "1500"))
+AI_BATCH_MAX_PHOTOS = int(os.environ.get("AI_BATCH_MAX_PHOTOS", "4"))
+
+# Быстрый decode больших JPEG (DCT scaling 1/2..1/8) перед финальным LANCZOS
+AI_IMAGE_FAST_DECODE = os.environ.get("AI_IMAGE_FAST_DECODE", "True").lower() == "true"
+
+# Почти-дубликаты по перцептивному хешу (dHash, расстояние Хэмминга из 64 бит)
+AI_NEAR_DUPLICATE_ENABLED = os.environ.get("AI_NEAR_DUPLICATE_ENABLED", "True").lower() == "true"
+AI_NEAR_DUPLICATE_MAX_DISTANCE = int(os.environ.get("AI_NEAR_DUPLICATE_MAX_DISTANCE", "5"))
+AI_NEAR_DUPLICATE_WINDOW_HOURS = int(os.environ.get("AI_NEAR_DUPLICATE_WINDOW_HOURS", "24"))
+AI_NEAR_DUPLICATE_MAX_CANDIDATES = int(os.environ.get("AI_NEAR_DUPLICATE_MAX_CANDIDATES", "50"))
+
+# Prometheus /metrics (apps.common.metrics): гистограммы стадий AI распознавания.
+# gunicorn — GET /metrics/ (Bearer METRICS_TOKEN; без токена — только при DEBUG),
+# Celery — отдельный HTTP порт главного процесса воркера (0 = выключено)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_CELERY_PORT = int(os.environ.get("METRICS_CELERY_PORT", "0"))
+
 
 # =============================================================================
 # Telegram settings (без парсинга "магией")
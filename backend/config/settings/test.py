@@ -40,3 +40,7 @@ PASSWORD_HASHERS = [
 
 # Логи в тестах обычно мешают — выключаем
 LOGGING = {"version": 1, "disable_existing_loggers": True}
+
+# Breaker/limiter AI Proxy хранят состояние в кэше — между тестами оно бы "протекало".
+# Тесты resilience включают его явно
+AI_PROXY_RESILIENCE_ENABLED = False
@@ -15,7 +15,7 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
-from apps.common.views import health_check, liveness_check, readiness_check
+from apps.common.views import health_check, liveness_check, metrics, readiness_check
 
 
 def basic_auth_required(view_func):
@@ -75,6 +75,8 @@ urlpatterns = [
     path("api/v1/health/", health_check, name="health-v1"),
     path("ready/", readiness_check, name="readiness"),
     path("live/", liveness_check, name="liveness"),
+    # Prometheus metrics (Bearer METRICS_TOKEN)
+    path("metrics/", metrics, name="metrics"),
     # API v1 endpoints
     path("api/v1/users/", include("apps.users.urls")),
     path("api/v1/", include("apps.nutrition.urls")),  # meals/ and nutrition/goals/
@@ -83,9 +83,12 @@ def _get_workers() -> int:
 
 workers = _get_workers()
 
-# Обычные синхронные воркеры
-# Подходят для Django + Celery (AI обрабатывается асинхронно)
-worker_class = "sync"
+# Потоки внутри воркера (gthread)
+# SSE-стрим статуса AI задачи (/api/v1/ai/task/<id>/stream/) держит соединение
+# до 60 с: в sync-воркере это занимает весь процесс, в gthread — один поток.
+# GUNICORN_THREADS=1 → обычные синхронные воркеры, как раньше
+threads = max(1, int(os.environ.get("GUNICORN_THREADS", "8")))
+worker_class = "gthread" if threads > 1 else "sync"
 
 # Максимальное количество одновременных соединений (для sync почти не влияет)
 worker_connections = 1000
@@ -174,7 +177,7 @@ def on_starting(server):
 
 def when_ready(server):
     """Вызывается когда сервер полностью готов."""
-    print(f"Gunicorn is ready. Spawning {workers} workers")
+    print(f"Gunicorn is ready. Spawning {workers} workers ({worker_class}, threads={threads})")
 
 
 def on_reload(server):
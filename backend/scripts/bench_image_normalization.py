@@ -0,0 +1,91 @@
+"""
+Бенчмарк normalize_image(): быстрый decode (fast_decode=True) vs полный decode.
+
+Сравнивает для каждого размера исходного JPEG:
+- латентность (median / p95 по N прогонам, мс)
+- качество результата (PSNR быстрого пути относительно полного, dB)
+
+Запуск:
+    python scripts/bench_image_normalization.py [--runs 20]
+
+PSNR > 40 dB — визуально неотличимо; для Vision-модели этого более чем достаточно.
+"""
+
+import argparse
+from io import BytesIO
+import math
+import os
+import statistics
+import sys
+import time
+
+import django
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+# Add backend to sys.path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Minimal Django config
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
+django.setup()
+
+from apps.ai_proxy.utils import normalize_image  # noqa: E402
+
+SIZES = [(1600, 1200), (3024, 4032), (4000, 3000), (6000, 4000)]
+
+
+def create_photo_like_jpeg(size: tuple) -> bytes:
+    """JPEG с градиентом и шумом — ближе к реальному фото, чем сплошная заливка."""
+    w, h = size
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 64).filter(ImageFilter.GaussianBlur(2))
+    img = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def psnr(a_bytes: bytes, b_bytes: bytes) -> float:
+    with Image.open(BytesIO(a_bytes)) as a, Image.open(BytesIO(b_bytes)) as b:
+        diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+        stat = ImageStat.Stat(diff)
+        mse = sum(s / c for s, c in zip(stat.sum2, stat.count)) / len(stat.count)
+    return float("inf") if mse == 0 else 10 * math.log10(255**2 / mse)
+
+
+def bench(image_bytes: bytes, fast_decode: bool, runs: int) -> tuple:
+    timings = []
+    out = b""
+    metrics = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        out, _, metrics = normalize_image(image_bytes, "image/jpeg", fast_decode=fast_decode)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return out, metrics, statistics.median(timings), p95
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print(f"normalize_image: fast_decode vs full decode (runs={args.runs})")
+    print("=" * 78)
+    print(f"{'source':>11} | {'full p50/p95 ms':>16} | {'fast p50/p95 ms':>16} | {'decode_px':>9} | PSNR")
+
+    for size in SIZES:
+        src = create_photo_like_jpeg(size)
+        full_out, _, full_p50, full_p95 = bench(src, False, args.runs)
+        fast_out, fast_metrics, fast_p50, fast_p95 = bench(src, True, args.runs)
+        print(
+            f"{size[0]:>5}x{size[1]:<5} | {full_p50:>7.1f}/{full_p95:<8.1f} | "
+            f"{fast_p50:>7.1f}/{fast_p95:<8.1f} | {fast_metrics['decode_px']:>9} | "
+            f"{psnr(full_out, fast_out):.1f} dB"
+        )
+
+
+if __name__ == "__main__":
+    main()
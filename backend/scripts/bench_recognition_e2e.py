@@ -0,0 +1,351 @@
+"""
+End-to-end нагрузочный прогон распознавания: upload → очередь → AI Proxy → статус.
+
+Что делает:
+- POST /api/v1/ai/recognize/ с фикстурами JPEG/PNG/HEIC (с заданной concurrency)
+- опрашивает TaskStatusView (GET /api/v1/ai/task/<id>/) до терминального статуса
+- собирает по каждому запросу:
+    enqueue_ms   — латентность POST (parse/validate + storage + постановка в очередь)
+    queue_wait   — ожидание в очереди (из result.timings_ms, см. apps.ai.stage_timings)
+    normalize    — нормализация фото
+    proxy_rtt    — вызов AI Proxy
+    db_persist   — запись items + MealPhoto
+    finalize     — finalize Meal + COMMIT + учёт usage
+    total_ms     — от отправки POST до терминального статуса (включая шаг polling)
+- печатает p50/p95/p99 и пишет JSON (--out) для сравнения прогонов между коммитами
+- --baseline: сравнение с прошлым JSON; рост перцентиля сверх --max-regression → exit 1
+
+Стенд (локально, НЕ прод — настоящий AI Proxy не нагружаем):
+    python -m apps.ai_proxy.fake_proxy --port 8001        # см. docs/AI_PROXY.md §9
+    AI_PROXY_URL=http://127.0.0.1:8001 ... runserver/gunicorn + celery -Q media,ai
+    python scripts/bench_recognition_e2e.py --requests 200 --concurrency 20 --out run.json
+
+Авторизация — debug headers (X-Debug-Mode / X-Debug-User-Id), нужен
+WEBAPP_DEBUG_MODE_ENABLED=True (по умолчанию в config.settings.local). При DEBUG
+дневной лимит фото в debug режиме не проверяется. Запросы раскладываются на --users
+пользователей, чтобы не упираться в лимит задач пользователя в работе (scheduling).
+
+Django не нужен: скрипт ходит в backend только по HTTP.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from io import BytesIO
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from PIL import Image, ImageFilter
+
+TERMINAL_STATUSES = ("success", "failed")
+STAGES = ("queue_wait", "normalize", "proxy_rtt", "db_persist", "finalize")
+METRICS = ("enqueue_ms",) + STAGES + ("total_ms",)
+PERCENTILES = (50, 95, 99)
+
+FIXTURE_EXTENSIONS = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".heic": "image/heic",
+    ".heif": "image/heif",
+}
+
+
+# ---------------------------------------------------------------------------
+# Фикстуры
+# ---------------------------------------------------------------------------
+
+
+def _photo_like_image(size: tuple) -> Image.Image:
+    """Градиент + шум — ближе к реальному фото, чем сплошная заливка."""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 64).filter(ImageFilter.GaussianBlur(2))
+    return Image.merge(
+        "RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT))
+    )
+
+
+def generate_fixtures() -> list:
+    """Телефонное JPEG 12 Мп, PNG-скриншот и HEIC (если установлен pillow-heif)."""
+    fixtures = []
+
+    buf = BytesIO()
+    _photo_like_image((3024, 4032)).save(buf, format="JPEG", quality=92)
+    fixtures.append(("generated_3024x4032.jpg", buf.getvalue(), "image/jpeg"))
+
+    buf = BytesIO()
+    _photo_like_image((1170, 2532)).save(buf, format="PNG")
+    fixtures.append(("generated_1170x2532.png", buf.getvalue(), "image/png"))
+
+    try:
+        from pillow_heif import register_heif_opener
+    except ImportError:
+        print("pillow-heif не установлен — HEIC фикстура пропущена", file=sys.stderr)
+    else:
+        register_heif_opener()
+        buf = BytesIO()
+        _photo_like_image((3024, 4032)).save(buf, format="HEIF", quality=90)
+        fixtures.append(("generated_3024x4032.heic", buf.getvalue(), "image/heic"))
+
+    return fixtures
+
+
+def load_fixtures(directory: str) -> list:
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        mime = FIXTURE_EXTENSIONS.get(os.path.splitext(name)[1].lower())
+        if mime is None:
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            fixtures.append((name, f.read(), mime))
+    if not fixtures:
+        raise SystemExit(f"В {directory} нет фикстур ({', '.join(FIXTURE_EXTENSIONS)})")
+    return fixtures
+
+
+# ---------------------------------------------------------------------------
+# Прогон
+# ---------------------------------------------------------------------------
+
+
+async def run_one(client: httpx.AsyncClient, args, index: int, fixture: tuple) -> dict:
+    name, data, mime = fixture
+    user_id = args.user_id_start + index % args.users
+    headers = {"X-Debug-Mode": "true", "X-Debug-User-Id": str(user_id)}
+    sample = {"fixture": name, "user_id": user_id}
+
+    start = time.perf_counter()
+    try:
+        resp = await client.post(
+            "/api/v1/ai/recognize/",
+            headers=headers,
+            files={"image": (name, data, mime)},
+            data={"meal_type": args.meal_type, "date": args.date},
+        )
+    except httpx.HTTPError as e:
+        return {**sample, "outcome": f"enqueue_error:{type(e).__name__}"}
+    sample["enqueue_ms"] = (time.perf_counter() - start) * 1000
+    if resp.status_code != 202:
+        code = _error_code(resp)
+        return {**sample, "outcome": f"enqueue_http_{resp.status_code}" + (f":{code}" if code else "")}
+
+    task_id = resp.json()["task_id"]
+    sample["task_id"] = task_id
+    deadline = start + args.timeout
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(args.poll_interval)
+        try:
+            resp = await client.get(f"/api/v1/ai/task/{task_id}/", headers=headers)
+        except httpx.HTTPError:
+            continue
+        if resp.status_code != 200:
+            continue
+        payload = resp.json()
+        if payload.get("status") not in TERMINAL_STATUSES:
+            continue
+
+        sample["total_ms"] = (time.perf_counter() - start) * 1000
+        result = payload.get("result") or {}
+        for stage_name, ms in (result.get("timings_ms") or {}).items():
+            if stage_name in STAGES:
+                sample[stage_name] = ms
+        error_code = result.get("error_code") or payload.get("error_code")
+        if payload["status"] == "failed":
+            sample["outcome"] = f"failed:{error_code or payload.get('error') or 'unknown'}"
+        elif error_code:
+            sample["outcome"] = f"error_code:{error_code}"
+        else:
+            sample["outcome"] = "success"
+        return sample
+
+    return {**sample, "outcome": "poll_timeout"}
+
+
+def _error_code(resp: httpx.Response) -> str:
+    try:
+        return str(resp.json().get("error_code") or "")
+    except (ValueError, AttributeError):
+        return ""
+
+
+async def run(args, fixtures: list) -> tuple:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30.0) as client:
+
+        async def bounded(index: int) -> dict:
+            async with semaphore:
+                return await run_one(client, args, index, fixtures[index % len(fixtures)])
+
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+        wall_s = time.perf_counter() - start
+    return list(samples), wall_s
+
+
+# ---------------------------------------------------------------------------
+# Отчёт
+# ---------------------------------------------------------------------------
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank перцентиль по отсортированному списку."""
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples: list, wall_s: float) -> dict:
+    metrics = {}
+    for metric in METRICS:
+        # Стадии — только по успешным задачам (ошибки искажают распределение)
+        values = sorted(
+            s[metric]
+            for s in samples
+            if metric in s and (metric == "enqueue_ms" or s["outcome"] == "success")
+        )
+        if not values:
+            continue
+        metrics[metric] = {
+            "count": len(values),
+            "mean": round(statistics.fmean(values), 1),
+            **{f"p{p}": round(percentile(values, p), 1) for p in PERCENTILES},
+            "max": round(values[-1], 1),
+        }
+
+    outcomes = {}
+    for s in samples:
+        outcomes[s["outcome"]] = outcomes.get(s["outcome"], 0) + 1
+    succeeded = outcomes.get("success", 0)
+    return {
+        "requests": len(samples),
+        "wall_s": round(wall_s, 2),
+        "throughput_rps": round(succeeded / wall_s, 2) if wall_s else 0.0,
+        "success_rate": round(succeeded / len(samples), 4) if samples else 0.0,
+        "outcomes": outcomes,
+        "metrics": metrics,
+    }
+
+
+def compare(summary: dict, baseline: dict, max_regression: float, min_delta_ms: float) -> list:
+    """Перцентили, выросшие относительно baseline больше чем на max_regression (доля)."""
+    regressions = []
+    for metric, current in summary["metrics"].items():
+        previous = baseline.get("summary", {}).get("metrics", {}).get(metric)
+        if not previous:
+            continue
+        for p in PERCENTILES:
+            key = f"p{p}"
+            before, after = previous.get(key), current.get(key)
+            if before is None or after is None:
+                continue
+            if after - before > max(min_delta_ms, before * max_regression):
+                regressions.append(f"{metric}.{key}: {before:.1f} → {after:.1f} ms")
+
+    before_rate = baseline.get("summary", {}).get("success_rate")
+    if before_rate is not None and summary["success_rate"] < before_rate - max_regression:
+        regressions.append(f"success_rate: {before_rate:.2%} → {summary['success_rate']:.2%}")
+    return regressions
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return out.stdout.strip()
+
+
+def print_report(summary: dict) -> None:
+    print("=" * 78)
+    print(
+        f"requests={summary['requests']} wall={summary['wall_s']}s "
+        f"throughput={summary['throughput_rps']} rps success={summary['success_rate']:.1%}"
+    )
+    print(f"outcomes: {summary['outcomes']}")
+    print("=" * 78)
+    print(f"{'metric':>12} | {'count':>5} | {'p50':>8} | {'p95':>8} | {'p99':>8} | {'max':>8}")
+    for metric in METRICS:
+        m = summary["metrics"].get(metric)
+        if m is None:
+            print(f"{metric:>12} | {'—':>5} |")
+            continue
+        print(
+            f"{metric:>12} | {m['count']:>5} | {m['p50']:>8.1f} | {m['p95']:>8.1f} | "
+            f"{m['p99']:>8.1f} | {m['max']:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E2E бенчмарк AI распознавания")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10, help="debug пользователей для запросов")
+    parser.add_argument("--user-id-start", type=int, default=900001)
+    parser.add_argument("--fixtures", help="каталог с .jpg/.png/.heic (иначе генерируются)")
+    parser.add_argument("--meal-type", default="lunch")
+    parser.add_argument("--date", default=datetime.now().date().isoformat())
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="шаг polling, с")
+    parser.add_argument("--timeout", type=float, default=120.0, help="лимит на запрос, с")
+    parser.add_argument("--out", help="путь для JSON с результатами")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="допустимый рост (доля)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="игнорировать рост меньше")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else generate_fixtures()
+    print(
+        f"fixtures: {[name for name, _, _ in fixtures]} "
+        f"requests={args.requests} concurrency={args.concurrency} → {args.base_url}"
+    )
+
+    samples, wall_s = asyncio.run(run(args, fixtures))
+    summary = summarize(samples, wall_s)
+    print_report(summary)
+
+    if args.out:
+        report = {
+            "commit": _git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                "base_url": args.base_url,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "users": args.users,
+                "poll_interval": args.poll_interval,
+                "fixtures": [name for name, _, _ in fixtures],
+            },
+            "summary": summary,
+            "samples": samples,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"JSON: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.max_regression, args.min_delta_ms)
+        print(f"baseline {baseline.get('commit') or args.baseline}: ", end="")
+        if regressions:
+            print("REGRESSION")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -112,6 +112,7 @@ export interface PaymentHistoryItem {
  */
 export interface PaymentHistory {
     results: PaymentHistoryItem[];
+    next: string | null;  // URL следующей страницы (keyset cursor) или null
 }
 
 /**